@@ -3,67 +3,180 @@
 ADB MCP Server Implementation using FastMCP
 
 This module contains the complete implementation of the ADB MCP server
-with all 19 tools for comprehensive Android device management.
+with all tools for comprehensive Android device management.
 """
 
 import sys
 import os
+import functools
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from mcp.server.fastmcp import FastMCP
-from src.utils.adb_helper import ADBHelper
+from mcp.server.fastmcp import FastMCP, Image
+from src.utils.async_adb_helper import AsyncADBHelper
+from src.utils.instrumentation import current_call, get_instrumentation, profile, profiling_enabled
+from src.utils.result_store import PREVIEW_LINES
 
 # 创建FastMCP服务器实例
 mcp = FastMCP("ADB MCP Server")
 
-@mcp.tool()
-def list_devices() -> str:
+_call_ids = itertools.count(1)
+
+def _is_error_result(result: Any) -> bool:
+    """工具结果是否表示失败：所有工具的错误文本都以 ❌ 开头，结构化结果以 error 字段表示"""
+    if isinstance(result, str):
+        return result.startswith("❌")
+    return isinstance(result, dict) and 'error' in result
+
+def _tool(**kwargs):
+    """
+    注册 MCP 工具，并记录每次调用的耗时、文本结果大小和是否失败；
+    工具名在 ADB_MCP_PROFILE 中时对本次调用启用 cProfile
+    """
+    register = mcp.tool(**kwargs)
+
+    def decorator(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kw):
+            call_id = next(_call_ids)
+            token = current_call.set((name, call_id))
+            start = time.monotonic()
+            result = None
+            failed = True
+            try:
+                if profiling_enabled(name):
+                    with profile(f"{name}-{call_id}", exclusive=True):
+                        result = await func(*args, **kw)
+                else:
+                    result = await func(*args, **kw)
+                failed = _is_error_result(result)
+                return result
+            finally:
+                current_call.reset(token)
+                instrumentation = get_instrumentation()
+                instrumentation.observe('tool', name, time.monotonic() - start, failed,
+                                        nbytes=len(result.encode('utf-8')) if isinstance(result, str) else 0)
+                instrumentation.maybe_dump()
+
+        return register(wrapper)
+
+    return decorator
+
+async def _spill_large_result(text: str, label: str) -> str:
+    """结果超过内联阈值时保存到结果存储，只返回开头部分预览和分页读取的句柄"""
+    stored = await AsyncADBHelper.spill_result(text, label)
+    if stored is None:
+        return text
+    preview = await AsyncADBHelper.read_result(stored['handle'], 0, PREVIEW_LINES)
+    parts = [preview['text'], "...",
+             f"📦 结果较大（共 {stored['lines']} 行，{stored['bytes']} 字节），完整内容已保存，句柄: {stored['handle']}"]
+    if preview['next_offset'] is not None:
+        parts.append(f"使用 read_result(handle=\"{stored['handle']}\", offset={preview['next_offset']}) 分页读取后续内容")
+    return "\n".join(parts)
+
+def _project(record: Any, fields: Optional[List[str]]) -> Any:
+    """只保留 fields 中列出的字段；未指定字段或记录不是字典时原样返回"""
+    if not fields or not isinstance(record, dict):
+        return record
+    return {key: record[key] for key in fields if key in record}
+
+def _page(items: List[Any], offset: int, limit: int) -> Tuple[List[Any], Optional[int]]:
+    """按 offset/limit 取一页，返回 (该页, 下一页的 offset，没有更多时为 None)"""
+    offset = max(0, offset)
+    page = items[offset:offset + limit] if limit > 0 else items[offset:]
+    end = offset + len(page)
+    return page, (end if end < len(items) else None)
+
+def _structured(items: List[Any], fields: Optional[List[str]] = None, offset: int = 0, limit: int = 0,
+                **extra: Any) -> Dict[str, Any]:
+    """结构化输出：字段投影并分页，附带 total / offset / next_offset"""
+    page, next_offset = _page(items, offset, limit)
+    return {**extra, 'items': [_project(item, fields) for item in page], 'total': len(items),
+            'offset': max(0, offset), 'next_offset': next_offset}
+
+@_tool()
+async def list_devices(output_format: str = "text", fields: Optional[List[str]] = None,
+                       offset: int = 0, limit: int = 0) -> Union[str, Dict[str, Any]]:
     """列出所有连接的 Android 设备。
 
+    Args:
+        output_format (str): text（默认，人类可读文本）或 json（直接返回解析后的结构化数据）。
+        fields (list): json 模式下只返回这些字段，如 ["id", "status", "model"]；留空时返回全部。
+        offset (int): 分页起始位置，默认 0。
+        limit (int): 最多返回的条目数；0 表示不限。
+
     Returns:
-        str: 人类可读的设备列表或错误信息。
+        str | dict: 人类可读的设备列表或错误信息；json 模式下为结构化数据。
     """
     try:
-        devices = ADBHelper.list_devices()
-        
+        devices = await AsyncADBHelper.list_devices()
+
+        if output_format == "json":
+            return _structured(devices, fields, offset, limit)
+
+        devices, next_offset = _page(devices, offset, limit)
         if not devices:
             return "没有找到连接的Android设备。请确保：\n1. 设备已连接\n2. 已启用USB调试\n3. 已授权此计算机"
-        
-        result = "连接的Android设备：\n\n"
-        for i, device in enumerate(devices, 1):
-            result += f"{i}. 设备ID: {device['id']}\n"
-            result += f"   状态: {device['status']}\n"
-            
+
+        lines = ["连接的Android设备：", ""]
+        for i, device in enumerate(devices, max(0, offset) + 1):
+            lines.append(f"{i}. 设备ID: {device['id']}")
+            lines.append(f"   状态: {device['status']}")
+
             # 显示额外信息
-            for key, value in device.items():
-                if key not in ['id', 'status']:
-                    result += f"   {key}: {value}\n"
-            result += "\n"
-        
-        return result
+            lines.extend(f"   {key}: {value}" for key, value in device.items() if key not in ['id', 'status'])
+            lines.append("")
+        if next_offset is not None:
+            lines.append(f"还有更多设备，使用 offset={next_offset} 继续")
+
+        return "\n".join(lines) + "\n"
         
     except Exception as e:
-        return f"列出设备时发生错误: {str(e)}"
+        return f"❌ 列出设备时发生错误: {str(e)}"
 
-@mcp.tool()
-def get_device_info(device_id: str = "") -> str:
+@_tool()
+async def get_device_info(device_id: str = "", properties: Optional[List[str]] = None,
+                          output_format: str = "text", fields: Optional[List[str]] = None) -> Union[str, Dict[str, Any]]:
     """获取指定设备的详细信息。
 
     Args:
         device_id (str): 设备 ID；留空时使用默认/首个设备。
+        properties (list): 只查询这些系统属性（如 ["ro.product.model", "sys.boot_completed"]）；
+            留空时返回常用设备信息。ro.* 属性在设备重启前会被缓存。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回解析后的结构化数据）。
+        fields (list): json 模式下只返回这些字段（属性名）；留空时返回全部。
 
     Returns:
-        str: 人类可读的设备信息或错误信息。
+        str | dict: 人类可读的设备信息或错误信息；json 模式下为结构化数据。
     """
     try:
         # 如果device_id为空字符串，传递None给ADBHelper
         device_id_param = device_id if device_id else None
-        info = ADBHelper.get_device_info(device_id_param)
-        
+
+        if properties:
+            props = await AsyncADBHelper.get_props(properties, device_id_param)
+            if output_format == "json":
+                return props if 'error' in props else _project(props, fields)
+            if 'error' in props:
+                return f"❌ 获取设备属性失败: {props['error']}"
+            lines = [f"设备属性 {'(设备: ' + device_id + ')' if device_id else ''}:", ""]
+            lines.extend(f"{key}: {props.get(key, '')}" for key in properties)
+            return "\n".join(lines) + "\n"
+
+        info = await AsyncADBHelper.get_device_info(device_id_param)
+
+        if output_format == "json":
+            return info if 'error' in info else _project(info, fields)
+
         if 'error' in info:
-            return f"获取设备信息失败: {info['error']}"
+            return f"❌ 获取设备信息失败: {info['error']}"
         
         # 格式化重要信息
         important_props = {
@@ -76,56 +189,93 @@ def get_device_info(device_id: str = "") -> str:
             'ro.build.display.id': '构建ID'
         }
         
-        result = f"设备信息 {'(设备: ' + device_id + ')' if device_id else ''}:\n\n"
-        
+        lines = [f"设备信息 {'(设备: ' + device_id + ')' if device_id else ''}:", ""]
+
         # 显示重要属性
-        for prop, label in important_props.items():
-            if prop in info:
-                result += f"{label}: {info[prop]}\n"
-        
+        lines.extend(f"{label}: {info[prop]}" for prop, label in important_props.items() if prop in info)
+
         # 显示电池和内存信息（如果可用）
-        result += "\n其他信息:\n"
-        other_info_found = False
-        for key, value in info.items():
-            if key.startswith(('battery', 'memory', 'storage')):
-                result += f"{key}: {value}\n"
-                other_info_found = True
-        
-        if not other_info_found:
-            result += "暂无其他信息\n"
-        
-        return result
+        lines.extend(["", "其他信息:"])
+        other_info = [f"{key}: {value}" for key, value in info.items()
+                      if key.startswith(('battery', 'memory', 'storage'))]
+        lines.extend(other_info or ["暂无其他信息"])
+
+        return "\n".join(lines) + "\n"
         
     except Exception as e:
-        return f"获取设备信息时发生错误: {str(e)}"
+        return f"❌ 获取设备信息时发生错误: {str(e)}"
+
+@_tool()
+async def get_device_events(limit: int = 50, output_format: str = "text",
+                            fields: Optional[List[str]] = None) -> Union[str, Dict[str, Any]]:
+    """获取最近的设备上线、下线和状态变化事件。
+
+    Args:
+        limit (int): 返回的最大事件数，默认 50。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回解析后的结构化数据）。
+        fields (list): json 模式下只返回这些字段，如 ["time", "id", "event"]；留空时返回全部。
+
+    Returns:
+        str | dict: 按时间顺序排列的设备事件列表或提示信息；json 模式下为结构化数据。
+    """
+    try:
+        events = await AsyncADBHelper.get_device_events(limit)
+
+        if output_format == "json":
+            return _structured(events, fields)
+
+        if not events:
+            return "暂无设备事件（设备跟踪器未启用或尚未观察到变化）"
+
+        event_names = {'connected': '上线', 'disconnected': '下线', 'changed': '状态变化'}
+        lines = [f"最近的设备事件 (共{len(events)}条):", ""]
+        for event in events:
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event['time']))
+            lines.append(f"{timestamp} {event_names.get(event['event'], event['event'])}: "
+                         f"{event['id']} ({event['status']})")
+
+        return "\n".join(lines)
+
+    except Exception as e:
+        return f"❌ 获取设备事件时发生错误: {str(e)}"
 
 # ==================== 应用管理工具 ====================
 
-@mcp.tool()
-def install_app(apk_path: str, device_id: str = "") -> str:
+@_tool()
+async def install_app(apk_path: str, device_id: str = "", split_paths: Optional[List[str]] = None,
+                      skip_if_installed: bool = True) -> str:
     """安装 APK 应用到 Android 设备。
 
+    设备上已安装同一版本（包名、versionCode 及 APK 文件摘要均相同）时默认跳过传输，
+    重复部署同一构建几乎不耗时。
+
     Args:
         apk_path (str): APK 文件的本地路径（绝对或相对，建议绝对路径）。
         device_id (str): 设备 ID；留空时使用默认/首个设备。
+        split_paths (list): 拆分 APK（split APK）的本地路径列表；提供时与 apk_path 一起以 install-multiple 安装。
+        skip_if_installed (bool): 已安装相同 APK 时是否跳过，默认 True；False 时总是重新安装。
 
     Returns:
         str: 安装结果的文本信息。
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.install_app(apk_path, device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.install_app(apk_path, device_id_param, split_paths,
+                                                                   skip_if_installed)
 
         if success:
+            if stdout.startswith(AsyncADBHelper.INSTALL_SKIPPED):
+                return (f"✅ 设备上已安装相同的 APK，已跳过安装\n路径: {apk_path}\n设备: {device_id or '默认设备'}\n"
+                        f"详情: {stdout[len(AsyncADBHelper.INSTALL_SKIPPED):].strip()}")
             return f"✅ 应用安装成功\n路径: {apk_path}\n设备: {device_id or '默认设备'}\n输出: {stdout}"
         else:
             return f"❌ 应用安装失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"安装应用时发生错误: {str(e)}"
+        return f"❌ 安装应用时发生错误: {str(e)}"
 
-@mcp.tool()
-def uninstall_app(package_name: str, device_id: str = "") -> str:
+@_tool()
+async def uninstall_app(package_name: str, device_id: str = "") -> str:
     """卸载 Android 应用。
 
     Args:
@@ -137,7 +287,7 @@ def uninstall_app(package_name: str, device_id: str = "") -> str:
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.uninstall_app(package_name, device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.uninstall_app(package_name, device_id_param)
 
         if success:
             return f"✅ 应用卸载成功\n包名: {package_name}\n设备: {device_id or '默认设备'}"
@@ -145,54 +295,128 @@ def uninstall_app(package_name: str, device_id: str = "") -> str:
             return f"❌ 应用卸载失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"卸载应用时发生错误: {str(e)}"
+        return f"❌ 卸载应用时发生错误: {str(e)}"
 
-@mcp.tool()
-def list_packages(device_id: str = "", system_apps: bool = False) -> str:
+@_tool()
+async def list_packages(device_id: str = "", system_apps: bool = False, output_format: str = "text",
+                        offset: int = 0, limit: int = 0) -> Union[str, Dict[str, Any]]:
     """列出设备上已安装的应用包。
 
     Args:
         device_id (str): 设备 ID；留空时使用默认/首个设备。
         system_apps (bool): 是否包含系统应用；默认 False，仅显示第三方应用。
+        output_format (str): text（默认，人类可读文本）或 json（包名列表）。json 模式的条目是包名字符串，
+            没有可投影的字段，因此不接受 fields；需要 version_code、installer 等字段时使用 query_packages。
+        offset (int): 分页起始位置，默认 0。
+        limit (int): 最多返回的条目数；0 表示不限。
 
     Returns:
-        str: 应用包列表或提示信息。
+        str | dict: 应用包列表或提示信息；json 模式下为结构化数据。
     """
     try:
         device_id_param = device_id if device_id else None
-        packages = ADBHelper.list_packages(device_id_param, system_apps)
+        packages = await AsyncADBHelper.list_packages(device_id_param, system_apps)
+
+        if output_format == "json":
+            return _structured(packages, None, offset, limit)
 
         if not packages:
             return "没有找到已安装的应用包"
 
         app_type = "所有应用" if system_apps else "第三方应用"
-        result = f"设备上的{app_type} (共{len(packages)}个):\n\n"
+        page, next_offset = _page(packages, offset, limit)
+        lines = [f"设备上的{app_type} (共{len(packages)}个):", ""]
+        lines.extend(f"{i}. {package}" for i, package in enumerate(page, max(0, offset) + 1))
+        if next_offset is not None:
+            lines.append(f"\n还有更多应用，使用 offset={next_offset} 继续")
 
-        for i, package in enumerate(packages, 1):
-            result += f"{i}. {package}\n"
+        return await _spill_large_result("\n".join(lines) + "\n", "list_packages")
 
-        return result
+    except Exception as e:
+        return f"❌ 列出应用包时发生错误: {str(e)}"
+
+@_tool()
+async def query_packages(search: str = "", system_apps: bool = False, installer: str = "", uid: int = 0,
+                         device_id: str = "", refresh: bool = False, output_format: str = "text",
+                         fields: Optional[List[str]] = None, offset: int = 0,
+                         limit: int = 0) -> Union[str, Dict[str, Any]]:
+    """查询已安装应用的详细清单（APK 路径、versionCode、UID、安装来源）。
+
+    清单通过一条 pm list packages 命令整体获取并按设备缓存，无需逐个 dumpsys package；
+    缓存过期后重新获取时会列出与上一次相比新增、删除和版本变化的应用。
+
+    Args:
+        search (str): 包名或 APK 路径包含的文本（不区分大小写）；为空则不过滤。
+        system_apps (bool): 是否包含系统应用；默认 False，仅显示第三方应用。
+        installer (str): 只显示该安装来源安装的应用，如 com.android.vending。
+        uid (int): 只显示该 UID 的应用；0 表示不限。
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        refresh (bool): 是否忽略缓存立即重新获取清单，默认 False。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回解析后的结构化数据）。
+        fields (list): json 模式下只返回这些字段，如 ["package", "version_code"]；可选 package, path, version_code, uid, installer, system；留空时返回全部。
+        offset (int): 分页起始位置，默认 0。
+        limit (int): 最多返回的条目数；0 表示不限。
+
+    Returns:
+        str | dict: 匹配的应用列表或提示信息；json 模式下为结构化数据。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        data = await AsyncADBHelper.query_packages(search, system_apps, installer, uid, device_id_param, refresh)
+
+        if output_format == "json":
+            if 'error' in data:
+                return data
+            return _structured(data['packages'], fields, offset, limit,
+                               device_total=data['total'], changes=data['changes'])
+
+        if 'error' in data:
+            return f"❌ 查询应用清单失败\n错误: {data['error']}"
+
+        lines = [f"应用清单 {'(设备: ' + device_id + ')' if device_id else ''}:",
+                 f"匹配: {len(data['packages'])} 个（设备上共 {data['total']} 个应用）"]
+        changes = data['changes']
+        for key, title in (('added', '新增'), ('removed', '删除'), ('updated', '更新')):
+            if changes.get(key):
+                lines.append(f"最近{title}: {', '.join(changes[key])}")
+        lines.append("")
+
+        page, next_offset = _page(data['packages'], offset, limit)
+        for info in page:
+            lines.append(f"{info['package']}{'' if not info['system'] else ' [系统]'}")
+            lines.append(f"   versionCode: {info['version_code'] if info['version_code'] is not None else '未知'}"
+                         f"  UID: {info['uid'] if info['uid'] is not None else '未知'}"
+                         f"  安装来源: {info['installer'] or '无'}")
+            lines.append(f"   路径: {info['path'] or '未知'}")
+        if next_offset is not None:
+            lines.append(f"\n还有更多应用，使用 offset={next_offset} 继续")
+
+        return await _spill_large_result("\n".join(lines), "query_packages")
 
     except Exception as e:
-        return f"列出应用包时发生错误: {str(e)}"
+        return f"❌ 查询应用清单时发生错误: {str(e)}"
 
 # ==================== 文件传输工具 ====================
 
-@mcp.tool()
-def push_file(local_path: str, remote_path: str, device_id: str = "") -> str:
+@_tool()
+async def push_file(local_path: str, remote_path: str, device_id: str = "",
+                    use_tar: bool = False, compress: bool = False) -> str:
     """推送文件到 Android 设备。
 
     Args:
-        local_path (str): 本地文件路径（建议绝对路径）。
+        local_path (str): 本地文件或目录路径（建议绝对路径）。
         remote_path (str): 设备上的目标路径。
         device_id (str): 设备 ID；留空时使用默认/首个设备。
+        use_tar (bool): 以 tar 流批量传输，推送包含大量小文件的目录时明显更快，默认 False。
+        compress (bool): tar 流使用 gzip 压缩（适合文本等可压缩数据），默认 False。
 
     Returns:
         str: 推送结果的文本信息。
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.push_file(local_path, remote_path, device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.push_file(
+            local_path, remote_path, device_id_param, use_tar, compress)
 
         if success:
             return f"✅ 文件推送成功\n本地: {local_path}\n设备: {remote_path}\n设备ID: {device_id or '默认设备'}\n详情: {stdout}"
@@ -200,23 +424,27 @@ def push_file(local_path: str, remote_path: str, device_id: str = "") -> str:
             return f"❌ 文件推送失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"推送文件时发生错误: {str(e)}"
+        return f"❌ 推送文件时发生错误: {str(e)}"
 
-@mcp.tool()
-def pull_file(remote_path: str, local_path: str, device_id: str = "") -> str:
+@_tool()
+async def pull_file(remote_path: str, local_path: str, device_id: str = "",
+                    use_tar: bool = False, compress: bool = False) -> str:
     """从 Android 设备拉取文件到本地。
 
     Args:
-        remote_path (str): 设备上的文件路径。
+        remote_path (str): 设备上的文件或目录路径。
         local_path (str): 本地保存路径（建议绝对路径）。
         device_id (str): 设备 ID；留空时使用默认/首个设备。
+        use_tar (bool): 以 tar 流批量传输，拉取包含大量小文件的目录时明显更快，默认 False。
+        compress (bool): tar 流使用 gzip 压缩（适合文本等可压缩数据），默认 False。
 
     Returns:
         str: 拉取结果的文本信息。
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.pull_file(remote_path, local_path, device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.pull_file(
+            remote_path, local_path, device_id_param, use_tar, compress)
 
         if success:
             return f"✅ 文件拉取成功\n设备: {remote_path}\n本地: {local_path}\n设备ID: {device_id or '默认设备'}\n详情: {stdout}"
@@ -224,58 +452,257 @@ def pull_file(remote_path: str, local_path: str, device_id: str = "") -> str:
             return f"❌ 文件拉取失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"拉取文件时发生错误: {str(e)}"
+        return f"❌ 拉取文件时发生错误: {str(e)}"
+
+def _format_sync_report(report: Dict[str, Any], source: str, target: str, delete: bool) -> str:
+    """格式化目录同步报告"""
+    mode = "（演练，未做任何修改）" if report['dry_run'] else ""
+    lines = [f"{'✅' if not report['errors'] else '❌'} 目录同步{'计划' if report['dry_run'] else '完成'}{mode}",
+             f"源: {source}", f"目标: {target}",
+             f"需传输: {len(report['transfer'])} 个文件（{report['bytes']} 字节）",
+             f"未变化: {report['unchanged']} 个文件",
+             f"目标端多余: {len(report['extra'])} 个文件{'（将删除）' if delete and report['dry_run'] else ''}"]
+    if not report['dry_run']:
+        lines.append(f"已传输: {report['transferred']} 个文件，已删除: {report['deleted']} 个文件")
+    if report['dry_run']:
+        for title, paths in (("传输", report['transfer']), ("多余", report['extra'])):
+            if paths:
+                lines.append(f"\n{title}列表:")
+                lines.extend(f"  {path}" for path in paths[:50])
+                if len(paths) > 50:
+                    lines.append(f"  ... 另有 {len(paths) - 50} 个")
+    if report['errors']:
+        lines.append("\n错误:")
+        lines.extend(f"  {error}" for error in report['errors'][:20])
+    return "\n".join(lines)
+
+@_tool()
+async def sync_push(local_dir: str, remote_dir: str, device_id: str = "", delete: bool = False,
+                    dry_run: bool = False, checksum: bool = False) -> str:
+    """增量推送本地目录到设备，只传输新增或变化的文件。
+
+    比较两端文件的大小和修改时间（checksum=True 时比较 md5），上一次同步的清单缓存在本地。
+
+    Args:
+        local_dir (str): 本地目录（建议绝对路径）。
+        remote_dir (str): 设备上的目标目录，不存在时自动创建。
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        delete (bool): 删除设备目录中本地不存在的文件，默认 False。
+        dry_run (bool): 只列出将要传输和删除的文件，不做修改，默认 False。
+        checksum (bool): 大小相同的文件比较 md5 摘要（在设备上计算），默认 False。
+
+    Returns:
+        str: 同步报告。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        success, report, stderr = await AsyncADBHelper.sync_push(
+            local_dir, remote_dir, device_id_param, delete, dry_run, checksum)
+        if report is None:
+            return f"❌ 目录同步失败\n错误: {stderr}"
+        return _format_sync_report(report, local_dir, remote_dir, delete)
+
+    except Exception as e:
+        return f"❌ 同步目录时发生错误: {str(e)}"
+
+@_tool()
+async def sync_pull(remote_dir: str, local_dir: str, device_id: str = "", delete: bool = False,
+                    dry_run: bool = False, checksum: bool = False) -> str:
+    """增量拉取设备目录到本地，只传输新增或变化的文件。
 
-@mcp.tool()
-def list_files(remote_path: str, device_id: str = "") -> str:
+    比较两端文件的大小和修改时间（checksum=True 时比较 md5），上一次同步的清单缓存在本地。
+
+    Args:
+        remote_dir (str): 设备上的目录。
+        local_dir (str): 本地目标目录（建议绝对路径），不存在时自动创建。
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        delete (bool): 删除本地目录中设备上不存在的文件，默认 False。
+        dry_run (bool): 只列出将要传输和删除的文件，不做修改，默认 False。
+        checksum (bool): 大小相同的文件比较 md5 摘要（在设备上计算），默认 False。
+
+    Returns:
+        str: 同步报告。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        success, report, stderr = await AsyncADBHelper.sync_pull(
+            remote_dir, local_dir, device_id_param, delete, dry_run, checksum)
+        if report is None:
+            return f"❌ 目录同步失败\n错误: {stderr}"
+        return _format_sync_report(report, remote_dir, local_dir, delete)
+
+    except Exception as e:
+        return f"❌ 同步目录时发生错误: {str(e)}"
+
+@_tool()
+async def list_files(remote_path: str, device_id: str = "", output_format: str = "text",
+                     fields: Optional[List[str]] = None, offset: int = 0,
+                     limit: int = 0) -> Union[str, Dict[str, Any]]:
     """列出 Android 设备上指定目录的文件。
 
     Args:
         remote_path (str): 设备上的目录路径。
         device_id (str): 设备 ID；留空时使用默认/首个设备。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回解析后的结构化数据）。
+        fields (list): json 模式下只返回这些字段；可选 permissions, links, owner, group, size, date, name；留空时返回全部。
+        offset (int): 分页起始位置，默认 0。
+        limit (int): 最多返回的条目数；0 表示不限。
 
     Returns:
-        str: 目录内容的表格文本或提示信息。
+        str | dict: 目录内容的表格文本或提示信息；json 模式下为结构化数据。
     """
     try:
         device_id_param = device_id if device_id else None
-        files = ADBHelper.list_files(remote_path, device_id_param)
+        files = await AsyncADBHelper.list_files(remote_path, device_id_param)
+
+        if output_format == "json":
+            return _structured(files, fields, offset, limit, path=remote_path)
 
         if not files:
             return f"目录为空或无法访问: {remote_path}"
 
-        result = f"目录内容: {remote_path}\n设备: {device_id or '默认设备'}\n\n"
-        result += f"{'权限':<12} {'大小':<10} {'修改时间':<15} {'文件名'}\n"
-        result += "-" * 60 + "\n"
+        page, next_offset = _page(files, offset, limit)
+        lines = [f"目录内容: {remote_path}", f"设备: {device_id or '默认设备'}", "",
+                 f"{'权限':<12} {'大小':<10} {'修改时间':<15} {'文件名'}", "-" * 60]
+        lines.extend(f"{file_info['permissions']:<12} {file_info['size']:<10} {file_info['date']:<15} {file_info['name']}"
+                     for file_info in page)
+        if next_offset is not None:
+            lines.append(f"\n还有更多条目，使用 offset={next_offset} 继续")
+
+        return await _spill_large_result("\n".join(lines) + "\n", "list_files")
+
+    except Exception as e:
+        return f"❌ 列出文件时发生错误: {str(e)}"
+
+@_tool()
+async def find_files(remote_path: str, device_id: str = "", pattern: str = "", file_type: str = "",
+                     max_depth: int = 0, offset: int = 0, limit: int = 500, refresh: bool = False,
+                     output_format: str = "text", fields: Optional[List[str]] = None) -> Union[str, Dict[str, Any]]:
+    """递归列出设备目录（单条 find + stat 命令完成遍历），支持通配符过滤和分页。
 
-        for file_info in files:
-            result += f"{file_info['permissions']:<12} {file_info['size']:<10} {file_info['date']:<15} {file_info['name']}\n"
+    遍历结果按设备缓存在文件索引中（默认 60 秒，push_file / sync_push 写入的目录立即失效），
+    同一子树之后的列目录、搜索和 get_disk_usage 直接由缓存回答。
 
-        return result
+    Args:
+        remote_path (str): 设备上的目录路径，如 /sdcard。
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        pattern (str): 通配符，如 *.jpg；含 / 时匹配相对 remote_path 的路径，否则匹配文件名。
+        file_type (str): 只返回该类型：file, dir, link, other；留空时不限。
+        max_depth (int): 最大递归深度，1 表示只列出直接子项；0 表示不限。
+        offset (int): 分页起始位置。
+        limit (int): 每页最多条目数。
+        refresh (bool): 忽略缓存重新遍历。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回解析后的结构化数据）。
+        fields (list): json 模式下只返回这些字段；可选 path, name, type, permissions, size, mtime, owner, group；留空时返回全部。
+
+    Returns:
+        str | dict: 文件列表（含分页信息）或错误信息；json 模式下为结构化数据。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        result = await AsyncADBHelper.find_files(remote_path, device_id_param, pattern or None, file_type or None,
+                                                 max_depth if max_depth > 0 else None, offset, limit, refresh)
+
+        if output_format == "json":
+            if 'error' not in result:
+                result['files'] = [_project(item, fields) for item in result['files']]
+            return result
+
+        if 'error' in result:
+            return f"❌ 列出文件失败: {result['error']}"
+
+        lines = [f"目录: {remote_path}  设备: {device_id or '默认设备'}",
+                 f"共 {result['total']} 项，显示 {offset + 1 if result['files'] else 0}-{offset + len(result['files'])}"
+                 f"{'（来自缓存）' if result['cached'] else ''}"]
+        if result['truncated']:
+            lines.append("⚠️ 输出超过大小上限，列表不完整（未缓存），可缩小目录范围或使用 max_depth")
+        lines.append("")
+        lines.append(f"{'权限':<12} {'大小':>10} {'修改时间':<17} {'路径'}")
+        lines.append("-" * 70)
+        for item in result['files']:
+            mtime = time.strftime('%Y-%m-%d %H:%M', time.localtime(item['mtime']))
+            lines.append(f"{item['permissions']:<12} {item['size']:>10} {mtime:<17} {item['path']}")
+        if result['next_offset'] is not None:
+            lines.append(f"\n还有更多结果，使用 offset={result['next_offset']} 继续")
+
+        return await _spill_large_result("\n".join(lines), "find_files")
 
     except Exception as e:
-        return f"列出文件时发生错误: {str(e)}"
+        return f"❌ 列出文件时发生错误: {str(e)}"
+
+@_tool()
+async def get_disk_usage(remote_path: str, device_id: str = "", refresh: bool = False,
+                         output_format: str = "text", fields: Optional[List[str]] = None,
+                         offset: int = 0, limit: int = 0) -> Union[str, Dict[str, Any]]:
+    """汇总设备目录下的文件总大小，并按直接子目录/文件列出占用（由文件索引计算）。
+
+    Args:
+        remote_path (str): 设备上的目录路径。
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        refresh (bool): 忽略缓存重新遍历。
+        output_format (str): text（默认，人类可读文本）或 json（汇总数据，子项在 items 中，大小以字节为单位）。
+        fields (list): json 模式下子项只返回这些字段；可选 name, is_dir, bytes, files；留空时返回全部。
+        offset (int): 子项分页起始位置，默认 0。
+        limit (int): 最多返回的子项数；0 表示不限。
+
+    Returns:
+        str | dict: 目录大小汇总或错误信息；json 模式下为结构化数据。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        usage = await AsyncADBHelper.get_disk_usage(remote_path, device_id_param, refresh)
+
+        if output_format == "json":
+            if 'error' in usage:
+                return usage
+            summary = {key: value for key, value in usage.items() if key != 'children'}
+            return _structured(usage['children'], fields, offset, limit, **summary)
+
+        if 'error' in usage:
+            return f"❌ 统计目录大小失败: {usage['error']}"
+
+        lines = [f"目录占用: {remote_path}{'（来自缓存）' if usage['cached'] else ''}",
+                 f"总计: {_format_bytes(usage['total_bytes'])}，{usage['files']} 个文件，{usage['dirs']} 个目录"]
+        if usage['truncated']:
+            lines.append("⚠️ 输出超过大小上限，统计不完整")
+        lines.append("")
+        page, next_offset = _page(usage['children'], offset, limit)
+        lines.extend(f"{_format_bytes(child['bytes']):>10}  {child['files']:>6} 个文件  "
+                     f"{child['name']}{'/' if child['is_dir'] else ''}" for child in page)
+        if next_offset is not None:
+            lines.append(f"\n还有更多子项，使用 offset={next_offset} 继续")
+
+        return await _spill_large_result("\n".join(lines), "get_disk_usage")
+
+    except Exception as e:
+        return f"❌ 统计目录大小时发生错误: {str(e)}"
 
 # ==================== 系统信息工具 ====================
 
-@mcp.tool()
-def get_battery_info(device_id: str = "") -> str:
+@_tool()
+async def get_battery_info(device_id: str = "", output_format: str = "text",
+                           fields: Optional[List[str]] = None) -> Union[str, Dict[str, Any]]:
     """获取设备电池信息。
 
     Args:
         device_id (str): 设备 ID；留空时使用默认/首个设备。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回解析后的结构化数据）。
+        fields (list): json 模式下只返回这些字段，如 ["level", "temperature"]；留空时返回全部。
 
     Returns:
-        str: 人类可读的电池信息或错误信息。
+        str | dict: 人类可读的电池信息或错误信息；json 模式下为结构化数据。
     """
     try:
         device_id_param = device_id if device_id else None
-        info = ADBHelper.get_battery_info(device_id_param)
+        info = await AsyncADBHelper.get_battery_info(device_id_param)
+
+        if output_format == "json":
+            return info if 'error' in info else _project(info, fields)
 
         if 'error' in info:
-            return f"获取电池信息失败: {info['error']}"
+            return f"❌ 获取电池信息失败: {info['error']}"
 
-        result = f"电池信息 {'(设备: ' + device_id + ')' if device_id else ''}:\n\n"
+        lines = [f"电池信息 {'(设备: ' + device_id + ')' if device_id else ''}:", ""]
 
         # 重要的电池信息
         important_keys = [
@@ -284,33 +711,37 @@ def get_battery_info(device_id: str = "") -> str:
             'voltage', 'temperature', 'technology'
         ]
 
-        for key in important_keys:
-            if key in info:
-                result += f"{key}: {info[key]}\n"
+        lines.extend(f"{key}: {info[key]}" for key in important_keys if key in info)
 
-        return result
+        return "\n".join(lines) + "\n"
 
     except Exception as e:
-        return f"获取电池信息时发生错误: {str(e)}"
+        return f"❌ 获取电池信息时发生错误: {str(e)}"
 
-@mcp.tool()
-def get_memory_info(device_id: str = "") -> str:
+@_tool()
+async def get_memory_info(device_id: str = "", output_format: str = "text",
+                          fields: Optional[List[str]] = None) -> Union[str, Dict[str, Any]]:
     """获取设备内存信息。
 
     Args:
         device_id (str): 设备 ID；留空时使用默认/首个设备。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回解析后的结构化数据）。
+        fields (list): json 模式下只返回这些字段，如 ["MemTotal", "MemAvailable"]；留空时返回全部。
 
     Returns:
-        str: 人类可读的内存信息或错误信息。
+        str | dict: 人类可读的内存信息或错误信息；json 模式下为结构化数据。
     """
     try:
         device_id_param = device_id if device_id else None
-        info = ADBHelper.get_memory_info(device_id_param)
+        info = await AsyncADBHelper.get_memory_info(device_id_param)
+
+        if output_format == "json":
+            return info if 'error' in info else _project(info, fields)
 
         if 'error' in info:
-            return f"获取内存信息失败: {info['error']}"
+            return f"❌ 获取内存信息失败: {info['error']}"
 
-        result = f"内存信息 {'(设备: ' + device_id + ')' if device_id else ''}:\n\n"
+        lines = [f"内存信息 {'(设备: ' + device_id + ')' if device_id else ''}:", ""]
 
         # 重要的内存信息
         important_keys = [
@@ -318,66 +749,288 @@ def get_memory_info(device_id: str = "") -> str:
             'SwapTotal', 'SwapFree', 'Active', 'Inactive'
         ]
 
-        for key in important_keys:
-            if key in info:
-                result += f"{key}: {info[key]}\n"
+        lines.extend(f"{key}: {info[key]}" for key in important_keys if key in info)
 
-        return result
+        return "\n".join(lines) + "\n"
 
     except Exception as e:
-        return f"获取内存信息时发生错误: {str(e)}"
+        return f"❌ 获取内存信息时发生错误: {str(e)}"
 
-@mcp.tool()
-def get_storage_info(device_id: str = "") -> str:
+@_tool()
+async def get_storage_info(device_id: str = "", output_format: str = "text",
+                           fields: Optional[List[str]] = None) -> Union[str, Dict[str, Any]]:
     """获取设备存储信息。
 
     Args:
         device_id (str): 设备 ID；留空时使用默认/首个设备。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回解析后的结构化数据）。
+        fields (list): json 模式下只返回这些字段；可选 filesystem, size, used, available, use_percent, mounted_on；留空时返回全部。
 
     Returns:
-        str: 人类可读的存储信息表格或错误信息。
+        str | dict: 人类可读的存储信息表格或错误信息；json 模式下为结构化数据。
     """
     try:
         device_id_param = device_id if device_id else None
-        storage_list = ADBHelper.get_storage_info(device_id_param)
+        storage_list = await AsyncADBHelper.get_storage_info(device_id_param)
+
+        if output_format == "json":
+            return _structured(storage_list, fields)
 
         if not storage_list:
-            return "无法获取存储信息"
+            return "❌ 无法获取存储信息"
+
+        lines = [f"存储信息 {'(设备: ' + device_id + ')' if device_id else ''}:", "",
+                 f"{'文件系统':<20} {'大小':<10} {'已用':<10} {'可用':<10} {'使用率':<8} {'挂载点'}", "-" * 80]
+        lines.extend(f"{storage['filesystem']:<20} {storage['size']:<10} {storage['used']:<10} {storage['available']:<10} {storage['use_percent']:<8} {storage['mounted_on']}"
+                     for storage in storage_list)
+
+        return "\n".join(lines) + "\n"
+
+    except Exception as e:
+        return f"❌ 获取存储信息时发生错误: {str(e)}"
+
+def _format_bytes(value: Optional[int]) -> str:
+    if value is None:
+        return "未知"
+    size = float(value)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}" if unit != "B" else f"{int(size)}B"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+def _format_snapshot(snapshot: Dict[str, Any]) -> List[str]:
+    lines = []
+    props = snapshot.get('props')
+    if props:
+        lines.append("设备:")
+        lines.extend(f"   {key}: {value}" for key, value in props.items())
+    battery = snapshot.get('battery')
+    if battery:
+        lines.append(f"电池: {battery['level_percent']}%  温度 {battery['temperature_c']}°C  电压 {battery['voltage_v']}V"
+                     f"  状态 {battery['status']}  健康 {battery['health']}  供电 {', '.join(battery['plugged']) or '无'}")
+    memory = snapshot.get('memory')
+    if memory:
+        lines.append(f"内存: 总计 {_format_bytes(memory['total_bytes'])}  可用 {_format_bytes(memory['available_bytes'])}"
+                     f"  使用率 {memory['used_percent']}%  交换区 {_format_bytes(memory['swap_free_bytes'])}"
+                     f"/{_format_bytes(memory['swap_total_bytes'])} 空闲")
+    uptime = snapshot.get('uptime')
+    if uptime and uptime['uptime_seconds'] is not None:
+        lines.append(f"运行时间: {uptime['uptime_seconds'] / 3600:.1f} 小时")
+    load = snapshot.get('load')
+    if load:
+        lines.append(f"负载: {load['load_1m']} / {load['load_5m']} / {load['load_15m']}"
+                     f"  任务 {load['running_tasks']}/{load['total_tasks']}")
+    storage = snapshot.get('storage')
+    if storage:
+        lines.append("存储:")
+        lines.extend(f"   {mount['mounted_on']}: 已用 {_format_bytes(mount['used_bytes'])} / {_format_bytes(mount['size_bytes'])}"
+                     f" ({mount['use_percent']}%)  可用 {_format_bytes(mount['available_bytes'])}" for mount in storage)
+    thermal = snapshot.get('thermal')
+    if thermal:
+        lines.append("温度传感器:")
+        lines.extend(f"   {zone['zone']} ({zone['type'] or '未知'}): {zone['temp_c']:.1f}°C" for zone in thermal)
+    return lines
+
+@_tool()
+async def get_device_snapshot(device_id: str = "", sections: Optional[List[str]] = None,
+                              output_format: str = "text",
+                              fields: Optional[List[str]] = None) -> Union[str, Dict[str, Any]]:
+    """一次往返获取设备状态快照（电池、内存、存储、常用属性、运行时间、负载、温度）。
+
+    所有信息由一条组合 shell 脚本取回并解析为带单位的数值，比分别调用
+    get_battery_info、get_memory_info、get_storage_info、get_device_info 快得多。
+
+    Args:
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        sections (list): 只获取这些分段，可选 battery, memory, storage, props, uptime, load, thermal；
+            留空时获取全部。
+        output_format (str): text（默认，人类可读文本）或 json（按分段返回带单位的数值：字节、百分比、°C、秒）。
+        fields (list): json 模式下各分段（及 storage、thermal 的每一项）只返回这些字段，如
+            ["level_percent", "available_bytes"]；通常与 sections 一起使用，留空时返回全部。
+
+    Returns:
+        str | dict: 人类可读的设备状态快照或错误信息；json 模式下为结构化数据。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        snapshot = await AsyncADBHelper.get_device_snapshot(device_id_param, sections)
+
+        if output_format == "json":
+            if 'error' in snapshot or not fields:
+                return snapshot
+            return {name: [_project(item, fields) for item in value] if isinstance(value, list)
+                    else _project(value, fields) for name, value in snapshot.items()}
+
+        if 'error' in snapshot:
+            return f"❌ 获取设备快照失败: {snapshot['error']}"
+
+        lines = [f"设备状态快照 {'(设备: ' + device_id + ')' if device_id else ''}:", ""]
+        lines.extend(_format_snapshot(snapshot))
+        return "\n".join(lines)
+
+    except Exception as e:
+        return f"❌ 获取设备快照时发生错误: {str(e)}"
+
+@_tool()
+async def start_monitoring(device_id: str = "", interval: float = 5.0, metrics: Optional[List[str]] = None,
+                           processes: Optional[List[str]] = None, duration: float = 0) -> str:
+    """在后台按固定间隔采集设备指标，用于长时间运行的测试（耗电、内存泄漏、发热等）。
 
-        result = f"存储信息 {'(设备: ' + device_id + ')' if device_id else ''}:\n\n"
-        result += f"{'文件系统':<20} {'大小':<10} {'已用':<10} {'可用':<10} {'使用率':<8} {'挂载点'}\n"
-        result += "-" * 80 + "\n"
+    每个周期只执行一条组合 shell 命令，数值保存在定长环形缓冲区中（默认保留最近
+    3600 个采样点），之后用 get_metrics 读取降采样序列和统计。同一设备再次调用时
+    以新参数重新开始采样。
+
+    Args:
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        interval (float): 采样间隔（秒），最小 0.5。
+        metrics (list): 指标组，可选 battery（电量、温度、电流）, memory（可用内存、使用率）,
+            load（负载）, cpu（总 CPU 使用率）；留空时采集全部。
+        processes (list): 需要采集 RSS 和 CPU 使用率的进程名（通常为包名）。
+        duration (float): 采样时长（秒），0 表示直到调用 stop_monitoring。
+
+    Returns:
+        str: 启动结果及采集的序列名。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        result = await AsyncADBHelper.start_monitoring(device_id_param, interval, metrics, processes, duration)
 
-        for storage in storage_list:
-            result += f"{storage['filesystem']:<20} {storage['size']:<10} {storage['used']:<10} {storage['available']:<10} {storage['use_percent']:<8} {storage['mounted_on']}\n"
+        if 'error' in result:
+            return f"❌ 启动指标采样失败: {result['error']}"
 
-        return result
+        return (f"✅ 已开始采样 {'(设备: ' + device_id + ')' if device_id else ''}\n"
+                f"间隔: {result['interval']} 秒，最多保留 {result['capacity']} 个采样点\n"
+                f"序列: {', '.join(result['metrics'])}")
 
     except Exception as e:
-        return f"获取存储信息时发生错误: {str(e)}"
+        return f"❌ 启动指标采样时发生错误: {str(e)}"
+
+@_tool()
+async def stop_monitoring(device_id: str = "") -> str:
+    """停止设备的后台指标采样，已采集的数据仍可通过 get_metrics 读取。
+
+    Args:
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+
+    Returns:
+        str: 操作结果。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        if await AsyncADBHelper.stop_monitoring(device_id_param):
+            return "✅ 已停止指标采样"
+        return "❌ 该设备没有正在进行的指标采样"
+
+    except Exception as e:
+        return f"❌ 停止指标采样时发生错误: {str(e)}"
+
+def _format_metric(name: str, value: float) -> str:
+    if name.endswith('_bytes'):
+        return _format_bytes(int(value))
+    return f"{value:.4g}"
+
+@_tool()
+async def get_metrics(device_id: str = "", metrics: Optional[List[str]] = None,
+                      since_seconds: float = 0, points: int = 30,
+                      output_format: str = "text", fields: Optional[List[str]] = None) -> Union[str, Dict[str, Any]]:
+    """读取后台采样的指标：每个序列的最小/最大/均值/分位数统计和降采样后的时间序列。
+
+    Args:
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        metrics (list): 序列名，如 battery_level, battery_temp_c, battery_current_ma,
+            mem_available_bytes, mem_used_percent, load_1m, cpu_percent,
+            <进程名>:rss_bytes, <进程名>:cpu_percent；留空时返回全部。
+        since_seconds (float): 只统计最近多少秒的数据，0 表示全部。
+        points (int): 每个序列降采样后的最多点数，0 表示只返回统计。
+        output_format (str): text（默认，人类可读文本）或 json（series 为 [时间戳, 值] 列表，aggregates 为统计值）。
+        fields (list): json 模式下每个序列的统计只返回这些字段；可选 last, min, max, mean, p50, p90, p99, samples；
+            留空时返回全部。序列由 metrics 选择，每个序列的长度由 points 限制。
+
+    Returns:
+        str | dict: 统计结果和降采样序列，或错误信息；json 模式下为结构化数据。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        result = await AsyncADBHelper.get_metrics(device_id_param, metrics, since_seconds, max(0, points))
+
+        if output_format == "json":
+            if 'error' in result or not fields:
+                return result
+            return {**result, 'aggregates': {name: _project(stats, fields)
+                                             for name, stats in result['aggregates'].items()}}
+
+        if 'error' in result:
+            return f"❌ 获取指标失败: {result['error']}"
+
+        state = "采样中" if result['running'] else "已停止"
+        lines = [f"设备指标 {'(设备: ' + device_id + ')' if device_id else ''}:",
+                 f"状态: {state}，间隔 {result['interval']} 秒，{result['samples']} 个采样点"]
+        if result['samples']:
+            lines.append(f"时间范围: {time.strftime('%H:%M:%S', time.localtime(result['first']))}"
+                         f" - {time.strftime('%H:%M:%S', time.localtime(result['last']))}")
+        if result['errors']:
+            lines.append(f"采样失败 {result['errors']} 次，最近错误: {result['last_error']}")
+
+        for name, stats in result['aggregates'].items():
+            if stats is None:
+                lines.append(f"\n{name}: 无数据")
+                continue
+            lines.append(f"\n{name}: 最新 {_format_metric(name, stats['last'])}  "
+                         f"最小 {_format_metric(name, stats['min'])}  最大 {_format_metric(name, stats['max'])}  "
+                         f"均值 {_format_metric(name, stats['mean'])}  p50 {_format_metric(name, stats['p50'])}  "
+                         f"p90 {_format_metric(name, stats['p90'])}  p99 {_format_metric(name, stats['p99'])}")
+            series = result['series'].get(name)
+            if points and series:
+                start = result['first']
+                lines.append("   " + " ".join(f"+{t - start:.0f}s={_format_metric(name, v)}" for t, v in series))
+        return "\n".join(lines)
+
+    except Exception as e:
+        return f"❌ 获取指标时发生错误: {str(e)}"
 
 # ==================== 屏幕操作工具 ====================
 
-@mcp.tool()
-def take_screenshot(save_path: str, device_id: str = "") -> str:
+@_tool(structured_output=False)
+async def take_screenshot(save_path: str = "", device_id: str = "", host_encode: bool = False,
+                          scale: float = 1.0, crop: Optional[List[int]] = None,
+                          image_format: str = "png", quality: int = 80,
+                          inline: bool = False, frame_handle: str = "") -> Union[str, Image]:
     """截取设备屏幕。
 
     Args:
-        save_path (str): 本地保存路径（必填，必须为绝对路径）。相对路径会相对 MCP 服务器进程工作目录解析，无法指向调用方项目目录。若需保存到调用方项目，请传入调用方项目的绝对路径。目标目录应由调用方预先创建。
+        save_path (str): 本地保存路径（inline 为 False 时必填，必须为绝对路径）。相对路径会相对 MCP 服务器进程工作目录解析，无法指向调用方项目目录。若需保存到调用方项目，请传入调用方项目的绝对路径。目标目录应由调用方预先创建。
         device_id (str): 设备 ID；留空时使用默认/首个设备。
+        host_encode (bool): 为 True 时从设备获取原始 RGBA 帧并在本机编码 PNG，跳过设备端较慢的 PNG 压缩。
+        scale (float): 缩放比例 (0, 1]，例如 0.5 表示长宽各缩小一半，默认 1.0。
+        crop (list): 裁剪区域 [x, y, width, height]（原始分辨率坐标），留空表示整屏。
+        image_format (str): 输出格式 png / jpeg / webp，默认 png（jpeg/webp 需要安装 Pillow）。
+        quality (int): JPEG/WebP 质量 1-100，默认 80。
+        inline (bool): 为 True 时直接以 MCP 图片内容返回，无需 save_path。
+        frame_handle (str): take_screenshot_if_changed / wait_for_screen_change 返回的帧句柄；指定时不再截屏，
+            返回或保存服务器缓存的该帧（每台设备只缓存最近一帧）。
 
     Returns:
-        str: 截图结果的文本信息。
+        str | Image: 截图结果的文本信息，或 inline 模式下的图片内容。
 
     Notes:
-        实际截图为 PNG 数据，建议使用 .png 扩展名。
+        未指定缩放/裁剪/格式时截图为 PNG 数据，建议使用与 image_format 一致的扩展名。
     """
     try:
+        device_id_param = device_id if device_id else None
+
+        if inline:
+            success, image, stderr = await AsyncADBHelper.capture_screenshot_image(
+                device_id_param, scale, crop, image_format, quality, frame_handle)
+            if not success:
+                return f"❌ 截屏失败\n错误: {stderr}"
+            return Image(data=image['data'], format=image['format'])
+
         if not save_path or not save_path.strip():
-            return "❌ 参数错误: 需要提供保存路径 save_path"
+            return "❌ 参数错误: 需要提供保存路径 save_path（或使用 inline=True 直接返回图片）"
 
-        device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.take_screenshot(save_path, device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.take_screenshot(
+            save_path, device_id_param, host_encode, scale, crop, image_format, quality, frame_handle)
 
         if success:
             return f"✅ 截屏成功\n保存位置: {save_path}\n设备: {device_id or '默认设备'}"
@@ -385,10 +1038,93 @@ def take_screenshot(save_path: str, device_id: str = "") -> str:
             return f"❌ 截屏失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"截屏时发生错误: {str(e)}"
+        return f"❌ 截屏时发生错误: {str(e)}"
+
+def _format_frame_change(result: Dict[str, Any]) -> str:
+    """格式化画面变化检测结果"""
+    lines = [f"帧句柄: {result['handle']}（可用 take_screenshot(frame_handle=...) 取回该帧图片）",
+             f"分辨率: {result['width']}x{result['height']}"]
+    if result['changed']:
+        lines.append(f"变化比例: {result['change_ratio'] * 100:.1f}%")
+        if result['bounding_box'] and not result['first_frame']:
+            x, y, w, h = result['bounding_box']
+            lines.append(f"变化区域: x={x}, y={y}, w={w}, h={h}（共 {len(result['changed_regions'])} 个分块）")
+    return "\n".join(lines)
+
+@_tool(structured_output=False)
+async def take_screenshot_if_changed(device_id: str = "", threshold: float = 2.0, scale: float = 1.0,
+                                     crop: Optional[List[int]] = None, image_format: str = "png",
+                                     quality: int = 80) -> Union[str, List[Union[str, Image]]]:
+    """截屏，仅在画面相对上一次截屏发生变化时返回图片。
+
+    服务器按设备缓存上一帧的摘要和分块签名；画面未变化时只返回上一帧的句柄，
+    避免重复传输相同的截图。需要该帧图片时，将句柄传给 take_screenshot 的 frame_handle。
+
+    Args:
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        threshold (float): 分块平均颜色差异阈值（0-255），低于该值的细微变化视为未变化，默认 2.0。
+        scale (float): 返回图片的缩放比例 (0, 1]，默认 1.0。
+        crop (list): 返回图片的裁剪区域 [x, y, width, height]，留空表示整屏。
+        image_format (str): 输出格式 png / jpeg / webp，默认 png。
+        quality (int): JPEG/WebP 质量 1-100，默认 80。
 
-@mcp.tool()
-def record_screen(duration: int = 10, save_path: str = "", device_id: str = "") -> str:
+    Returns:
+        str | list: 画面未变化时为文本（含帧句柄）；变化时为文本与图片内容。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        success, result, stderr = await AsyncADBHelper.screenshot_if_changed(
+            device_id_param, threshold, scale, crop, image_format, quality)
+        if not success:
+            return f"❌ 截屏失败\n错误: {stderr}"
+
+        if not result['changed']:
+            return f"✅ 画面未变化\n{_format_frame_change(result)}"
+        title = "✅ 首次截屏" if result['first_frame'] else "✅ 画面已变化"
+        image = result['image']
+        return [f"{title}\n{_format_frame_change(result)}", Image(data=image['data'], format=image['format'])]
+
+    except Exception as e:
+        return f"❌ 截屏时发生错误: {str(e)}"
+
+@_tool()
+async def wait_for_screen_change(timeout: float = 10.0, interval: float = 0.5, threshold: float = 2.0,
+                                 device_id: str = "", output_format: str = "text") -> Union[str, Dict[str, Any]]:
+    """等待设备画面发生变化（在服务器侧轮询截屏）。
+
+    以该设备上一次截屏（take_screenshot_if_changed 或本工具）为基准；没有基准时先截取一帧。
+    适合在点击、输入等操作后等待界面刷新，再决定是否截图。超时仍未变化是正常结果
+    （changed 为 false），只有截屏失败才返回错误。
+
+    Args:
+        timeout (float): 最长等待时间（秒），默认 10。
+        interval (float): 轮询间隔（秒），默认 0.5。
+        threshold (float): 分块平均颜色差异阈值（0-255），默认 2.0。
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        output_format (str): text（默认，人类可读文本）或 json（changed、timed_out、change_ratio、handle 等字段）。
+
+    Returns:
+        str | dict: 等待结果、耗时及变化区域，或错误信息；json 模式下为结构化数据。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        success, result, stderr = await AsyncADBHelper.wait_for_screen_change(
+            device_id_param, timeout, interval, threshold)
+        if output_format == "json":
+            return result if success else {'error': stderr}
+
+        if not success:
+            return f"❌ 等待画面变化失败\n错误: {stderr}"
+
+        title = "✅ 画面未变化（等待超时）" if result['timed_out'] else "✅ 画面已变化"
+        return (f"{title}\n耗时: {result['elapsed_ms']:.0f}ms（截屏 {result['polls']} 次）\n"
+                f"{_format_frame_change(result)}")
+
+    except Exception as e:
+        return f"❌ 等待画面变化时发生错误: {str(e)}"
+
+@_tool()
+async def record_screen(duration: int = 10, save_path: str = "", device_id: str = "") -> str:
     """录制设备屏幕。
 
     Args:
@@ -401,7 +1137,7 @@ def record_screen(duration: int = 10, save_path: str = "", device_id: str = "")
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.record_screen(duration, save_path, device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.record_screen(duration, save_path, device_id_param)
 
         if success:
             if save_path:
@@ -412,12 +1148,12 @@ def record_screen(duration: int = 10, save_path: str = "", device_id: str = "")
             return f"❌ 录屏失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"录屏时发生错误: {str(e)}"
+        return f"❌ 录屏时发生错误: {str(e)}"
 
 # ==================== 输入模拟工具 ====================
 
-@mcp.tool()
-def send_text(text: str, device_id: str = "") -> str:
+@_tool()
+async def send_text(text: str, device_id: str = "") -> str:
     """向设备发送文本输入。
 
     Args:
@@ -429,7 +1165,7 @@ def send_text(text: str, device_id: str = "") -> str:
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.send_text(text, device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.send_text(text, device_id_param)
 
         if success:
             return f"✅ 文本发送成功\n内容: {text}\n设备: {device_id or '默认设备'}"
@@ -437,10 +1173,10 @@ def send_text(text: str, device_id: str = "") -> str:
             return f"❌ 文本发送失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"发送文本时发生错误: {str(e)}"
+        return f"❌ 发送文本时发生错误: {str(e)}"
 
-@mcp.tool()
-def send_keyevent(keycode: int, device_id: str = "") -> str:
+@_tool()
+async def send_keyevent(keycode: int, device_id: str = "") -> str:
     """向设备发送按键事件。
 
     Args:
@@ -452,7 +1188,7 @@ def send_keyevent(keycode: int, device_id: str = "") -> str:
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.send_keyevent(keycode, device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.send_keyevent(keycode, device_id_param)
 
         # 常用按键代码说明
         key_names = {
@@ -467,10 +1203,10 @@ def send_keyevent(keycode: int, device_id: str = "") -> str:
             return f"❌ 按键发送失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"发送按键时发生错误: {str(e)}"
+        return f"❌ 发送按键时发生错误: {str(e)}"
 
-@mcp.tool()
-def send_tap(x: int, y: int, device_id: str = "") -> str:
+@_tool()
+async def send_tap(x: int, y: int, device_id: str = "") -> str:
     """向设备发送点击事件。
 
     Args:
@@ -483,7 +1219,7 @@ def send_tap(x: int, y: int, device_id: str = "") -> str:
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.send_tap(x, y, device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.send_tap(x, y, device_id_param)
 
         if success:
             return f"✅ 点击发送成功\n坐标: ({x}, {y})\n设备: {device_id or '默认设备'}"
@@ -491,10 +1227,10 @@ def send_tap(x: int, y: int, device_id: str = "") -> str:
             return f"❌ 点击发送失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"发送点击时发生错误: {str(e)}"
+        return f"❌ 发送点击时发生错误: {str(e)}"
 
-@mcp.tool()
-def send_swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300, device_id: str = "") -> str:
+@_tool()
+async def send_swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300, device_id: str = "") -> str:
     """向设备发送滑动事件。
 
     Args:
@@ -510,7 +1246,7 @@ def send_swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300, device_i
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.send_swipe(x1, y1, x2, y2, duration, device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.send_swipe(x1, y1, x2, y2, duration, device_id_param)
 
         if success:
             return f"✅ 滑动发送成功\n起点: ({x1}, {y1})\n终点: ({x2}, {y2})\n持续时间: {duration}ms\n设备: {device_id or '默认设备'}"
@@ -518,45 +1254,157 @@ def send_swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300, device_i
             return f"❌ 滑动发送失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"发送滑动时发生错误: {str(e)}"
+        return f"❌ 发送滑动时发生错误: {str(e)}"
+
+@_tool()
+async def send_input_batch(steps: List[Dict[str, Any]], stop_on_error: bool = True, device_id: str = "") -> str:
+    """在一次往返中按顺序执行一组输入操作。
+
+    Args:
+        steps (list): 有序步骤列表，每项为一个对象，支持：
+            {"type": "tap", "x": 100, "y": 200}
+            {"type": "swipe", "x1": 100, "y1": 800, "x2": 100, "y2": 200, "duration": 300}
+            {"type": "keyevent", "keycode": 66}
+            {"type": "text", "text": "hello"}
+            {"type": "sleep", "ms": 500}
+        stop_on_error (bool): 某一步失败后是否跳过后续步骤，默认 True。
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+
+    Returns:
+        str: 每个步骤的执行结果。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        success, results, stderr = await AsyncADBHelper.send_input_batch(steps, stop_on_error, device_id_param)
+
+        if not results:
+            return f"❌ 批量输入失败\n错误: {stderr}"
+
+        status_names = {'ok': '✅ 成功', 'failed': '❌ 失败', 'skipped': '⏭️ 跳过'}
+        lines = [f"{'✅ 批量输入成功' if success else '❌ 批量输入未全部成功'}",
+                 f"步骤数: {len(results)}", f"设备: {device_id or '默认设备'}", ""]
+        for item in results:
+            line = f"{item['index'] + 1}. {item['type']}: {status_names[item['status']]}"
+            if item['status'] == 'failed':
+                line += f" (退出码: {item['exit_code']}) {item['output']}"
+            lines.append(line)
+
+        return "\n".join(lines)
+
+    except Exception as e:
+        return f"❌ 批量输入时发生错误: {str(e)}"
 
 # ==================== 日志工具 ====================
 
-@mcp.tool()
-def get_logcat(filter_tag: str = "", lines: int = 100, device_id: str = "") -> str:
+@_tool()
+async def get_logcat(filter_tag: str = "", lines: int = 100, device_id: str = "",
+                     cursor: int = -1, wait: float = 0.0) -> str:
     """获取设备日志（logcat）。
 
+    日志来自每台设备共享的后台 logcat 流。返回结果末尾带有游标，下次调用传入该游标
+    即可只获取之后的新日志，无需重复读取已经看过的内容。
+
     Args:
-        filter_tag (str): 过滤标签，仅显示包含此标签的日志；为空则不过滤。
-        lines (int): 显示日志的行数，默认 100 行。
+        filter_tag (str): 过滤标签，仅显示该标签的日志；为空则不过滤。
+        lines (int): 最多返回的行数，默认 100 行；0 表示不限。
         device_id (str): 设备 ID；留空时使用默认/首个设备。
+        cursor (int): 上一次返回的游标，只返回其后的新日志；-1（默认）返回最新的 lines 行。
+        wait (float): 传入游标且暂无新日志时，最多等待的秒数（长轮询），默认 0 不等待。
 
     Returns:
-        str: 日志文本或提示信息。
+        str: 日志文本、下一次读取的游标或提示信息。
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.get_logcat(filter_tag, lines, device_id_param)
+        success, data, stderr = await AsyncADBHelper.read_logcat(filter_tag, lines, cursor, wait, device_id_param)
+
+        if not success:
+            if cursor >= 0:
+                return f"❌ 获取日志失败\n错误: {stderr}"
+            # 后台日志流不可用时退回一次性导出
+            success, stdout, stderr = await AsyncADBHelper.get_logcat(filter_tag, lines, device_id_param)
+            if not success:
+                return f"❌ 获取日志失败\n错误: {stderr}"
+            log_lines = stdout.rstrip('\n').split('\n') if stdout.strip() else []
+            next_cursor, dropped = None, 0
+        else:
+            log_lines, next_cursor, dropped = data['lines'], data['cursor'], data['dropped']
+
+        cursor_note = f"\n游标: {next_cursor}（下次传入 cursor={next_cursor} 获取新日志）" if next_cursor is not None else ""
+        if not log_lines:
+            if cursor >= 0:
+                return f"没有新的日志\n过滤标签: {filter_tag or '无'}\n设备: {device_id or '默认设备'}{cursor_note}"
+            return f"没有找到日志内容\n过滤标签: {filter_tag or '无'}\n设备: {device_id or '默认设备'}{cursor_note}"
+
+        parts = [f"设备日志 {'(设备: ' + device_id + ')' if device_id else ''}:"]
+        if filter_tag:
+            parts.append(f"过滤标签: {filter_tag}")
+        parts.append(f"返回行数: {len(log_lines)}")
+        if dropped:
+            parts.append(f"注意: 缓冲区溢出，游标之后有 {dropped} 行日志已丢弃")
+        parts.append("")
+        parts.extend(log_lines)
+        # 游标放在预览之后，结果被保存时仍能直接看到
+        return await _spill_large_result("\n".join(parts) + "\n", "get_logcat") + cursor_note
 
-        if success:
-            if not stdout.strip():
-                return f"没有找到日志内容\n过滤标签: {filter_tag or '无'}\n设备: {device_id or '默认设备'}"
+    except Exception as e:
+        return f"❌ 获取日志时发生错误: {str(e)}"
 
-            result = f"设备日志 {'(设备: ' + device_id + ')' if device_id else ''}:\n"
-            if filter_tag:
-                result += f"过滤标签: {filter_tag}\n"
-            result += f"显示行数: {lines}\n\n"
-            result += stdout
+@_tool()
+async def query_logcat(tag: str = "", pid: int = 0, package: str = "", level: str = "",
+                       since_seconds: float = 0, start_time: str = "", end_time: str = "",
+                       pattern: str = "", limit: int = 100, device_id: str = "", output_format: str = "text",
+                       fields: Optional[List[str]] = None) -> Union[str, Dict[str, Any]]:
+    """查询设备日志（在服务器已接收的结构化日志中过滤，不重新读取设备日志）。
 
-            return result
-        else:
-            return f"❌ 获取日志失败\n错误: {stderr}"
+    日志来自每台设备共享的后台 logcat 流（与 get_logcat 相同），按标签、进程、级别和时间建立索引。
+
+    Args:
+        tag (str): 标签，多个用逗号分隔（精确匹配）；为空则不限。
+        pid (int): 进程 ID；0 表示不限。
+        package (str): 包名，按该应用当前的进程过滤（会在设备上执行一次 pidof）。
+        level (str): 最低级别 V/D/I/W/E/F，例如 W 表示警告及以上。
+        since_seconds (float): 只查询最新日志之前若干秒内的日志；0 表示不限。
+        start_time (str): 起始时间，格式 MM-DD HH:MM:SS[.mmm]。
+        end_time (str): 结束时间，格式同上。
+        pattern (str): 对日志消息内容匹配的正则表达式。
+        limit (int): 最多返回的记录数（取最新的），默认 100；0 表示不限。
+        device_id (str): 设备 ID；留空时使用默认/首个设备。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回解析后的结构化数据）。
+        fields (list): json 模式下只返回这些字段，如 ["time", "level", "tag", "message"]；留空时返回全部。
+
+    Returns:
+        str | dict: 匹配的日志行或提示信息；json 模式下为结构化数据。
+    """
+    try:
+        device_id_param = device_id if device_id else None
+        success, data, stderr = await AsyncADBHelper.query_logcat(
+            tag, pid, package, level, since_seconds, start_time, end_time, pattern, limit, device_id_param)
+
+        if output_format == "json":
+            if not success:
+                return {'error': stderr}
+            return _structured(data['records'], fields, truncated=data['truncated'], buffered=data['buffered'])
+
+        if not success:
+            return f"❌ 查询日志失败\n错误: {stderr}"
+
+        records = data['records']
+        if not records:
+            return f"没有匹配的日志\n已缓存日志: {data['buffered']} 行\n设备: {device_id or '默认设备'}"
+
+        parts = [f"日志查询结果 {'(设备: ' + device_id + ')' if device_id else ''}:",
+                 f"匹配行数: {len(records)}{'（仅显示最新的部分，可调大 limit 或缩小范围）' if data['truncated'] else ''}",
+                 f"已缓存日志: {data['buffered']} 行",
+                 ""]
+        parts.extend(record['line'] for record in records)
+        return await _spill_large_result("\n".join(parts), "query_logcat")
 
     except Exception as e:
-        return f"获取日志时发生错误: {str(e)}"
+        return f"❌ 查询日志时发生错误: {str(e)}"
 
-@mcp.tool()
-def clear_logcat(device_id: str = "") -> str:
+@_tool()
+async def clear_logcat(device_id: str = "") -> str:
     """清除设备日志（logcat -c）。
 
     Args:
@@ -567,7 +1415,7 @@ def clear_logcat(device_id: str = "") -> str:
     """
     try:
         device_id_param = device_id if device_id else None
-        success, stdout, stderr = ADBHelper.clear_logcat(device_id_param)
+        success, stdout, stderr = await AsyncADBHelper.clear_logcat(device_id_param)
 
         if success:
             return f"✅ 日志清除成功\n设备: {device_id or '默认设备'}"
@@ -575,7 +1423,204 @@ def clear_logcat(device_id: str = "") -> str:
             return f"❌ 日志清除失败\n错误: {stderr}"
 
     except Exception as e:
-        return f"清除日志时发生错误: {str(e)}"
+        return f"❌ 清除日志时发生错误: {str(e)}"
+
+# ==================== 多设备工具 ====================
+
+@_tool()
+async def run_on_devices(operation: str, device_ids: Optional[List[str]] = None,
+                         params: Optional[Dict[str, Any]] = None, max_concurrency: int = 8,
+                         output_format: str = "text") -> Union[str, Dict[str, Any]]:
+    """在多台设备上并发执行同一操作，并按设备汇总结果。
+
+    Args:
+        operation (str): 操作名，可选 get_device_info, get_props, install_app, uninstall_app, list_packages,
+            push_file, get_battery_info, get_memory_info, get_storage_info, get_device_snapshot, send_text,
+            send_keyevent, send_tap, send_swipe, send_input_batch, clear_logcat。
+        device_ids (list): 目标设备 ID 列表；留空时使用所有在线设备。
+        params (dict): 操作参数（与对应单设备工具相同，不含 device_id），如 {"apk_path": "/path/app.apk"}。
+        max_concurrency (int): 本次调用的最大并发设备数，默认 8。
+        output_format (str): text（默认，人类可读文本）或 json（每台设备的结果保持操作返回的原始数据）。
+
+    Returns:
+        str | dict: 每台设备的执行结果、耗时及成功/失败统计；json 模式下为结构化数据。
+    """
+    try:
+        summary = await AsyncADBHelper.run_on_devices(operation, device_ids, params, max_concurrency)
+
+        if output_format == "json":
+            return summary
+
+        if 'error' in summary:
+            return f"❌ 多设备执行失败\n错误: {summary['error']}"
+
+        lines = [f"多设备执行: {operation}",
+                 f"成功: {summary['succeeded']}  失败: {summary['failed']}  总耗时: {summary['elapsed_ms']}ms", ""]
+        for item in summary['results']:
+            status = '✅ 成功' if item['success'] else '❌ 失败'
+            lines.append(f"设备 {item['device_id']}: {status} (排队 {item['queued_ms']}ms, 执行 {item['duration_ms']}ms)")
+            if not item['success']:
+                lines.append(f"   错误: {item['error']}")
+            elif isinstance(item['output'], str):
+                if item['output']:
+                    lines.append(f"   输出: {item['output']}")
+            else:
+                lines.append(f"   结果: {json.dumps(item['output'], ensure_ascii=False)}")
+
+        return await _spill_large_result("\n".join(lines), "run_on_devices")
+
+    except Exception as e:
+        return f"❌ 多设备执行时发生错误: {str(e)}"
+
+# ==================== 结果存储工具 ====================
+
+@_tool()
+async def read_result(handle: str, offset: int = 0, limit: int = 200) -> str:
+    """分页读取较大的工具结果。
+
+    get_logcat、query_logcat、list_packages、query_packages、list_files、find_files、get_disk_usage、run_on_devices 的结果超过大小阈值时
+    只返回开头部分预览和结果句柄，完整内容保存在服务器本地，可用本工具按行分页读取。
+    结果按最近使用顺序淘汰，服务器重启后失效。
+
+    Args:
+        handle (str): 工具返回的结果句柄。
+        offset (int): 起始行号（从 0 开始），默认 0。
+        limit (int): 最多返回的行数，默认 200；单页同时受大小阈值约束。
+
+    Returns:
+        str: 该页内容及下一页的 offset，或错误信息。
+    """
+    try:
+        page = await AsyncADBHelper.read_result(handle, offset, limit)
+        if 'error' in page:
+            return f"❌ 读取结果失败\n错误: {page['error']}"
+
+        label = f"（{page['label']}）" if page['label'] else ""
+        if not page['text'] and page['next_offset'] is None and page['offset'] >= page['lines']:
+            return f"结果 {handle}{label} 共 {page['lines']} 行，offset={page['offset']} 已超出末尾"
+
+        end = page['next_offset'] if page['next_offset'] is not None else page['lines']
+        parts = [f"结果 {handle}{label}: 第 {page['offset'] + 1}-{end} 行，共 {page['lines']} 行", "", page['text'], ""]
+        if page['next_offset'] is not None:
+            parts.append(f"下一页: read_result(handle=\"{handle}\", offset={page['next_offset']})")
+        else:
+            parts.append("（已读完）")
+        return "\n".join(parts)
+
+    except Exception as e:
+        return f"❌ 读取结果时发生错误: {str(e)}"
+
+# ==================== 缓存工具 ====================
+
+@_tool()
+async def get_cache_stats(reset: bool = False, clear: bool = False,
+                          output_format: str = "text") -> Union[str, Dict[str, Any]]:
+    """查看命令结果缓存的命中/未命中统计。
+
+    pm list packages、df、ls、dumpsys battery 等只读命令的结果按策略缓存数秒到数十秒，
+    并发的相同请求只执行一次；安装/卸载应用、推送或删除文件等写操作会使相关缓存立即失效。
+
+    Args:
+        reset (bool): 读取后将统计计数清零。
+        clear (bool): 同时丢弃所有缓存的结果（强制之后的查询重新读取设备）。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回统计数据）。
+
+    Returns:
+        str | dict: 缓存统计；json 模式下为结构化数据。
+    """
+    try:
+        stats = await AsyncADBHelper.get_cache_stats(reset, clear)
+
+        if output_format == "json":
+            return stats
+
+        hit_rate = f"{stats['hit_rate'] * 100:.1f}%" if stats['hit_rate'] is not None else "无"
+        lines = [f"命令结果缓存{'' if stats['enabled'] else '（已禁用）'}:",
+                 f"命中: {stats['hits']}  未命中: {stats['misses']}  命中率: {hit_rate}",
+                 f"合并的并发请求: {stats['collapsed']}  淘汰: {stats['evictions']}  失效: {stats['invalidations']}",
+                 f"缓存条目: {stats['entries']}（{_format_bytes(stats['bytes'])}）", "",
+                 f"{'策略':<10} {'TTL':>6} {'命中':>8} {'未命中':>8}"]
+        lines.extend(f"{name:<10} {policy['ttl']:>5.0f}s {policy['hits']:>8} {policy['misses']:>8}"
+                     for name, policy in stats['policies'].items())
+        if clear:
+            lines.append("\n✅ 已清空缓存")
+        return "\n".join(lines)
+
+    except Exception as e:
+        return f"❌ 获取缓存统计时发生错误: {str(e)}"
+
+# ==================== 性能统计 ====================
+
+def _format_latency_table(title: str, series: Dict[str, Dict[str, Any]]) -> List[str]:
+    """按调用次数从多到少排列的耗时/错误统计表"""
+    def ms(value: Optional[float]) -> str:
+        return f"{value:.1f}" if value is not None else "-"
+
+    lines = [f"{title}:", f"  {'名称':<28} {'次数':>6} {'错误率':>7} {'超时':>5} {'p50ms':>8} {'p90ms':>8} "
+                          f"{'p99ms':>8} {'最大ms':>8} {'字节':>9}"]
+    for label, item in sorted(series.items(), key=lambda kv: -kv[1]['count']):
+        lines.append(f"  {label:<28} {item['count']:>6} {item['error_rate'] * 100:>6.1f}% {item['timeouts']:>5} "
+                     f"{ms(item['p50_ms']):>8} {ms(item['p90_ms']):>8} {ms(item['p99_ms']):>8} "
+                     f"{ms(item['max_ms']):>8} {_format_bytes(item['bytes']):>9}")
+    return lines
+
+@_tool()
+async def get_performance_stats(reset: bool = False, prometheus_path: Optional[str] = None,
+                                output_format: str = "text") -> Union[str, Dict[str, Any]]:
+    """查看服务器的延迟与吞吐量统计。
+
+    统计每个工具调用、每个 ADB 辅助方法（线程池中执行的部分，含启动 adb、设备执行和输出解析）、
+    每类 adb 命令和每台设备的调用次数、错误率、超时次数、p50/p90/p99 耗时和输出字节数，
+    以及启动的 adb 子进程数、adb server 连接数和 push/pull 传输字节数。
+    工具耗时与辅助方法耗时之差即结果渲染等服务器侧开销。
+    同样的数据也可通过 MCP 资源 adb://metrics（JSON）和 adb://metrics/prometheus（Prometheus 文本格式）读取。
+
+    Args:
+        reset (bool): 读取后将统计清零。
+        prometheus_path (str, optional): 同时以 Prometheus 文本格式写入该本地文件；
+            传空字符串时写入 ADB_MCP_PROMETHEUS_FILE 配置的文件。
+        output_format (str): text（默认，人类可读文本）或 json（直接返回统计数据）。
+
+    Returns:
+        str | dict: 性能统计；json 模式下为结构化数据。
+    """
+    try:
+        stats = await AsyncADBHelper.get_performance_stats(reset, prometheus_path)
+        if 'error' in stats:
+            return f"❌ 获取性能统计失败\n错误: {stats['error']}"
+
+        if output_format == "json":
+            return stats
+
+        spawned = stats['subprocesses_spawned']
+        lines = [f"性能统计（统计时长 {stats['uptime_seconds']:.0f} 秒）:",
+                 f"adb 子进程: {spawned['total']}（" +
+                 (", ".join(f"{kind} {n}" for kind, n in spawned.items() if kind != 'total') or "无") + "）",
+                 f"adb server 连接: {stats['adb_server_connections']}",
+                 "push/pull 传输: " + (", ".join(f"{direction} {_format_bytes(n)}"
+                                               for direction, n in stats['bytes_transferred'].items()) or "无")]
+        for title, key in (("工具", 'tools'), ("辅助方法", 'helpers'), ("adb 命令", 'commands'), ("设备", 'devices')):
+            if stats[key]:
+                lines.append("")
+                lines.extend(_format_latency_table(title, stats[key]))
+        if stats['prometheus_file']:
+            lines.append(f"\n✅ 已写入 Prometheus 文件: {stats['prometheus_file']}")
+        if reset:
+            lines.append("\n✅ 已清零统计")
+        return "\n".join(lines)
+
+    except Exception as e:
+        return f"❌ 获取性能统计时发生错误: {str(e)}"
+
+@mcp.resource("adb://metrics", mime_type="application/json")
+async def metrics_resource() -> str:
+    """延迟与吞吐量统计（JSON），内容同 get_performance_stats 的 json 输出"""
+    return json.dumps(await AsyncADBHelper.get_performance_stats(), ensure_ascii=False, indent=2)
+
+@mcp.resource("adb://metrics/prometheus", mime_type="text/plain")
+async def prometheus_metrics_resource() -> str:
+    """Prometheus 文本格式（exposition format 0.0.4）的延迟与吞吐量统计"""
+    return await AsyncADBHelper.get_prometheus_metrics()
 
 def main():
     """主函数"""
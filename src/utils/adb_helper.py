@@ -1,14 +1,137 @@
+import os
+import posixpath
+import shlex
+import socket
 import subprocess
 import json
-from typing import List, Dict, Optional, Tuple
+import math
+import re
+import threading
+import time
+from typing import Iterator, List, Dict, Optional, Tuple, Union
+
+from .adb_protocol import ADBClient, ADBProtocolError
+from . import device_snapshot, dir_sync, file_index, tar_stream
+from .apk_info import APKError, APKIdentityCache
+from .command_cache import CommandCache
+from .device_tracker import DeviceTracker, parse_device_line
+from .fanout import fan_out
+from .frame_cache import FrameCache
+from .image_utils import PNG_SIGNATURE, crop_and_scale, encode_image, encode_png, parse_raw_screencap
+from .instrumentation import get_instrumentation, instrument_source
+from .logcat_store import level_rank, parse_time
+from .logcat_stream import LogcatFollowerError, LogcatFollowerPool
+from .metrics_sampler import METRIC_GROUPS, MetricsSampler
+from .output_stream import MAX_OUTPUT_BYTES, OutputStream, Source
+from .package_inventory import PackageInventory
+from .prop_cache import PropertyCache
+from .result_store import ResultStore
+from .shell_session import ShellSessionError, ShellSessionPool, ShellSessionUnavailable
+
+# 传输方式: auto（优先直连 adb server，失败时回退到 adb 子进程）/ native / subprocess
+ADB_TRANSPORT = os.environ.get('ADB_MCP_TRANSPORT', 'auto').lower()
+
+# 是否通过每设备长驻的 shell 会话执行输入和只读查询命令
+SHELL_SESSIONS = os.environ.get('ADB_MCP_SHELL_SESSIONS', '1') != '0'
+# 超时长于此值（秒）的命令不占用长驻会话，改用单次 adb shell
+SESSION_MAX_TIMEOUT = 30
+# 批量输入的超时：预计耗时的倍数加上固定余量（秒）
+INPUT_BATCH_TIMEOUT_FACTOR = 1.5
+INPUT_BATCH_TIMEOUT_MARGIN = 5
+
+# 是否在后台订阅 adb server 的设备变化推送（host:track-devices-l）
+DEVICE_TRACKER = os.environ.get('ADB_MCP_DEVICE_TRACKER', '1') != '0'
+
+# 是否通过每设备后台 logcat 流读取日志（支持游标增量读取）
+LOGCAT_FOLLOW = os.environ.get('ADB_MCP_LOGCAT_FOLLOW', '1') != '0'
+
+# tar 流批量传输的超时时间（秒）
+TAR_TIMEOUT = int(os.environ.get('ADB_MCP_TAR_TIMEOUT', '1800'))
+
+_local = threading.local()
+
+
+class CancelScope:
+    """记录一次调用期间启动的 adb 子进程与 socket 连接，取消时统一终止"""
+
+    def __init__(self):
+        self.cancelled = False
+        self._resources = set()
+        self._lock = threading.Lock()
+
+    def register(self, resource) -> bool:
+        """登记资源；作用域已取消时立即终止该资源并返回 False"""
+        with self._lock:
+            if not self.cancelled:
+                self._resources.add(resource)
+                return True
+        resource.kill()
+        return False
+
+    def unregister(self, resource):
+        with self._lock:
+            self._resources.discard(resource)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            resources = list(self._resources)
+            self._resources.clear()
+        for resource in resources:
+            try:
+                resource.kill()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        # 同一作用域可能在多个线程中同时进入（如多设备并发），上一层作用域按线程保存
+        if not hasattr(_local, 'stack'):
+            _local.stack = []
+        _local.stack.append(getattr(_local, 'scope', None))
+        _local.scope = self
+        return self
+
+    def __exit__(self, *exc):
+        _local.scope = _local.stack.pop()
+        return False
+
+
+def current_scope() -> Optional[CancelScope]:
+    """返回当前线程所在的取消作用域"""
+    return getattr(_local, 'scope', None)
+
+
+def _register_connection(conn):
+    get_instrumentation().count_connection()
+    scope = current_scope()
+    if scope is not None:
+        scope.register(conn)
+
 
 class ADBHelper:
     """ADB命令封装类"""
+
+    _client: Optional[ADBClient] = None
+    _shell_sessions: Optional[ShellSessionPool] = None
+    _prop_cache: Optional[PropertyCache] = None
+    _device_tracker: Optional[DeviceTracker] = None
+    _frame_cache: Optional[FrameCache] = None
+    _logcat_followers: Optional[LogcatFollowerPool] = None
+    _result_store: Optional[ResultStore] = None
+    _apk_cache: Optional[APKIdentityCache] = None
+    _package_inventory: Optional[PackageInventory] = None
+    _metrics_sampler: Optional[MetricsSampler] = None
+    _file_index: Optional[file_index.FileIndex] = None
+    _command_cache: Optional[CommandCache] = None
     
     @staticmethod
     def run_adb_command(command: List[str], timeout: int = 30) -> Tuple[bool, str, str]:
         """
         执行ADB命令
+
+        优先通过 adb server 主机协议直连执行，不支持的命令或无法连接
+        adb server 时回退到 adb 子进程。只读命令的结果按策略缓存，写操作
+        使相关缓存失效，见 command_cache。
         
         Args:
             command: ADB命令列表
@@ -17,24 +140,507 @@ class ADBHelper:
         Returns:
             (success, stdout, stderr)
         """
+        serial, args = ADBHelper._split_serial(command)
+        return ADBHelper.get_command_cache().run(
+            serial, 'adb', args, lambda: ADBHelper._execute_adb_command(command, timeout))
+
+    @staticmethod
+    def _execute_adb_command(command: List[str], timeout: int = 30) -> Tuple[bool, str, str]:
+        """不经过命令结果缓存执行ADB命令，记录耗时、输出大小和超时"""
+        start = time.monotonic()
+        result = None
+        if ADB_TRANSPORT != 'subprocess':
+            result = ADBHelper._run_native_command(command, timeout)
+        if result is None:
+            result = ADBHelper._run_subprocess_command(command, timeout)
+
+        success, stdout, stderr = result
+        serial, args = ADBHelper._split_serial(command)
+        get_instrumentation().observe_command(serial, args, time.monotonic() - start, success, stderr,
+                                              len(stdout) + len(stderr))
+        return result
+
+    @staticmethod
+    def _run_subprocess_command(command: List[str], timeout: int = 30) -> Tuple[bool, str, str]:
+        """通过 adb 客户端子进程执行命令"""
+        scope = current_scope()
+        if scope is not None and scope.cancelled:
+            return False, "", "Command cancelled"
         try:
-            result = subprocess.run(
+            process = subprocess.Popen(
                 ['adb'] + command,
-                capture_output=True,
-                text=True,
-                timeout=timeout
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
             )
-            return result.returncode == 0, result.stdout.strip(), result.stderr.strip()
-        except subprocess.TimeoutExpired:
-            return False, "", "Command timed out"
         except FileNotFoundError:
             return False, "", "ADB not found. Please install Android SDK platform-tools"
         except Exception as e:
             return False, "", str(e)
+        get_instrumentation().count_spawn('command')
+
+        # 登记到取消作用域，异步调用被取消时由作用域负责杀掉子进程
+        if scope is not None and not scope.register(process):
+            process.communicate()
+            return False, "", "Command cancelled"
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+            if scope is not None and scope.cancelled:
+                return False, "", "Command cancelled"
+            return process.returncode == 0, stdout.strip(), stderr.strip()
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            return False, "", "Command timed out"
+        except Exception as e:
+            process.kill()
+            return False, "", str(e)
+        finally:
+            if scope is not None:
+                scope.unregister(process)
+
+    @staticmethod
+    def exec_out(args: List[str], device_id: Optional[str] = None, timeout: int = 60,
+                 sink=None) -> Tuple[bool, bytes, str]:
+        """
+        以二进制方式执行 exec-out 命令，输出不经过文本解码
+
+        Args:
+            args: 设备端命令参数
+            device_id: 设备 ID
+            timeout: 超时时间（秒）
+            sink: 可写的二进制文件对象；指定时输出按块写入其中，返回的数据为空
+
+        Returns:
+            (success, stdout 字节, stderr)
+        """
+        start = time.monotonic()
+        success, data, stderr = ADBHelper._exec_out(args, device_id, timeout, sink)
+        get_instrumentation().observe_command(device_id, ['exec-out'] + args, time.monotonic() - start,
+                                              success, stderr, len(data))
+        return success, data, stderr
+
+    @staticmethod
+    def _exec_out(args: List[str], device_id: Optional[str], timeout: int, sink) -> Tuple[bool, bytes, str]:
+        if ADB_TRANSPORT != 'subprocess':
+            try:
+                data = ADBHelper.get_client().exec_out(device_id, ' '.join(args), timeout, sink)
+                return True, data, ""
+            except (ConnectionRefusedError, FileNotFoundError):
+                pass  # adb server 未启动，交给 adb 客户端
+            except socket.timeout:
+                return False, b"", "Command timed out"
+            except ADBProtocolError as e:
+                return False, b"", f"adb: error: {e}"
+            except OSError as e:
+                return False, b"", str(e)
+
+        cmd = ['exec-out'] + args
+        if device_id:
+            cmd = ['-s', device_id] + cmd
+        return ADBHelper._run_subprocess_binary(cmd, timeout, sink)
+
+    @staticmethod
+    def _run_subprocess_binary(command: List[str], timeout: int = 60, sink=None) -> Tuple[bool, bytes, str]:
+        """通过 adb 子进程执行命令并按块读取二进制 stdout"""
+        stream = OutputStream(ADBHelper._subprocess_source(command, timeout, current_scope()), binary=True)
+        chunks = []
+        try:
+            for chunk in stream:
+                if sink is not None:
+                    sink.write(chunk)
+                else:
+                    chunks.append(chunk)
+        except Exception as e:
+            stream.close()
+            return False, b"", str(e)
+        return bool(stream.success), b''.join(chunks), stream.stderr
+
+    @staticmethod
+    def stream_adb_command(command: List[str], timeout: int = 30, max_bytes: Optional[int] = None,
+                           binary: bool = False) -> OutputStream:
+        """
+        以流的形式执行ADB命令
+
+        命令与传输方式同 run_adb_command，但 stdout 按块读取、由调用方以生成器
+        逐行（或逐块）消费，不在内存中缓存完整输出。读取超过 max_bytes 后终止
+        命令，文本模式在末尾附加截断标记行。
+
+        Args:
+            command: ADB命令列表
+            timeout: 超时时间（秒）
+            max_bytes: 最多读取的字节数；None 时使用 ADB_MCP_MAX_OUTPUT_BYTES，0 表示不限
+            binary: 为 True 时产出原始字节块，否则产出解码后的文本行
+
+        Returns:
+            OutputStream，迭代结束后可读取 success / stderr / truncated
+        """
+        scope = current_scope()
+
+        def open_source() -> Source:
+            source = None
+            if ADB_TRANSPORT != 'subprocess':
+                source = ADBHelper._native_source(command, timeout, scope)
+            if source is None:
+                source = ADBHelper._subprocess_source(command, timeout, scope)
+            return source
+
+        serial, args = ADBHelper._split_serial(command)
+        source = ADBHelper.get_command_cache().stream(
+            serial, args, lambda: instrument_source(open_source(), serial, args))
+        return OutputStream(source, MAX_OUTPUT_BYTES if max_bytes is None else max_bytes, binary)
+
+    @staticmethod
+    def _subprocess_source(command: List[str], timeout: int, scope: Optional[CancelScope]) -> Source:
+        """通过 adb 子进程执行命令，逐块产出 stdout"""
+        if scope is not None and scope.cancelled:
+            return False, "Command cancelled"
+        try:
+            process = subprocess.Popen(['adb'] + command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            return False, "ADB not found. Please install Android SDK platform-tools"
+        except Exception as e:
+            return False, str(e)
+        get_instrumentation().count_spawn('stream')
+
+        if scope is not None and not scope.register(process):
+            process.communicate()
+            return False, "Command cancelled"
+        # 流式读取时无法使用 communicate 的超时，由定时器负责杀掉子进程
+        timed_out = threading.Event()
+
+        def on_timeout():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, on_timeout)
+        timer.start()
+        try:
+            stderr_chunks = []
+            stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+            stderr_reader.start()
+            while True:
+                chunk = process.stdout.read1(65536)
+                if not chunk:
+                    break
+                yield chunk
+            process.wait()
+            stderr_reader.join()
+            if timed_out.is_set():
+                return False, "Command timed out"
+            if scope is not None and scope.cancelled:
+                return False, "Command cancelled"
+            return process.returncode == 0, b''.join(stderr_chunks).decode('utf-8', errors='replace').strip()
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            if scope is not None:
+                scope.unregister(process)
+
+    @staticmethod
+    def _native_source(command: List[str], timeout: int, scope: Optional[CancelScope]) -> Optional[Source]:
+        """
+        通过 adb server 主机协议执行 shell / exec-out / logcat，逐块产出 stdout
+
+        Returns:
+            生成器；命令不支持直连时返回 None。连接 adb server 失败且尚未产出
+            输出时回退到 adb 子进程。
+        """
+        serial, args = ADBHelper._split_serial(command)
+        if not args or args[0] not in ('shell', 'exec-out', 'logcat'):
+            return None
+        name, rest = args[0], args[1:]
+        if name != 'logcat' and not rest:
+            return None
+
+        def source() -> Source:
+            client = ADBHelper.get_client()
+            started = False
+            try:
+                if name == 'exec-out':
+                    for chunk in client.iter_exec(serial, ' '.join(rest), timeout):
+                        started = True
+                        yield chunk
+                    return True, ""
+                if name == 'logcat':
+                    shell_cmd = "export ANDROID_LOG_TAGS=\"''\"; exec logcat " + ' '.join(shlex.quote(a) for a in rest)
+                else:
+                    shell_cmd = ' '.join(rest)
+                chunks = client.iter_shell(serial, shell_cmd, timeout)
+                while True:
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration as stop:
+                        exit_code, stderr = stop.value
+                        return exit_code == 0, stderr.decode('utf-8', errors='replace').strip()
+                    started = True
+                    yield chunk
+            except (ConnectionRefusedError, FileNotFoundError):
+                # adb server 未启动，交给 adb 客户端（会自动拉起 server）
+                if started:
+                    return False, "connection to adb server lost"
+                return (yield from ADBHelper._subprocess_source(command, timeout, scope))
+            except socket.timeout:
+                return False, "Command timed out"
+            except ADBProtocolError as e:
+                return False, f"adb: error: {e}"
+            except OSError as e:
+                if scope is not None and scope.cancelled:
+                    return False, "Command cancelled"
+                if started or ADB_TRANSPORT == 'native':
+                    return False, str(e)
+                return (yield from ADBHelper._subprocess_source(command, timeout, scope))
+
+        return source()
+
+    @staticmethod
+    def get_client() -> ADBClient:
+        """获取共享的 adb server 协议客户端"""
+        if ADBHelper._client is None:
+            client = ADBClient()
+            client.on_connect = _register_connection
+            ADBHelper._client = client
+        return ADBHelper._client
+
+    @staticmethod
+    def get_shell_sessions() -> ShellSessionPool:
+        """获取共享的长驻 shell 会话池"""
+        if ADBHelper._shell_sessions is None:
+            ADBHelper._shell_sessions = ShellSessionPool()
+        return ADBHelper._shell_sessions
+
+    @staticmethod
+    def run_shell_command(args: List[str], device_id: Optional[str] = None,
+                          timeout: int = 30) -> Tuple[bool, str, str]:
+        """
+        在设备上执行 shell 命令
+
+        超时不超过 SESSION_MAX_TIMEOUT 的命令借用该设备的长驻 shell 会话在子
+        shell 中执行（stdout 与 stderr 分开返回）；会话都在忙、无法建立、设备的
+        adb shell 合并了 stdout 与 stderr（无 shell_v2）或命令耗时较长时改用单次
+        adb shell。命令写入会话后失败不会重试。
+
+        Args:
+            args: shell 命令参数，与 adb shell 一样以空格拼接
+            device_id: 设备 ID
+            timeout: 超时时间（秒）
+
+        Returns:
+            (success, stdout, stderr)
+        """
+        return ADBHelper.get_command_cache().run(
+            device_id, 'session', ['shell'] + args, lambda: ADBHelper._run_shell_uncached(args, device_id, timeout))
+
+    @staticmethod
+    def _run_shell_uncached(args: List[str], device_id: Optional[str], timeout: int,
+                            any_timeout: bool = False) -> Tuple[bool, str, str]:
+        """any_timeout 为 True 时不论超时长短都优先借用会话（用于对延迟敏感的输入）"""
+        if SHELL_SESSIONS and (any_timeout or timeout <= SESSION_MAX_TIMEOUT):
+            result = ADBHelper._run_in_session(args, device_id, timeout)
+            if result is not None:
+                return result
+
+        return ADBHelper._run_shell_once(args, device_id, timeout)
+
+    @staticmethod
+    def _run_shell_once(args: List[str], device_id: Optional[str], timeout: int) -> Tuple[bool, str, str]:
+        """以单次 adb shell 执行命令，不借用会话，也不经过命令结果缓存"""
+        cmd = ['shell'] + args
+        if device_id:
+            cmd = ['-s', device_id] + cmd
+        return ADBHelper._execute_adb_command(cmd, timeout)
+
+    @staticmethod
+    def _run_in_session(args: List[str], device_id: Optional[str], timeout: int) -> Optional[Tuple[bool, str, str]]:
+        """在借用的会话中执行命令；命令没有执行（会话忙或不可用）时返回 None"""
+        with ADBHelper.get_shell_sessions().checkout(device_id) as session:
+            if session is None:
+                return None
+            # 只登记本次借用的会话，取消时不会影响其他调用方
+            scope = current_scope()
+            if scope is not None and not scope.register(session):
+                return False, "", "Command cancelled"
+            start = time.monotonic()
+            try:
+                exit_code, stdout, stderr = session.run(' '.join(args), timeout)
+            except ShellSessionUnavailable:
+                return None
+            except ShellSessionError as e:
+                # 命令可能已经执行，不再重试
+                get_instrumentation().observe_command(device_id, ['shell'] + args, time.monotonic() - start,
+                                                      False, str(e), 0)
+                return False, "", str(e)
+            finally:
+                if scope is not None:
+                    scope.unregister(session)
+            stdout, stderr = stdout.strip(), stderr.strip()
+            get_instrumentation().observe_command(device_id, ['shell'] + args, time.monotonic() - start,
+                                                  exit_code == 0, stderr, len(stdout))
+            return exit_code == 0, stdout, stderr
+
+    @staticmethod
+    def get_command_cache() -> CommandCache:
+        """获取共享的命令结果缓存"""
+        if ADBHelper._command_cache is None:
+            ADBHelper._command_cache = CommandCache()
+        return ADBHelper._command_cache
+
+    @staticmethod
+    def get_cache_stats(reset: bool = False, clear: bool = False) -> Dict:
+        """
+        命令结果缓存的命中/未命中统计，见 CommandCache.stats
+
+        Args:
+            reset: 读取后将计数清零
+            clear: 同时丢弃所有缓存的结果
+        """
+        cache = ADBHelper.get_command_cache()
+        if clear:
+            cache.invalidate()
+        return cache.stats(reset)
+
+    @staticmethod
+    def get_performance_stats(reset: bool = False, prometheus_path: Optional[str] = None) -> Dict:
+        """
+        工具调用、ADBHelper 方法和 adb 命令的耗时分位数、错误/超时计数、字节数，
+        以及 adb 子进程和 adb server 连接计数，见 instrumentation
+
+        Args:
+            reset: 读取后将统计清零
+            prometheus_path: 同时以 Prometheus 文本格式写入该文件；空字符串表示
+                写入 ADB_MCP_PROMETHEUS_FILE 配置的文件
+        """
+        instrumentation = get_instrumentation()
+        written = None
+        if prometheus_path is not None:
+            try:
+                written = instrumentation.dump_prometheus(prometheus_path or None)
+            except OSError as e:
+                return {'error': f"写入 Prometheus 文件失败: {e}"}
+            if written is None:
+                return {'error': "未指定 Prometheus 文件路径，也未设置 ADB_MCP_PROMETHEUS_FILE"}
+        stats = instrumentation.snapshot(reset)
+        stats['prometheus_file'] = written
+        return stats
+
+    @staticmethod
+    def get_prometheus_metrics() -> str:
+        """Prometheus 文本格式的统计"""
+        return get_instrumentation().prometheus_text()
+
+    @staticmethod
+    def _split_serial(command: List[str]) -> Tuple[Optional[str], List[str]]:
+        """拆出命令中的 -s <serial> 选项"""
+        if len(command) >= 2 and command[0] == '-s':
+            return command[1], command[2:]
+        return None, command
+
+    @staticmethod
+    def _run_native_command(command: List[str], timeout: int = 30) -> Optional[Tuple[bool, str, str]]:
+        """
+        通过 adb server 主机协议执行命令
+
+        Returns:
+            (success, stdout, stderr)；命令不支持直连或无法连接 adb server 时返回 None
+        """
+        serial, args = ADBHelper._split_serial(command)
+        if not args:
+            return None
+
+        client = ADBHelper.get_client()
+        name, rest = args[0], args[1:]
+        try:
+            if name == 'devices':
+                payload = client.devices(long_format='-l' in rest)
+                return True, ("List of devices attached\n" + payload).strip(), ""
+
+            if name == 'shell' and rest:
+                exit_code, stdout, stderr = client.shell(serial, ' '.join(rest), timeout)
+                return (exit_code == 0,
+                        stdout.decode('utf-8', errors='replace').strip(),
+                        stderr.decode('utf-8', errors='replace').strip())
+
+            if name == 'exec-out' and rest:
+                stdout = client.exec_out(serial, ' '.join(rest), timeout)
+                return True, stdout.decode('utf-8', errors='replace').strip(), ""
+
+            if name == 'logcat':
+                # 与 adb 客户端一致：清空 ANDROID_LOG_TAGS 后 exec logcat
+                logcat_cmd = "export ANDROID_LOG_TAGS=\"''\"; exec logcat " + ' '.join(shlex.quote(a) for a in rest)
+                exit_code, stdout, stderr = client.shell(serial, logcat_cmd, timeout)
+                return (exit_code == 0,
+                        stdout.decode('utf-8', errors='replace').strip(),
+                        stderr.decode('utf-8', errors='replace').strip())
+
+            if name == 'pull' and len(rest) == 2:
+                return ADBHelper._native_pull(client, serial, rest[0], rest[1], timeout)
+
+            if name == 'push' and len(rest) == 2:
+                return ADBHelper._native_push(client, serial, rest[0], rest[1], timeout)
+
+        except (ConnectionRefusedError, FileNotFoundError):
+            # adb server 未启动，交给 adb 客户端（会自动拉起 server）
+            return None
+        except socket.timeout:
+            return False, "", "Command timed out"
+        except ADBProtocolError as e:
+            return False, "", f"adb: error: {e}"
+        except OSError as e:
+            # shell/exec 服务请求发出之后的连接错误已转换为 ADBProtocolError，
+            # 这里只剩命令尚未发到设备或可以安全重做的 sync 传输，改用 adb 客户端
+            if ADB_TRANSPORT == 'native':
+                return False, "", str(e)
+            return None
+
+        return None
+
+    @staticmethod
+    def _native_pull(client: ADBClient, serial: Optional[str], remote_path: str,
+                     local_path: str, timeout: int) -> Optional[Tuple[bool, str, str]]:
+        """通过 sync 协议拉取单个文件，目录交给 adb 客户端处理"""
+        mode, size, mtime = client.stat(serial, remote_path, timeout)
+        if mode == 0:
+            return False, "", f"adb: error: failed to stat remote object '{remote_path}': No such file or directory"
+        if (mode & 0o170000) != 0o100000:
+            return None
+        if os.path.isdir(local_path):
+            local_path = os.path.join(local_path, os.path.basename(remote_path.rstrip('/')))
+
+        start = time.monotonic()
+        total = client.pull(serial, remote_path, local_path, timeout)
+        elapsed = max(time.monotonic() - start, 1e-6)
+        return True, (f"{remote_path}: 1 file pulled, 0 skipped. "
+                      f"{total / elapsed / 1024 / 1024:.1f} MB/s ({total} bytes in {elapsed:.3f}s)"), ""
+
+    @staticmethod
+    def _native_push(client: ADBClient, serial: Optional[str], local_path: str,
+                     remote_path: str, timeout: int) -> Optional[Tuple[bool, str, str]]:
+        """通过 sync 协议推送单个文件，目录交给 adb 客户端处理"""
+        if not os.path.isfile(local_path):
+            if not os.path.exists(local_path):
+                return False, "", f"adb: error: cannot stat '{local_path}': No such file or directory"
+            return None
+
+        mode, _, _ = client.stat(serial, remote_path, timeout)
+        if (mode & 0o170000) == 0o040000:
+            remote_path = remote_path.rstrip('/') + '/' + os.path.basename(local_path)
+
+        start = time.monotonic()
+        total = client.push(serial, local_path, remote_path, timeout)
+        elapsed = max(time.monotonic() - start, 1e-6)
+        return True, (f"{local_path}: 1 file pushed, 0 skipped. "
+                      f"{total / elapsed / 1024 / 1024:.1f} MB/s ({total} bytes in {elapsed:.3f}s)"), ""
     
     @staticmethod
     def list_devices() -> List[Dict[str, str]]:
-        """列出连接的设备"""
+        """列出连接的设备（设备跟踪器在线时直接读取其设备表）"""
+        tracker = ADBHelper.get_device_tracker()
+        if tracker is not None and tracker.ready:
+            return [dict(device) for device in tracker.devices()]
+
         success, stdout, stderr = ADBHelper.run_adb_command(['devices', '-l'])
         
         if not success:
@@ -44,66 +650,234 @@ class ADBHelper:
         lines = stdout.split('\n')[1:]  # 跳过第一行标题
         
         for line in lines:
-            if line.strip() and not line.startswith('*'):
-                parts = line.split()
-                if len(parts) >= 2:
-                    device_id = parts[0]
-                    status = parts[1]
-                    
-                    # 解析设备信息
-                    device_info = {
-                        'id': device_id,
-                        'status': status
-                    }
-                    
-                    # 解析额外信息（如果有）
-                    for part in parts[2:]:
-                        if ':' in part:
-                            key, value = part.split(':', 1)
-                            device_info[key] = value
-                    
-                    devices.append(device_info)
+            device_info = parse_device_line(line)
+            if device_info is not None:
+                devices.append(device_info)
         
         return devices
+
+    @staticmethod
+    def get_device_tracker() -> Optional[DeviceTracker]:
+        """获取后台设备跟踪器，首次调用时启动；使用 adb 子进程传输时返回 None"""
+        if not DEVICE_TRACKER or ADB_TRANSPORT == 'subprocess':
+            return None
+        if ADBHelper._device_tracker is None:
+            tracker = DeviceTracker(ADBHelper.get_client())
+            tracker.add_listener(ADBHelper._on_device_event)
+            ADBHelper._device_tracker = tracker
+            tracker.start()
+            # 给首个设备列表一点时间，避免启动后的第一次查询仍走轮询
+            tracker.wait_ready(0.5)
+        return ADBHelper._device_tracker
+
+    @staticmethod
+    def get_device_events(limit: int = 50) -> List[Dict]:
+        """返回最近的设备上线/下线/状态变化事件"""
+        tracker = ADBHelper.get_device_tracker()
+        if tracker is None:
+            return []
+        return tracker.recent_events(limit)
+
+    @staticmethod
+    def _on_device_event(event: str, device_info: Dict[str, str]):
+        """设备下线或状态变化时丢弃与该设备相关的缓存和连接"""
+        if event == 'connected' and device_info.get('status') == 'device':
+            return
+        device_id = device_info['id']
+        ADBHelper.get_prop_cache().invalidate(device_id)
+        ADBHelper.get_frame_cache().invalidate(device_id)
+        ADBHelper.get_package_inventory().invalidate(device_id)
+        ADBHelper.get_file_index().invalidate(device_id)
+        ADBHelper.get_command_cache().invalidate(device_id)
+        ADBHelper.get_shell_sessions().close(device_id)
+        if ADBHelper._logcat_followers is not None:
+            ADBHelper._logcat_followers.close(device_id)
+        ADBHelper.get_client().forget_device(device_id)
     
     @staticmethod
     def get_device_info(device_id: Optional[str] = None) -> Dict[str, str]:
-        """获取设备详细信息"""
-        cmd = ['shell', 'getprop']
-        if device_id:
-            cmd = ['-s', device_id] + cmd
-            
-        success, stdout, stderr = ADBHelper.run_adb_command(cmd)
-        
+        """获取设备详细信息（ro.* 属性缓存到设备重启，其他属性按 TTL 刷新）"""
+        success, info, stderr = ADBHelper.get_prop_cache().get_all(device_id)
+
         if not success:
             return {'error': stderr}
-        
-        info = {}
-        for line in stdout.split('\n'):
-            if line.strip() and line.startswith('[') and ']:' in line:
-                try:
-                    # 解析格式: [key]: [value]
-                    key_end = line.find(']:')
-                    key = line[1:key_end]
-                    value = line[key_end + 3:].strip()
-                    if value.startswith('[') and value.endswith(']'):
-                        value = value[1:-1]
-                    info[key] = value
-                except:
-                    continue
-        
+
         return info
 
+    @staticmethod
+    def get_props(keys: List[str], device_id: Optional[str] = None) -> Dict[str, str]:
+        """获取指定的系统属性，只查询缓存中没有的属性"""
+        success, props, stderr = ADBHelper.get_prop_cache().get(keys, device_id)
+
+        if not success:
+            return {'error': stderr}
+
+        return props
+
+    @staticmethod
+    def get_prop_cache() -> PropertyCache:
+        """获取共享的系统属性缓存"""
+        if ADBHelper._prop_cache is None:
+            ADBHelper._prop_cache = PropertyCache(ADBHelper.run_shell_command)
+        return ADBHelper._prop_cache
+
     # ==================== 应用管理方法 ====================
 
+    # install_app 因设备上已安装相同 APK 而跳过时，stdout 以此开头
+    INSTALL_SKIPPED = "Skipped:"
+
     @staticmethod
-    def install_app(apk_path: str, device_id: Optional[str] = None) -> Tuple[bool, str, str]:
-        """安装APK应用"""
-        cmd = ['install', apk_path]
-        if device_id:
-            cmd = ['-s', device_id] + cmd
+    def get_apk_cache() -> APKIdentityCache:
+        """获取共享的本地 APK 标识缓存"""
+        if ADBHelper._apk_cache is None:
+            ADBHelper._apk_cache = APKIdentityCache()
+        return ADBHelper._apk_cache
+
+    @staticmethod
+    def install_app(apk_path: str, device_id: Optional[str] = None, split_paths: Optional[List[str]] = None,
+                    skip_if_installed: bool = True) -> Tuple[bool, str, str]:
+        """
+        安装APK应用
+
+        skip_if_installed 为 True 时先读取本地 APK 的包名和 versionCode（与文件摘要
+        一起按大小和修改时间缓存），若设备上已安装同一版本且各 APK 文件摘要完全
+        相同，则跳过传输，stdout 以 INSTALL_SKIPPED 开头。提供 split_paths 时
+        以 install-multiple 安装拆分 APK，直连 adb server 时各文件流式写入同一个
+        安装会话。
+
+        Args:
+            apk_path: 基础 APK 路径
+            split_paths: 拆分 APK 路径列表
+            skip_if_installed: 已安装相同 APK 时是否跳过
+        """
+        paths = [apk_path] + list(split_paths or [])
+        if skip_if_installed:
+            identical, detail = ADBHelper._installed_identical(paths, device_id)
+            if identical:
+                return True, f"{ADBHelper.INSTALL_SKIPPED} {detail}", ""
+
+        timeout = 120 * len(paths)  # 安装可能需要更长时间
+        result = None
+        if len(paths) > 1 and ADB_TRANSPORT != 'subprocess':
+            result = ADBHelper._native_install_multiple(paths, device_id, timeout)
+        if result is None:
+            cmd = ['install-multiple'] + paths if len(paths) > 1 else ['install', apk_path]
+            if device_id:
+                cmd = ['-s', device_id] + cmd
+            result = ADBHelper.run_adb_command(cmd, timeout=timeout)
+
+        if result[0]:
+            ADBHelper.get_command_cache().invalidate(device_id, ['packages'])
+        if result[0] and ADBHelper._package_inventory is not None:
+            try:
+                package = ADBHelper.get_apk_cache().identify(apk_path)['package']
+            except (APKError, OSError):
+                ADBHelper._package_inventory.invalidate(device_id)
+            else:
+                ADBHelper._package_inventory.package_installed(device_id, package)
+        return result
+
+    @staticmethod
+    def _installed_identical(paths: List[str], device_id: Optional[str]) -> Tuple[bool, str]:
+        """比较本地 APK 与设备上已安装的版本和文件摘要，返回 (是否相同, 说明)"""
+        try:
+            identities = [ADBHelper.get_apk_cache().identify(path) for path in paths]
+        except (APKError, OSError) as e:
+            return False, str(e)
+        package = identities[0]['package']
+        if any(identity['package'] != package for identity in identities):
+            return False, "split APKs belong to different packages"
+
+        quoted = shlex.quote(package)
+        script = (f"out=$(pm list packages --show-versioncode {quoted} 2>/dev/null); "
+                  f"case \"$out\" in *versionCode:*) echo \"$out\";; "
+                  f"*) dumpsys package {quoted} | grep -m1 'versionCode=';; esac; "
+                  f"for p in $(pm path {quoted} 2>/dev/null | sed 's/^package://'); do md5sum \"$p\"; done")
+        success, stdout, _ = ADBHelper.run_shell_command([script], device_id)
+        if not success and not stdout:
+            return False, "cannot query installed package"
+
+        installed_code = None
+        device_hashes = []
+        for line in stdout.split('\n'):
+            line = line.strip()
+            match = re.match(r'^package:(\S+) versionCode:(\d+)', line)
+            if match:
+                if match.group(1) == package:
+                    installed_code = int(match.group(2))
+                continue
+            match = re.search(r'versionCode=(\d+)', line)
+            if match and installed_code is None:
+                installed_code = int(match.group(1))
+                continue
+            match = re.match(r'^([0-9a-f]{32})\s+(\S+)$', line)
+            if match:
+                device_hashes.append(match.group(1))
+
+        version_code = identities[0]['version_code']
+        if installed_code is None or installed_code != version_code:
+            return False, f"installed versionCode {installed_code}, local {version_code}"
+        if sorted(device_hashes) != sorted(identity['md5'] for identity in identities):
+            return False, "installed APK differs"
+        return True, f"{package} versionCode {version_code} already installed ({len(paths)} identical APK)"
+
+    @staticmethod
+    def _native_install_multiple(paths: List[str], device_id: Optional[str],
+                                 timeout: int) -> Optional[Tuple[bool, str, str]]:
+        """
+        通过 package manager 安装会话流式安装多个 APK（install-create / install-write / install-commit）
 
-        return ADBHelper.run_adb_command(cmd, timeout=120)  # 安装可能需要更长时间
+        Returns:
+            (success, stdout, stderr)；设备不支持 cmd 或无法连接 adb server 时返回 None
+        """
+        client = ADBHelper.get_client()
+        try:
+            if 'cmd' not in client.features(device_id):
+                return None
+            for path in paths:
+                if not os.path.isfile(path):
+                    return False, "", f"adb: error: cannot stat '{path}': No such file or directory"
+            total = sum(os.path.getsize(path) for path in paths)
+            output = client.exec_out(device_id, f"cmd package install-create -S {total}", timeout)
+            output = output.decode('utf-8', errors='replace').strip()
+            match = re.search(r'\[(\d+)\]', output)
+            if not match:
+                return False, "", output or "install-create failed"
+            session = match.group(1)
+
+            committed = False
+            try:
+                for index, path in enumerate(paths):
+                    name = shlex.quote(f"{index}_{os.path.basename(path)}")
+                    with open(path, 'rb') as f:
+                        output = client.exec_in(
+                            device_id, f"cmd package install-write -S {os.path.getsize(path)} {session} {name} -",
+                            f, timeout)
+                    output = output.decode('utf-8', errors='replace').strip()
+                    if not output.startswith('Success'):
+                        return False, "", f"install-write {os.path.basename(path)} failed: {output}"
+                output = client.exec_out(device_id, f"cmd package install-commit {session}", timeout)
+                output = output.decode('utf-8', errors='replace').strip()
+                committed = True
+                if not output.startswith('Success'):
+                    return False, "", output
+                return True, output, ""
+            finally:
+                if not committed:
+                    try:
+                        client.exec_out(device_id, f"cmd package install-abandon {session}", 30)
+                    except (OSError, ADBProtocolError):
+                        pass
+        except (ConnectionRefusedError, FileNotFoundError):
+            return None
+        except socket.timeout:
+            return False, "", "Command timed out"
+        except ADBProtocolError as e:
+            return False, "", f"adb: error: {e}"
+        except OSError as e:
+            if ADB_TRANSPORT == 'native':
+                return False, "", str(e)
+            return None
 
     @staticmethod
     def uninstall_app(package_name: str, device_id: Optional[str] = None) -> Tuple[bool, str, str]:
@@ -112,74 +886,364 @@ class ADBHelper:
         if device_id:
             cmd = ['-s', device_id] + cmd
 
-        return ADBHelper.run_adb_command(cmd)
+        result = ADBHelper.run_adb_command(cmd)
+        if result[0] and ADBHelper._package_inventory is not None:
+            ADBHelper._package_inventory.package_removed(device_id, package_name)
+        return result
+
+    @staticmethod
+    def get_package_inventory() -> PackageInventory:
+        """获取共享的已安装应用清单缓存"""
+        if ADBHelper._package_inventory is None:
+            ADBHelper._package_inventory = PackageInventory(ADBHelper.run_shell_command)
+        return ADBHelper._package_inventory
 
     @staticmethod
     def list_packages(device_id: Optional[str] = None, system_apps: bool = False) -> List[str]:
-        """列出已安装的应用包"""
-        cmd = ['shell', 'pm', 'list', 'packages']
-        if not system_apps:
-            cmd.append('-3')  # 只显示第三方应用
+        """列出已安装的应用包（读取应用清单缓存）"""
+        packages = ADBHelper._list_packages_checked(device_id, system_apps)
 
-        if device_id:
-            cmd = ['-s', device_id] + cmd
+        if isinstance(packages, dict):
+            return []
 
-        success, stdout, stderr = ADBHelper.run_adb_command(cmd)
+        return packages
 
-        if not success:
-            return []
+    @staticmethod
+    def query_packages(search: str = "", system_apps: bool = True, installer: str = "", uid: int = 0,
+                       device_id: Optional[str] = None, refresh: bool = False) -> Dict:
+        """
+        在应用清单中查询
 
-        packages = []
-        for line in stdout.split('\n'):
-            if line.startswith('package:'):
-                package_name = line.replace('package:', '').strip()
-                packages.append(package_name)
+        Args:
+            search: 包名或 APK 路径包含的文本（不区分大小写）
+            system_apps: 是否包含系统应用
+            installer: 只返回该安装来源（如 com.android.vending）安装的应用
+            uid: 只返回该 UID 的应用；0 表示不限
+            refresh: 为 True 时忽略缓存重新获取清单
 
-        return packages
+        Returns:
+            {'packages': [信息...], 'total': 清单中的应用数, 'changes': 最近一次刷新的变化}；
+            出错时包含 error 字段
+        """
+        success, packages, changes, stderr = ADBHelper.get_package_inventory().get(device_id, refresh)
+        if not success:
+            return {'error': stderr}
+
+        needle = search.lower()
+        matched = [info for info in packages.values()
+                   if (system_apps or not info['system'])
+                   and (not needle or needle in info['package'].lower() or needle in info['path'].lower())
+                   and (not installer or info['installer'] == installer)
+                   and (not uid or info['uid'] == uid)]
+        matched.sort(key=lambda info: info['package'])
+        return {'packages': matched, 'total': len(packages), 'changes': changes}
 
     # ==================== 文件传输方法 ====================
 
     @staticmethod
-    def push_file(local_path: str, remote_path: str, device_id: Optional[str] = None) -> Tuple[bool, str, str]:
-        """推送文件到设备"""
-        cmd = ['push', local_path, remote_path]
-        if device_id:
-            cmd = ['-s', device_id] + cmd
+    def push_file(local_path: str, remote_path: str, device_id: Optional[str] = None,
+                  use_tar: bool = False, compress: bool = False) -> Tuple[bool, str, str]:
+        """
+        推送文件到设备
 
-        return ADBHelper.run_adb_command(cmd, timeout=300)  # 文件传输可能需要更长时间
+        Args:
+            use_tar: 以 tar 流批量传输（适合包含大量小文件的目录）
+            compress: tar 流使用 gzip 压缩（适合可压缩的数据）
+        """
+        try:
+            if use_tar:
+                return ADBHelper._tar_push(local_path, remote_path, device_id, compress)
+
+            cmd = ['push', local_path, remote_path]
+            if device_id:
+                cmd = ['-s', device_id] + cmd
+
+            result = ADBHelper.run_adb_command(cmd, timeout=300)  # 文件传输可能需要更长时间
+            if result[0] and os.path.isfile(local_path):
+                get_instrumentation().count_transfer('push', os.path.getsize(local_path))
+            return result
+        finally:
+            # 传输结束后再失效，传输期间列出的目录不会留在索引中
+            ADBHelper.get_file_index().invalidate(device_id, remote_path)
+            ADBHelper.get_command_cache().invalidate(device_id, ['files'])
 
     @staticmethod
-    def pull_file(remote_path: str, local_path: str, device_id: Optional[str] = None) -> Tuple[bool, str, str]:
-        """从设备拉取文件"""
+    def pull_file(remote_path: str, local_path: str, device_id: Optional[str] = None,
+                  use_tar: bool = False, compress: bool = False) -> Tuple[bool, str, str]:
+        """
+        从设备拉取文件
+
+        Args:
+            use_tar: 以 tar 流批量传输（适合包含大量小文件的目录）
+            compress: tar 流使用 gzip 压缩（适合可压缩的数据）
+        """
+        if use_tar:
+            return ADBHelper._tar_pull(remote_path, local_path, device_id, compress)
+
         cmd = ['pull', remote_path, local_path]
         if device_id:
             cmd = ['-s', device_id] + cmd
 
-        return ADBHelper.run_adb_command(cmd, timeout=300)
+        result = ADBHelper.run_adb_command(cmd, timeout=300)
+        if result[0] and os.path.isfile(local_path):
+            get_instrumentation().count_transfer('pull', os.path.getsize(local_path))
+        return result
 
     @staticmethod
-    def list_files(remote_path: str, device_id: Optional[str] = None) -> List[Dict[str, str]]:
-        """列出设备上的文件"""
-        cmd = ['shell', 'ls', '-la', remote_path]
-        if device_id:
-            cmd = ['-s', device_id] + cmd
+    def _tar_summary(path: str, action: str, counts: Tuple[int, int], compress: bool, start: float) -> str:
+        files, total = counts
+        get_instrumentation().count_transfer('push' if action == 'pushed' else 'pull', total)
+        elapsed = max(time.monotonic() - start, 1e-6)
+        return (f"{path}: {files} files {action} (tar{', gzip' if compress else ''}). "
+                f"{total / elapsed / 1024 / 1024:.1f} MB/s ({total} bytes in {elapsed:.3f}s)")
 
-        success, stdout, stderr = ADBHelper.run_adb_command(cmd)
+    @staticmethod
+    def _tar_push(local_path: str, remote_path: str, device_id: Optional[str],
+                  compress: bool) -> Tuple[bool, str, str]:
+        """本地边打包边写入设备端 tar -x 的标准输入"""
+        if not os.path.exists(local_path):
+            return False, "", f"adb: error: cannot stat '{local_path}': No such file or directory"
+
+        # 与 adb push 一致：目标为已存在的目录时放入其中，否则以目标路径为新名称
+        remote_path = remote_path.rstrip('/') or '/'
+        success, stdout, _ = ADBHelper.run_shell_command(
+            [f"[ -d {shlex.quote(remote_path)} ] && echo dir"], device_id)
+        if stdout.strip() == 'dir':
+            dest_dir, arcname = remote_path, os.path.basename(os.path.abspath(local_path))
+        else:
+            dest_dir, arcname = posixpath.dirname(remote_path) or '/', posixpath.basename(remote_path)
+        command = tar_stream.device_extract_command(dest_dir, compress)
+
+        counts: List[int] = []
+
+        def write_archive(stdin):
+            counts.extend(tar_stream.create_stream(stdin, local_path, arcname, compress))
+
+        start = time.monotonic()
+        if ADB_TRANSPORT != 'subprocess':
+            try:
+                exit_code, out, err = ADBHelper.get_client().shell(device_id, command, TAR_TIMEOUT, write_archive)
+                if exit_code != 0 or len(counts) != 2:
+                    return False, "", (err or out).decode('utf-8', errors='replace').strip() or f"tar exited with {exit_code}"
+                return True, ADBHelper._tar_summary(local_path, 'pushed', tuple(counts), compress, start), ""
+            except (ConnectionRefusedError, FileNotFoundError, ADBProtocolError):
+                counts.clear()  # adb server 未启动或设备不支持 shell_v2，交给 adb 客户端
+            except socket.timeout:
+                return False, "", "Command timed out"
+            except OSError as e:
+                return False, "", str(e)
+
+        cmd = ['adb'] + (['-s', device_id] if device_id else []) + ['shell', command]
+        scope = current_scope()
+        try:
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except FileNotFoundError:
+            return False, "", "ADB not found. Please install Android SDK platform-tools"
+        get_instrumentation().count_spawn('tar')
+        if scope is not None and not scope.register(process):
+            return False, "", "Command cancelled"
+        output: List[bytes] = []
+        reader = threading.Thread(target=lambda: output.append(process.stdout.read()), daemon=True)
+        reader.start()
+        timer = threading.Timer(TAR_TIMEOUT, process.kill)
+        timer.start()
+        try:
+            try:
+                write_archive(process.stdin)
+            except (OSError, ValueError):
+                pass  # 设备端 tar 提前退出，以退出码为准
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+            process.wait()
+            reader.join()
+        finally:
+            timer.cancel()
+            if scope is not None:
+                scope.unregister(process)
+
+        message = b''.join(output).decode('utf-8', errors='replace').strip()
+        if process.returncode != 0 or len(counts) != 2:
+            return False, "", message or f"tar exited with {process.returncode}"
+        return True, ADBHelper._tar_summary(local_path, 'pushed', tuple(counts), compress, start), ""
 
+    @staticmethod
+    def _tar_pull(remote_path: str, local_path: str, device_id: Optional[str],
+                  compress: bool) -> Tuple[bool, str, str]:
+        """设备端 tar -c 的输出经 exec-out 边接收边解包"""
+        remote_path = remote_path.rstrip('/') or '/'
+        success, stdout, stderr = ADBHelper.run_shell_command(
+            [f"[ -e {shlex.quote(remote_path)} ] && echo exists"], device_id)
+        if stdout.strip() != 'exists':
+            return False, "", stderr or f"adb: error: failed to stat remote object '{remote_path}': No such file or directory"
+
+        # 与 adb pull 一致：本地为已存在的目录时放入其中，否则以本地路径为新名称
+        name = posixpath.basename(remote_path)
+        if os.path.isdir(local_path):
+            dest_dir, rename = local_path, None
+        else:
+            dest_dir = os.path.dirname(os.path.abspath(local_path))
+            rename = (name, os.path.basename(os.path.abspath(local_path)))
+            os.makedirs(dest_dir, exist_ok=True)
+
+        command = tar_stream.device_create_command(remote_path, compress)
+        start = time.monotonic()
+        success, counts, error = tar_stream.receive_via_pipe(
+            lambda sink: ADBHelper.exec_out([command], device_id, TAR_TIMEOUT, sink)[::2],
+            dest_dir, compress, rename)
         if not success:
-            return []
+            return False, "", error
+        return True, ADBHelper._tar_summary(remote_path, 'pulled', counts, compress, start), ""
 
-        files = []
-        lines = stdout.split('\n')
+    @staticmethod
+    def sync_push(local_dir: str, remote_dir: str, device_id: Optional[str] = None, delete: bool = False,
+                  dry_run: bool = False, checksum: bool = False) -> Tuple[bool, Optional[Dict], str]:
+        """增量推送本地目录到设备，只传输新增或变化的文件（参数与返回值见 _sync_directory）"""
+        try:
+            return ADBHelper._sync_directory('push', local_dir, remote_dir, device_id, delete, dry_run, checksum)
+        finally:
+            if not dry_run:
+                ADBHelper.get_file_index().invalidate(device_id, remote_dir)
+                ADBHelper.get_command_cache().invalidate(device_id, ['files'])
 
-        for line in lines:
-            if line.strip() and not line.startswith('total'):
-                parts = line.split()
-                if len(parts) >= 8:  # 至少需要8个部分
-                    # Android ls -la 输出格式: permissions links owner group size date time name
-                    # 例如: drwxrwx--- 2 root everybody 3452 2025-03-07 11:16 Alarms
+    @staticmethod
+    def sync_pull(remote_dir: str, local_dir: str, device_id: Optional[str] = None, delete: bool = False,
+                  dry_run: bool = False, checksum: bool = False) -> Tuple[bool, Optional[Dict], str]:
+        """增量拉取设备目录到本地，只传输新增或变化的文件（参数与返回值见 _sync_directory）"""
+        return ADBHelper._sync_directory('pull', local_dir, remote_dir, device_id, delete, dry_run, checksum)
+
+    @staticmethod
+    def _sync_directory(direction: str, local_dir: str, remote_dir: str, device_id: Optional[str],
+                        delete: bool, dry_run: bool, checksum: bool) -> Tuple[bool, Optional[Dict], str]:
+        """
+        比较本地与设备目录的清单并同步
+
+        Args:
+            direction: push（本地 -> 设备）或 pull（设备 -> 本地）
+            delete: 删除目标端多余的文件
+            dry_run: 只返回同步计划，不做任何修改
+            checksum: 大小相同的文件比较 md5 摘要，而不是修改时间
+
+        Returns:
+            (success, 报告, stderr)；报告包含 transfer（需传输的路径）、extra（目标端多余的路径）、
+            unchanged、bytes、transferred、deleted、errors、dry_run
+        """
+        remote_dir = remote_dir.rstrip('/') or '/'
+        if direction == 'push' and not os.path.isdir(local_dir):
+            return False, None, f"local directory not found: {local_dir}"
+        if direction == 'pull' and os.path.exists(local_dir) and not os.path.isdir(local_dir):
+            return False, None, f"not a directory: {local_dir}"
+
+        success, stdout, stderr = ADBHelper.run_shell_command(
+            [dir_sync.remote_manifest_script(remote_dir)], device_id, timeout=120)
+        if not success:
+            return False, None, stderr or stdout
+        exists, remote = dir_sync.parse_remote_manifest(stdout)
+        if direction == 'pull' and not exists:
+            return False, None, f"remote directory not found: {remote_dir}"
+        local = dir_sync.local_manifest(local_dir) if os.path.isdir(local_dir) else {}
+
+        cached_local, cached_remote = dir_sync.load_cache(device_id, local_dir, remote_dir)
+        dir_sync.reuse_hashes(local, cached_local)
+        dir_sync.reuse_hashes(remote, cached_remote)
+        source, target = (local, remote) if direction == 'push' else (remote, local)
+
+        if checksum:
+            candidates = dir_sync.needs_hash(source, target)
+            for rel in candidates:
+                if local[rel][2] is None:
+                    local[rel][2] = dir_sync.local_hash(os.path.join(local_dir, rel))
+            missing = [rel for rel in candidates if remote[rel][2] is None]
+            for script in dir_sync.remote_hash_scripts(remote_dir, missing):
+                success, stdout, stderr = ADBHelper.run_shell_command([script], device_id, timeout=300)
+                if not success:
+                    return False, None, stderr or stdout
+                for rel, digest in dir_sync.parse_hashes(stdout).items():
+                    if rel in remote:
+                        remote[rel][2] = digest
+
+        changed, extra, unchanged = dir_sync.diff_manifests(source, target, checksum)
+        report = {
+            'direction': direction,
+            'transfer': changed,
+            'extra': extra,
+            'unchanged': unchanged,
+            'bytes': sum(source[rel][0] for rel in changed),
+            'transferred': 0,
+            'deleted': 0,
+            'errors': [],
+            'dry_run': dry_run,
+        }
+        if dry_run:
+            return True, report, ""
+
+        scope = current_scope()
+        for rel in changed:
+            if scope is not None and scope.cancelled:
+                report['errors'].append("cancelled")
+                break
+            local_path = os.path.join(local_dir, *rel.split('/'))
+            remote_path = f"{remote_dir.rstrip('/')}/{rel}"
+            if direction == 'push':
+                success, stdout, stderr = ADBHelper.push_file(local_path, remote_path, device_id)
+            else:
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                success, stdout, stderr = ADBHelper.pull_file(remote_path, local_path, device_id)
+                if success:
+                    # 保留设备端修改时间，下一次同步据此判断文件未变化
+                    mtime = source[rel][1]
+                    os.utime(local_path, (mtime, mtime))
+            if success:
+                target[rel] = list(source[rel])
+                report['transferred'] += 1
+            else:
+                report['errors'].append(f"{rel}: {stderr or stdout}")
+
+        if delete and extra and not (scope is not None and scope.cancelled):
+            if direction == 'push':
+                for i in range(0, len(extra), dir_sync.HASH_BATCH):
+                    batch = extra[i:i + dir_sync.HASH_BATCH]
+                    script = f"cd {shlex.quote(remote_dir)} && rm -f " + ' '.join(shlex.quote('./' + r) for r in batch)
+                    success, stdout, stderr = ADBHelper.run_shell_command([script], device_id, timeout=120)
+                    if success:
+                        for rel in batch:
+                            remote.pop(rel, None)
+                        report['deleted'] += len(batch)
+                    else:
+                        report['errors'].append(f"delete: {stderr or stdout}")
+            else:
+                for rel in extra:
                     try:
-                        file_info = {
+                        os.remove(os.path.join(local_dir, *rel.split('/')))
+                        local.pop(rel, None)
+                        report['deleted'] += 1
+                    except OSError as e:
+                        report['errors'].append(f"{rel}: {e}")
+
+        dir_sync.save_cache(device_id, local_dir, remote_dir, local, remote)
+        return not report['errors'], report, '; '.join(report['errors'][:5])
+
+    @staticmethod
+    def list_files(remote_path: str, device_id: Optional[str] = None) -> List[Dict[str, str]]:
+        """列出设备上的文件"""
+        return list(ADBHelper.iter_files(remote_path, device_id))
+
+    @staticmethod
+    def iter_files(remote_path: str, device_id: Optional[str] = None) -> Iterator[Dict[str, str]]:
+        """逐行读取并解析 ls -la 的输出，以生成器形式产出文件信息"""
+        cmd = ['shell', 'ls', '-la', remote_path]
+        if device_id:
+            cmd = ['-s', device_id] + cmd
+        with ADBHelper.stream_adb_command(cmd) as stream:
+            for line in stream:
+                if line.strip() and not line.startswith('total'):
+                    parts = line.split()
+                    if len(parts) >= 8:  # 至少需要8个部分
+                        # Android ls -la 输出格式: permissions links owner group size date time name
+                        # 例如: drwxrwx--- 2 root everybody 3452 2025-03-07 11:16 Alarms
+                        yield {
                             'permissions': parts[0],
                             'links': parts[1],
                             'owner': parts[2],
@@ -188,23 +1252,102 @@ class ADBHelper:
                             'date': f"{parts[5]} {parts[6]}",
                             'name': ' '.join(parts[7:])
                         }
-                        files.append(file_info)
-                    except IndexError:
-                        # 如果解析失败，跳过这一行
-                        continue
 
-        return files
+    @staticmethod
+    def get_file_index() -> file_index.FileIndex:
+        """获取共享的设备文件索引"""
+        if ADBHelper._file_index is None:
+            ADBHelper._file_index = file_index.FileIndex()
+        return ADBHelper._file_index
+
+    @staticmethod
+    def _index_subtree(remote_path: str, device_id: Optional[str], max_depth: Optional[int],
+                       refresh: bool) -> Tuple[Optional[List[file_index.Entry]], bool, bool, str]:
+        """
+        取得 remote_path 子树的索引项，优先使用缓存的索引
+
+        Returns:
+            (索引项或 None, 是否来自缓存, 输出是否被截断, 错误信息)
+        """
+        path = file_index.normalize(remote_path)
+        index = ADBHelper.get_file_index()
+        if not refresh:
+            cached = index.lookup(device_id, path, max_depth)
+            if cached is not None:
+                if not cached.is_dir(path):
+                    return None, True, False, f"not a directory: {path}"
+                return cached.subtree(path, max_depth), True, False, ""
+
+        cmd = ['shell', file_index.index_script(path, max_depth)]
+        if device_id:
+            cmd = ['-s', device_id] + cmd
+        entries: List[file_index.Entry] = []
+        with ADBHelper.stream_adb_command(cmd, timeout=120) as stream:
+            for line in stream:
+                if line == file_index.NOT_DIR_MARKER:
+                    return None, False, False, f"not a directory: {path}"
+                entry = file_index.parse_index_line(line)
+                if entry is not None:
+                    entries.append(entry)
+        if not stream.success and not entries:
+            return None, False, False, stream.stderr or f"cannot list {path}"
+        stored = index.store(device_id, path, max_depth, entries, complete=not stream.truncated)
+        return stored.entries, False, stream.truncated, ""
+
+    @staticmethod
+    def find_files(remote_path: str, device_id: Optional[str] = None, pattern: Optional[str] = None,
+                   file_type: Optional[str] = None, max_depth: Optional[int] = None,
+                   offset: int = 0, limit: int = 500, refresh: bool = False) -> Dict:
+        """
+        递归列出设备目录（一条 find + stat 命令），结果缓存在文件索引中
+
+        Args:
+            pattern: 通配符，含 / 时匹配相对 remote_path 的路径，否则匹配文件名
+            file_type: 只返回该类型: file / dir / link / other
+            max_depth: 最大递归深度，1 表示只列出直接子项；None 表示不限
+            offset / limit: 分页
+            refresh: 忽略缓存重新遍历
+
+        Returns:
+            {'files': [...], 'total', 'next_offset'（没有更多时为 None）, 'cached', 'truncated'}；
+            出错时包含 error 字段
+        """
+        entries, cached, truncated, error = ADBHelper._index_subtree(remote_path, device_id, max_depth, refresh)
+        if entries is None:
+            return {'error': error}
+        if pattern:
+            entries = file_index.match(entries, file_index.normalize(remote_path), pattern)
+        if file_type:
+            entries = [e for e in entries if file_index.entry_type(e[1]) == file_type]
+        offset = max(0, offset)
+        page = entries[offset:offset + max(1, limit)]
+        end = offset + len(page)
+        return {'files': [file_index.entry_dict(e) for e in page], 'total': len(entries),
+                'next_offset': end if end < len(entries) else None, 'cached': cached, 'truncated': truncated}
+
+    @staticmethod
+    def get_disk_usage(remote_path: str, device_id: Optional[str] = None, refresh: bool = False) -> Dict:
+        """
+        汇总设备目录下的文件大小（由文件索引计算，不再单独执行 du）
+
+        Returns:
+            {'total_bytes', 'files', 'dirs', 'children': [{'name', 'bytes', 'files', 'is_dir'}],
+             'cached', 'truncated'}；出错时包含 error 字段
+        """
+        path = file_index.normalize(remote_path)
+        entries, cached, truncated, error = ADBHelper._index_subtree(path, device_id, None, refresh)
+        if entries is None:
+            return {'error': error}
+        usage = file_index.rollup(entries, path)
+        usage.update(cached=cached, truncated=truncated)
+        return usage
 
     # ==================== 系统信息方法 ====================
 
     @staticmethod
     def get_battery_info(device_id: Optional[str] = None) -> Dict[str, str]:
         """获取电池信息"""
-        cmd = ['shell', 'dumpsys', 'battery']
-        if device_id:
-            cmd = ['-s', device_id] + cmd
-
-        success, stdout, stderr = ADBHelper.run_adb_command(cmd)
+        success, stdout, stderr = ADBHelper.run_shell_command(['dumpsys', 'battery'], device_id)
 
         if not success:
             return {'error': stderr}
@@ -224,11 +1367,7 @@ class ADBHelper:
     @staticmethod
     def get_memory_info(device_id: Optional[str] = None) -> Dict[str, str]:
         """获取内存信息"""
-        cmd = ['shell', 'cat', '/proc/meminfo']
-        if device_id:
-            cmd = ['-s', device_id] + cmd
-
-        success, stdout, stderr = ADBHelper.run_adb_command(cmd)
+        success, stdout, stderr = ADBHelper.run_shell_command(['cat', '/proc/meminfo'], device_id)
 
         if not success:
             return {'error': stderr}
@@ -247,59 +1386,311 @@ class ADBHelper:
     @staticmethod
     def get_storage_info(device_id: Optional[str] = None) -> List[Dict[str, str]]:
         """获取存储信息"""
+        return list(ADBHelper.iter_storage_info(device_id))
+
+    @staticmethod
+    def iter_storage_info(device_id: Optional[str] = None) -> Iterator[Dict[str, str]]:
+        """逐行读取并解析 df -h 的输出，以生成器形式产出各文件系统的用量"""
         cmd = ['shell', 'df', '-h']
         if device_id:
             cmd = ['-s', device_id] + cmd
+        with ADBHelper.stream_adb_command(cmd) as stream:
+            lines = iter(stream)
+            next(lines, None)  # 跳过标题行
+            for line in lines:
+                row = ADBHelper._parse_df_row(line)
+                if row:
+                    yield row
 
-        success, stdout, stderr = ADBHelper.run_adb_command(cmd)
+    @staticmethod
+    def _parse_df_row(line: str) -> Optional[Dict[str, str]]:
+        """解析 df -h 的一行，列数不足时返回 None"""
+        parts = line.split()
+        if len(parts) < 6:
+            return None
+        return {
+            'filesystem': parts[0],
+            'size': parts[1],
+            'used': parts[2],
+            'available': parts[3],
+            'use_percent': parts[4],
+            'mounted_on': ' '.join(parts[5:])
+        }
 
-        if not success:
-            return []
+    @staticmethod
+    def get_device_snapshot(device_id: Optional[str] = None, sections: Optional[List[str]] = None) -> Dict:
+        """
+        一次往返获取设备状态快照
 
-        storage_info = []
-        lines = stdout.split('\n')[1:]  # 跳过标题行
+        电池、内存、存储、常用属性、运行时间、负载和温度传感器由一条组合脚本
+        取回，解析为带单位的数值，见 device_snapshot。
 
-        for line in lines:
-            if line.strip():
-                parts = line.split()
-                if len(parts) >= 6:
-                    storage_info.append({
-                        'filesystem': parts[0],
-                        'size': parts[1],
-                        'used': parts[2],
-                        'available': parts[3],
-                        'use_percent': parts[4],
-                        'mounted_on': ' '.join(parts[5:])
-                    })
-
-        return storage_info
+        Args:
+            sections: 要包含的分段，默认全部（见 device_snapshot.SECTIONS）
+
+        Returns:
+            {分段名: 解析结果, 'captured_at': 主机时间戳}；出错时包含 error 字段
+        """
+        sections = list(dict.fromkeys(sections or device_snapshot.SECTIONS))
+        unknown = [name for name in sections if name not in device_snapshot.SECTIONS]
+        if unknown:
+            return {'error': f"unknown sections: {', '.join(unknown)}"}
+
+        success, stdout, stderr = ADBHelper.run_shell_command([device_snapshot.snapshot_script(sections)], device_id)
+        snapshot = device_snapshot.parse_snapshot(stdout)
+        if not snapshot:
+            return {'error': stderr or stdout or "empty snapshot"}
+        snapshot['captured_at'] = time.time()
+        return snapshot
+
+    @staticmethod
+    def get_metrics_sampler() -> MetricsSampler:
+        """获取共享的后台指标采样器"""
+        if ADBHelper._metrics_sampler is None:
+            # 采样线程使用独占会话；会话不可用时改用单次 adb shell，不经过共享会话池和结果缓存
+            ADBHelper._metrics_sampler = MetricsSampler(ADBHelper._run_shell_once, use_session=SHELL_SESSIONS)
+        return ADBHelper._metrics_sampler
+
+    @staticmethod
+    def start_monitoring(device_id: Optional[str] = None, interval: float = 5.0,
+                         metrics: Optional[List[str]] = None, processes: Optional[List[str]] = None,
+                         duration: float = 0.0) -> Dict:
+        """
+        在后台按固定间隔采集设备指标
+
+        每个采样周期执行一条组合 shell 命令，数值写入定长环形缓冲区，
+        见 metrics_sampler。同一设备再次启动时以新参数重新开始。
+
+        Args:
+            interval: 采样间隔（秒）
+            metrics: 指标组，默认全部（见 metrics_sampler.METRIC_GROUPS）
+            processes: 需要采集 RSS 和 CPU 的进程名（通常为包名）
+            duration: 采样时长（秒），0 表示直到停止
+
+        Returns:
+            {'metrics': 序列名列表, 'interval', 'capacity'}；出错时包含 error 字段
+        """
+        unknown = [name for name in metrics or [] if name not in METRIC_GROUPS]
+        if unknown:
+            return {'error': f"unknown metrics: {', '.join(unknown)}"}
+        monitor = ADBHelper.get_metrics_sampler().start(device_id, interval, metrics, processes, duration)
+        return {'metrics': list(monitor.buffer.names), 'interval': monitor.interval,
+                'capacity': monitor.buffer.capacity}
+
+    @staticmethod
+    def stop_monitoring(device_id: Optional[str] = None) -> bool:
+        """停止后台采样，已采集的数据仍可读取；没有采样时返回 False"""
+        return ADBHelper.get_metrics_sampler().stop(device_id)
+
+    @staticmethod
+    def get_metrics(device_id: Optional[str] = None, metrics: Optional[List[str]] = None,
+                    since_seconds: float = 0.0, points: int = 60) -> Dict:
+        """
+        读取后台采样的指标
+
+        Args:
+            metrics: 序列名（如 battery_level、<进程名>:rss_bytes），默认全部
+            since_seconds: 只统计最近多少秒的数据，0 表示全部
+            points: 每个序列降采样后的最多点数
+
+        Returns:
+            {'series', 'aggregates', 'samples', ...}，见 metrics_sampler.Monitor.read；
+            出错时包含 error 字段
+        """
+        monitor = ADBHelper.get_metrics_sampler().get(device_id)
+        if monitor is None:
+            return {'error': "no monitoring started for this device"}
+        unknown = [name for name in metrics or [] if name not in monitor.buffer.columns]
+        if unknown:
+            return {'error': f"unknown metrics: {', '.join(unknown)}"}
+        return monitor.read(metrics, since_seconds, points)
 
     # ==================== 屏幕操作方法 ====================
 
     @staticmethod
-    def take_screenshot(save_path: str, device_id: Optional[str] = None) -> Tuple[bool, str, str]:
+    def take_screenshot(save_path: str, device_id: Optional[str] = None,
+                        host_encode: bool = False, scale: float = 1.0,
+                        crop: Optional[List[int]] = None, image_format: str = 'png',
+                        quality: int = 80, frame_handle: str = "") -> Tuple[bool, str, str]:
         """截屏（必须提供本地保存路径，且必须为绝对路径）
 
+        通过 exec-out screencap 一次往返直接把图像流写入本地文件，不在设备上
+        留下临时文件，并发截图也不会争用同一个设备路径。host_encode 为 True 时
+        从设备获取原始 RGBA 帧，在主机侧编码 PNG，省去设备端较慢的 PNG 压缩。
+        指定缩放、裁剪或非 PNG 格式时同样走原始帧，经主机侧流水线处理。
+        指定 frame_handle 时不截屏，保存帧缓存中该句柄对应的帧。
+
         注意：路径解析在MCP服务器进程侧完成，无法自动定位调用方项目目录。
         如需保存到调用方项目，请在调用侧传入调用方项目的绝对路径；
-        若目标目录不存在，请在调用前创建目录，否则 adb pull 可能失败。
+        若目标目录不存在，请在调用前创建目录，否则写入会失败。
         """
         if not save_path or not save_path.strip():
             return False, "", "save_path is required"
-        remote_path = "/sdcard/screenshot.png"
 
-        # 先在设备上截屏
-        cmd = ['shell', 'screencap', '-p', remote_path]
-        if device_id:
-            cmd = ['-s', device_id] + cmd
+        save_dir = os.path.dirname(os.path.abspath(save_path))
+        if not os.path.isdir(save_dir):
+            return False, "", f"directory does not exist: {save_dir}"
+
+        processed = bool(frame_handle) or scale != 1.0 or bool(crop) or image_format.lower() != 'png'
+        partial_path = f"{save_path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with open(partial_path, 'wb') as f:
+                if processed:
+                    success, image, stderr = ADBHelper.capture_screenshot_image(
+                        device_id, scale, crop, image_format, quality, frame_handle)
+                    if success:
+                        f.write(image['data'])
+                elif host_encode:
+                    success, rgba, stderr = ADBHelper.capture_screen_raw(device_id)
+                    if success:
+                        width, height, pixels = rgba
+                        f.write(encode_png(width, height, pixels))
+                else:
+                    success, _, stderr = ADBHelper.exec_out(['screencap', '-p'], device_id, sink=f)
+
+            if not success:
+                return False, "", stderr
+            if not processed:
+                with open(partial_path, 'rb') as f:
+                    if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+                        return False, "", "screencap did not return PNG data"
+            size = os.path.getsize(partial_path)
+            os.replace(partial_path, save_path)
+            return True, f"{save_path}: {size} bytes", ""
+        except OSError as e:
+            return False, "", str(e)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    @staticmethod
+    def capture_screenshot_image(device_id: Optional[str] = None, scale: float = 1.0,
+                                 crop: Optional[List[int]] = None, image_format: str = 'png',
+                                 quality: int = 80, frame_handle: str = "") -> Tuple[bool, Optional[Dict], str]:
+        """
+        截屏并在主机侧裁剪、缩小、编码
+
+        Args:
+            device_id: 设备 ID
+            scale: 缩放比例，取值 (0, 1]
+            crop: 裁剪区域 [x, y, width, height]（原始分辨率坐标）
+            image_format: png / jpeg / webp
+            quality: JPEG/WebP 质量 1-100
+            frame_handle: 帧缓存中的帧句柄（见 screenshot_if_changed）；指定时编码该帧，不再截屏
+
+        Returns:
+            (success, {'data', 'format', 'width', 'height'}, stderr)
+        """
+        if frame_handle:
+            frame = ADBHelper.get_frame_cache().find(frame_handle)
+            if frame is None:
+                return False, None, f"frame not found: {frame_handle} (replaced by a newer frame or cache cleared)"
+            rgba = (frame.width, frame.height, frame.pixels)
+        else:
+            success, rgba, stderr = ADBHelper.capture_screen_raw(device_id)
+            if not success:
+                return False, None, stderr
+
+        try:
+            return True, ADBHelper._encode_frame(*rgba, scale, crop, image_format, quality), ""
+        except ValueError as e:
+            return False, None, str(e)
 
-        success, stdout, stderr = ADBHelper.run_adb_command(cmd)
+    @staticmethod
+    def _encode_frame(width: int, height: int, pixels, scale: float = 1.0,
+                      crop: Optional[List[int]] = None, image_format: str = 'png',
+                      quality: int = 80) -> Dict:
+        """裁剪、缩小并编码原始帧，返回 {'data', 'format', 'width', 'height'}"""
+        out_w, out_h, channels, data = crop_and_scale(width, height, pixels, crop, scale)
+        encoded = encode_image(out_w, out_h, channels, data, image_format, quality)
+        image_format = image_format.lower().replace('jpg', 'jpeg')
+        return {'data': encoded, 'format': image_format, 'width': out_w, 'height': out_h}
+
+    @staticmethod
+    def get_frame_cache() -> FrameCache:
+        """获取共享的屏幕帧缓存"""
+        if ADBHelper._frame_cache is None:
+            ADBHelper._frame_cache = FrameCache()
+        return ADBHelper._frame_cache
 
+    @staticmethod
+    def screenshot_if_changed(device_id: Optional[str] = None, threshold: float = 2.0,
+                              scale: float = 1.0, crop: Optional[List[int]] = None,
+                              image_format: str = 'png', quality: int = 80) -> Tuple[bool, Optional[Dict], str]:
+        """
+        截屏并与该设备上一帧比较，仅在画面变化时编码图像
+
+        Returns:
+            (success, 结果, stderr)；结果见 FrameCache.update，画面变化时
+            额外包含 image（见 capture_screenshot_image）
+        """
+        success, rgba, stderr = ADBHelper.capture_screen_raw(device_id)
         if not success:
-            return False, "", stderr
+            return False, None, stderr
+
+        width, height, pixels = rgba
+        result = ADBHelper.get_frame_cache().update(device_id, width, height, pixels, threshold)
+        if result['changed']:
+            try:
+                result['image'] = ADBHelper._encode_frame(width, height, pixels, scale, crop, image_format, quality)
+            except ValueError as e:
+                return False, None, str(e)
+        return True, result, ""
+
+    @staticmethod
+    def wait_for_screen_change(device_id: Optional[str] = None, timeout: float = 10.0,
+                               interval: float = 0.5, threshold: float = 2.0) -> Tuple[bool, Optional[Dict], str]:
+        """
+        在服务器侧轮询，直到画面相对基准帧发生变化或超时
+
+        基准帧为该设备缓存的上一帧；没有缓存时先截取一帧作为基准。
 
-        # 拉取到本地保存路径
-        return ADBHelper.pull_file(remote_path, save_path, device_id)
+        Returns:
+            (success, 结果, stderr)；结果见 FrameCache.update，另含
+            timed_out、polls、elapsed_ms
+        """
+        cache = ADBHelper.get_frame_cache()
+        start = time.monotonic()
+        polls = 0
+        if cache.get(device_id) is None:
+            success, rgba, stderr = ADBHelper.capture_screen_raw(device_id)
+            if not success:
+                return False, None, stderr
+            cache.update(device_id, *rgba, threshold)
+            polls += 1
+
+        scope = current_scope()
+        while True:
+            time.sleep(max(0.0, interval))
+            if scope is not None and scope.cancelled:
+                return False, None, "Command cancelled"
+            success, rgba, stderr = ADBHelper.capture_screen_raw(device_id)
+            if not success:
+                return False, None, stderr
+            polls += 1
+            result = cache.update(device_id, *rgba, threshold)
+            elapsed = time.monotonic() - start
+            if result['changed'] or elapsed >= timeout:
+                result.update({'timed_out': not result['changed'], 'polls': polls,
+                               'elapsed_ms': round(elapsed * 1000, 1)})
+                return True, result, ""
+
+    @staticmethod
+    def capture_screen_raw(device_id: Optional[str] = None) -> Tuple[bool, Optional[Tuple[int, int, memoryview]], str]:
+        """
+        获取原始 RGBA 屏幕帧（screencap 不带 -p，设备端不做 PNG 压缩）
+
+        Returns:
+            (success, (width, height, rgba 像素数据), stderr)
+        """
+        success, data, stderr = ADBHelper.exec_out(['screencap'], device_id)
+        if not success:
+            return False, None, stderr
+        try:
+            width, height, _, pixels = parse_raw_screencap(data)
+        except ValueError as e:
+            return False, None, str(e)
+        return True, (width, height, pixels), ""
 
     @staticmethod
     def record_screen(duration: int = 10, save_path: str = "", device_id: Optional[str] = None) -> Tuple[bool, str, str]:
@@ -327,41 +1718,138 @@ class ADBHelper:
     @staticmethod
     def send_text(text: str, device_id: Optional[str] = None) -> Tuple[bool, str, str]:
         """发送文本输入"""
-        # 转义特殊字符
-        escaped_text = text.replace(' ', '%s').replace('&', '\\&')
+        return ADBHelper.run_shell_command(['input', 'text', ADBHelper._escape_input_text(text)], device_id)
 
-        cmd = ['shell', 'input', 'text', escaped_text]
-        if device_id:
-            cmd = ['-s', device_id] + cmd
-
-        return ADBHelper.run_adb_command(cmd)
+    @staticmethod
+    def _escape_input_text(text: str) -> str:
+        """转义 input text 的特殊字符"""
+        return text.replace(' ', '%s').replace('&', '\\&')
 
     @staticmethod
     def send_keyevent(keycode: int, device_id: Optional[str] = None) -> Tuple[bool, str, str]:
         """发送按键事件"""
-        cmd = ['shell', 'input', 'keyevent', str(keycode)]
-        if device_id:
-            cmd = ['-s', device_id] + cmd
-
-        return ADBHelper.run_adb_command(cmd)
+        return ADBHelper.run_shell_command(['input', 'keyevent', str(keycode)], device_id)
 
     @staticmethod
     def send_tap(x: int, y: int, device_id: Optional[str] = None) -> Tuple[bool, str, str]:
         """发送点击事件"""
-        cmd = ['shell', 'input', 'tap', str(x), str(y)]
-        if device_id:
-            cmd = ['-s', device_id] + cmd
-
-        return ADBHelper.run_adb_command(cmd)
+        return ADBHelper.run_shell_command(['input', 'tap', str(x), str(y)], device_id)
 
     @staticmethod
     def send_swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300, device_id: Optional[str] = None) -> Tuple[bool, str, str]:
         """发送滑动事件"""
-        cmd = ['shell', 'input', 'swipe', str(x1), str(y1), str(x2), str(y2), str(duration)]
-        if device_id:
-            cmd = ['-s', device_id] + cmd
+        return ADBHelper.run_shell_command(['input', 'swipe', str(x1), str(y1), str(x2), str(y2), str(duration)], device_id)
+
+    @staticmethod
+    def _compile_input_step(step: Dict) -> Tuple[str, float]:
+        """
+        将单个输入步骤编译为 shell 命令
+
+        Returns:
+            (command, 预计耗时秒数)
+
+        Raises:
+            ValueError: 步骤类型未知或参数缺失
+        """
+        step_type = str(step.get('type', '')).lower()
+        try:
+            if step_type == 'tap':
+                return f"input tap {int(step['x'])} {int(step['y'])}", 0.5
+            if step_type == 'swipe':
+                duration = int(step.get('duration', 300))
+                return (f"input swipe {int(step['x1'])} {int(step['y1'])} "
+                        f"{int(step['x2'])} {int(step['y2'])} {duration}"), 0.5 + duration / 1000
+            if step_type == 'keyevent':
+                return f"input keyevent {int(step['keycode'])}", 0.5
+            if step_type == 'text':
+                # 整段加引号后无需再转义 shell 特殊字符，只需处理空格
+                return f"input text {shlex.quote(str(step['text']).replace(' ', '%s'))}", 1.0
+            if step_type == 'sleep':
+                seconds = float(step['ms']) / 1000 if 'ms' in step else float(step['seconds'])
+                if seconds < 0:
+                    raise ValueError("sleep duration must not be negative")
+                return f"sleep {seconds:g}", seconds
+        except KeyError as e:
+            raise ValueError(f"step '{step_type}' is missing parameter {e}")
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"step '{step_type}' has invalid parameter: {e}")
+        raise ValueError(f"unknown step type: '{step_type}'")
+
+    @staticmethod
+    def _parse_step_markers(stdout: str, marker: str) -> Dict[int, Tuple[int, str]]:
+        """解析批量输入脚本的标记行 `<marker><序号>:<退出码>:<输出>`，返回 {序号: (退出码, 输出)}"""
+        outcomes = {}
+        for line in stdout.split('\n'):
+            if not line.startswith(marker):
+                continue
+            parts = line[len(marker):].split(':', 2)
+            if len(parts) < 2 or not parts[0].isdigit() or not parts[1].lstrip('-').isdigit():
+                continue
+            outcomes[int(parts[0])] = (int(parts[1]), parts[2].strip() if len(parts) > 2 else '')
+        return outcomes
+
+    @staticmethod
+    def send_input_batch(steps: List[Dict], stop_on_error: bool = True,
+                         device_id: Optional[str] = None) -> Tuple[bool, List[Dict], str]:
+        """
+        批量发送输入事件
+
+        所有步骤编译为一段设备端 shell 脚本，经由长驻 shell 会话一次往返
+        执行完毕，每个步骤执行后输出带序号和退出码的标记行。超时按各步骤
+        的预计耗时计算。
+
+        Args:
+            steps: 有序步骤列表，如 {'type': 'tap', 'x': 100, 'y': 200}、
+                {'type': 'swipe', 'x1', 'y1', 'x2', 'y2', 'duration'}、
+                {'type': 'keyevent', 'keycode': 66}、{'type': 'text', 'text': 'hi'}、
+                {'type': 'sleep', 'ms': 500}
+            stop_on_error: 某一步失败后是否跳过后续步骤
+            device_id: 设备 ID
+
+        Returns:
+            (success, 每个步骤的结果列表, stderr)
+        """
+        if not steps:
+            return False, [], "steps is empty"
+
+        marker = "__ADB_MCP_STEP_"
+        lines = ["__b_ok=1"]
+        expected_seconds = 0.0
+        for index, step in enumerate(steps):
+            try:
+                command, seconds = ADBHelper._compile_input_step(step)
+            except ValueError as e:
+                return False, [], f"step {index}: {e}"
+            expected_seconds += seconds
+            guard = 'if [ $__b_ok = 1 ]; then ' if stop_on_error else '{ '
+            close = '; fi' if stop_on_error else '; }'
+            lines.append(
+                f"{guard}__b_out=$({command} 2>&1); __b_rc=$?; "
+                f"[ $__b_rc = 0 ] || __b_ok=0; "
+                f"printf '{marker}%d:%d:%s\\n' {index} $__b_rc \"$__b_out\" | tr '\\n' ' '; echo"
+                f"{close}"
+            )
 
-        return ADBHelper.run_adb_command(cmd)
+        timeout = math.ceil(expected_seconds * INPUT_BATCH_TIMEOUT_FACTOR + INPUT_BATCH_TIMEOUT_MARGIN)
+        # 输入命令不可缓存，直接执行；含较长 sleep 的批次同样借用会话
+        success, stdout, stderr = ADBHelper._run_shell_uncached(['\n'.join(lines)], device_id, timeout,
+                                                                any_timeout=True)
+        outcomes = ADBHelper._parse_step_markers(stdout, marker)
+
+        results = []
+        for index, step in enumerate(steps):
+            if index in outcomes:
+                exit_code, output = outcomes[index]
+                results.append({'index': index, 'type': step.get('type'),
+                                'status': 'ok' if exit_code == 0 else 'failed',
+                                'exit_code': exit_code, 'output': output})
+            else:
+                results.append({'index': index, 'type': step.get('type'), 'status': 'skipped'})
+
+        all_ok = len(outcomes) == len(steps) and all(code == 0 for code, _ in outcomes.values())
+        if not outcomes and not success:
+            return False, results, stderr
+        return all_ok, results, ""
 
     # ==================== 日志方法 ====================
 
@@ -380,92 +1868,214 @@ class ADBHelper:
         if device_id:
             cmd = ['-s', device_id] + cmd
 
-        return ADBHelper.run_adb_command(cmd, timeout=60)
+        # lines=0 时可能输出整个日志缓冲区，按 ADB_MCP_MAX_OUTPUT_BYTES 截断
+        with ADBHelper.stream_adb_command(cmd, timeout=60) as stream:
+            stdout = stream.read().strip()
+        return bool(stream.success), stdout, stream.stderr
 
     @staticmethod
-    def clear_logcat(device_id: Optional[str] = None) -> Tuple[bool, str, str]:
-        """清除logcat日志"""
-        cmd = ['logcat', '-c']
-        if device_id:
-            cmd = ['-s', device_id] + cmd
+    def get_logcat_followers() -> LogcatFollowerPool:
+        """获取共享的后台 logcat 跟随器池"""
+        if ADBHelper._logcat_followers is None:
+            ADBHelper._logcat_followers = LogcatFollowerPool()
+        return ADBHelper._logcat_followers
+
+    @staticmethod
+    def read_logcat(filter_tag: str = "", lines: int = 100, cursor: int = -1, wait: float = 0.0,
+                    device_id: Optional[str] = None) -> Tuple[bool, Optional[Dict], str]:
+        """
+        从设备的后台 logcat 流读取日志
 
-        return ADBHelper.run_adb_command(cmd)
+        Args:
+            filter_tag: 只返回该标签的日志
+            lines: 最多返回的行数，0 表示不限
+            cursor: 上一次返回的游标，只返回其后的新日志；小于 0 时返回最新的 lines 行
+            wait: 没有新日志时最多等待的秒数（长轮询）
 
-    # ==================== 系统信息方法 ====================
+        Returns:
+            (success, {'lines', 'cursor', 'dropped'}, stderr)
+        """
+        if not LOGCAT_FOLLOW:
+            return False, None, "logcat follower disabled (ADB_MCP_LOGCAT_FOLLOW=0)"
+        try:
+            follower = ADBHelper.get_logcat_followers().get(device_id)
+        except (OSError, LogcatFollowerError) as e:
+            return False, None, str(e)
+
+        scope = current_scope()
+        cancelled = (lambda: scope.cancelled) if scope is not None else None
+        result = follower.read(cursor, lines, filter_tag, wait, cancelled)
+        if not result['lines'] and follower.error:
+            # 跟随进程在读取期间异常退出，下一次读取时重连
+            return False, None, follower.error
+        return True, result, ""
 
     @staticmethod
-    def get_battery_info(device_id: Optional[str] = None) -> Dict[str, str]:
-        """获取电池信息"""
-        cmd = ['shell', 'dumpsys', 'battery']
-        if device_id:
-            cmd = ['-s', device_id] + cmd
+    def query_logcat(tag: str = "", pid: int = 0, package: str = "", level: str = "",
+                     since_seconds: float = 0, start_time: str = "", end_time: str = "",
+                     pattern: str = "", limit: int = 100,
+                     device_id: Optional[str] = None) -> Tuple[bool, Optional[Dict], str]:
+        """
+        在后台 logcat 流已接收的结构化日志中查询
 
-        success, stdout, stderr = ADBHelper.run_adb_command(cmd)
+        Args:
+            tag: 标签，多个用逗号分隔（精确匹配）
+            pid: 进程 ID
+            package: 包名，通过 pidof 解析为进程 ID（唯一需要访问设备的条件）
+            level: 最低级别 V/D/I/W/E/F/A
+            since_seconds: 只返回最新一条日志之前若干秒内的日志
+            start_time / end_time: 时间范围，格式 MM-DD HH:MM:SS[.mmm]
+            pattern: 对消息内容做匹配的正则表达式
+            limit: 最多返回的记录数（取最新的），0 表示不限
 
-        if not success:
-            return {'error': stderr}
+        Returns:
+            (success, {'records', 'truncated', 'buffered', 'oldest', 'newest'}, stderr)
+        """
+        if not LOGCAT_FOLLOW:
+            return False, None, "logcat follower disabled (ADB_MCP_LOGCAT_FOLLOW=0)"
+
+        criteria = {'limit': limit}
+        if tag:
+            criteria['tags'] = [t.strip() for t in tag.split(',') if t.strip()]
+        if level:
+            criteria['min_level'] = level_rank(level)
+            if not criteria['min_level']:
+                return False, None, f"invalid level: {level}"
+        if pattern:
+            try:
+                criteria['pattern'] = re.compile(pattern)
+            except re.error as e:
+                return False, None, f"invalid pattern: {e}"
+        for key, value in (('start_time', start_time), ('end_time', end_time)):
+            if value:
+                parsed = parse_time(value)
+                if parsed is None:
+                    return False, None, f"invalid {key}: {value} (expected MM-DD HH:MM:SS)"
+                criteria[key] = parsed
+
+        pids = [pid] if pid else []
+        if package:
+            success, stdout, stderr = ADBHelper.run_shell_command(['pidof', shlex.quote(package)], device_id)
+            package_pids = [int(p) for p in stdout.split() if p.isdigit()]
+            if not package_pids:
+                return False, None, f"package not running: {package}"
+            pids.extend(package_pids)
+        if pids:
+            criteria['pids'] = pids
 
-        battery_info = {}
-        for line in stdout.split('\n'):
-            line = line.strip()
-            if ':' in line and not line.startswith('Current Battery Service state'):
-                try:
-                    key, value = line.split(':', 1)
-                    battery_info[key.strip()] = value.strip()
-                except:
-                    continue
+        try:
+            follower = ADBHelper.get_logcat_followers().get(device_id)
+        except (OSError, LogcatFollowerError) as e:
+            return False, None, str(e)
 
-        return battery_info
+        return True, follower.query(since_seconds, **criteria), ""
 
     @staticmethod
-    def get_memory_info(device_id: Optional[str] = None) -> Dict[str, str]:
-        """获取内存信息"""
-        cmd = ['shell', 'cat', '/proc/meminfo']
+    def clear_logcat(device_id: Optional[str] = None) -> Tuple[bool, str, str]:
+        """清除logcat日志"""
+        cmd = ['logcat', '-c']
         if device_id:
             cmd = ['-s', device_id] + cmd
 
-        success, stdout, stderr = ADBHelper.run_adb_command(cmd)
+        result = ADBHelper.run_adb_command(cmd)
+        if result[0] and ADBHelper._logcat_followers is not None:
+            follower = ADBHelper._logcat_followers.peek(device_id)
+            if follower is not None:
+                follower.clear()
+        return result
+
+    # ==================== 多设备方法 ====================
+
+    # 允许在多台设备上并发执行的操作
+    FANOUT_OPERATIONS = (
+        'get_device_info', 'get_props', 'install_app', 'uninstall_app', 'list_packages', 'push_file',
+        'get_battery_info', 'get_memory_info', 'get_storage_info', 'get_device_snapshot',
+        'send_text', 'send_keyevent', 'send_tap', 'send_swipe', 'send_input_batch',
+        'clear_logcat',
+    )
+
+    # 失败时返回空列表、与"没有结果"无法区分的操作，多设备执行时改用返回 error 的版本
+    FANOUT_CHECKED = {
+        'list_packages': '_list_packages_checked',
+        'get_storage_info': '_storage_info_checked',
+    }
 
+    @staticmethod
+    def _list_packages_checked(device_id: Optional[str] = None, system_apps: bool = False) -> Union[List[str], Dict]:
+        """同 list_packages，读取清单失败时返回 {'error': ...}"""
+        success, packages, _, stderr = ADBHelper.get_package_inventory().get(device_id)
         if not success:
             return {'error': stderr}
-
-        memory_info = {}
-        for line in stdout.split('\n'):
-            if ':' in line:
-                try:
-                    key, value = line.split(':', 1)
-                    memory_info[key.strip()] = value.strip()
-                except:
-                    continue
-
-        return memory_info
+        return [name for name, info in packages.items() if system_apps or not info['system']]
 
     @staticmethod
-    def get_storage_info(device_id: Optional[str] = None) -> List[Dict[str, str]]:
-        """获取存储信息"""
+    def _storage_info_checked(device_id: Optional[str] = None) -> Union[List[Dict[str, str]], Dict]:
+        """同 get_storage_info，df 执行失败时返回 {'error': ...}"""
         cmd = ['shell', 'df', '-h']
         if device_id:
             cmd = ['-s', device_id] + cmd
+        with ADBHelper.stream_adb_command(cmd) as stream:
+            lines = list(stream)
+        if not stream.success:
+            return {'error': stream.stderr or "df failed"}
+        return [row for row in map(ADBHelper._parse_df_row, lines[1:]) if row]
 
-        success, stdout, stderr = ADBHelper.run_adb_command(cmd)
+    @staticmethod
+    def get_online_devices() -> List[str]:
+        """返回状态为 device（在线且已授权）的设备 ID 列表"""
+        return [d['id'] for d in ADBHelper.list_devices() if d.get('status') == 'device']
 
-        if not success:
-            return []
+    @staticmethod
+    def run_on_devices(operation: str, device_ids: Optional[List[str]] = None,
+                       params: Optional[Dict] = None, max_concurrency: int = 8) -> Dict:
+        """
+        在多台设备上并发执行同一个 ADBHelper 操作
 
-        storage_info = []
-        lines = stdout.split('\n')[1:]  # 跳过标题行
+        Args:
+            operation: 操作名，见 FANOUT_OPERATIONS
+            device_ids: 目标设备列表；为空时使用所有在线设备
+            params: 操作参数（不含 device_id）
+            max_concurrency: 本次调用的最大并发数
 
-        for line in lines:
-            if line.strip():
-                parts = line.split()
-                if len(parts) >= 6:
-                    storage_info.append({
-                        'filesystem': parts[0],
-                        'size': parts[1],
-                        'used': parts[2],
-                        'available': parts[3],
-                        'use_percent': parts[4],
-                        'mounted_on': ' '.join(parts[5:])
-                    })
-
-        return storage_info
+        Returns:
+            按设备汇总的结果，见 fanout.fan_out；出错时包含 error 字段
+        """
+        if operation not in ADBHelper.FANOUT_OPERATIONS:
+            return {'error': f"unsupported operation: {operation}"}
+        params = dict(params or {})
+        params.pop('device_id', None)
+
+        targets = list(device_ids) if device_ids else ADBHelper.get_online_devices()
+        if not targets:
+            return {'error': "no online devices"}
+
+        operation = ADBHelper.FANOUT_CHECKED.get(operation, operation)
+        return fan_out(getattr(ADBHelper, operation), targets, params,
+                       max_concurrency=max_concurrency, scope=current_scope())
+
+    # ==================== 结果存储方法 ====================
+
+    @staticmethod
+    def get_result_store() -> ResultStore:
+        """获取共享的大结果存储"""
+        if ADBHelper._result_store is None:
+            ADBHelper._result_store = ResultStore()
+        return ADBHelper._result_store
+
+    @staticmethod
+    def spill_result(text: str, label: str = "") -> Optional[Dict]:
+        """
+        超过内联阈值（ADB_MCP_RESULT_INLINE_LIMIT）的结果写入结果存储
+
+        Returns:
+            {'handle', 'label', 'lines', 'bytes'}；未超过阈值时返回 None
+        """
+        store = ADBHelper.get_result_store()
+        if len(text) * 4 <= store.inline_limit or len(text.encode('utf-8')) <= store.inline_limit:
+            return None
+        return store.put(text, label)
+
+    @staticmethod
+    def read_result(handle: str, offset: int = 0, limit: int = 200) -> Dict:
+        """按行分页读取已保存的结果，见 ResultStore.read"""
+        return ADBHelper.get_result_store().read(handle, offset, limit)
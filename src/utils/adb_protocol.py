@@ -0,0 +1,567 @@
+"""
+ADB server 主机协议客户端
+
+直接通过 TCP（默认 127.0.0.1:5037）与 adb server 通信，免去每次调用都
+fork/exec 一个 adb 客户端进程的开销。支持的服务：
+
+- host:*                    主机级请求（devices-l、features 等）
+- host:transport:<serial>   切换到指定设备的传输通道
+- shell: / shell,v2,raw:    执行 shell 命令（v2 协议可取得退出码）
+- exec:                     原始二进制输出（等价于 adb exec-out）
+- sync:                     文件传输协议（STAT/LIST/RECV/SEND）
+
+服务器地址可通过 adb 自身使用的环境变量 ANDROID_ADB_SERVER_ADDRESS /
+ANDROID_ADB_SERVER_PORT 覆盖，便于对接本地伪造的 adb server 进行测试。
+"""
+
+import os
+import socket
+import stat as stat_module
+import struct
+import threading
+import time
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+
+DEFAULT_HOST = os.environ.get('ANDROID_ADB_SERVER_ADDRESS', '127.0.0.1')
+DEFAULT_PORT = int(os.environ.get('ANDROID_ADB_SERVER_PORT', '5037'))
+
+# shell v2 协议包类型
+SHELL_ID_STDIN = 0
+SHELL_ID_STDOUT = 1
+SHELL_ID_STDERR = 2
+SHELL_ID_EXIT = 3
+SHELL_ID_CLOSE_STDIN = 4
+
+# shell v2 协议单个 stdin 包的最大负载（不超过旧设备的缓冲区大小）
+SHELL_STDIN_MAX = 16 * 1024
+
+# sync 协议单个 DATA 包的最大负载
+SYNC_DATA_MAX = 64 * 1024
+
+
+class ADBProtocolError(Exception):
+    """adb server 或设备返回 FAIL，或服务在应答完成前异常中断时抛出"""
+
+
+class ADBConnection:
+    """到 adb server 的单个 socket 连接"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def kill(self):
+        """从其他线程中断阻塞中的读写"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.close()
+
+    def set_timeout(self, timeout: Optional[float]):
+        self.sock.settimeout(timeout)
+
+    def send_request(self, payload: str):
+        """发送带 4 位十六进制长度前缀的请求并校验 OKAY/FAIL"""
+        data = payload.encode('utf-8')
+        self.sock.sendall(b'%04x' % len(data) + data)
+        self.read_status()
+
+    def read_status(self):
+        status = self.read_exactly(4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            raise ADBProtocolError(self.read_hex_string())
+        raise ADBProtocolError(f"unexpected response: {status!r}")
+
+    def read_hex_string(self) -> str:
+        length = int(self.read_exactly(4), 16)
+        return self.read_exactly(length).decode('utf-8', errors='replace')
+
+    def read_exactly(self, size: int) -> bytes:
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            chunk = self.sock.recv(remaining)
+            if not chunk:
+                raise ConnectionError("connection closed by adb server")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b''.join(chunks)
+
+    def read_all(self) -> bytes:
+        chunks = []
+        while True:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+
+class SyncConnection:
+    """sync: 服务会话，可在多次 STAT/LIST/RECV/SEND 之间复用"""
+
+    def __init__(self, conn: ADBConnection, serial: str):
+        self.conn = conn
+        self.serial = serial
+        self.broken = False
+
+    def _send(self, cmd: bytes, payload: bytes):
+        self.conn.sock.sendall(cmd + struct.pack('<I', len(payload)) + payload)
+
+    def _read_header(self) -> Tuple[bytes, int]:
+        header = self.conn.read_exactly(8)
+        return header[:4], struct.unpack('<I', header[4:])[0]
+
+    def _fail(self, length: int):
+        message = self.conn.read_exactly(length).decode('utf-8', errors='replace')
+        # 设备在 FAIL 之后会关闭会话，不能再放回连接池
+        self.broken = True
+        raise ADBProtocolError(message)
+
+    def stat(self, remote_path: str) -> Tuple[int, int, int]:
+        """返回 (mode, size, mtime)；文件不存在时 mode 为 0"""
+        self._send(b'STAT', remote_path.encode('utf-8'))
+        data = self.conn.read_exactly(16)
+        if data[:4] != b'STAT':
+            self.broken = True
+            raise ADBProtocolError(f"unexpected sync response: {data[:4]!r}")
+        return struct.unpack('<III', data[4:])
+
+    def list(self, remote_path: str) -> List[Dict[str, int]]:
+        """列出目录项 (name, mode, size, mtime)"""
+        self._send(b'LIST', remote_path.encode('utf-8'))
+        entries = []
+        while True:
+            header = self.conn.read_exactly(4)
+            if header == b'DONE':
+                self.conn.read_exactly(16)
+                return entries
+            if header != b'DENT':
+                self.broken = True
+                raise ADBProtocolError(f"unexpected sync response: {header!r}")
+            mode, size, mtime, namelen = struct.unpack('<IIII', self.conn.read_exactly(16))
+            name = self.conn.read_exactly(namelen).decode('utf-8', errors='replace')
+            if name not in ('.', '..'):
+                entries.append({'name': name, 'mode': mode, 'size': size, 'mtime': mtime})
+
+    def recv(self, remote_path: str, local_file) -> int:
+        """将设备文件写入本地文件对象，返回字节数"""
+        self._send(b'RECV', remote_path.encode('utf-8'))
+        total = 0
+        while True:
+            cmd, length = self._read_header()
+            if cmd == b'DATA':
+                local_file.write(self.conn.read_exactly(length))
+                total += length
+            elif cmd == b'DONE':
+                return total
+            elif cmd == b'FAIL':
+                self._fail(length)
+            else:
+                self.broken = True
+                raise ADBProtocolError(f"unexpected sync response: {cmd!r}")
+
+    def send(self, local_file, remote_path: str, mode: int, mtime: int) -> int:
+        """将本地文件对象写入设备，返回字节数"""
+        self._send(b'SEND', f"{remote_path},{mode}".encode('utf-8'))
+        total = 0
+        while True:
+            chunk = local_file.read(SYNC_DATA_MAX)
+            if not chunk:
+                break
+            self._send(b'DATA', chunk)
+            total += len(chunk)
+        self.conn.sock.sendall(b'DONE' + struct.pack('<I', mtime))
+        cmd, length = self._read_header()
+        if cmd == b'FAIL':
+            self._fail(length)
+        if cmd != b'OKAY':
+            self.broken = True
+            raise ADBProtocolError(f"unexpected sync response: {cmd!r}")
+        return total
+
+    def quit(self):
+        try:
+            self._send(b'QUIT', b'')
+        except OSError:
+            pass
+        self.conn.close()
+
+
+class ShellStdin:
+    """可写文件对象：把写入的数据封装为 shell v2 的 stdin 数据包"""
+
+    def __init__(self, conn: ADBConnection):
+        self.conn = conn
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast('B')
+        for start in range(0, len(view), SHELL_STDIN_MAX):
+            chunk = view[start:start + SHELL_STDIN_MAX]
+            self.conn.sock.sendall(struct.pack('<BI', SHELL_ID_STDIN, len(chunk)) + chunk)
+        return len(view)
+
+    def flush(self):
+        pass
+
+    def close_stdin(self):
+        self.conn.sock.sendall(struct.pack('<BI', SHELL_ID_CLOSE_STDIN, 0))
+
+
+class ADBClient:
+    """adb server 主机协议客户端
+
+    adb server 在一个连接上启动服务（shell:/exec: 等）后即由该服务独占，
+    因此主机请求和 shell 请求每次都使用新连接；sync: 会话可以承载多次
+    文件操作，这部分连接按设备放入连接池复用。
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, pool_size: int = 4):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self._sync_pool: Dict[str, List[SyncConnection]] = {}
+        self._features: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        # 每建立一个连接时回调，供调用方登记以便取消
+        self.on_connect: Optional[Callable[[ADBConnection], None]] = None
+
+    # ==================== 连接管理 ====================
+
+    def connect(self, timeout: Optional[float] = None) -> ADBConnection:
+        sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = ADBConnection(sock)
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
+
+    def host_request(self, service: str, timeout: Optional[float] = 10) -> str:
+        """执行 host:* 请求并返回带长度前缀的响应内容"""
+        conn = self.connect(timeout)
+        try:
+            conn.send_request(service)
+            return conn.read_hex_string()
+        finally:
+            conn.close()
+
+    def open_service(self, serial: Optional[str], service: str,
+                     timeout: Optional[float] = None) -> ADBConnection:
+        """
+        切换到设备传输通道并打开服务，返回由该服务独占的连接
+
+        服务请求发出之后的连接错误以 ADBProtocolError 抛出：设备可能已经开始
+        执行，调用方不能改用其他方式重试。
+        """
+        conn = self.connect(timeout)
+        try:
+            conn.send_request(f"host:transport:{serial}" if serial else "host:transport-any")
+            try:
+                conn.send_request(service)
+            except socket.timeout:
+                raise
+            except OSError as e:
+                raise ADBProtocolError(f"connection lost while opening {service.split(':', 1)[0]}: {e}") from e
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def resolve_serial(self, serial: Optional[str]) -> str:
+        """未指定设备时解析出默认设备的序列号"""
+        if serial:
+            return serial
+        return self.host_request("host:get-serialno").strip()
+
+    def features(self, serial: Optional[str]) -> set:
+        serial = self.resolve_serial(serial)
+        with self._lock:
+            cached = self._features.get(serial)
+        if cached is not None:
+            return cached
+        features = set(self.host_request(f"host-serial:{serial}:features").strip().split(','))
+        with self._lock:
+            self._features[serial] = features
+        return features
+
+    def forget_device(self, serial: str):
+        """设备断开或重连后丢弃其缓存的特性与池化连接"""
+        with self._lock:
+            self._features.pop(serial, None)
+            pooled = self._sync_pool.pop(serial, [])
+        for session in pooled:
+            session.quit()
+
+    # ==================== 服务 ====================
+
+    def devices(self, long_format: bool = True) -> str:
+        return self.host_request("host:devices-l" if long_format else "host:devices")
+
+    def shell(self, serial: Optional[str], command: str, timeout: Optional[float] = None,
+              stdin_writer: Optional[Callable[[ShellStdin], None]] = None) -> Tuple[int, bytes, bytes]:
+        """执行 shell 命令，返回 (exit_code, stdout, stderr)
+
+        设备支持 shell_v2 时使用带退出码的 v2 协议；否则退化为旧版 shell:，
+        此时 stderr 合并在 stdout 中，退出码固定为 0（与 adb 客户端行为一致）。
+
+        指定 stdin_writer 时以 ShellStdin 为参数调用它，写入的数据作为命令的
+        标准输入（需要 shell_v2），返回后关闭标准输入；输出由后台线程同时读取，
+        避免双方缓冲区写满而互相等待。
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        if 'shell_v2' not in self.features(serial):
+            if stdin_writer is not None:
+                raise ADBProtocolError("device does not support shell_v2 (required for stdin)")
+            conn = self.open_service(serial, f"shell:{command}", timeout)
+            try:
+                return 0, self._read_until_closed(conn, deadline), b''
+            finally:
+                conn.close()
+
+        conn = self.open_service(serial, f"shell,v2,raw:{command}", timeout)
+        try:
+            if stdin_writer is None:
+                return self._read_shell_packets(conn, deadline)
+
+            result: List = []
+            errors: List[BaseException] = []
+
+            def read_output():
+                try:
+                    result.append(self._read_shell_packets(conn, deadline))
+                except BaseException as e:
+                    errors.append(e)
+
+            reader = threading.Thread(target=read_output, daemon=True)
+            reader.start()
+            stdin = ShellStdin(conn)
+            try:
+                stdin_writer(stdin)
+                stdin.close_stdin()
+            except OSError:
+                # 设备端命令提前退出时写入会失败，以命令自身的退出码为准
+                pass
+            reader.join()
+            if errors:
+                raise errors[0]
+            return result[0]
+        finally:
+            conn.close()
+
+    def _read_shell_packets(self, conn: ADBConnection, deadline: Optional[float]) -> Tuple[int, bytes, bytes]:
+        stdout = []
+        packets = self._iter_shell_packets(conn, deadline)
+        while True:
+            try:
+                stdout.append(next(packets))
+            except StopIteration as stop:
+                exit_code, stderr = stop.value
+                return exit_code, b''.join(stdout), stderr
+
+    def _iter_shell_packets(self, conn: ADBConnection,
+                            deadline: Optional[float]) -> Generator[bytes, None, Tuple[int, bytes]]:
+        """
+        逐个产出 shell v2 的 stdout 数据包，结束时返回 (exit_code, stderr)
+
+        收到退出码之前连接被关闭（包括数据包读到一半时）抛出 ADBProtocolError：
+        命令可能只执行了一部分，不能当作成功，也不应由调用方自动重试。
+        """
+        stderr = []
+        exit_code = 0
+        while True:
+            self._apply_deadline(conn, deadline)
+            try:
+                header = conn.read_exactly(5)
+                packet_id = header[0]
+                length = struct.unpack('<I', header[1:])[0]
+                payload = conn.read_exactly(length)
+            except socket.timeout:
+                raise
+            except OSError as e:
+                raise ADBProtocolError("connection closed before the command exited") from e
+            if packet_id == SHELL_ID_STDOUT:
+                if payload:
+                    yield payload
+            elif packet_id == SHELL_ID_STDERR:
+                stderr.append(payload)
+            elif packet_id == SHELL_ID_EXIT:
+                exit_code = payload[0] if payload else 0
+                break
+        return exit_code, b''.join(stderr)
+
+    def iter_shell(self, serial: Optional[str], command: str,
+                   timeout: Optional[float] = None) -> Generator[bytes, None, Tuple[int, bytes]]:
+        """以生成器形式执行 shell 命令：逐块产出 stdout，结束时返回 (exit_code, stderr)
+
+        协议选择与 shell() 相同。提前关闭生成器会断开连接，设备端命令随之结束。
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        v2 = 'shell_v2' in self.features(serial)
+        conn = self.open_service(serial, f"shell,v2,raw:{command}" if v2 else f"shell:{command}", timeout)
+        try:
+            if v2:
+                return (yield from self._iter_shell_packets(conn, deadline))
+            yield from self._iter_until_closed(conn, deadline)
+            return 0, b''
+        finally:
+            conn.close()
+
+    def exec_in(self, serial: Optional[str], command: str, local_file,
+                timeout: Optional[float] = None) -> bytes:
+        """执行 exec: 服务，把 local_file 的内容按块写入命令的标准输入，返回命令输出
+
+        命令需自行知道要读取的字节数（如 install-write -S），写完后不关闭连接的写端。
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        conn = self.open_service(serial, f"exec:{command}", timeout)
+        try:
+            while True:
+                chunk = local_file.read(SYNC_DATA_MAX)
+                if not chunk:
+                    break
+                self._apply_deadline(conn, deadline)
+                try:
+                    conn.sock.sendall(chunk)
+                except socket.timeout:
+                    raise
+                except OSError as e:
+                    raise ADBProtocolError(f"connection lost while writing command input: {e}") from e
+            return self._read_until_closed(conn, deadline)
+        finally:
+            conn.close()
+
+    def iter_exec(self, serial: Optional[str], command: str,
+                  timeout: Optional[float] = None) -> Generator[bytes, None, None]:
+        """以生成器形式执行 exec: 服务，逐块产出原始输出"""
+        deadline = time.monotonic() + timeout if timeout else None
+        conn = self.open_service(serial, f"exec:{command}", timeout)
+        try:
+            yield from self._iter_until_closed(conn, deadline)
+        finally:
+            conn.close()
+
+    def exec_out(self, serial: Optional[str], command: str,
+                 timeout: Optional[float] = None, sink=None) -> bytes:
+        """执行 exec: 服务，返回未经终端转换的原始输出
+
+        指定 sink（可写文件对象）时输出按块直接写入 sink，返回空字节串。
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        conn = self.open_service(serial, f"exec:{command}", timeout)
+        try:
+            return self._read_until_closed(conn, deadline, sink)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _apply_deadline(conn: ADBConnection, deadline: Optional[float]):
+        if deadline is None:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("timed out")
+        conn.set_timeout(remaining)
+
+    def _read_until_closed(self, conn: ADBConnection, deadline: Optional[float], sink=None) -> bytes:
+        chunks = []
+        for chunk in self._iter_until_closed(conn, deadline):
+            if sink is not None:
+                sink.write(chunk)
+            else:
+                chunks.append(chunk)
+        return b''.join(chunks)
+
+    def _iter_until_closed(self, conn: ADBConnection, deadline: Optional[float]) -> Generator[bytes, None, None]:
+        """读取服务输出直到连接关闭；连接异常中断时抛出 ADBProtocolError（命令已在执行，不能重试）"""
+        while True:
+            self._apply_deadline(conn, deadline)
+            try:
+                chunk = conn.sock.recv(65536)
+            except socket.timeout:
+                raise
+            except OSError as e:
+                raise ADBProtocolError(f"connection lost while reading command output: {e}") from e
+            if not chunk:
+                return
+            yield chunk
+
+    # ==================== sync 协议 ====================
+
+    def acquire_sync(self, serial: Optional[str], timeout: Optional[float] = None) -> SyncConnection:
+        serial = self.resolve_serial(serial)
+        with self._lock:
+            pooled = self._sync_pool.get(serial)
+            session = pooled.pop() if pooled else None
+        if session is not None:
+            session.conn.set_timeout(timeout)
+            return session
+        return SyncConnection(self.open_service(serial, "sync:", timeout), serial)
+
+    def release_sync(self, session: SyncConnection):
+        """归还 sync 会话；出错或池已满时直接关闭"""
+        if session.broken:
+            session.conn.close()
+            return
+        with self._lock:
+            pooled = self._sync_pool.setdefault(session.serial, [])
+            if len(pooled) < self.pool_size:
+                pooled.append(session)
+                return
+        session.quit()
+
+    def stat(self, serial: Optional[str], remote_path: str,
+             timeout: Optional[float] = None) -> Tuple[int, int, int]:
+        session = self.acquire_sync(serial, timeout)
+        try:
+            return session.stat(remote_path)
+        except OSError:
+            session.broken = True
+            raise
+        finally:
+            self.release_sync(session)
+
+    def pull(self, serial: Optional[str], remote_path: str, local_path: str,
+             timeout: Optional[float] = None) -> int:
+        """
+        拉取单个文件，返回传输的字节数
+
+        先写入同目录下的临时文件，完整接收后再替换目标文件；传输失败时删除
+        临时文件，不留下不完整的本地文件，也不破坏已有的同名文件。
+        """
+        partial_path = f"{local_path}.{os.getpid()}.{threading.get_ident()}.part"
+        session = self.acquire_sync(serial, timeout)
+        try:
+            with open(partial_path, 'wb') as f:
+                total = session.recv(remote_path, f)
+            os.replace(partial_path, local_path)
+            return total
+        except OSError:
+            session.broken = True
+            raise
+        finally:
+            self.release_sync(session)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def push(self, serial: Optional[str], local_path: str, remote_path: str,
+             timeout: Optional[float] = None) -> int:
+        """推送单个文件，保留本地文件权限与修改时间，返回传输的字节数"""
+        st = os.stat(local_path)
+        mode = stat_module.S_IFREG | stat_module.S_IMODE(st.st_mode)
+        session = self.acquire_sync(serial, timeout)
+        try:
+            with open(local_path, 'rb') as f:
+                return session.send(f, remote_path, mode, int(st.st_mtime))
+        except OSError:
+            session.broken = True
+            raise
+        finally:
+            self.release_sync(session)
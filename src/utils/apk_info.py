@@ -0,0 +1,205 @@
+"""
+本地 APK 标识
+
+不依赖 aapt，直接解析 APK 中二进制 XML（AXML）格式的 AndroidManifest.xml，
+读取包名、versionCode、versionName 和拆分名（split）。解析结果连同文件的
+MD5 摘要一起按路径缓存（内存中和本地缓存目录下的 JSON 文件），文件大小和
+修改时间未变时直接复用，重复部署同一个 APK 不必重新读取和计算摘要。
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+from .dir_sync import CACHE_DIR
+
+# AXML 块类型
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_TYPE = 0x0003
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+
+UTF8_FLAG = 0x100
+NO_ENTRY = 0xFFFFFFFF
+
+# 属性值类型
+TYPE_STRING = 0x03
+TYPE_INT_DEC = 0x10
+TYPE_INT_HEX = 0x11
+
+# android: 命名空间下的属性资源 ID
+ATTR_VERSION_CODE = 0x0101021b
+ATTR_VERSION_NAME = 0x0101021c
+ATTR_VERSION_CODE_MAJOR = 0x01010576
+
+
+class APKError(Exception):
+    """APK 或其中的 AndroidManifest.xml 无法解析时抛出"""
+
+
+def _read_string_pool(data: bytes, start: int) -> List[str]:
+    header_size, size, count, _, flags, strings_start = struct.unpack_from('<HIIIII', data, start + 2)
+    utf8 = bool(flags & UTF8_FLAG)
+    offsets = struct.unpack_from(f'<{count}I', data, start + header_size)
+    base = start + strings_start
+    strings = []
+    for offset in offsets:
+        pos = base + offset
+        if utf8:
+            # UTF-16 长度与 UTF-8 字节数，各占 1 或 2 字节
+            pos += 2 if data[pos] & 0x80 else 1
+            length = data[pos]
+            if length & 0x80:
+                length = ((length & 0x7F) << 8) | data[pos + 1]
+                pos += 1
+            pos += 1
+            strings.append(data[pos:pos + length].decode('utf-8', errors='replace'))
+        else:
+            length = struct.unpack_from('<H', data, pos)[0]
+            if length & 0x8000:
+                length = ((length & 0x7FFF) << 16) | struct.unpack_from('<H', data, pos + 2)[0]
+                pos += 2
+            pos += 2
+            strings.append(data[pos:pos + length * 2].decode('utf-16-le', errors='replace'))
+    return strings
+
+
+def parse_manifest(data: bytes) -> Dict[str, object]:
+    """
+    从二进制 AndroidManifest.xml 中读取 <manifest> 元素的属性
+
+    Returns:
+        {'package', 'version_code', 'version_name', 'split'}
+    """
+    if len(data) < 8 or struct.unpack_from('<H', data, 0)[0] != RES_XML_TYPE:
+        raise APKError("AndroidManifest.xml is not a binary XML document")
+
+    strings: List[str] = []
+    resource_ids: Tuple[int, ...] = ()
+    pos = struct.unpack_from('<H', data, 2)[0]
+    while pos + 8 <= len(data):
+        chunk_type, header_size, size = struct.unpack_from('<HHI', data, pos)
+        if size < 8:
+            break
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = _read_string_pool(data, pos)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            resource_ids = struct.unpack_from(f'<{(size - header_size) // 4}I', data, pos + header_size)
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            ext = pos + header_size
+            _, name, attr_start, attr_size, attr_count = struct.unpack_from('<IIHHH', data, ext)
+            if name < len(strings) and strings[name] == 'manifest':
+                return _manifest_attributes(data, ext + attr_start, attr_size, attr_count, strings, resource_ids)
+        pos += size
+    raise APKError("<manifest> element not found")
+
+
+def _manifest_attributes(data: bytes, pos: int, attr_size: int, count: int,
+                         strings: List[str], resource_ids: Tuple[int, ...]) -> Dict[str, object]:
+    info: Dict[str, object] = {'package': None, 'version_code': None, 'version_name': None, 'split': None}
+    major = 0
+    for i in range(count):
+        _, name, raw, _, _, value_type, value = struct.unpack_from('<IIIHBBI', data, pos + i * attr_size)
+        res_id = resource_ids[name] if name < len(resource_ids) else 0
+        attr = strings[name] if name < len(strings) else ''
+        if raw != NO_ENTRY:
+            text = strings[raw] if raw < len(strings) else None
+        elif value_type == TYPE_STRING:
+            text = strings[value] if value < len(strings) else None
+        else:
+            text = None
+
+        if res_id == ATTR_VERSION_CODE:
+            info['version_code'] = value if value_type in (TYPE_INT_DEC, TYPE_INT_HEX) else int(text or 0)
+        elif res_id == ATTR_VERSION_CODE_MAJOR:
+            major = value if value_type in (TYPE_INT_DEC, TYPE_INT_HEX) else int(text or 0)
+        elif res_id == ATTR_VERSION_NAME:
+            info['version_name'] = text
+        elif attr in ('package', 'split') and not res_id:
+            info[attr] = text
+    if info['version_code'] is not None and major:
+        # 与 PackageInfo.getLongVersionCode 一致：高 32 位为 versionCodeMajor
+        info['version_code'] = (major << 32) | info['version_code']
+    if not info['package']:
+        raise APKError("package attribute not found in manifest")
+    return info
+
+
+def read_apk_manifest(path: str) -> Dict[str, object]:
+    """读取 APK 文件中的包名和版本信息"""
+    try:
+        with zipfile.ZipFile(path) as apk:
+            data = apk.read('AndroidManifest.xml')
+    except KeyError:
+        raise APKError(f"AndroidManifest.xml not found in {path}")
+    except (zipfile.BadZipFile, OSError) as e:
+        raise APKError(f"cannot read {path}: {e}")
+    try:
+        return parse_manifest(data)
+    except (struct.error, IndexError, ValueError) as e:
+        raise APKError(f"malformed AndroidManifest.xml in {path}: {e}")
+
+
+def _md5(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class APKIdentityCache:
+    """按 (路径, 大小, 修改时间) 缓存 APK 的清单信息和 MD5 摘要"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(CACHE_DIR, 'apk_identity.json')
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.part'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def identify(self, apk_path: str) -> Dict[str, object]:
+        """
+        返回 APK 的标识
+
+        Returns:
+            {'package', 'version_code', 'version_name', 'split', 'md5', 'size'}
+        """
+        key = os.path.abspath(apk_path)
+        st = os.stat(key)
+        with self._lock:
+            cached = self._load().get(key)
+            if cached is not None and cached['size'] == st.st_size and cached['mtime_ns'] == st.st_mtime_ns:
+                return cached
+
+        identity = read_apk_manifest(key)
+        identity.update(md5=_md5(key), size=st.st_size, mtime_ns=st.st_mtime_ns)
+        with self._lock:
+            entries = self._load()
+            entries[key] = identity
+            # 只保留仍然存在的文件
+            for stale in [p for p in entries if p != key and not os.path.exists(p)]:
+                del entries[stale]
+            self._save()
+        return identity
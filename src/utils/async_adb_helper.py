@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from .adb_helper import ADBHelper, CancelScope
+from .instrumentation import current_call, get_instrumentation, profile, profiling_enabled
+
+# 同时在途的 ADB 调用上限
+MAX_WORKERS = int(os.environ.get('ADB_MCP_MAX_WORKERS', '32'))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='adb')
+    return _executor
+
+
+def _is_failure(result) -> bool:
+    """ADBHelper 方法的返回值是否表示失败：(False, stdout, stderr) 或带 error 的字典"""
+    if isinstance(result, dict):
+        return 'error' in result
+    return isinstance(result, tuple) and len(result) == 3 and result[0] is False
+
+
+async def run_in_scope(func, *args, **kwargs):
+    """
+    在工作线程中执行同步的 ADBHelper 方法
+
+    调用在独立的 CancelScope 中运行；协程被取消时，作用域内启动的
+    adb 子进程会被杀掉、socket 连接会被关闭，工作线程随之尽快返回。
+    每次调用的耗时计入 helper 统计；所属工具启用了 cProfile 时在工作
+    线程中同样采样。
+    """
+    scope = CancelScope()
+    call = current_call.get()
+
+    def runner():
+        start = time.monotonic()
+        failed = True
+        try:
+            with scope:
+                if call is not None and profiling_enabled(call[0]):
+                    with profile(f"{call[0]}-{call[1]}-{func.__name__}"):
+                        result = func(*args, **kwargs)
+                else:
+                    result = func(*args, **kwargs)
+            failed = _is_failure(result)
+            return result
+        finally:
+            get_instrumentation().observe('helper', func.__name__, time.monotonic() - start, failed)
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    try:
+        return await loop.run_in_executor(_get_executor(), context.run, runner)
+    except asyncio.CancelledError:
+        scope.cancel()
+        raise
+
+
+def _offload(func):
+    """将同步的 ADBHelper 静态方法包装为协程"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_scope(func, *args, **kwargs)
+    return staticmethod(wrapper)
+
+
+class AsyncADBHelper:
+    """ADBHelper 的异步版本
+
+    所有方法复用 ADBHelper 的实现（传输方式选择、命令结果缓存和统计），
+    在线程池中执行，互不阻塞事件循环。
+    """
+
+    # ==================== 设备管理方法 ====================
+
+    list_devices = _offload(ADBHelper.list_devices)
+    get_device_events = _offload(ADBHelper.get_device_events)
+    get_device_info = _offload(ADBHelper.get_device_info)
+    get_props = _offload(ADBHelper.get_props)
+
+    # ==================== 应用管理方法 ====================
+
+    INSTALL_SKIPPED = ADBHelper.INSTALL_SKIPPED
+    install_app = _offload(ADBHelper.install_app)
+    uninstall_app = _offload(ADBHelper.uninstall_app)
+    list_packages = _offload(ADBHelper.list_packages)
+    query_packages = _offload(ADBHelper.query_packages)
+
+    # ==================== 文件传输方法 ====================
+
+    push_file = _offload(ADBHelper.push_file)
+    pull_file = _offload(ADBHelper.pull_file)
+    sync_push = _offload(ADBHelper.sync_push)
+    sync_pull = _offload(ADBHelper.sync_pull)
+    list_files = _offload(ADBHelper.list_files)
+    find_files = _offload(ADBHelper.find_files)
+    get_disk_usage = _offload(ADBHelper.get_disk_usage)
+
+    # ==================== 系统信息方法 ====================
+
+    get_battery_info = _offload(ADBHelper.get_battery_info)
+    get_memory_info = _offload(ADBHelper.get_memory_info)
+    get_storage_info = _offload(ADBHelper.get_storage_info)
+    get_device_snapshot = _offload(ADBHelper.get_device_snapshot)
+    start_monitoring = _offload(ADBHelper.start_monitoring)
+    stop_monitoring = _offload(ADBHelper.stop_monitoring)
+    get_metrics = _offload(ADBHelper.get_metrics)
+
+    # ==================== 屏幕操作方法 ====================
+
+    take_screenshot = _offload(ADBHelper.take_screenshot)
+    capture_screen_raw = _offload(ADBHelper.capture_screen_raw)
+    capture_screenshot_image = _offload(ADBHelper.capture_screenshot_image)
+    screenshot_if_changed = _offload(ADBHelper.screenshot_if_changed)
+    wait_for_screen_change = _offload(ADBHelper.wait_for_screen_change)
+    record_screen = _offload(ADBHelper.record_screen)
+
+    # ==================== 输入模拟方法 ====================
+
+    send_text = _offload(ADBHelper.send_text)
+    send_keyevent = _offload(ADBHelper.send_keyevent)
+    send_tap = _offload(ADBHelper.send_tap)
+    send_swipe = _offload(ADBHelper.send_swipe)
+    send_input_batch = _offload(ADBHelper.send_input_batch)
+
+    # ==================== 日志方法 ====================
+
+    get_logcat = _offload(ADBHelper.get_logcat)
+    read_logcat = _offload(ADBHelper.read_logcat)
+    query_logcat = _offload(ADBHelper.query_logcat)
+    clear_logcat = _offload(ADBHelper.clear_logcat)
+
+    # ==================== 多设备方法 ====================
+
+    get_online_devices = _offload(ADBHelper.get_online_devices)
+    run_on_devices = _offload(ADBHelper.run_on_devices)
+
+    # ==================== 结果存储方法 ====================
+
+    spill_result = _offload(ADBHelper.spill_result)
+    read_result = _offload(ADBHelper.read_result)
+
+    # ==================== 缓存方法 ====================
+
+    get_cache_stats = _offload(ADBHelper.get_cache_stats)
+
+    # ==================== 统计方法 ====================
+
+    get_performance_stats = _offload(ADBHelper.get_performance_stats)
+    get_prometheus_metrics = _offload(ADBHelper.get_prometheus_metrics)
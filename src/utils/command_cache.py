@@ -0,0 +1,294 @@
+"""
+命令结果缓存
+
+在 run_adb_command / run_shell_command / stream_adb_command 之下按 (设备, 命令)
+缓存只读命令的结果。哪些命令可以缓存、缓存多久由声明式的策略表决定，只有
+不含管道、重定向、命令替换等 shell 元字符的单条命令才会被缓存（自行管理缓存
+的组合脚本，如属性缓存和应用清单，不受影响）。getprop 不在策略表中：属性由
+PropertyCache 按 boot_id 和自己的 TTL 缓存，再叠加一层只会推迟属性刷新。
+写操作（安装、卸载、推送、删除文件等）按失效规则清除带有相关标签的缓存。
+并发的相同请求只执行一次（single-flight），其余请求等待并共享结果。缓存按
+最近使用顺序（LRU）限制条目数和总字节数，并记录命中/未命中统计。
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .output_stream import Source
+
+# 是否启用命令结果缓存
+CACHE_ENABLED = os.environ.get('ADB_MCP_COMMAND_CACHE', '1') != '0'
+# 最多缓存的命令结果数
+CACHE_SIZE = int(os.environ.get('ADB_MCP_COMMAND_CACHE_SIZE', '256'))
+# 缓存结果的总字节数上限
+CACHE_BYTES = 32 * 1024 * 1024
+# 超过该字节数的单条结果不缓存
+MAX_ENTRY_BYTES = 1024 * 1024
+
+# 使所有缓存失效的标签
+ALL = '*'
+
+
+class CachePolicy(NamedTuple):
+    """一类可缓存命令：匹配的命令前缀（按词）、缓存时间和失效标签"""
+    name: str
+    prefixes: Tuple[str, ...]
+    ttl: float
+    tags: Tuple[str, ...] = ()
+
+
+# 可缓存的只读命令（adb 参数，shell 命令以 shell 开头）
+POLICIES = (
+    CachePolicy('packages', ('shell pm list packages', 'shell pm path', 'shell dumpsys package'), 30.0,
+                ('packages',)),
+    CachePolicy('listing', ('shell ls', 'shell stat'), 10.0, ('files',)),
+    CachePolicy('storage', ('shell df',), 10.0, ('files',)),
+    CachePolicy('battery', ('shell dumpsys battery',), 5.0),
+    CachePolicy('memory', ('shell cat /proc/meminfo',), 2.0),
+)
+
+# 写操作及其使失效的标签；shell 脚本按 ; && || | 拆分后逐段匹配
+INVALIDATION_RULES = (
+    (('install', 'install-multiple', 'uninstall', 'shell pm install', 'shell pm uninstall', 'shell pm clear',
+      'shell pm enable', 'shell pm disable', 'shell pm disable-user', 'shell cmd package'), ('packages',)),
+    (('push', 'shell rm', 'shell rmdir', 'shell mv', 'shell cp', 'shell mkdir', 'shell touch', 'shell tar',
+      'shell ln', 'shell chmod', 'shell chown', 'shell truncate'), ('files',)),
+    (('reboot', 'root', 'unroot', 'remount', 'shell reboot'), (ALL,)),
+)
+
+SHELL_METACHARACTERS = frozenset(';|&$<>`()\n\\*?')
+
+Result = Tuple[bool, str, str]
+Key = Tuple[Optional[str], str, str]
+
+
+def _starts_with(tokens: List[str], prefix: str) -> bool:
+    words = prefix.split()
+    return tokens[:len(words)] == words
+
+
+def classify(argv: List[str]) -> Optional[CachePolicy]:
+    """返回命令（去掉 -s serial 的 adb 参数）对应的缓存策略；不可缓存时返回 None"""
+    if len(argv) < 2 or argv[0] != 'shell':
+        return None
+    text = ' '.join(argv[1:])
+    if any(c in SHELL_METACHARACTERS for c in text):
+        return None
+    tokens = ['shell'] + text.split()
+    for policy in POLICIES:
+        if any(_starts_with(tokens, prefix) for prefix in policy.prefixes):
+            return policy
+    return None
+
+
+def invalidated_tags(argv: List[str]) -> List[str]:
+    """命令会使哪些标签的缓存失效"""
+    if argv and argv[0] == 'shell':
+        segments = [['shell'] + segment.split() for segment in re.split(r'[;&|\n]+', ' '.join(argv[1:]))]
+    else:
+        segments = [argv]
+    tags: List[str] = []
+    for tokens in segments:
+        for prefixes, rule_tags in INVALIDATION_RULES:
+            if any(_starts_with(tokens, prefix) for prefix in prefixes):
+                tags.extend(t for t in rule_tags if t not in tags)
+    return tags
+
+
+class _Entry:
+    def __init__(self, policy: CachePolicy, value, size: int):
+        self.policy = policy
+        self.value = value
+        self.size = size
+        self.expires_at = time.monotonic() + policy.ttl
+
+
+class _Flight:
+    """一次正在执行的请求，相同的并发请求等待其结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Result] = None
+
+
+class CommandCache:
+    """按 (设备, 通道, 命令) 缓存只读命令的结果"""
+
+    def __init__(self, max_entries: int = CACHE_SIZE, max_bytes: int = CACHE_BYTES, enabled: bool = CACHE_ENABLED):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._entries: 'OrderedDict[Key, _Entry]' = OrderedDict()
+        self._flights: Dict[Key, _Flight] = {}
+        self._total = 0
+        # 每次失效加一；执行期间发生过失效的结果不写入缓存
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'collapsed': 0, 'evictions': 0, 'invalidations': 0}
+        self._policy_stats: Dict[str, Dict[str, int]] = {}
+
+    def _lookup(self, key: Key, policy: CachePolicy):
+        """在锁内查找未过期的缓存；命中时返回值，否则返回 None"""
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            entry = None
+        counters = self._policy_stats.setdefault(policy.name, {'hits': 0, 'misses': 0})
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        self._stats['hits'] += 1
+        counters['hits'] += 1
+        return entry.value
+
+    def _count_miss(self, policy: CachePolicy):
+        self._stats['misses'] += 1
+        self._policy_stats[policy.name]['misses'] += 1
+
+    def _remove(self, key: Key):
+        entry = self._entries.pop(key)
+        self._total -= entry.size
+
+    def _store(self, key: Key, policy: CachePolicy, value, size: int, generation: int):
+        if size > MAX_ENTRY_BYTES or generation != self._generation:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(policy, value, size)
+        self._total += size
+        while len(self._entries) > self.max_entries or self._total > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+
+    def run(self, device_id: Optional[str], channel: str, argv: List[str],
+            execute: Callable[[], Result]) -> Result:
+        """
+        执行命令，可缓存的命令优先返回缓存结果
+
+        Args:
+            channel: 执行通道（adb / session），不同通道的输出格式可能不同，分别缓存
+            argv: 去掉 -s serial 的 adb 参数
+            execute: 实际执行命令的函数
+        """
+        policy = classify(argv) if self.enabled else None
+        if policy is None:
+            result = execute()
+            self._after_command(device_id, argv)
+            return result
+
+        key = (device_id, channel, ' '.join(argv))
+        with self._lock:
+            cached = self._lookup(key, policy)
+            if cached is not None:
+                return cached
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._count_miss(policy)
+                generation = self._generation
+            else:
+                self._stats['collapsed'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.result is not None and flight.result[0]:
+                return flight.result
+            # 领头的请求失败（例如被取消或超时）时自行执行
+            return execute()
+
+        try:
+            flight.result = execute()
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                result = flight.result
+                if result is not None and result[0]:
+                    self._store(key, policy, result, len(result[1]) + len(result[2]), generation)
+            flight.done.set()
+        return flight.result
+
+    def stream(self, device_id: Optional[str], argv: List[str], open_source: Callable[[], Source]) -> Source:
+        """
+        流式命令的缓存：命中时重放缓存的输出；未命中时边产出边记录，命令成功
+        且被完整读取（未截断、未中途停止）后写入缓存
+        """
+        policy = classify(argv) if self.enabled else None
+        if policy is None:
+            self._after_command(device_id, argv)
+            return open_source()
+
+        key = (device_id, 'stream', ' '.join(argv))
+        with self._lock:
+            cached = self._lookup(key, policy)
+            if cached is None:
+                self._count_miss(policy)
+                generation = self._generation
+        if cached is not None:
+            return _replay(cached)
+        return self._record(key, policy, open_source(), generation)
+
+    def _record(self, key: Key, policy: CachePolicy, source: Source, generation: int) -> Source:
+        chunks: List[bytes] = []
+        size = 0
+        try:
+            while True:
+                try:
+                    chunk = next(source)
+                except StopIteration as stop:
+                    success, stderr = stop.value if stop.value is not None else (True, "")
+                    break
+                size += len(chunk)
+                if size <= MAX_ENTRY_BYTES:
+                    chunks.append(chunk)
+                yield chunk
+        finally:
+            source.close()
+        if success and size <= MAX_ENTRY_BYTES:
+            with self._lock:
+                self._store(key, policy, b''.join(chunks), size, generation)
+        return success, stderr
+
+    def _after_command(self, device_id: Optional[str], argv: List[str]):
+        tags = invalidated_tags(argv)
+        if tags:
+            self.invalidate(device_id, tags)
+
+    def invalidate(self, device_id: Optional[str] = None, tags: Optional[List[str]] = None):
+        """
+        丢弃带有任一标签的缓存（tags 为 None 或包含 ALL 时丢弃全部）；
+        device_id 为 None 时作用于所有设备，否则同时丢弃默认设备（None）的缓存
+        """
+        drop_all = tags is None or ALL in tags
+        with self._lock:
+            self._generation += 1
+            self._stats['invalidations'] += 1
+            for key in [k for k, entry in self._entries.items()
+                        if (device_id is None or k[0] in (device_id, None))
+                        and (drop_all or any(tag in entry.policy.tags for tag in tags))]:
+                self._remove(key)
+
+    def stats(self, reset: bool = False) -> Dict:
+        """命中/未命中等统计，以及按策略分组的命中数"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            policies = {}
+            for policy in POLICIES:
+                counters = self._policy_stats.get(policy.name, {'hits': 0, 'misses': 0})
+                policies[policy.name] = dict(counters, ttl=policy.ttl)
+            result = dict(self._stats, entries=len(self._entries), bytes=self._total, enabled=self.enabled,
+                          hit_rate=self._stats['hits'] / lookups if lookups else None, policies=policies)
+            if reset:
+                self._stats = dict.fromkeys(self._stats, 0)
+                self._policy_stats.clear()
+            return result
+
+
+def _replay(data: bytes) -> Source:
+    if data:
+        yield data
+    return True, ""
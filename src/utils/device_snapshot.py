@@ -0,0 +1,184 @@
+"""
+设备状态快照
+
+把电池、内存、存储、常用属性、运行时间、负载和温度传感器的查询拼成
+一条带分段标记的 shell 脚本，一次往返取回，再逐行解析为带单位的数值
+（字节、百分比、摄氏度、秒），而不是原样的字符串。
+"""
+
+import shlex
+from typing import Dict, Iterable, List, Optional
+
+SECTION_MARKER = '__ADB_MCP_SECTION__'
+
+# 快照包含的常用属性
+SNAPSHOT_PROPS = (
+    'ro.product.manufacturer', 'ro.product.model', 'ro.build.version.release',
+    'ro.build.version.sdk', 'ro.build.fingerprint', 'sys.boot_completed',
+)
+
+SECTION_COMMANDS = {
+    'battery': "dumpsys battery",
+    'memory': "cat /proc/meminfo",
+    'storage': "df -k",
+    'props': '; '.join(f"echo {p}=$(getprop {shlex.quote(p)})" for p in SNAPSHOT_PROPS),
+    'uptime': "cat /proc/uptime",
+    'load': "cat /proc/loadavg",
+    'thermal': ("for z in /sys/class/thermal/thermal_zone*; do "
+                "[ -r $z/temp ] && echo \"${z##*/} $(cat $z/temp 2>/dev/null) $(cat $z/type 2>/dev/null)\"; done"),
+}
+
+SECTIONS = tuple(SECTION_COMMANDS)
+
+BATTERY_STATUS = {1: 'unknown', 2: 'charging', 3: 'discharging', 4: 'not_charging', 5: 'full'}
+BATTERY_HEALTH = {1: 'unknown', 2: 'good', 3: 'overheat', 4: 'dead', 5: 'over_voltage',
+                  6: 'unspecified_failure', 7: 'cold'}
+
+
+def snapshot_script(sections: Iterable[str]) -> str:
+    """生成带分段标记的组合脚本"""
+    return '; '.join(f"echo {SECTION_MARKER}{name}; {SECTION_COMMANDS[name]} 2>/dev/null" for name in sections)
+
+
+def _number(text: str) -> Optional[float]:
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _int(text: str) -> Optional[int]:
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def parse_battery(lines: List[str]) -> Dict[str, object]:
+    raw: Dict[str, str] = {}
+    for line in lines:
+        key, sep, value = line.strip().partition(':')
+        if sep and value.strip():
+            raw[key.strip()] = value.strip()
+    level, scale = _int(raw.get('level', '')), _int(raw.get('scale', '')) or 100
+    temperature = _int(raw.get('temperature', ''))
+    voltage = _int(raw.get('voltage', ''))
+    status = _int(raw.get('status', ''))
+    health = _int(raw.get('health', ''))
+    plugged = [name for name in ('AC', 'USB', 'Wireless', 'Dock')
+               if raw.get(f'{name} powered', '').lower() == 'true']
+    return {
+        'level_percent': round(level * 100 / scale, 1) if level is not None else None,
+        'temperature_c': temperature / 10 if temperature is not None else None,
+        'voltage_v': voltage / 1000 if voltage is not None else None,
+        'status': BATTERY_STATUS.get(status, 'unknown') if status is not None else None,
+        'health': BATTERY_HEALTH.get(health, 'unknown') if health is not None else None,
+        'plugged': plugged,
+        'technology': raw.get('technology'),
+    }
+
+
+def parse_meminfo(lines: List[str]) -> Dict[str, object]:
+    """/proc/meminfo 中以 kB 为单位的值换算为字节"""
+    fields: Dict[str, int] = {}
+    for line in lines:
+        key, sep, value = line.partition(':')
+        parts = value.split()
+        if sep and parts and parts[0].isdigit():
+            fields[key.strip()] = int(parts[0]) * (1024 if len(parts) > 1 and parts[1] == 'kB' else 1)
+    total = fields.get('MemTotal')
+    available = fields.get('MemAvailable', fields.get('MemFree'))
+    return {
+        'total_bytes': total,
+        'available_bytes': available,
+        'used_percent': round((total - available) * 100 / total, 1) if total and available is not None else None,
+        'swap_total_bytes': fields.get('SwapTotal'),
+        'swap_free_bytes': fields.get('SwapFree'),
+        'fields_bytes': fields,
+    }
+
+
+def parse_df(lines: List[str]) -> List[Dict[str, object]]:
+    """df -k 输出（1K 块）换算为字节"""
+    mounts = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 6 or not parts[1].isdigit():
+            continue
+        size, used, available = (int(p) * 1024 if p.isdigit() else None for p in parts[1:4])
+        percent = _number(parts[4].rstrip('%'))
+        mounts.append({
+            'filesystem': parts[0],
+            'mounted_on': ' '.join(parts[5:]),
+            'size_bytes': size,
+            'used_bytes': used,
+            'available_bytes': available,
+            'use_percent': percent,
+        })
+    return mounts
+
+
+def parse_props(lines: List[str]) -> Dict[str, str]:
+    props = {}
+    for line in lines:
+        key, sep, value = line.partition('=')
+        if sep and key in SNAPSHOT_PROPS:
+            props[key] = value.strip()
+    return props
+
+
+def parse_uptime(lines: List[str]) -> Dict[str, object]:
+    parts = lines[0].split() if lines else []
+    return {'uptime_seconds': _number(parts[0]) if parts else None,
+            'idle_seconds': _number(parts[1]) if len(parts) > 1 else None}
+
+
+def parse_loadavg(lines: List[str]) -> Dict[str, object]:
+    parts = lines[0].split() if lines else []
+    running, _, total = parts[3].partition('/') if len(parts) > 3 else ('', '', '')
+    return {
+        'load_1m': _number(parts[0]) if parts else None,
+        'load_5m': _number(parts[1]) if len(parts) > 1 else None,
+        'load_15m': _number(parts[2]) if len(parts) > 2 else None,
+        'running_tasks': _int(running),
+        'total_tasks': _int(total),
+    }
+
+
+def parse_thermal(lines: List[str]) -> List[Dict[str, object]]:
+    """温度传感器读数通常为毫摄氏度，少数设备直接给出摄氏度"""
+    zones = []
+    for line in lines:
+        parts = line.split(None, 2)
+        if len(parts) < 2:
+            continue
+        value = _int(parts[1])
+        if value is None:
+            continue
+        zones.append({'zone': parts[0], 'type': parts[2].strip() if len(parts) > 2 else '',
+                      'temp_c': value / 1000 if abs(value) >= 1000 else float(value)})
+    return zones
+
+
+PARSERS = {
+    'battery': parse_battery,
+    'memory': parse_meminfo,
+    'storage': parse_df,
+    'props': parse_props,
+    'uptime': parse_uptime,
+    'load': parse_loadavg,
+    'thermal': parse_thermal,
+}
+
+
+def parse_snapshot(output: str) -> Dict[str, object]:
+    """按分段标记切分脚本输出，一次遍历后交给各分段的解析函数"""
+    sections: Dict[str, List[str]] = {}
+    current: Optional[List[str]] = None
+    for line in output.split('\n'):
+        line = line.rstrip('\r')
+        if line.startswith(SECTION_MARKER):
+            current = sections.setdefault(line[len(SECTION_MARKER):], [])
+        elif current is not None and line.strip():
+            current.append(line)
+    return {name: PARSERS[name](lines) for name, lines in sections.items() if name in PARSERS}
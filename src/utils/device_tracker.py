@@ -0,0 +1,147 @@
+"""
+设备跟踪器
+
+后台线程订阅 adb server 的 host:track-devices-l 推送流，按差异增量更新
+内存中的设备表。设备列表查询直接读取快照，无需每次执行 adb devices -l；
+设备上线、下线和状态变化以事件形式通知监听者并保留最近的事件记录。
+"""
+
+import collections
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional
+
+from .adb_protocol import ADBClient
+
+DeviceListener = Callable[[str, Dict[str, str]], None]
+
+# 保留的最近事件数
+MAX_EVENTS = 200
+
+
+def parse_device_line(line: str) -> Optional[Dict[str, str]]:
+    """解析 devices -l 的单行输出，例如 `emulator-5554 device product:sdk model:Pixel`"""
+    if not line.strip() or line.startswith('*'):
+        return None
+    parts = line.split()
+    if len(parts) < 2:
+        return None
+
+    device_info = {
+        'id': parts[0],
+        'status': parts[1]
+    }
+
+    # 解析额外信息（如果有）
+    for part in parts[2:]:
+        if ':' in part:
+            key, value = part.split(':', 1)
+            device_info[key] = value
+
+    return device_info
+
+
+class DeviceTracker:
+    """订阅 host:track-devices-l 并维护设备表"""
+
+    def __init__(self, client: ADBClient, retry_interval: float = 2.0):
+        self.client = client
+        self.retry_interval = retry_interval
+        self.events: Deque[Dict] = collections.deque(maxlen=MAX_EVENTS)
+        self._table: Dict[str, Dict[str, str]] = {}
+        self._snapshot: List[Dict[str, str]] = []
+        self._listeners: List[DeviceListener] = []
+        self._ready = threading.Event()
+        # 首次连接尝试结束（成功收到设备列表或连接失败）
+        self._settled = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        """已与 adb server 建立跟踪连接并收到首个设备列表"""
+        return self._ready.is_set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='adb-device-tracker', daemon=True)
+                self._thread.start()
+
+    def wait_ready(self, timeout: float) -> bool:
+        """等待首次连接尝试结束，返回跟踪器是否可用"""
+        self._settled.wait(timeout)
+        return self.ready
+
+    def add_listener(self, listener: DeviceListener):
+        """注册事件回调 listener(event, device_info)，event 为 connected/disconnected/changed"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def devices(self) -> List[Dict[str, str]]:
+        """返回当前设备表快照"""
+        return self._snapshot
+
+    def recent_events(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            return list(self.events)[-limit:]
+
+    def _run(self):
+        while True:
+            conn = None
+            try:
+                conn = self.client.connect(timeout=10)
+                conn.send_request('host:track-devices-l')
+                conn.set_timeout(None)
+                while True:
+                    self._apply(conn.read_hex_string())
+                    self._ready.set()
+                    self._settled.set()
+            except Exception:
+                pass
+            finally:
+                if conn is not None:
+                    conn.close()
+            # 连接断开（adb server 重启等）时设备表不再可信，回退到轮询
+            self._ready.clear()
+            self._settled.set()
+            self._apply('')
+            time.sleep(self.retry_interval)
+
+    def _apply(self, payload: str):
+        """与上一份设备表比较，增量更新并产生事件"""
+        current = {}
+        for line in payload.split('\n'):
+            info = parse_device_line(line)
+            if info is not None:
+                current[info['id']] = info
+
+        changes = []
+        with self._lock:
+            for device_id, info in current.items():
+                previous = self._table.get(device_id)
+                if previous is None:
+                    changes.append(('connected', info))
+                elif previous != info:
+                    changes.append(('changed', info))
+            for device_id, info in self._table.items():
+                if device_id not in current:
+                    changes.append(('disconnected', info))
+
+            if not changes:
+                return
+            for event, info in changes:
+                if event == 'disconnected':
+                    self._table.pop(info['id'], None)
+                else:
+                    self._table[info['id']] = info
+                self.events.append({'time': time.time(), 'event': event, **info})
+            self._snapshot = list(self._table.values())
+            listeners = list(self._listeners)
+
+        for event, info in changes:
+            for listener in listeners:
+                try:
+                    listener(event, info)
+                except Exception:
+                    pass
@@ -0,0 +1,159 @@
+"""
+目录增量同步
+
+分别建立本地和设备端目录的清单（相对路径 -> 大小、修改时间，可选内容
+摘要），比较后只传输新增或变化的文件。设备端清单通过一条 find + stat
+命令取得，摘要用设备上的 md5sum 计算。上一次同步后的清单（含摘要）缓存
+在本地，大小和修改时间未变的文件直接复用缓存的摘要，不必重新计算。
+"""
+
+import hashlib
+import json
+import os
+import shlex
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 本地缓存目录（同步清单等）
+CACHE_DIR = os.environ.get('ADB_MCP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'adb-mcp'))
+
+# 设备端单条 md5sum 命令包含的文件数
+HASH_BATCH = 100
+
+# 清单项: [size, mtime, md5 或 None]
+Manifest = Dict[str, list]
+
+REMOTE_DIR_MARKER = '__ADB_MCP_DIR__'
+
+
+def local_manifest(root: str) -> Manifest:
+    """遍历本地目录，返回 {相对路径(/ 分隔): [size, mtime, None]}"""
+    manifest: Manifest = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            rel = os.path.relpath(path, root).replace(os.sep, '/')
+            manifest[rel] = [st.st_size, int(st.st_mtime), None]
+    return manifest
+
+
+def remote_manifest_script(root: str) -> str:
+    """列出设备目录下所有文件的 shell 脚本；目录存在时首行输出标记"""
+    quoted = shlex.quote(root)
+    return (f"if [ -d {quoted} ]; then echo {REMOTE_DIR_MARKER}; cd {quoted} && "
+            f"find . -type f -exec stat -c '%s %Y %n' {{}} +; fi")
+
+
+def parse_remote_manifest(output: str) -> Tuple[bool, Manifest]:
+    """解析 remote_manifest_script 的输出，返回 (目录是否存在, 清单)"""
+    exists = False
+    manifest: Manifest = {}
+    for line in output.split('\n'):
+        line = line.rstrip('\r')
+        if line == REMOTE_DIR_MARKER:
+            exists = True
+            continue
+        parts = line.split(' ', 2)
+        if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+            rel = parts[2][2:] if parts[2].startswith('./') else parts[2]
+            manifest[rel] = [int(parts[0]), int(parts[1]), None]
+    return exists, manifest
+
+
+def remote_hash_scripts(root: str, paths: List[str]) -> Iterable[str]:
+    """计算设备端文件摘要的 shell 脚本（按批次）"""
+    for i in range(0, len(paths), HASH_BATCH):
+        batch = ' '.join(shlex.quote('./' + p) for p in paths[i:i + HASH_BATCH])
+        yield f"cd {shlex.quote(root)} && md5sum {batch}"
+
+
+def parse_hashes(output: str) -> Dict[str, str]:
+    """解析 md5sum 输出: `<hash>  ./<path>`"""
+    hashes = {}
+    for line in output.split('\n'):
+        digest, _, path = line.rstrip('\r').partition('  ')
+        if len(digest) == 32 and path:
+            hashes[path[2:] if path.startswith('./') else path] = digest
+    return hashes
+
+
+def local_hash(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reuse_hashes(manifest: Manifest, cached: Manifest):
+    """大小和修改时间未变的文件沿用缓存清单中的摘要"""
+    for rel, entry in manifest.items():
+        old = cached.get(rel)
+        if old is not None and old[0] == entry[0] and old[1] == entry[1] and old[2]:
+            entry[2] = old[2]
+
+
+def diff_manifests(source: Manifest, target: Manifest, checksum: bool) -> Tuple[List[str], List[str], int]:
+    """
+    比较源和目标清单
+
+    Args:
+        checksum: 为 True 时大小相同的文件以摘要判定是否变化（调用前需填好摘要）；
+            否则大小或修改时间不同即视为变化
+
+    Returns:
+        (需要传输的路径, 目标端多余的路径, 未变化的文件数)
+    """
+    changed, unchanged = [], 0
+    for rel, (size, mtime, digest) in sorted(source.items()):
+        other = target.get(rel)
+        if other is None or other[0] != size:
+            changed.append(rel)
+        elif checksum and digest and other[2]:
+            if digest != other[2]:
+                changed.append(rel)
+            else:
+                unchanged += 1
+        elif other[1] != mtime:
+            changed.append(rel)
+        else:
+            unchanged += 1
+    extra = sorted(rel for rel in target if rel not in source)
+    return changed, extra, unchanged
+
+
+def needs_hash(source: Manifest, target: Manifest) -> List[str]:
+    """大小相同、需要比较摘要的文件"""
+    return [rel for rel, entry in source.items()
+            if rel in target and target[rel][0] == entry[0]]
+
+
+def _cache_path(device_id: Optional[str], local_root: str, remote_root: str) -> str:
+    key = f"{device_id or ''}|{os.path.abspath(local_root)}|{remote_root.rstrip('/')}"
+    return os.path.join(CACHE_DIR, 'sync', hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+
+def load_cache(device_id: Optional[str], local_root: str, remote_root: str) -> Tuple[Manifest, Manifest]:
+    """读取上一次同步后的 (本地清单, 设备清单)；没有缓存或缓存损坏时返回空清单"""
+    try:
+        with open(_cache_path(device_id, local_root, remote_root), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('local', {}), data.get('remote', {})
+    except (OSError, ValueError):
+        return {}, {}
+
+
+def save_cache(device_id: Optional[str], local_root: str, remote_root: str,
+               local: Manifest, remote: Manifest):
+    path = _cache_path(device_id, local_root, remote_root)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.part'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'local': local, 'remote': remote}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
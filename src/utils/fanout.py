@@ -0,0 +1,119 @@
+"""
+多设备并发执行
+
+在共享线程池上对一组设备执行同一个操作：全局并发上限由线程池大小
+决定，单次调用可进一步收紧并发数；按设备的并发上限作用于所有并发中的
+多设备任务，避免同一台设备被同时占用。结果按设备汇总，单台设备失败
+不影响其他设备。
+"""
+
+import contextlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# 所有多设备任务共享的全局并发上限
+GLOBAL_CONCURRENCY = int(os.environ.get('ADB_MCP_FANOUT_CONCURRENCY', '16'))
+# 同一台设备上同时执行的多设备任务上限
+PER_DEVICE_LIMIT = int(os.environ.get('ADB_MCP_FANOUT_PER_DEVICE', '1'))
+
+_executor: Optional[ThreadPoolExecutor] = None
+# 各设备上正在执行的多设备任务数；设备或调用的名额释放时通知等待中的调度方
+_device_busy: Dict[str, int] = {}
+_lock = threading.Lock()
+_slot_released = threading.Condition(_lock)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=GLOBAL_CONCURRENCY, thread_name_prefix='adb-fanout')
+        return _executor
+
+
+def _release_device(device_id: str):
+    """任务结束后归还设备名额；调用方需持有 _lock"""
+    _device_busy[device_id] -= 1
+    if not _device_busy[device_id]:
+        del _device_busy[device_id]
+
+
+def normalize_result(result: Any) -> Dict[str, Any]:
+    """将 ADBHelper 的各种返回形式统一为 {success, output, error}"""
+    if isinstance(result, tuple) and len(result) == 3 and isinstance(result[0], bool):
+        success, output, error = result
+        return {'success': success, 'output': output, 'error': error if not success else ''}
+    if isinstance(result, dict) and 'error' in result:
+        return {'success': False, 'output': None, 'error': result['error']}
+    return {'success': True, 'output': result, 'error': ''}
+
+
+def fan_out(operation: Callable[..., Any], device_ids: List[str], kwargs: Optional[Dict[str, Any]] = None,
+            max_concurrency: int = GLOBAL_CONCURRENCY, scope=None) -> Dict[str, Any]:
+    """
+    在多台设备上并发执行同一操作
+
+    调用方线程负责调度：只有本次调用的并发名额和目标设备的名额都空闲时
+    才把任务交给线程池，等待名额不会占用线程池中的工作线程。
+
+    Args:
+        operation: 以 device_id 关键字参数区分设备的可调用对象；失败时返回
+            (False, stdout, stderr) 或带 error 键的字典
+        device_ids: 目标设备列表
+        kwargs: 传给 operation 的其他参数
+        max_concurrency: 本次调用的最大并发数（不超过全局上限）
+        scope: 调用方的 CancelScope，取消时一并终止各设备上的子进程
+
+    Returns:
+        {'results': [每台设备的结果], 'succeeded': n, 'failed': n, 'elapsed_ms': 总耗时}
+    """
+    kwargs = dict(kwargs or {})
+    call_limit = max(1, min(max_concurrency, GLOBAL_CONCURRENCY))
+    device_limit = max(1, PER_DEVICE_LIMIT)
+    start = time.monotonic()
+    pending = list(dict.fromkeys(device_ids))
+    futures = {}
+    in_flight = 0
+
+    def run_one(device_id: str) -> Dict[str, Any]:
+        nonlocal in_flight
+        started_at = time.monotonic()
+        try:
+            with scope if scope is not None else contextlib.nullcontext():
+                entry = normalize_result(operation(device_id=device_id, **kwargs))
+        except Exception as e:
+            entry = {'success': False, 'output': None, 'error': str(e)}
+        finally:
+            finished_at = time.monotonic()
+            with _slot_released:
+                in_flight -= 1
+                _release_device(device_id)
+                _slot_released.notify_all()
+        entry['device_id'] = device_id
+        entry['queued_ms'] = round((started_at - start) * 1000, 1)
+        entry['duration_ms'] = round((finished_at - started_at) * 1000, 1)
+        return entry
+
+    executor = _get_executor()
+    with _slot_released:
+        while pending:
+            ready = next((d for d in pending if _device_busy.get(d, 0) < device_limit), None)
+            if in_flight >= call_limit or ready is None:
+                _slot_released.wait()
+                continue
+            pending.remove(ready)
+            _device_busy[ready] = _device_busy.get(ready, 0) + 1
+            in_flight += 1
+            futures[ready] = executor.submit(run_one, ready)
+
+    results = [futures[device_id].result() for device_id in dict.fromkeys(device_ids)]
+    succeeded = sum(1 for r in results if r['success'])
+    return {
+        'results': results,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'elapsed_ms': round((time.monotonic() - start) * 1000, 1),
+    }
@@ -0,0 +1,206 @@
+"""
+设备文件索引
+
+递归列目录只需一条设备端命令：find 遍历后由 stat -c 按制表符分隔输出
+类型位、大小、修改时间、属主和路径（路径放在最后，文件名中的空格不影响
+解析），输出按行流式解析。结果按设备、按根目录缓存在内存中（路径有序
+排列），之后同一子树的列目录、通配符搜索和目录大小汇总直接由索引回答，
+直到超过 TTL 或被 push 等写操作失效。
+"""
+
+import fnmatch
+import os
+import posixpath
+import shlex
+import stat
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 索引的缓存时间（秒）
+FILE_INDEX_TTL = float(os.environ.get('ADB_MCP_FILE_INDEX_TTL', '60'))
+# 每台设备最多缓存的根目录数
+MAX_ROOTS = 16
+
+STAT_FORMAT = '%f\t%s\t%Y\t%U\t%G\t%n'
+
+# 索引项: (路径, 模式位, 大小, 修改时间, 属主, 属组)
+Entry = Tuple[str, int, int, int, str, str]
+
+
+def normalize(path: str) -> str:
+    # 去掉开头多余的 /，否则 normpath 会保留 POSIX 允许的 // 前缀
+    return posixpath.normpath('/' + path.strip().lstrip('/'))
+
+
+NOT_DIR_MARKER = '__ADB_MCP_NOT_DIR__'
+
+
+def index_script(root: str, max_depth: Optional[int] = None) -> str:
+    """
+    递归列出 root 下所有条目的脚本（-H 使 /sdcard 这类符号链接根目录也能展开）；
+    root 不是目录时只输出标记
+    """
+    quoted = shlex.quote(root)
+    depth = f" -maxdepth {int(max_depth)}" if max_depth is not None else ""
+    return (f"if [ -d {quoted} ]; then find -H {quoted} -mindepth 1{depth} "
+            f"-exec stat -c {shlex.quote(STAT_FORMAT)} {{}} + 2>/dev/null; else echo {NOT_DIR_MARKER}; fi")
+
+
+def parse_index_line(line: str) -> Optional[Entry]:
+    """解析一行 stat 输出；无法解析（如文件名中含换行的续行）时返回 None"""
+    parts = line.split('\t', 5)
+    if len(parts) != 6 or not parts[5].startswith('/'):
+        return None
+    try:
+        return parts[5], int(parts[0], 16), int(parts[1]), int(parts[2]), parts[3], parts[4]
+    except ValueError:
+        return None
+
+
+def entry_type(mode: int) -> str:
+    if stat.S_ISDIR(mode):
+        return 'dir'
+    if stat.S_ISREG(mode):
+        return 'file'
+    if stat.S_ISLNK(mode):
+        return 'link'
+    return 'other'
+
+
+def entry_dict(entry: Entry) -> Dict[str, object]:
+    path, mode, size, mtime, owner, group = entry
+    return {'path': path, 'name': posixpath.basename(path), 'type': entry_type(mode),
+            'permissions': stat.filemode(mode), 'size': size, 'mtime': mtime,
+            'owner': owner, 'group': group}
+
+
+def _depth(path: str) -> int:
+    return 0 if path == '/' else path.count('/')
+
+
+class _RootIndex:
+    def __init__(self, root: str, max_depth: Optional[int], entries: List[Entry], complete: bool):
+        self.root = root
+        self.max_depth = max_depth
+        entries.sort(key=lambda e: e[0])
+        self.entries = entries
+        self.paths = [e[0] for e in entries]
+        self.complete = complete
+        self.fetched_at = time.monotonic()
+
+    def covers(self, path: str, max_depth: Optional[int]) -> bool:
+        """该索引是否包含 path 子树（到 max_depth 层）的全部条目"""
+        if not self.complete or not _within(path, self.root):
+            return False
+        if self.max_depth is None:
+            return True
+        return max_depth is not None and _depth(path) - _depth(self.root) + max_depth <= self.max_depth
+
+    def subtree(self, path: str, max_depth: Optional[int] = None) -> List[Entry]:
+        """path 之下（到 max_depth 层）的所有条目，按路径有序，不含 path 本身"""
+        if path == '/':
+            entries = self.entries
+        else:
+            start = bisect_left(self.paths, path + '/')
+            # '0' 是 '/' 之后的下一个字符
+            end = bisect_left(self.paths, path + '0', start)
+            entries = self.entries[start:end]
+        if max_depth is not None:
+            limit = _depth(path) + max_depth
+            entries = [e for e in entries if _depth(e[0]) <= limit]
+        return entries
+
+    def is_dir(self, path: str) -> bool:
+        if path == self.root:
+            return True
+        i = bisect_left(self.paths, path)
+        return i < len(self.paths) and self.paths[i] == path and stat.S_ISDIR(self.entries[i][1])
+
+
+def _within(path: str, root: str) -> bool:
+    return root == '/' or path == root or path.startswith(root + '/')
+
+
+class FileIndex:
+    """按设备缓存目录子树的文件索引"""
+
+    def __init__(self, ttl: float = FILE_INDEX_TTL):
+        self.ttl = ttl
+        self._devices: Dict[Optional[str], List[_RootIndex]] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, device_id: Optional[str], path: str,
+               max_depth: Optional[int] = None) -> Optional[_RootIndex]:
+        """返回覆盖 path 子树且未过期的索引"""
+        now = time.monotonic()
+        with self._lock:
+            roots = self._devices.get(device_id, [])
+            roots[:] = [r for r in roots if now - r.fetched_at < self.ttl]
+            for index in roots:
+                if index.covers(path, max_depth):
+                    return index
+        return None
+
+    def store(self, device_id: Optional[str], root: str, max_depth: Optional[int],
+              entries: Iterable[Entry], complete: bool) -> _RootIndex:
+        """保存一次遍历的结果；被新索引覆盖的旧索引一并丢弃"""
+        index = _RootIndex(root, max_depth, list(entries), complete)
+        if not complete:
+            return index
+        with self._lock:
+            roots = [r for r in self._devices.get(device_id, [])
+                     if not (_within(r.root, root) and index.covers(r.root, r.max_depth))]
+            roots.append(index)
+            self._devices[device_id] = roots[-MAX_ROOTS:]
+        return index
+
+    def invalidate(self, device_id: Optional[str] = None, path: Optional[str] = None):
+        """
+        丢弃与 path 重叠的索引（path 为 None 时丢弃该设备的全部索引）；
+        device_id 为 None 时作用于所有设备
+        """
+        path = normalize(path) if path is not None else None
+        with self._lock:
+            devices = list(self._devices) if device_id is None else [device_id, None]
+            for device in devices:
+                if device not in self._devices:
+                    continue
+                if path is None:
+                    del self._devices[device]
+                    continue
+                self._devices[device] = [r for r in self._devices[device]
+                                         if not (_within(path, r.root) or _within(r.root, path))]
+
+
+def match(entries: Iterable[Entry], base: str, pattern: str) -> List[Entry]:
+    """按通配符过滤：模式含 / 时匹配相对 base 的路径，否则匹配文件名"""
+    prefix = len(base.rstrip('/')) + 1
+    if '/' in pattern:
+        return [e for e in entries if fnmatch.fnmatchcase(e[0][prefix:], pattern)]
+    return [e for e in entries if fnmatch.fnmatchcase(posixpath.basename(e[0]), pattern)]
+
+
+def rollup(entries: List[Entry], base: str) -> Dict[str, object]:
+    """汇总 base 下的文件总大小，并按直接子项分组"""
+    prefix = len(base.rstrip('/')) + 1
+    children: Dict[str, List[int]] = {}
+    total = files = dirs = 0
+    for path, mode, size, _, _, _ in entries:
+        child = path[prefix:].split('/', 1)[0]
+        bucket = children.setdefault(child, [0, 0, 0])
+        if stat.S_ISDIR(mode):
+            dirs += 1
+            if '/' not in path[prefix:]:
+                bucket[2] = 1
+            continue
+        if stat.S_ISREG(mode):
+            total += size
+            files += 1
+            bucket[0] += size
+            bucket[1] += 1
+    ordered = sorted(children.items(), key=lambda item: (-item[1][0], item[0]))
+    return {'total_bytes': total, 'files': files, 'dirs': dirs,
+            'children': [{'name': name, 'bytes': b, 'files': n, 'is_dir': bool(d)}
+                         for name, (b, n, d) in ordered]}
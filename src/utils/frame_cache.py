@@ -0,0 +1,159 @@
+"""
+屏幕帧变化检测
+
+按设备缓存最近一帧的整帧摘要和分块签名。新帧与缓存帧摘要相同即判定
+未变化；否则逐块比较签名，给出发生变化的区域。安装了 NumPy 时分块签名
+为降采样后的各通道均值（容忍细微噪声），否则为分块像素的精确摘要。
+缓存帧同时保留原始像素，调用方可以凭返回的帧句柄取回该帧的图像。
+"""
+
+import hashlib
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .image_utils import np
+
+# 分块网格（列 × 行）
+GRID_COLUMNS = 8
+GRID_ROWS = 16
+# 分块签名的采样步长（像素）
+SAMPLE_STEP = 4
+
+
+class _Frame:
+    def __init__(self, handle: str, width: int, height: int, pixels, signatures, captured_at: float):
+        self.handle = handle
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+        self.signatures = signatures
+        self.captured_at = captured_at
+
+
+def _tile_bounds(width: int, height: int) -> List[Tuple[int, int, int, int]]:
+    bounds = []
+    for row in range(GRID_ROWS):
+        y0, y1 = height * row // GRID_ROWS, height * (row + 1) // GRID_ROWS
+        for col in range(GRID_COLUMNS):
+            x0, x1 = width * col // GRID_COLUMNS, width * (col + 1) // GRID_COLUMNS
+            bounds.append((x0, y0, x1 - x0, y1 - y0))
+    return bounds
+
+
+def tile_signatures(width: int, height: int, pixels):
+    """计算每个分块的签名"""
+    if np is not None:
+        frame = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)
+        sampled = frame[::SAMPLE_STEP, ::SAMPLE_STEP, :3]
+        sh, sw = sampled.shape[:2]
+        signatures = np.empty((GRID_ROWS * GRID_COLUMNS, 3), dtype=np.float32)
+        index = 0
+        for row in range(GRID_ROWS):
+            y0, y1 = sh * row // GRID_ROWS, max(sh * (row + 1) // GRID_ROWS, sh * row // GRID_ROWS + 1)
+            for col in range(GRID_COLUMNS):
+                x0, x1 = sw * col // GRID_COLUMNS, max(sw * (col + 1) // GRID_COLUMNS, sw * col // GRID_COLUMNS + 1)
+                signatures[index] = sampled[y0:y1, x0:x1].mean(axis=(0, 1))
+                index += 1
+        return signatures
+
+    view = memoryview(pixels).cast('B').cast('I')
+    signatures = []
+    for x, y, w, h in _tile_bounds(width, height):
+        digest = hashlib.blake2b(digest_size=8)
+        for line in range(y, y + h, SAMPLE_STEP):
+            start = line * width + x
+            digest.update(view[start:start + w:SAMPLE_STEP].tobytes())
+        signatures.append(digest.digest())
+    return signatures
+
+
+def changed_tiles(old, new, threshold: float) -> List[int]:
+    """返回签名差异超过阈值（0-255 灰度单位）的分块序号"""
+    if np is not None and isinstance(old, np.ndarray):
+        diff = np.abs(old - new).max(axis=1)
+        return [int(i) for i in np.nonzero(diff > threshold)[0]]
+    return [i for i, (a, b) in enumerate(zip(old, new)) if a != b]
+
+
+class FrameCache:
+    """按设备缓存最近一帧并检测变化"""
+
+    def __init__(self):
+        self._frames: Dict[Optional[str], _Frame] = {}
+        self._lock = threading.Lock()
+
+    def get(self, device_id: Optional[str]) -> Optional[_Frame]:
+        with self._lock:
+            return self._frames.get(device_id)
+
+    def find(self, handle: str) -> Optional[_Frame]:
+        """按句柄查找仍在缓存中的帧（每台设备只保留最近一帧）"""
+        with self._lock:
+            for frame in self._frames.values():
+                if frame.handle == handle:
+                    return frame
+        return None
+
+    def invalidate(self, device_id: Optional[str]):
+        with self._lock:
+            self._frames.pop(device_id, None)
+
+    def update(self, device_id: Optional[str], width: int, height: int, pixels,
+               threshold: float = 2.0) -> Dict:
+        """
+        用新帧更新缓存并与上一帧比较
+
+        Returns:
+            {'handle', 'changed', 'first_frame', 'changed_regions': [[x, y, w, h]...],
+             'bounding_box', 'change_ratio', 'width', 'height'}
+        """
+        handle = hashlib.blake2b(pixels, digest_size=8).hexdigest()
+        previous = self.get(device_id)
+        now = time.time()
+
+        if previous is not None and previous.handle == handle:
+            previous.captured_at = now
+            return self._result(previous, [], False)
+
+        signatures = tile_signatures(width, height, pixels)
+        frame = _Frame(handle, width, height, pixels, signatures, now)
+
+        if previous is None or (previous.width, previous.height) != (width, height):
+            with self._lock:
+                self._frames[device_id] = frame
+            return self._result(frame, list(range(GRID_ROWS * GRID_COLUMNS)), True,
+                                first_frame=previous is None)
+
+        tiles = changed_tiles(previous.signatures, signatures, threshold)
+        if not tiles:
+            # 仅有低于阈值的细微变化，沿用上一帧的句柄与签名作为比较基准
+            previous.captured_at = now
+            return self._result(previous, [], False)
+
+        with self._lock:
+            self._frames[device_id] = frame
+        return self._result(frame, tiles, True)
+
+    @staticmethod
+    def _result(frame: _Frame, tiles: List[int], changed: bool, first_frame: bool = False) -> Dict:
+        bounds = _tile_bounds(frame.width, frame.height)
+        regions = [list(bounds[i]) for i in tiles]
+        bounding_box = None
+        if regions:
+            x0 = min(r[0] for r in regions)
+            y0 = min(r[1] for r in regions)
+            x1 = max(r[0] + r[2] for r in regions)
+            y1 = max(r[1] + r[3] for r in regions)
+            bounding_box = [x0, y0, x1 - x0, y1 - y0]
+        return {
+            'handle': frame.handle,
+            'changed': changed,
+            'first_frame': first_frame,
+            'changed_regions': regions,
+            'bounding_box': bounding_box,
+            'change_ratio': round(len(tiles) / len(bounds), 4),
+            'width': frame.width,
+            'height': frame.height,
+            'captured_at': frame.captured_at,
+        }
@@ -0,0 +1,185 @@
+"""
+截图数据处理
+
+解析 screencap 原始帧缓冲格式，在主机侧裁剪、缩小并编码为 PNG / JPEG /
+WebP（PNG 使用 zlib 低压缩级别，比设备端 screencap -p 的压缩快得多）。
+NumPy 与 Pillow 为可选依赖。
+"""
+
+import io
+import struct
+import zlib
+from array import array
+from typing import Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖，缺失时使用纯 Python 的近邻采样
+    np = None
+
+try:
+    from PIL import Image as PILImage
+except ImportError:  # 可选依赖，JPEG/WebP 编码需要
+    PILImage = None
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+IMAGE_FORMATS = ('png', 'jpeg', 'webp')
+
+# screencap 原始输出中的像素格式（android.graphics.PixelFormat）
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+
+
+def parse_raw_screencap(data: bytes) -> Tuple[int, int, int, memoryview]:
+    """
+    解析 `screencap`（不带 -p）的输出
+
+    头部为 width、height、format 三个小端 uint32，Android 9 起额外带
+    一个 colorspace 字段；通过像素数据长度判断头部大小。RGBX_8888 帧的
+    第四个字节未定义，将其置为 0xFF，使返回的数据总是不透明的 RGBA。
+
+    Returns:
+        (width, height, pixel_format, rgba 像素数据)
+
+    Raises:
+        ValueError: 数据长度与头部描述不符或像素格式不受支持
+    """
+    if len(data) < 12:
+        raise ValueError("screencap output too short")
+    width, height, pixel_format = struct.unpack_from('<III', data, 0)
+    pixel_bytes = width * height * 4
+    for header_size in (16, 12):
+        if len(data) - header_size == pixel_bytes:
+            break
+    else:
+        raise ValueError(f"unexpected screencap size {len(data)} for {width}x{height}")
+    if pixel_format not in (PIXEL_FORMAT_RGBA_8888, PIXEL_FORMAT_RGBX_8888):
+        raise ValueError(f"unsupported pixel format: {pixel_format}")
+    if pixel_format == PIXEL_FORMAT_RGBX_8888:
+        pixels = bytearray(memoryview(data)[header_size:])
+        pixels[3::4] = b'\xff' * (width * height)
+        return width, height, pixel_format, memoryview(pixels)
+    return width, height, pixel_format, memoryview(data)[header_size:]
+
+
+def _png_chunk(chunk_type: bytes, payload: bytes) -> bytes:
+    return (struct.pack('>I', len(payload)) + chunk_type + payload
+            + struct.pack('>I', zlib.crc32(chunk_type + payload) & 0xffffffff))
+
+
+def encode_png(width: int, height: int, pixels, channels: int = 4, level: int = 1) -> bytes:
+    """
+    将 RGBA（channels=4）或 RGB（channels=3）像素编码为 PNG
+
+    每行使用 None 滤波，zlib 压缩级别默认 1，优先编码速度。
+    """
+    color_type = 6 if channels == 4 else 2
+    stride = width * channels
+    view = memoryview(pixels).cast('B')
+    # 每行前加一个滤波类型字节（0 = None）
+    parts = []
+    for row in range(height):
+        parts.append(b'\x00')
+        parts.append(view[row * stride:(row + 1) * stride])
+    compressed = zlib.compress(b''.join(parts), level)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)
+    return (PNG_SIGNATURE + _png_chunk(b'IHDR', header)
+            + _png_chunk(b'IDAT', compressed) + _png_chunk(b'IEND', b''))
+
+
+# ==================== 缩放/裁剪/编码流水线 ====================
+
+def _clamp_crop(width: int, height: int, crop: Optional[Sequence[int]]) -> Tuple[int, int, int, int]:
+    if not crop:
+        return 0, 0, width, height
+    if len(crop) != 4:
+        raise ValueError("crop must be [x, y, width, height]")
+    x, y, w, h = (int(v) for v in crop)
+    x = min(max(x, 0), width - 1)
+    y = min(max(y, 0), height - 1)
+    w = min(max(w, 1), width - x)
+    h = min(max(h, 1), height - y)
+    return x, y, w, h
+
+
+def crop_and_scale(width: int, height: int, pixels, crop: Optional[Sequence[int]] = None,
+                   scale: float = 1.0) -> Tuple[int, int, int, bytes]:
+    """
+    裁剪并缩小 RGBA 帧
+
+    安装了 NumPy 时整帧向量化处理：先按整数倍做区域平均，再近邻采样到
+    目标尺寸；否则直接近邻采样到目标尺寸。两种方式输出的尺寸相同，都去掉
+    alpha 通道。
+
+    Args:
+        crop: [x, y, width, height]，超出屏幕的部分会被截断
+        scale: 缩放比例，取值 (0, 1]
+
+    Returns:
+        (width, height, channels, 像素数据)
+    """
+    if not 0 < scale <= 1:
+        raise ValueError("scale must be in (0, 1]")
+    x, y, w, h = _clamp_crop(width, height, crop)
+    out_w, out_h = max(1, round(w * scale)), max(1, round(h * scale))
+
+    if np is not None:
+        frame = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)[y:y + h, x:x + w, :3]
+        factor = int(1 / scale)
+        if factor >= 2:
+            # 区域平均：累加 factor×factor 个步长切片，避免浮点运算
+            bh, bw = h // factor, w // factor
+            acc = np.zeros((bh, bw, 3), dtype=np.uint16 if factor <= 16 else np.uint32)
+            for dy in range(factor):
+                for dx in range(factor):
+                    acc += frame[dy:bh * factor:factor, dx:bw * factor:factor]
+            frame = (acc // (factor * factor)).astype(np.uint8)
+        if frame.shape[:2] != (out_h, out_w):
+            rows = (np.arange(out_h) * frame.shape[0] // out_h)
+            cols = (np.arange(out_w) * frame.shape[1] // out_w)
+            frame = frame[rows][:, cols]
+        return out_w, out_h, 3, np.ascontiguousarray(frame).tobytes()
+
+    # 每个 RGBA 像素视为一个 uint32，按与 NumPy 路径相同的行列下标近邻采样
+    view = memoryview(pixels).cast('B').cast('I')
+    cols = [x + col * w // out_w for col in range(out_w)]
+    rows = []
+    for out_row in range(out_h):
+        start = (y + out_row * h // out_h) * width
+        if out_w == w:
+            rows.append(view[start + x:start + x + w].tobytes())
+        else:
+            rows.append(array('I', [view[start + col] for col in cols]).tobytes())
+    rgba = b''.join(rows)
+    rgb = bytearray(out_w * out_h * 3)
+    for channel in range(3):
+        rgb[channel::3] = rgba[channel::4]
+    return out_w, out_h, 3, bytes(rgb)
+
+
+def encode_image(width: int, height: int, channels: int, pixels, image_format: str = 'png',
+                 quality: int = 80) -> bytes:
+    """
+    编码为 PNG / JPEG / WebP
+
+    PNG 使用内置编码器；JPEG 和 WebP 需要安装 Pillow。
+    """
+    image_format = image_format.lower()
+    if image_format == 'jpg':
+        image_format = 'jpeg'
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"unsupported image format: {image_format}")
+    if image_format == 'png':
+        return encode_png(width, height, pixels, channels=channels)
+
+    if PILImage is None:
+        raise ValueError(f"Pillow is required for {image_format} encoding (pip install Pillow)")
+    mode = 'RGBA' if channels == 4 else 'RGB'
+    image = PILImage.frombuffer(mode, (width, height), bytes(pixels), 'raw', mode, 0, 1)
+    if image_format == 'jpeg' and mode == 'RGBA':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format.upper(), quality=max(1, min(int(quality), 100)))
+    return buffer.getvalue()
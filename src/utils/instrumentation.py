@@ -0,0 +1,343 @@
+"""
+延迟与吞吐量统计
+
+记录每个 MCP 工具调用、每个 ADBHelper 方法（线程池中执行的部分：启动 adb、
+设备执行和输出解析）以及每条实际执行的 adb 命令（按命令类别和按设备）的
+耗时直方图、错误数、超时数和传输字节数，另外统计启动的 adb 子进程数和
+adb server 连接数。工具耗时减去 ADBHelper 方法耗时即为结果渲染等服务器
+侧开销。
+
+统计以 JSON 快照或 Prometheus 文本格式导出；设置 ADB_MCP_PROMETHEUS_FILE 后
+定期写入该文件（可配合 node_exporter 的 textfile collector）。设置
+ADB_MCP_PROFILE 后对指定工具的调用启用 cProfile，结果保存为 .prof 文件。
+"""
+
+import atexit
+import bisect
+import contextvars
+import cProfile
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .dir_sync import CACHE_DIR
+from .output_stream import Source
+
+# 定期写入 Prometheus 文本格式统计的文件路径（为空时不写入）
+PROMETHEUS_FILE = os.environ.get('ADB_MCP_PROMETHEUS_FILE', '')
+# 写入 Prometheus 文件的最小间隔（秒）
+PROMETHEUS_INTERVAL = float(os.environ.get('ADB_MCP_PROMETHEUS_INTERVAL', '15'))
+# 启用 cProfile 的工具名（逗号分隔，* 表示所有工具；为空时不启用）
+PROFILE_TOOLS = frozenset(t.strip() for t in os.environ.get('ADB_MCP_PROFILE', '').split(',') if t.strip())
+# cProfile 结果的保存目录
+PROFILE_DIR = os.environ.get('ADB_MCP_PROFILE_DIR', os.path.join(CACHE_DIR, 'profiles'))
+
+# 耗时直方图的桶上界（秒），最后隐含 +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 统计分组: (名称, 标签名, 说明)
+FAMILIES = (
+    ('tool', 'tool', 'MCP 工具调用'),
+    ('helper', 'method', 'ADBHelper 方法（线程池中执行的部分）'),
+    ('command', 'command', '实际执行的 adb 命令（按命令类别）'),
+    ('device', 'device', '实际执行的 adb 命令（按设备）'),
+)
+
+# 当前正在执行的工具调用: (工具名, 调用序号)，传递到线程池中的 ADBHelper 方法
+current_call: contextvars.ContextVar[Optional[Tuple[str, int]]] = contextvars.ContextVar(
+    'adb_mcp_current_call', default=None)
+
+_WORD = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+def command_label(args: List[str]) -> str:
+    """
+    adb 命令的类别（去掉 -s serial 之后的参数）：shell / exec-out 附带设备端
+    命令名，如 shell:getprop；组合脚本归为 shell:script
+    """
+    if not args:
+        return 'unknown'
+    name = args[0]
+    if name not in ('shell', 'exec-out'):
+        return name
+    words = ' '.join(args[1:]).split()
+    if not words:
+        return name
+    word = words[0].rsplit('/', 1)[-1]
+    return f"{name}:{word}" if _WORD.match(word) else f"{name}:script"
+
+
+class _Series:
+    """一组调用的耗时直方图与计数"""
+
+    __slots__ = ('buckets', 'count', 'total', 'max', 'errors', 'timeouts', 'bytes')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.timeouts = 0
+        self.bytes = 0
+
+    def observe(self, seconds: float, error: bool, timed_out: bool, nbytes: int):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.errors += error
+        self.timeouts += timed_out
+        self.bytes += nbytes
+
+    def quantile(self, q: float) -> Optional[float]:
+        """由直方图估计分位数（桶内线性插值，落在 +Inf 桶时取最大值）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                if i == len(BUCKETS):
+                    return self.max
+                lower = BUCKETS[i - 1] if i else 0.0
+                return min(lower + (BUCKETS[i] - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def summary(self) -> Dict[str, object]:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 3) if value is not None else None
+        return {'count': self.count, 'errors': self.errors, 'timeouts': self.timeouts,
+                'error_rate': self.errors / self.count if self.count else None,
+                'bytes': self.bytes, 'mean_ms': ms(self.total / self.count if self.count else None),
+                'p50_ms': ms(self.quantile(0.5)), 'p90_ms': ms(self.quantile(0.9)),
+                'p99_ms': ms(self.quantile(0.99)), 'max_ms': ms(self.max if self.count else None)}
+
+
+class Instrumentation:
+    """线程安全的统计注册表"""
+
+    def __init__(self, prometheus_file: str = PROMETHEUS_FILE, interval: float = PROMETHEUS_INTERVAL):
+        self.prometheus_file = prometheus_file
+        self.interval = interval
+        self._series: Dict[str, Dict[str, _Series]] = {name: {} for name, _, _ in FAMILIES}
+        self._spawns: Dict[str, int] = {}
+        self._connections = 0
+        self._transfers: Dict[str, int] = {}
+        self._started_at = time.time()
+        self._last_dump = 0.0
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+
+    def observe(self, family: str, label: str, seconds: float, error: bool = False,
+                timed_out: bool = False, nbytes: int = 0):
+        """记录一次调用；family 为 FAMILIES 中的分组名"""
+        with self._lock:
+            series = self._series[family].get(label)
+            if series is None:
+                series = self._series[family][label] = _Series()
+            series.observe(seconds, error, timed_out, nbytes)
+
+    def observe_command(self, device_id: Optional[str], args: List[str], seconds: float,
+                        success: bool, stderr: str, nbytes: int):
+        """记录一条实际执行的 adb 命令，同时计入命令类别和设备两个分组"""
+        timed_out = stderr == "Command timed out"
+        label = command_label(args)
+        with self._lock:
+            for family, key in (('command', label), ('device', device_id or 'default')):
+                series = self._series[family].get(key)
+                if series is None:
+                    series = self._series[family][key] = _Series()
+                series.observe(seconds, not success, timed_out, nbytes)
+
+    def count_spawn(self, kind: str):
+        """记录一次 adb 子进程启动；kind 为启动位置（command / stream / tar / shell_session / logcat）"""
+        with self._lock:
+            self._spawns[kind] = self._spawns.get(kind, 0) + 1
+
+    def count_transfer(self, direction: str, nbytes: int):
+        """记录 push / pull 传输的文件字节数"""
+        with self._lock:
+            self._transfers[direction] = self._transfers.get(direction, 0) + nbytes
+
+    def count_connection(self):
+        """记录一次到 adb server 的 socket 连接"""
+        with self._lock:
+            self._connections += 1
+
+    def snapshot(self, reset: bool = False) -> Dict[str, object]:
+        """各分组的计数、错误率和耗时分位数（毫秒）"""
+        with self._lock:
+            result: Dict[str, object] = {
+                'uptime_seconds': round(time.time() - self._started_at, 3),
+                'subprocesses_spawned': dict(self._spawns, total=sum(self._spawns.values())),
+                'adb_server_connections': self._connections,
+                'bytes_transferred': dict(self._transfers),
+            }
+            for family, _, _ in FAMILIES:
+                result[family + 's'] = {label: series.summary()
+                                        for label, series in sorted(self._series[family].items())}
+            if reset:
+                self._series = {name: {} for name, _, _ in FAMILIES}
+                self._spawns = {}
+                self._connections = 0
+                self._transfers = {}
+            return result
+
+    def prometheus_text(self) -> str:
+        """Prometheus 文本格式（exposition format 0.0.4）的统计"""
+        lines: List[str] = []
+        with self._lock:
+            for family, label_name, description in FAMILIES:
+                series = sorted(self._series[family].items())
+                name = f"adb_mcp_{family}"
+                lines += [f"# HELP {name}_duration_seconds {description}的耗时",
+                          f"# TYPE {name}_duration_seconds histogram"]
+                for label, s in series:
+                    labels = f'{label_name}="{_escape(label)}"'
+                    cumulative = 0
+                    for bound, n in zip(BUCKETS + (float('inf'),), s.buckets):
+                        cumulative += n
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{name}_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                    lines.append(f'{name}_duration_seconds_sum{{{labels}}} {s.total!r}')
+                    lines.append(f'{name}_duration_seconds_count{{{labels}}} {s.count}')
+                for counter, attr, text in (('errors', 'errors', '失败次数'), ('timeouts', 'timeouts', '超时次数'),
+                                            ('bytes', 'bytes', '输出字节数')):
+                    if family in ('tool', 'helper') and counter == 'timeouts':
+                        continue
+                    lines += [f"# HELP {name}_{counter}_total {description}的{text}",
+                              f"# TYPE {name}_{counter}_total counter"]
+                    lines.extend(f'{name}_{counter}_total{{{label_name}="{_escape(label)}"}} {getattr(s, attr)}'
+                                 for label, s in series)
+            lines += ["# HELP adb_mcp_subprocesses_spawned_total 启动的 adb 子进程数",
+                      "# TYPE adb_mcp_subprocesses_spawned_total counter"]
+            lines.extend(f'adb_mcp_subprocesses_spawned_total{{kind="{_escape(kind)}"}} {n}'
+                         for kind, n in sorted(self._spawns.items()))
+            lines += ["# HELP adb_mcp_adb_server_connections_total 到 adb server 的 socket 连接数",
+                      "# TYPE adb_mcp_adb_server_connections_total counter",
+                      f"adb_mcp_adb_server_connections_total {self._connections}",
+                      "# HELP adb_mcp_transfer_bytes_total push / pull 传输的文件字节数",
+                      "# TYPE adb_mcp_transfer_bytes_total counter"]
+            lines.extend(f'adb_mcp_transfer_bytes_total{{direction="{_escape(direction)}"}} {n}'
+                         for direction, n in sorted(self._transfers.items()))
+        return "\n".join(lines) + "\n"
+
+    def dump_prometheus(self, path: Optional[str] = None) -> Optional[str]:
+        """将 Prometheus 文本写入文件（先写临时文件再替换，读取方不会看到写了一半的内容）"""
+        path = path or self.prometheus_file
+        if not path:
+            return None
+        with self._dump_lock:
+            self._last_dump = time.monotonic()
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, path)
+        return path
+
+    def maybe_dump(self):
+        """距上次写入超过间隔时写入 Prometheus 文件"""
+        if self.prometheus_file and time.monotonic() - self._last_dump >= self.interval:
+            try:
+                self.dump_prometheus()
+            except OSError:
+                pass
+
+
+def _dump_at_exit(instrumentation: Instrumentation):
+    try:
+        instrumentation.dump_prometheus()
+    except OSError:
+        pass
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_instrumentation: Optional[Instrumentation] = None
+_instrumentation_lock = threading.Lock()
+
+
+def get_instrumentation() -> Instrumentation:
+    """获取共享的统计注册表；配置了 Prometheus 文件时在进程退出前再写入一次"""
+    global _instrumentation
+    if _instrumentation is None:
+        with _instrumentation_lock:
+            if _instrumentation is None:
+                instrumentation = Instrumentation()
+                if instrumentation.prometheus_file:
+                    atexit.register(_dump_at_exit, instrumentation)
+                _instrumentation = instrumentation
+    return _instrumentation
+
+
+def instrument_source(source: Source, device_id: Optional[str], args: List[str]) -> Source:
+    """包装流式命令的输出，命令结束（或被提前关闭）时记录耗时和读取的字节数"""
+    start = time.monotonic()
+    nbytes = 0
+    success, stderr = False, ""
+    try:
+        while True:
+            try:
+                chunk = next(source)
+            except StopIteration as stop:
+                success, stderr = stop.value if stop.value is not None else (True, "")
+                return success, stderr
+            nbytes += len(chunk)
+            yield chunk
+    except GeneratorExit:
+        # 调用方读够后提前停止（如输出截断），不算失败
+        success = True
+        raise
+    finally:
+        source.close()
+        get_instrumentation().observe_command(device_id, args, time.monotonic() - start, success, stderr, nbytes)
+
+
+def profiling_enabled(tool: str) -> bool:
+    return '*' in PROFILE_TOOLS or tool in PROFILE_TOOLS
+
+
+# 事件循环线程中同时只对一个工具调用启用 cProfile（同一线程内的 profiler 会互相覆盖）
+_loop_profile_lock = threading.Lock()
+
+
+@contextmanager
+def profile(name: str, exclusive: bool = False) -> Iterator[None]:
+    """
+    对当前线程中的代码启用 cProfile，结束后保存为 PROFILE_DIR/<name>.prof
+
+    exclusive 为 True 时（事件循环线程），已有其他调用在采样则不再采样。
+    cProfile 只记录当前线程，线程池中的 ADBHelper 方法各自保存一个文件。
+    """
+    if exclusive and not _loop_profile_lock.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        try:
+            profiler.enable()
+        except ValueError:
+            # 已有其他 profiler 处于启用状态
+            profiler = None
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                try:
+                    os.makedirs(PROFILE_DIR, exist_ok=True)
+                    profiler.dump_stats(os.path.join(PROFILE_DIR, re.sub(r'[^\w.-]', '_', name) + '.prof'))
+                except OSError:
+                    pass
+    finally:
+        if exclusive:
+            _loop_profile_lock.release()
@@ -0,0 +1,420 @@
+"""
+结构化 logcat 存储
+
+把 threadtime 格式的日志行解析为时间戳、pid、tid、级别、标签、消息，按
+固定大小的分段列式存储：每段用 array/bytearray 保存数值列，原始行只保留
+一份，消息通过偏移量切片得到。每段维护按标签和 pid 的倒排索引以及时间
+范围，查询时先按时间和索引裁剪分段与候选行，只对候选行做级别、时间和
+正则匹配。总行数超过上限时整段淘汰最旧的数据；标签表超过上限时在淘汰后
+按剩余分段重建，不随历史上出现过的标签无限增长。
+
+除文本行外，也可以直接摄入 `logcat -B` 输出的二进制 logger_entry 记录：
+用 struct 从 memoryview 中读出头部字段，负载（tag\0message）原样保存为
+bytes，只有在记录被返回时才解码并格式化为 threadtime 文本。
+"""
+
+import datetime
+import re
+import struct
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional, Pattern, Sequence, Tuple, Union
+
+# 每个分段的行数
+SEGMENT_SIZE = 2048
+# 标签表超过这么多项时，在淘汰分段后丢弃不再被引用的标签
+TAG_LIMIT = 4096
+
+# 日志级别，按严重程度递增；列中以 序号+1 存储，0 表示无法解析的行
+LEVELS = 'VDIWEFA'
+
+# logger_entry 头部: len, hdr_size, pid, tid, sec, nsec（v3/v4 头部更长，多出的字段不使用）
+ENTRY_HEADER = struct.Struct('<HHiIII')
+# v1 头部没有 hdr_size 字段（该位置为填充 0）
+ENTRY_V1_HEADER_SIZE = 20
+
+THREADTIME_RE = re.compile(
+    r'^(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)\.(\d+)\s+(\d+)\s+(\d+)\s+([VDIWEFA])\s+(.*?)\s*: ?')
+
+
+def _day_start(month: int, day: int, now: float) -> float:
+    """threadtime 不含年份：取当前年份，若结果明显晚于现在则视为上一年"""
+    year = datetime.datetime.fromtimestamp(now).year
+    try:
+        start = datetime.datetime(year, month, day).timestamp()
+    except ValueError:
+        return 0.0
+    if start > now + 86400:
+        start = datetime.datetime(year - 1, month, day).timestamp()
+    return start
+
+
+def parse_time(value: str) -> Optional[float]:
+    """解析 `MM-DD HH:MM:SS[.mmm]` 格式的时间为时间戳，格式不符时返回 None"""
+    match = re.match(r'^\s*(\d\d)-(\d\d) (\d\d):(\d\d)(?::(\d\d)(?:\.(\d+))?)?\s*$', value)
+    if not match:
+        return None
+    month, day, hour, minute = (int(match.group(i)) for i in range(1, 5))
+    second = int(match.group(5) or 0)
+    fraction = float('0.' + match.group(6)) if match.group(6) else 0.0
+    return _day_start(month, day, time.time()) + hour * 3600 + minute * 60 + second + fraction
+
+
+def format_time(timestamp: float) -> str:
+    """格式化为 threadtime 的 `MM-DD HH:MM:SS.mmm`"""
+    return time.strftime('%m-%d %H:%M:%S', time.localtime(timestamp)) + f'.{int(timestamp * 1000) % 1000:03d}'
+
+
+def level_rank(level: str) -> int:
+    """级别字母对应的列值（V=1 … A=7），无法识别时返回 0"""
+    index = LEVELS.find(level.upper()[:1]) if level else -1
+    return index + 1
+
+
+class _Segment:
+    __slots__ = ('start_seq', 'lines', 'times', 'pids', 'tids', 'levels', 'tags', 'msg_offsets',
+                 'tag_index', 'pid_index', 'min_time', 'max_time')
+
+    def __init__(self, start_seq: int):
+        self.start_seq = start_seq
+        # 文本行（str）或二进制记录的负载（bytes: tag\0message）
+        self.lines: List[Union[str, bytes]] = []
+        self.times = array('d')
+        self.pids = array('i')
+        self.tids = array('i')
+        self.levels = bytearray()
+        self.tags = array('I')
+        self.msg_offsets = array('I')
+        self.tag_index: Dict[int, array] = {}
+        self.pid_index: Dict[int, array] = {}
+        self.min_time = float('inf')
+        self.max_time = float('-inf')
+
+
+class LogStore:
+    """按序号寻址的分段列式日志存储（非线程安全，由调用方加锁）"""
+
+    def __init__(self, capacity: int, segment_size: int = SEGMENT_SIZE):
+        self.segment_size = max(1, min(segment_size, capacity))
+        # 至少保留两个分段，淘汰时不会清空全部数据
+        self.max_segments = max(2, -(-capacity // self.segment_size))
+        self.next_seq = 0
+        self._segments: List[_Segment] = []
+        self._tag_ids: Dict[str, int] = {'': 0}
+        self._tag_names: List[str] = ['']
+        self._raw_tag_ids: Dict[bytes, int] = {}
+        self._tag_limit = TAG_LIMIT
+        # 二进制流重连时用于去重: (最后时间戳, 该时间戳下已接收的负载)
+        self._resume: Optional[Tuple[float, set]] = None
+        self._day_cache: Dict[Tuple[int, int], float] = {}
+        self._last_time = 0.0
+
+    def __len__(self) -> int:
+        return self.next_seq - self.first_seq
+
+    @property
+    def first_seq(self) -> int:
+        """存储中最早一行的序号"""
+        return self._segments[0].start_seq if self._segments else self.next_seq
+
+    def last_line(self) -> Optional[str]:
+        for segment in reversed(self._segments):
+            if segment.lines:
+                return self._line(segment, len(segment.lines) - 1)
+        return None
+
+    def last_time(self) -> Optional[float]:
+        for segment in reversed(self._segments):
+            if segment.lines:
+                return segment.times[-1]
+        return None
+
+    def _line(self, segment: _Segment, offset: int) -> str:
+        item = segment.lines[offset]
+        if isinstance(item, str):
+            return item
+        level = segment.levels[offset]
+        message = item[segment.msg_offsets[offset]:].decode('utf-8', errors='replace').rstrip('\n')
+        return (f"{format_time(segment.times[offset])} {segment.pids[offset]:5d} {segment.tids[offset]:5d} "
+                f"{LEVELS[level - 1] if level else '?'} {self._tag_names[segment.tags[offset]]}: {message}")
+
+    def _message(self, segment: _Segment, offset: int) -> str:
+        item = segment.lines[offset][segment.msg_offsets[offset]:]
+        if isinstance(item, str):
+            return item
+        return item.decode('utf-8', errors='replace').rstrip('\n')
+
+    def time_range(self) -> Tuple[Optional[float], Optional[float]]:
+        """已存储日志的最早和最晚时间戳"""
+        times = [s for s in self._segments if s.lines and s.min_time <= s.max_time]
+        if not times:
+            return None, None
+        return min(s.min_time for s in times), max(s.max_time for s in times)
+
+    def clear(self):
+        """丢弃全部日志（序号继续递增）"""
+        self._segments = []
+
+    def _tag_id(self, tag: str) -> int:
+        tag_id = self._tag_ids.get(tag)
+        if tag_id is None:
+            tag_id = len(self._tag_names)
+            self._tag_ids[tag] = tag_id
+            self._tag_names.append(tag)
+        return tag_id
+
+    def _timestamp(self, match) -> float:
+        month, day = int(match.group(1)), int(match.group(2))
+        start = self._day_cache.get((month, day))
+        if start is None:
+            start = _day_start(month, day, time.time())
+            self._day_cache[(month, day)] = start
+        return (start + int(match.group(3)) * 3600 + int(match.group(4)) * 60 + int(match.group(5))
+                + int(match.group(6)) / (10 ** len(match.group(6))))
+
+    def _current_segment(self) -> _Segment:
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or len(segment.lines) >= self.segment_size:
+            segment = _Segment(self.next_seq)
+            self._segments.append(segment)
+            if len(self._segments) > self.max_segments:
+                del self._segments[0]
+                if len(self._tag_names) > self._tag_limit:
+                    self._compact_tags()
+        return segment
+
+    def _compact_tags(self):
+        """按剩余分段重建标签表并改写各分段中的标签编号"""
+        live = {0}
+        for segment in self._segments:
+            live.update(segment.tag_index)
+        remap = {old: new for new, old in enumerate(sorted(live))}
+        for segment in self._segments:
+            segment.tags = array('I', [remap[t] for t in segment.tags])
+            segment.tag_index = {remap[t]: offsets for t, offsets in segment.tag_index.items()}
+        self._tag_names = [self._tag_names[old] for old in sorted(live)]
+        self._tag_ids = {name: i for i, name in enumerate(self._tag_names)}
+        self._raw_tag_ids = {}
+        # 仍在使用的标签很多时提高上限，避免每次淘汰都重建
+        self._tag_limit = max(TAG_LIMIT, 2 * len(self._tag_names))
+
+    def append(self, line: str):
+        """追加一行 threadtime 格式的文本日志"""
+        segment = self._current_segment()
+        offset = len(segment.lines)
+        match = THREADTIME_RE.match(line)
+        if match:
+            timestamp = self._timestamp(match)
+            pid, tid = int(match.group(7)), int(match.group(8))
+            level = LEVELS.index(match.group(9)) + 1
+            tag_id = self._tag_id(match.group(10))
+            msg_offset = match.end()
+            self._last_time = timestamp
+            self._index(segment, offset, tag_id, pid, timestamp)
+        else:
+            # 例如 `--------- beginning of main`，沿用上一行的时间
+            timestamp, pid, tid, level, tag_id, msg_offset = self._last_time, -1, -1, 0, 0, 0
+
+        segment.lines.append(line)
+        segment.times.append(timestamp)
+        segment.pids.append(pid)
+        segment.tids.append(tid)
+        segment.levels.append(level)
+        segment.tags.append(tag_id)
+        segment.msg_offsets.append(msg_offset)
+        self.next_seq += 1
+
+    def begin_resume(self):
+        """二进制流从最后时间戳重连前调用：之后到达的、与已有记录重复的记录会被跳过"""
+        last_time = self.last_time()
+        if last_time is None:
+            self._resume = None
+            return
+        seen = set()
+        for segment in reversed(self._segments):
+            for offset in range(len(segment.lines) - 1, -1, -1):
+                if segment.times[offset] < last_time:
+                    break
+                seen.add(segment.lines[offset])
+            else:
+                continue
+            break
+        self._resume = (last_time, seen)
+
+    def extend_binary(self, data) -> int:
+        """
+        解析并追加 `logcat -B` 输出中的完整 logger_entry 记录
+
+        负载（tag\0message）原样保存为 bytes，只解码首次出现的标签。
+
+        Returns:
+            已消费的字节数；不足一条的尾部数据留待与后续数据拼接
+        """
+        view = memoryview(data)
+        size = len(view)
+        unpack_from = ENTRY_HEADER.unpack_from
+        raw_tag_ids = self._raw_tag_ids
+        resume = self._resume
+        segment = None
+        pos = 0
+        while pos + ENTRY_V1_HEADER_SIZE <= size:
+            payload_len, header_size, pid, tid, sec, nsec = unpack_from(view, pos)
+            start = pos + (header_size or ENTRY_V1_HEADER_SIZE)
+            end = start + payload_len
+            if end > size:
+                break
+            pos = end
+            if not payload_len:
+                continue
+            timestamp = sec + nsec / 1e9
+            # 去掉消息末尾的 NUL
+            payload = bytes(view[start + 1:end - 1 if view[end - 1] == 0 else end])
+            if resume is not None:
+                if timestamp < resume[0] or (timestamp == resume[0] and payload in resume[1]):
+                    continue
+                resume = self._resume = None
+
+            if segment is None or len(segment.lines) >= self.segment_size:
+                segment = self._current_segment()
+                # 淘汰分段时标签表可能已重建
+                raw_tag_ids = self._raw_tag_ids
+            tag_end = payload.find(b'\0')
+            if tag_end < 0:
+                tag_end = len(payload)
+            raw_tag = payload[:tag_end]
+            tag_id = raw_tag_ids.get(raw_tag)
+            if tag_id is None:
+                tag_id = raw_tag_ids[raw_tag] = self._tag_id(raw_tag.decode('utf-8', errors='replace'))
+            # 优先级: 2=V … 7=F，与 LEVELS 的列值相差 1
+            priority = view[start]
+            level = priority - 1 if 2 <= priority <= 8 else 0
+
+            offset = len(segment.lines)
+            self._index(segment, offset, tag_id, pid, timestamp)
+            segment.lines.append(payload)
+            segment.times.append(timestamp)
+            segment.pids.append(pid)
+            segment.tids.append(tid)
+            segment.levels.append(level)
+            segment.tags.append(tag_id)
+            segment.msg_offsets.append(min(tag_end + 1, len(payload)))
+            self.next_seq += 1
+            self._last_time = timestamp
+        return pos
+
+    @staticmethod
+    def _index(segment: _Segment, offset: int, tag_id: int, pid: int, timestamp: float):
+        offsets = segment.tag_index.get(tag_id)
+        if offsets is None:
+            offsets = segment.tag_index[tag_id] = array('I')
+        offsets.append(offset)
+        offsets = segment.pid_index.get(pid)
+        if offsets is None:
+            offsets = segment.pid_index[pid] = array('I')
+        offsets.append(offset)
+        if timestamp < segment.min_time:
+            segment.min_time = timestamp
+        if timestamp > segment.max_time:
+            segment.max_time = timestamp
+
+    def iter_from(self, seq: int, tag: str = "") -> Iterator[Tuple[int, str]]:
+        """按序号顺序产出 (seq, line)；指定 tag 时只产出该标签的行"""
+        tag_id = self._tag_ids.get(tag) if tag else None
+        if tag and tag_id is None:
+            return
+        for segment in list(self._segments):
+            end = segment.start_seq + len(segment.lines)
+            if end <= seq:
+                continue
+            start = max(0, seq - segment.start_seq)
+            if tag_id is None:
+                for offset in range(start, len(segment.lines)):
+                    yield segment.start_seq + offset, self._line(segment, offset)
+            else:
+                for offset in segment.tag_index.get(tag_id, ()):
+                    if offset >= start:
+                        yield segment.start_seq + offset, self._line(segment, offset)
+
+    def query(self, tags: Sequence[str] = (), pids: Sequence[int] = (), min_level: int = 0,
+              start_time: Optional[float] = None, end_time: Optional[float] = None,
+              pattern: Optional[Pattern] = None, limit: int = 100) -> Tuple[List[Dict], bool]:
+        """
+        查询日志，返回最新的 limit 条匹配记录（按时间顺序）
+
+        Args:
+            tags: 标签列表（精确匹配，任一即可）
+            pids: 进程 ID 列表
+            min_level: 最低级别（见 level_rank）
+            start_time / end_time: 时间范围（时间戳，闭区间）
+            pattern: 对消息内容做 search 的正则；str 正则匹配解码后的消息，bytes 正则匹配原始字节
+            limit: 最多返回的记录数，0 表示不限
+
+        Returns:
+            (records, truncated)：truncated 表示还有更早的匹配记录未返回
+        """
+        tag_ids = [self._tag_ids[t] for t in tags if t in self._tag_ids]
+        if tags and not tag_ids:
+            return [], False
+        raw_pattern = pattern is not None and isinstance(pattern.pattern, bytes)
+
+        matched: List[Tuple[_Segment, int]] = []
+        truncated = False
+        for segment in reversed(list(self._segments)):
+            if start_time is not None and segment.max_time < start_time:
+                continue
+            if end_time is not None and segment.min_time > end_time:
+                continue
+
+            candidates = None
+            if tag_ids:
+                candidates = set()
+                for tag_id in tag_ids:
+                    candidates.update(segment.tag_index.get(tag_id, ()))
+            if pids:
+                by_pid = set()
+                for pid in pids:
+                    by_pid.update(segment.pid_index.get(pid, ()))
+                candidates = by_pid if candidates is None else candidates & by_pid
+            offsets = sorted(candidates, reverse=True) if candidates is not None \
+                else range(len(segment.lines) - 1, -1, -1)
+
+            for offset in offsets:
+                if min_level and segment.levels[offset] < min_level:
+                    continue
+                timestamp = segment.times[offset]
+                if start_time is not None and timestamp < start_time:
+                    continue
+                if end_time is not None and timestamp > end_time:
+                    continue
+                if pattern is not None:
+                    item = segment.lines[offset]
+                    if isinstance(item, bytes) == raw_pattern:
+                        # 类型一致时直接匹配，二进制记录不必解码
+                        message = item[segment.msg_offsets[offset]:]
+                    elif raw_pattern:
+                        message = item[segment.msg_offsets[offset]:].encode('utf-8')
+                    else:
+                        message = self._message(segment, offset)
+                    if not pattern.search(message):
+                        continue
+                if limit > 0 and len(matched) >= limit:
+                    truncated = True
+                    break
+                matched.append((segment, offset))
+            if truncated:
+                break
+
+        records = []
+        for segment, offset in reversed(matched):
+            level = segment.levels[offset]
+            records.append({
+                'seq': segment.start_seq + offset,
+                'time': segment.times[offset],
+                'pid': segment.pids[offset],
+                'tid': segment.tids[offset],
+                'level': LEVELS[level - 1] if level else '',
+                'tag': self._tag_names[segment.tags[offset]],
+                'message': self._message(segment, offset),
+                'line': self._line(segment, offset),
+            })
+        return records, truncated
@@ -0,0 +1,326 @@
+"""
+后台 logcat 跟随
+
+每个设备保持一个 `adb logcat -v threadtime`（或二进制的 `logcat -B`）流式进程，读取线程把日志行
+解析后写入有界的结构化存储（见 logcat_store），并为每行分配单调递增的序号。读取方以游标（下一条
+待读行的序号）增量获取新日志，可选长轮询等待；同一设备的所有读取方共享
+同一个日志流。进程意外退出时下一次读取会自动重连；启动后很快退出（例如设备
+不存在）时以 adb 的错误输出和退出码报告失败。长时间无人读取的跟随进程由后台
+线程回收。
+"""
+
+import os
+import re
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .instrumentation import get_instrumentation
+from .logcat_store import LogStore
+
+# 存储保留的日志行数
+BUFFER_LINES = int(os.environ.get('ADB_MCP_LOGCAT_BUFFER', '20000'))
+# 启动跟随时回溯的历史行数（logcat -T）
+BACKLOG_LINES = int(os.environ.get('ADB_MCP_LOGCAT_BACKLOG', '1000'))
+# 日志流格式: text（-v threadtime）/ binary（-B，日志量大的设备上解析开销更低）
+LOGCAT_FORMAT = os.environ.get('ADB_MCP_LOGCAT_FORMAT', 'text').lower()
+# 多久（秒）无人读取后停止跟随进程
+IDLE_TIMEOUT = float(os.environ.get('ADB_MCP_LOGCAT_IDLE_TIMEOUT', '600'))
+# 启动后最多等待多久（秒）确认进程没有立即退出
+START_CHECK = 0.5
+# 保留的 adb 错误输出字节数
+STDERR_BYTES = 4096
+
+# threadtime 格式: "MM-DD HH:MM:SS.mmm  PID  TID L TAG     : message"
+THREADTIME_RE = re.compile(r'^(\d\d-\d\d \d\d:\d\d:\d\d\.\d+)\s+\d+\s+\d+\s+[VDIWEFA]\s+(.*?)\s*: ')
+
+
+def _timestamp(line: str) -> Optional[str]:
+    match = THREADTIME_RE.match(line)
+    return match.group(1) if match else None
+
+
+class LogcatFollowerError(Exception):
+    """跟随进程启动后立即退出"""
+
+
+class LogcatFollower:
+    """单个设备上的 logcat 跟随进程及其日志存储"""
+
+    def __init__(self, device_id: Optional[str] = None, capacity: int = BUFFER_LINES,
+                 backlog: int = BACKLOG_LINES, binary: bool = LOGCAT_FORMAT == 'binary'):
+        self.device_id = device_id
+        self.binary = binary
+        self.backlog = backlog
+        self.last_used = time.monotonic()
+        self.started_at = 0.0
+        self.store = LogStore(max(1, capacity))
+        # 上一个跟随进程异常退出的原因（adb 错误输出与退出码），正常运行时为 None
+        self.error: Optional[str] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._ended: Optional[subprocess.Popen] = None
+        self._cond = threading.Condition()
+        # 重连时跳过与上次最后时间戳相同、且已经接收过的行
+        self._resume: Optional[Tuple[str, set]] = None
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def ensure_started(self):
+        """
+        进程未运行时启动（或重连）跟随进程
+
+        Raises:
+            OSError: 无法执行 adb
+            LogcatFollowerError: 进程在 START_CHECK 秒内退出且没有输出或退出码非 0
+        """
+        with self._cond:
+            if self.alive:
+                return
+            cmd = ['adb']
+            if self.device_id:
+                cmd += ['-s', self.device_id]
+            if self.binary:
+                # exec-out 不经过 pty，二进制数据不会被换行转换破坏
+                cmd += ['exec-out', 'logcat', '-B', '-T']
+                last_time = self.store.last_time()
+                if last_time is not None:
+                    # 从最后接收的时间戳继续，重复的记录由存储跳过
+                    cmd.append(f"{int(last_time * 1000) / 1000:.3f}")
+                    self.store.begin_resume()
+                else:
+                    cmd.append(str(max(1, self.backlog)))
+            else:
+                cmd += ['logcat', '-v', 'threadtime', '-T']
+                last_line = self.store.last_line()
+                last_ts = _timestamp(last_line) if last_line is not None else None
+                if last_ts is not None:
+                    # 从最后接收的时间戳继续，避免重复或遗漏
+                    cmd.append(last_ts)
+                    recent = self.store.iter_from(max(self.store.first_seq, self.store.next_seq - 256))
+                    self._resume = (last_ts, {line for _, line in recent if line.startswith(last_ts)})
+                else:
+                    cmd.append(str(max(1, self.backlog)))
+                    self._resume = None
+
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+            get_instrumentation().count_spawn('logcat')
+            self._process = process
+            self.error = None
+            self.started_at = time.monotonic()
+            before = self.store.next_seq
+        errors = bytearray()
+        drain = threading.Thread(target=self._drain_stderr, args=(process, errors), daemon=True)
+        drain.start()
+        pump = self._pump_binary if self.binary else self._pump
+        threading.Thread(target=pump, args=(process, errors, drain), name='adb-logcat', daemon=True).start()
+
+        # 等到第一批输出或进程退出，及时发现设备不存在等错误
+        deadline = time.monotonic() + START_CHECK
+        with self._cond:
+            while self.store.next_seq == before and self._ended is not process:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._ended is process and self.error:
+                raise LogcatFollowerError(self.error)
+
+    @staticmethod
+    def _drain_stderr(process: subprocess.Popen, errors: bytearray):
+        for chunk in iter(lambda: process.stderr.read(4096), b''):
+            errors += chunk
+            del errors[:-STDERR_BYTES]
+
+    def _finish(self, process: subprocess.Popen, errors: bytearray, drain: threading.Thread, received: bool):
+        """输出结束后记录退出原因；主动停止的进程不算错误"""
+        code = process.wait()
+        drain.join(1.0)
+        with self._cond:
+            if self._process is process:
+                message = errors.decode('utf-8', errors='replace').strip()
+                if code != 0 or not received:
+                    self.error = f"logcat exited with code {code}" + (f": {message}" if message else "")
+                self._process = None
+            self._ended = process
+            self._cond.notify_all()
+
+    def _pump_binary(self, process: subprocess.Popen, errors: bytearray, drain: threading.Thread):
+        read = process.stdout.read1 if hasattr(process.stdout, 'read1') else process.stdout.read
+        pending = bytearray()
+        received = False
+        while True:
+            chunk = read(262144)
+            if not chunk:
+                break
+            received = True
+            pending += chunk
+            with self._cond:
+                consumed = self.store.extend_binary(pending)
+                if consumed:
+                    self._cond.notify_all()
+            del pending[:consumed]
+        self._finish(process, errors, drain, received)
+
+    def _pump(self, process: subprocess.Popen, errors: bytearray, drain: threading.Thread):
+        received = False
+        for raw in process.stdout:
+            received = True
+            line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            with self._cond:
+                if self._resume is not None:
+                    last_ts, seen = self._resume
+                    if line.startswith(last_ts) and line in seen:
+                        continue
+                    if _timestamp(line) is not None and not line.startswith(last_ts):
+                        self._resume = None
+                self.store.append(line)
+                self._cond.notify_all()
+        self._finish(process, errors, drain, received)
+
+    def stop(self):
+        with self._cond:
+            process = self._process
+            self._process = None
+        if process is not None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    def clear(self):
+        """丢弃已缓冲的日志（序号继续递增）"""
+        with self._cond:
+            self.store.clear()
+
+    def wait_backlog(self, settle: float = 0.2, limit: float = 2.0):
+        """刚启动时等待历史日志（-T）输出完毕：连续 settle 秒无新行或距启动超过 limit 秒"""
+        # 进程退出后输出可能还没读完，以读取线程结束（_process 被清空）为准
+        while time.monotonic() - self.started_at < limit and self._process is not None:
+            with self._cond:
+                before = self.store.next_seq
+                self._cond.wait(settle)
+                if self.store.next_seq == before:
+                    return
+
+    def query(self, since_seconds: float = 0, **criteria) -> Dict:
+        """
+        在已接收的日志中查询，条件参数见 LogStore.query
+
+        Args:
+            since_seconds: 只查询最新一条日志之前若干秒内的日志
+
+        Returns:
+            {'records', 'truncated', 'buffered': 存储中的行数, 'oldest', 'newest': 存储的时间范围}
+        """
+        self.last_used = time.monotonic()
+        if time.monotonic() - self.started_at < 2.0:
+            self.wait_backlog()
+        with self._cond:
+            oldest, newest = self.store.time_range()
+            if since_seconds > 0 and newest is not None:
+                criteria['start_time'] = max(criteria.get('start_time') or 0, newest - since_seconds)
+            records, truncated = self.store.query(**criteria)
+            return {'records': records, 'truncated': truncated, 'buffered': len(self.store),
+                    'oldest': oldest, 'newest': newest}
+
+    def read(self, cursor: int = -1, lines: int = 100, filter_tag: str = "", wait: float = 0.0,
+             cancelled: Optional[Callable[[], bool]] = None) -> Dict:
+        """
+        读取日志
+
+        Args:
+            cursor: 下一条待读行的序号（上一次返回的 cursor）；小于 0 时返回最新的 lines 行
+            lines: 最多返回的行数，0 表示不限
+            filter_tag: 只返回该标签的日志
+            wait: 游标之后没有新日志时最多等待的秒数（长轮询）
+            cancelled: 返回 True 时提前结束等待
+
+        Returns:
+            {'lines': [...], 'cursor': 下一次读取的游标, 'dropped': 因缓冲区溢出而丢失的行数}
+        """
+        self.last_used = time.monotonic()
+        tail = cursor < 0
+        if tail and time.monotonic() - self.started_at < 2.0:
+            self.wait_backlog()
+
+        deadline = time.monotonic() + max(0.0, wait)
+        dropped = 0
+        with self._cond:
+            while True:
+                first, end = self.store.first_seq, self.store.next_seq
+                start = first if tail else min(max(cursor, first), end)
+                dropped += 0 if tail else max(0, first - cursor)
+
+                matched: List[str] = []
+                next_cursor = end
+                for seq, line in self.store.iter_from(start, filter_tag):
+                    matched.append(line)
+                    if not tail and lines > 0 and len(matched) >= lines:
+                        next_cursor = seq + 1
+                        break
+                if tail and lines > 0:
+                    matched = matched[-lines:]
+
+                remaining = deadline - time.monotonic()
+                if matched or tail or remaining <= 0 or self._process is None:
+                    return {'lines': matched, 'cursor': next_cursor, 'dropped': dropped}
+                if cancelled is not None and cancelled():
+                    return {'lines': [], 'cursor': next_cursor, 'dropped': dropped}
+                # 游标之后的行都不匹配，下次从 next_cursor 继续检查
+                cursor = next_cursor
+                self._cond.wait(min(remaining, 0.5))
+
+
+class LogcatFollowerPool:
+    """按设备管理 LogcatFollower，后台线程停止空闲的跟随进程"""
+
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._followers: Dict[Optional[str], LogcatFollower] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+
+    def get(self, device_id: Optional[str]) -> LogcatFollower:
+        """获取设备的跟随器，必要时启动跟随进程"""
+        with self._lock:
+            follower = self._followers.get(device_id)
+            if follower is None:
+                follower = LogcatFollower(device_id)
+                self._followers[device_id] = follower
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, daemon=True)
+                self._reaper.start()
+        follower.ensure_started()
+        return follower
+
+    def peek(self, device_id: Optional[str]) -> Optional[LogcatFollower]:
+        """返回已存在的跟随器，不启动进程"""
+        with self._lock:
+            return self._followers.get(device_id)
+
+    def close(self, device_id: Optional[str]):
+        with self._lock:
+            follower = self._followers.pop(device_id, None)
+        if follower is not None:
+            follower.stop()
+
+    def close_all(self):
+        with self._lock:
+            followers = list(self._followers.values())
+            self._followers.clear()
+        for follower in followers:
+            follower.stop()
+
+    def _reap(self):
+        interval = max(1.0, min(self.idle_timeout / 4, 30.0))
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            with self._lock:
+                idle = [f for f in self._followers.values()
+                        if f.alive and now - f.last_used > self.idle_timeout]
+            for follower in idle:
+                follower.stop()
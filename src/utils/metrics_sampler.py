@@ -0,0 +1,334 @@
+"""
+后台指标采样
+
+每个设备一个采样线程，每个采样周期只执行一条组合 shell 命令，读取电池（sysfs）、/proc/meminfo、/proc/loadavg、
+/proc/stat 以及指定进程的 /proc/<pid>/stat 和 VmRSS。采样线程使用自己独占
+的长驻 shell 会话（不占用共享会话池，也不经过命令结果缓存），会话无法建立
+时改用单次 adb shell。数值写入定长的
+typed array 环形缓冲区（时间戳为 double，指标值为 float），长时间运行内存
+占用固定。读取时按时间桶降采样，并计算最小/最大/均值/分位数等统计。
+"""
+
+import math
+import os
+import shlex
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .shell_session import ShellSession, ShellSessionUnavailable, ShellSessionUnsupported
+
+# 每个设备保留的采样点数
+CAPACITY = int(os.environ.get('ADB_MCP_METRICS_CAPACITY', '3600'))
+# 最短采样间隔（秒）
+MIN_INTERVAL = 0.5
+
+ShellRunner = Callable[[List[str], Optional[str], int], Tuple[bool, str, str]]
+
+BATTERY_DIR = '/sys/class/power_supply/battery'
+
+# 指标组及其包含的序列
+METRIC_GROUPS = {
+    'battery': ('battery_level', 'battery_temp_c', 'battery_current_ma'),
+    'memory': ('mem_available_bytes', 'mem_used_percent'),
+    'load': ('load_1m', 'load_5m', 'load_15m'),
+    'cpu': ('cpu_percent',),
+}
+DEFAULT_GROUPS = ('battery', 'memory', 'load', 'cpu')
+
+
+def sample_script(groups: List[str], processes: List[str]) -> str:
+    """一次采样的组合脚本，每行以类别字母开头"""
+    parts = []
+    if 'battery' in groups:
+        parts.append(f"echo B $(cat {BATTERY_DIR}/capacity 2>/dev/null || echo -) "
+                     f"$(cat {BATTERY_DIR}/temp 2>/dev/null || echo -) "
+                     f"$(cat {BATTERY_DIR}/current_now 2>/dev/null || echo -)")
+    if 'memory' in groups:
+        parts.append("grep -E '^(MemTotal|MemAvailable):' /proc/meminfo | sed 's/^/M /'")
+    if 'load' in groups:
+        parts.append("echo L $(cat /proc/loadavg)")
+    if 'cpu' in groups or processes:
+        parts.append("grep '^cpu' /proc/stat | sed 's/^/C /'")
+    for index, name in enumerate(processes):
+        parts.append(f"p=$(pidof {shlex.quote(name)} | cut -d' ' -f1); "
+                     f"[ -n \"$p\" ] && echo \"P {index} $(cat /proc/$p/stat)\" && "
+                     f"echo \"R {index} $(grep VmRSS /proc/$p/status)\"")
+    return '; '.join(parts)
+
+
+class RingBuffer:
+    """定长环形缓冲区：时间戳一列，每个指标一列"""
+
+    def __init__(self, names: List[str], capacity: int = CAPACITY):
+        self.capacity = max(2, capacity)
+        self.names = list(names)
+        self.times = array('d', bytes(8 * self.capacity))
+        self.columns = {name: array('f', bytes(4 * self.capacity)) for name in self.names}
+        self.count = 0
+        self._next = 0
+
+    def append(self, timestamp: float, values: Dict[str, float]):
+        index = self._next
+        self.times[index] = timestamp
+        for name, column in self.columns.items():
+            column[index] = values.get(name, math.nan)
+        self._next = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _order(self) -> List[int]:
+        start = (self._next - self.count) % self.capacity
+        return [(start + i) % self.capacity for i in range(self.count)]
+
+    def snapshot(self, names: List[str], since: float = 0.0) -> Tuple[List[float], Dict[str, List[float]]]:
+        """按时间顺序返回 since 之后的 (时间戳, {指标: 值})"""
+        order = [i for i in self._order() if self.times[i] >= since]
+        return ([self.times[i] for i in order],
+                {name: [self.columns[name][i] for i in order] for name in names if name in self.columns})
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """线性插值分位数，sorted_values 需已排序且非空"""
+    position = (len(sorted_values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def aggregate(values: List[float]) -> Optional[Dict[str, float]]:
+    valid = sorted(v for v in values if not math.isnan(v))
+    if not valid:
+        return None
+    last = next(v for v in reversed(values) if not math.isnan(v))
+    return {'min': valid[0], 'max': valid[-1], 'mean': sum(valid) / len(valid),
+            'p50': percentile(valid, 0.5), 'p90': percentile(valid, 0.9), 'p99': percentile(valid, 0.99),
+            'last': last, 'samples': len(valid)}
+
+
+def downsample(times: List[float], values: List[float], points: int) -> List[Tuple[float, float]]:
+    """按等宽时间桶取均值，忽略缺失值（NaN）"""
+    if not times:
+        return []
+    if points <= 0 or len(times) <= points:
+        return [(t, v) for t, v in zip(times, values) if not math.isnan(v)]
+    start, span = times[0], (times[-1] - times[0]) or 1.0
+    sums, counts, stamps = [0.0] * points, [0] * points, [0.0] * points
+    for t, v in zip(times, values):
+        if math.isnan(v):
+            continue
+        bucket = min(points - 1, int((t - start) / span * points))
+        sums[bucket] += v
+        stamps[bucket] += t
+        counts[bucket] += 1
+    return [(stamps[i] / counts[i], sums[i] / counts[i]) for i in range(points) if counts[i]]
+
+
+class Monitor:
+    """单个设备上的采样线程"""
+
+    def __init__(self, run_shell: ShellRunner, device_id: Optional[str], interval: float,
+                 groups: List[str], processes: List[str], duration: float = 0.0, capacity: int = CAPACITY,
+                 use_session: bool = True):
+        self.run_shell = run_shell
+        self.use_session = use_session
+        self.device_id = device_id
+        self.interval = max(MIN_INTERVAL, interval)
+        self.groups = [g for g in DEFAULT_GROUPS if g in groups]
+        self.processes = list(processes)
+        self.duration = duration
+        names = [name for group in self.groups for name in METRIC_GROUPS[group]]
+        for process in self.processes:
+            names += [f"{process}:rss_bytes", f"{process}:cpu_percent"]
+        self.buffer = RingBuffer(names, capacity)
+        self.started_at = time.time()
+        self.errors = 0
+        self.last_error = ""
+        self._script = sample_script(self.groups, self.processes)
+        self._previous_cpu: Optional[Tuple[float, float, int]] = None
+        self._previous_proc: Dict[int, float] = {}
+        self._session: Optional[ShellSession] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='adb-metrics', daemon=True)
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        deadline = time.monotonic() + self.duration if self.duration > 0 else None
+        self._session = ShellSession(self.device_id) if self.use_session else None
+        try:
+            while not self._stop.is_set():
+                tick = time.monotonic()
+                if deadline is not None and tick >= deadline:
+                    break
+                try:
+                    success, stdout, stderr = self._sample(max(5, int(self.interval * 2)))
+                    if stdout:
+                        values = self._parse(stdout)
+                        with self._lock:
+                            self.buffer.append(time.time(), values)
+                    if not success and not stdout:
+                        self.errors += 1
+                        self.last_error = stderr
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+                self._stop.wait(max(0.0, self.interval - (time.monotonic() - tick)))
+        finally:
+            if self._session is not None:
+                self._session.kill()
+            self._stop.set()
+
+    def _sample(self, timeout: int) -> Tuple[bool, str, str]:
+        """执行一次采样脚本；会话超时或断开时抛出 ShellSessionError，下一周期重建会话"""
+        if self._session is not None:
+            try:
+                exit_code, stdout, stderr = self._session.run(self._script, timeout)
+                return exit_code == 0, stdout.strip(), stderr.strip()
+            except ShellSessionUnsupported:
+                # 设备不支持分离的 stdout/stderr，之后都使用单次 adb shell
+                self._session = None
+            except ShellSessionUnavailable:
+                pass
+        return self.run_shell([self._script], self.device_id, timeout)
+
+    def _parse(self, output: str) -> Dict[str, float]:
+        values: Dict[str, float] = {}
+        mem: Dict[str, int] = {}
+        cpu_total = cpu_idle = 0.0
+        cpu_count = 0
+        proc_ticks: Dict[int, float] = {}
+        for line in output.split('\n'):
+            kind, _, rest = line.strip().partition(' ')
+            fields = rest.split()
+            if kind == 'B' and len(fields) >= 3:
+                level, temp, current = (_float(f) for f in fields[:3])
+                values['battery_level'] = level
+                values['battery_temp_c'] = temp / 10
+                # current_now 单位为微安，放电时多数设备为负值
+                values['battery_current_ma'] = current / 1000
+            elif kind == 'M' and len(fields) >= 2:
+                mem[fields[0].rstrip(':')] = int(fields[1]) * 1024 if fields[1].isdigit() else 0
+            elif kind == 'L' and len(fields) >= 3:
+                values['load_1m'], values['load_5m'], values['load_15m'] = (_float(f) for f in fields[:3])
+            elif kind == 'C' and fields:
+                if fields[0] == 'cpu':
+                    jiffies = [_float(f) for f in fields[1:]]
+                    cpu_total = sum(v for v in jiffies if not math.isnan(v))
+                    # idle + iowait
+                    cpu_idle = sum(v for v in jiffies[3:5] if not math.isnan(v))
+                else:
+                    cpu_count += 1
+            elif kind == 'P' and len(fields) >= 2 and fields[0].isdigit():
+                # comm 可能包含空格，从最后一个 ')' 之后开始按字段解析
+                stat = rest[len(fields[0]) + 1:]
+                after = stat[stat.rfind(')') + 2:].split()
+                if len(after) > 12:
+                    proc_ticks[int(fields[0])] = _float(after[11]) + _float(after[12])
+            elif kind == 'R' and len(fields) >= 3 and fields[0].isdigit():
+                rss = _float(fields[2])
+                if int(fields[0]) < len(self.processes):
+                    values[f"{self.processes[int(fields[0])]}:rss_bytes"] = rss * 1024
+
+        if 'MemTotal' in mem and 'MemAvailable' in mem:
+            values['mem_available_bytes'] = mem['MemAvailable']
+            values['mem_used_percent'] = (mem['MemTotal'] - mem['MemAvailable']) * 100 / (mem['MemTotal'] or 1)
+
+        previous = self._previous_cpu
+        if cpu_total:
+            self._previous_cpu = (cpu_total, cpu_idle, max(1, cpu_count))
+        if previous is not None and cpu_total > previous[0]:
+            elapsed = cpu_total - previous[0]
+            values['cpu_percent'] = (elapsed - (cpu_idle - previous[1])) * 100 / elapsed
+            # 进程 CPU 以单个核心为 100%
+            per_core = elapsed / max(1, cpu_count)
+            for index, ticks in proc_ticks.items():
+                before = self._previous_proc.get(index)
+                if before is not None and ticks >= before and index < len(self.processes):
+                    values[f"{self.processes[index]}:cpu_percent"] = (ticks - before) * 100 / per_core
+        self._previous_proc = proc_ticks
+        return values
+
+    def read(self, names: Optional[List[str]] = None, since_seconds: float = 0.0,
+             points: int = 60) -> Dict:
+        """
+        读取降采样后的序列和统计
+
+        Returns:
+            {'series': {指标: [(时间戳, 值), ...]}, 'aggregates': {指标: {...}}, 'samples', ...}
+        """
+        names = [n for n in (names or self.buffer.names) if n in self.buffer.columns]
+        since = time.time() - since_seconds if since_seconds > 0 else 0.0
+        with self._lock:
+            times, columns = self.buffer.snapshot(names, since)
+        return {
+            'series': {name: downsample(times, columns[name], points) for name in names},
+            'aggregates': {name: aggregate(columns[name]) for name in names},
+            'samples': len(times),
+            'first': times[0] if times else None,
+            'last': times[-1] if times else None,
+            'interval': self.interval,
+            'running': self.running,
+            'started_at': self.started_at,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'metrics': list(self.buffer.names),
+        }
+
+
+def _float(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+class MetricsSampler:
+    """按设备管理采样线程"""
+
+    def __init__(self, run_shell: ShellRunner, use_session: bool = True):
+        self.run_shell = run_shell
+        self.use_session = use_session
+        self._monitors: Dict[Optional[str], Monitor] = {}
+        self._lock = threading.Lock()
+
+    def start(self, device_id: Optional[str], interval: float = 5.0, groups: Optional[List[str]] = None,
+              processes: Optional[List[str]] = None, duration: float = 0.0) -> Monitor:
+        """启动（或以新参数重启）设备的采样，之前的数据被丢弃"""
+        monitor = Monitor(self.run_shell, device_id, interval, list(groups or DEFAULT_GROUPS),
+                          list(processes or []), duration, use_session=self.use_session)
+        with self._lock:
+            previous = self._monitors.get(device_id)
+            self._monitors[device_id] = monitor
+        if previous is not None:
+            previous.stop()
+        monitor.start()
+        return monitor
+
+    def stop(self, device_id: Optional[str]) -> bool:
+        """停止采样（保留已采集的数据）；没有采样时返回 False"""
+        with self._lock:
+            monitor = self._monitors.get(device_id)
+        if monitor is None:
+            return False
+        monitor.stop()
+        return True
+
+    def get(self, device_id: Optional[str]) -> Optional[Monitor]:
+        with self._lock:
+            return self._monitors.get(device_id)
+
+    def stop_all(self):
+        with self._lock:
+            monitors = list(self._monitors.values())
+        for monitor in monitors:
+            monitor.stop()
@@ -0,0 +1,106 @@
+"""
+命令输出流
+
+把 adb 命令的输出以生成器的形式逐块（二进制）或逐行（文本）交给调用方，
+不在内存中缓存完整输出，也不整体解码。可设置字节上限：超出后停止读取、
+终止命令，文本模式下在末尾附加一行截断标记。
+"""
+
+import codecs
+import os
+from typing import Generator, Iterator, List, Optional, Tuple, Union
+
+# 流式命令默认读取的最大字节数，0 表示不限
+MAX_OUTPUT_BYTES = int(os.environ.get('ADB_MCP_MAX_OUTPUT_BYTES', str(16 * 1024 * 1024)))
+
+TRUNCATION_MARKER = "[输出已截断: 超过 {limit} 字节]"
+
+# 逐块产出 stdout 的生成器，结束时返回 (success, stderr)
+Source = Generator[bytes, None, Tuple[bool, str]]
+
+
+class OutputStream:
+    """
+    一次命令执行的输出流，只能迭代一次
+
+    Args:
+        source: 逐块产出 stdout 字节、结束时返回 (success, stderr) 的生成器
+        max_bytes: 最多读取的字节数，0 表示不限
+        binary: 为 True 时产出 bytes 块（截断时不附加标记，见 truncated），
+            否则产出去掉换行符的文本行
+
+    迭代结束后可读取 success、stderr、truncated 和 bytes_read；中途停止迭代时
+    调用 close()（或使用 with 语句）终止命令。
+    """
+
+    def __init__(self, source: Source, max_bytes: int = 0, binary: bool = False):
+        self._source = source
+        self.max_bytes = max(0, max_bytes)
+        self.binary = binary
+        self.success: Optional[bool] = None
+        self.stderr = ""
+        self.truncated = False
+        self.bytes_read = 0
+
+    def __iter__(self) -> Iterator[Union[bytes, str]]:
+        return self._chunks() if self.binary else self._lines()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """终止命令并释放子进程或连接"""
+        self._source.close()
+
+    def read(self) -> Union[bytes, str]:
+        """读取全部输出：二进制模式拼接所有块，文本模式以换行连接各行"""
+        if self.binary:
+            return b''.join(self._chunks())
+        return '\n'.join(self._lines())
+
+    @property
+    def marker(self) -> str:
+        return TRUNCATION_MARKER.format(limit=self.max_bytes)
+
+    def _chunks(self) -> Iterator[bytes]:
+        try:
+            while True:
+                try:
+                    chunk = next(self._source)
+                except StopIteration as stop:
+                    self.success, self.stderr = stop.value if stop.value is not None else (True, "")
+                    return
+                if self.max_bytes and self.bytes_read + len(chunk) > self.max_bytes:
+                    keep = self.max_bytes - self.bytes_read
+                    self.bytes_read += keep
+                    self.truncated = True
+                    self.success = True
+                    if keep:
+                        yield chunk[:keep]
+                    return
+                self.bytes_read += len(chunk)
+                yield chunk
+        finally:
+            self.close()
+
+    def _lines(self) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        partial: List[str] = []
+        for chunk in self._chunks():
+            text = decoder.decode(chunk)
+            partial.append(text)
+            if '\n' not in text:
+                continue
+            lines = ''.join(partial).split('\n')
+            partial = [lines.pop()]
+            for line in lines:
+                yield line.rstrip('\r')
+        partial.append(decoder.decode(b'', final=True))
+        tail = ''.join(partial)
+        if tail:
+            yield tail.rstrip('\r')
+        if self.truncated:
+            yield self.marker
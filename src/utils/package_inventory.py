@@ -0,0 +1,175 @@
+"""
+已安装应用清单缓存
+
+按设备缓存已安装应用的清单（APK 路径、versionCode、UID、安装来源、是否
+第三方应用），通过一条 `pm list packages -f -U --show-versioncode -i` 命令
+整体获取，不必逐个 dumpsys package。清单超过 TTL 后重新获取并与上一次的
+快照比较，记录新增、删除和版本变化的应用；经由本服务器安装或卸载应用时
+只刷新或删除对应的条目。
+"""
+
+import os
+import shlex
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 清单的缓存时间（秒）
+PACKAGE_TTL = float(os.environ.get('ADB_MCP_PACKAGE_TTL', '30'))
+
+ShellRunner = Callable[[List[str], Optional[str]], Tuple[bool, str, str]]
+
+THIRD_PARTY_MARKER = '__ADB_MCP_THIRD_PARTY__'
+
+
+def list_script(package: str = "") -> str:
+    """列出应用清单及第三方应用名称的脚本；旧系统不支持的选项逐级退化"""
+    name = f" {shlex.quote(package)}" if package else ""
+    return (f"pm list packages -f -U --show-versioncode -i{name} 2>/dev/null || "
+            f"pm list packages -f -U -i{name} 2>/dev/null || pm list packages -f{name}; "
+            f"echo {THIRD_PARTY_MARKER}; pm list packages -3{name}")
+
+
+def parse_package_line(line: str) -> Optional[Dict[str, object]]:
+    """
+    解析一行 pm list packages 输出，例如:
+    package:/data/app/~~a==/com.foo-b==/base.apk=com.foo versionCode:12 uid:10234  installer=com.android.vending
+    """
+    if not line.startswith('package:'):
+        return None
+    tokens = line[len('package:'):].split()
+    if not tokens:
+        return None
+    path, sep, name = tokens[0].rpartition('=')
+    if not sep:
+        path, name = '', tokens[0]
+    info: Dict[str, object] = {'package': name, 'path': path, 'version_code': None,
+                               'uid': None, 'installer': None, 'system': True}
+    for token in tokens[1:]:
+        key, sep, value = token.partition(':')
+        if not sep:
+            key, sep, value = token.partition('=')
+        if key == 'versionCode' and value.isdigit():
+            info['version_code'] = int(value)
+        elif key == 'uid':
+            uid = value.split(',')[0]
+            info['uid'] = int(uid) if uid.isdigit() else None
+        elif key == 'installer':
+            info['installer'] = None if value in ('', 'null') else value
+    return info
+
+
+def parse_inventory(output: str) -> Dict[str, Dict[str, object]]:
+    """解析 list_script 的输出，返回 {包名: 信息}"""
+    packages: Dict[str, Dict[str, object]] = {}
+    third_party = False
+    for line in output.split('\n'):
+        line = line.strip()
+        if line == THIRD_PARTY_MARKER:
+            third_party = True
+        elif third_party:
+            name = line[len('package:'):] if line.startswith('package:') else ''
+            if name in packages:
+                packages[name]['system'] = False
+        else:
+            info = parse_package_line(line)
+            if info is not None:
+                packages[info['package']] = info
+    return packages
+
+
+def diff_inventory(old: Dict[str, Dict], new: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """比较两个清单快照，返回新增、删除和发生变化（版本、路径或安装来源）的包名"""
+    updated = [name for name, info in new.items()
+               if name in old and (old[name]['version_code'], old[name]['path'], old[name]['installer'])
+               != (info['version_code'], info['path'], info['installer'])]
+    return {'added': sorted(name for name in new if name not in old),
+            'removed': sorted(name for name in old if name not in new),
+            'updated': sorted(updated)}
+
+
+class _DeviceInventory:
+    def __init__(self, packages: Dict[str, Dict]):
+        self.packages = packages
+        self.fetched_at = time.monotonic()
+        self.changes: Dict[str, List[str]] = {'added': [], 'removed': [], 'updated': []}
+
+
+class PackageInventory:
+    """按设备缓存已安装应用清单"""
+
+    def __init__(self, run_shell: ShellRunner, ttl: float = PACKAGE_TTL):
+        self.run_shell = run_shell
+        self.ttl = ttl
+        self._devices: Dict[Optional[str], _DeviceInventory] = {}
+        self._locks: Dict[Optional[str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _device_lock(self, device_id: Optional[str]) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(device_id, threading.Lock())
+
+    def invalidate(self, device_id: Optional[str] = None):
+        """丢弃设备的清单（设备重连时调用）；device_id 为 None 时清空所有设备"""
+        with self._lock:
+            if device_id is None:
+                self._devices.clear()
+            else:
+                self._devices.pop(device_id, None)
+                self._devices.pop(None, None)
+
+    def get(self, device_id: Optional[str] = None,
+            refresh: bool = False) -> Tuple[bool, Dict[str, Dict], Dict[str, List[str]], str]:
+        """
+        获取设备的应用清单
+
+        Args:
+            refresh: 为 True 时忽略 TTL 立即重新获取
+
+        Returns:
+            (success, {包名: 信息}, 最近一次刷新的变化 {'added', 'removed', 'updated'}, stderr)
+        """
+        with self._device_lock(device_id):
+            with self._lock:
+                entry = self._devices.get(device_id)
+            if entry is not None and not refresh and time.monotonic() - entry.fetched_at < self.ttl:
+                return True, entry.packages, entry.changes, ""
+
+            success, stdout, stderr = self.run_shell([list_script()], device_id)
+            packages = parse_inventory(stdout)
+            if not packages:
+                return False, {}, {}, stderr or stdout or "no packages listed"
+            new_entry = _DeviceInventory(packages)
+            if entry is not None:
+                new_entry.changes = diff_inventory(entry.packages, packages)
+            with self._lock:
+                self._devices[device_id] = new_entry
+            return True, packages, new_entry.changes, ""
+
+    def package_installed(self, device_id: Optional[str], package: str):
+        """经由本服务器安装应用后只刷新该应用的条目"""
+        with self._device_lock(device_id):
+            with self._lock:
+                entry = self._devices.get(device_id)
+            if entry is None:
+                return
+            success, stdout, _ = self.run_shell([list_script(package)], device_id)
+            info = parse_inventory(stdout).get(package) if success else None
+            if info is None:
+                self.invalidate(device_id)
+                return
+            old = entry.packages.get(package)
+            entry.packages = {**entry.packages, package: info}
+            if old is None:
+                entry.changes = {'added': [package], 'removed': [], 'updated': []}
+            else:
+                entry.changes = diff_inventory({package: old}, {package: info})
+
+    def package_removed(self, device_id: Optional[str], package: str):
+        """经由本服务器卸载应用后删除该应用的条目"""
+        with self._lock:
+            entry = self._devices.get(device_id)
+            if entry is None or package not in entry.packages:
+                return
+            entry.packages = {name: info for name, info in entry.packages.items() if name != package}
+            entry.changes = {'added': [], 'removed': [package], 'updated': []}
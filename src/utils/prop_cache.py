@@ -0,0 +1,188 @@
+"""
+系统属性缓存
+
+按设备缓存 getprop 结果。ro.* 属性在设备本次启动期间不会改变，缓存到
+设备重连或重启（boot_id 变化）为止；其他属性按可配置的 TTL 过期，刷新
+时只拉取非 ro.* 部分。另提供按属性名的精确查询，避免完整 getprop。
+
+每次访问设备都同时读取 boot_id。设备跟踪关闭时重连不会通知缓存，因此
+boot_id 的确认同样按 TTL 过期：过期后命中的 ro.* 属性随下一次查询重新
+读取并校验 boot_id，设备重启过则丢弃该设备的全部缓存。
+"""
+
+import os
+import shlex
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 非 ro.* 属性的缓存时间（秒）
+VOLATILE_TTL = float(os.environ.get('ADB_MCP_PROP_TTL', '5'))
+
+BOOT_ID_PATH = '/proc/sys/kernel/random/boot_id'
+
+ShellRunner = Callable[[List[str], Optional[str]], Tuple[bool, str, str]]
+
+
+def parse_getprop(stdout: str) -> Dict[str, str]:
+    """解析 getprop 输出，格式: [key]: [value]"""
+    info = {}
+    for line in stdout.split('\n'):
+        if line.strip() and line.startswith('[') and ']:' in line:
+            key_end = line.find(']:')
+            key = line[1:key_end]
+            value = line[key_end + 3:].strip()
+            if value.startswith('[') and value.endswith(']'):
+                value = value[1:-1]
+            info[key] = value
+    return info
+
+
+def is_immutable(key: str) -> bool:
+    return key.startswith('ro.')
+
+
+class _DeviceProps:
+    def __init__(self, boot_id: str):
+        self.boot_id = boot_id
+        self.immutable: Dict[str, str] = {}
+        self.volatile: Dict[str, str] = {}
+        self.volatile_fetched_at = 0.0
+        # 最近一次确认 boot_id 未变的时间
+        self.verified_at = time.monotonic()
+        self.complete = False
+
+
+class PropertyCache:
+    """按设备缓存系统属性"""
+
+    def __init__(self, run_shell: ShellRunner, volatile_ttl: float = VOLATILE_TTL):
+        self.run_shell = run_shell
+        self.volatile_ttl = volatile_ttl
+        self._devices: Dict[Optional[str], _DeviceProps] = {}
+        self._locks: Dict[Optional[str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _device_lock(self, device_id: Optional[str]) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(device_id, threading.Lock())
+
+    def invalidate(self, device_id: Optional[str] = None):
+        """丢弃设备的全部缓存（设备重连时调用）；device_id 为 None 时清空所有设备"""
+        with self._lock:
+            if device_id is None:
+                self._devices.clear()
+            else:
+                self._devices.pop(device_id, None)
+                self._devices.pop(None, None)
+
+    def _fetch(self, script: str, device_id: Optional[str]) -> Tuple[bool, str, str, str]:
+        """执行以 boot_id 开头的脚本，返回 (success, boot_id, 其余输出, stderr)"""
+        success, stdout, stderr = self.run_shell([script], device_id)
+        if not success:
+            return False, "", "", stderr or stdout
+        boot_id, _, rest = stdout.partition('\n')
+        return True, boot_id.strip(), rest, ""
+
+    def _entry_for_boot(self, device_id: Optional[str], boot_id: str) -> _DeviceProps:
+        with self._lock:
+            entry = self._devices.get(device_id)
+            if entry is None or entry.boot_id != boot_id:
+                # 首次访问或设备已重启，ro.* 缓存失效
+                entry = _DeviceProps(boot_id)
+                self._devices[device_id] = entry
+            return entry
+
+    def get_all(self, device_id: Optional[str] = None) -> Tuple[bool, Dict[str, str], str]:
+        """
+        获取设备全部属性
+
+        Returns:
+            (success, props, stderr)
+        """
+        with self._device_lock(device_id):
+            with self._lock:
+                entry = self._devices.get(device_id)
+
+            now = time.monotonic()
+            if entry is not None and entry.complete and now - entry.volatile_fetched_at < self.volatile_ttl:
+                return True, {**entry.immutable, **entry.volatile}, ""
+
+            if entry is not None and entry.complete:
+                # 只刷新非 ro.* 属性，同时校验 boot_id
+                success, boot_id, rest, stderr = self._fetch(
+                    f"cat {BOOT_ID_PATH}; getprop | grep -v '^\\[ro\\.'", device_id)
+                if not success:
+                    return False, {}, stderr
+                if boot_id == entry.boot_id:
+                    entry.volatile = parse_getprop(rest)
+                    entry.volatile_fetched_at = entry.verified_at = time.monotonic()
+                    return True, {**entry.immutable, **entry.volatile}, ""
+
+            success, boot_id, rest, stderr = self._fetch(f"cat {BOOT_ID_PATH}; getprop", device_id)
+            if not success:
+                return False, {}, stderr
+            entry = self._entry_for_boot(device_id, boot_id)
+            props = parse_getprop(rest)
+            entry.immutable = {k: v for k, v in props.items() if is_immutable(k)}
+            entry.volatile = {k: v for k, v in props.items() if not is_immutable(k)}
+            entry.volatile_fetched_at = entry.verified_at = time.monotonic()
+            entry.complete = True
+            return True, props, ""
+
+    def get(self, keys: Iterable[str], device_id: Optional[str] = None) -> Tuple[bool, Dict[str, str], str]:
+        """
+        获取指定属性
+
+        已缓存的 ro.* 属性和未过期的其他属性直接返回，其余属性通过一条
+        `getprop <key>` 组合命令一次取回。boot_id 的确认超过 TTL 时，命中的
+        ro.* 属性也随这条命令重新读取，以便发现设备重启。不存在的属性值为
+        空字符串。
+
+        Returns:
+            (success, props, stderr)
+        """
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            entry = self._devices.get(device_id)
+
+        result: Dict[str, str] = {}
+        missing: List[str] = []
+        now = time.monotonic()
+        verified = entry is not None and now - entry.verified_at < self.volatile_ttl
+        for key in keys:
+            if verified and is_immutable(key) and (entry.complete or key in entry.immutable):
+                result[key] = entry.immutable.get(key, '')
+            elif (entry is not None and entry.complete and key in entry.volatile
+                  and now - entry.volatile_fetched_at < self.volatile_ttl):
+                result[key] = entry.volatile[key]
+            else:
+                missing.append(key)
+
+        if not missing:
+            return True, result, ""
+
+        marker = '__ADB_MCP_PROP__'
+        script = f"cat {BOOT_ID_PATH}; " + '; '.join(
+            f"echo {marker}{shlex.quote(key)}; getprop {shlex.quote(key)}" for key in missing)
+        success, boot_id, rest, stderr = self._fetch(script, device_id)
+        if not success:
+            return False, result, stderr
+
+        fetched: Dict[str, str] = {}
+        current = None
+        for line in rest.split('\n'):
+            if line.startswith(marker):
+                current = line[len(marker):]
+                fetched[current] = ''
+            elif current is not None:
+                fetched[current] = (fetched[current] + '\n' + line) if fetched[current] else line
+
+        entry = self._entry_for_boot(device_id, boot_id)
+        entry.verified_at = time.monotonic()
+        for key in missing:
+            value = fetched.get(key, '').strip()
+            result[key] = value
+            if is_immutable(key):
+                entry.immutable[key] = value
+        return True, result, ""
@@ -0,0 +1,165 @@
+"""
+大结果落盘存储
+
+超过阈值的工具输出不直接内联返回，而是写入本地临时文件并以内存映射
+方式打开，调用方拿到句柄后按行分页读取。写入时建立行首偏移索引，分页
+读取只映射所需的片段，不把整个结果读回内存。存储按最近使用顺序（LRU）
+淘汰，同时限制结果个数和总字节数；进程退出时删除存储目录。
+"""
+
+import atexit
+import mmap
+import os
+import shutil
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .dir_sync import CACHE_DIR
+
+# 超过该字节数（UTF-8）的结果写入存储，只内联返回预览
+INLINE_LIMIT = int(os.environ.get('ADB_MCP_RESULT_INLINE_LIMIT', '32768'))
+# 存储占用的总字节数上限
+STORE_BYTES = int(os.environ.get('ADB_MCP_RESULT_STORE_BYTES', str(256 * 1024 * 1024)))
+# 最多保留的结果个数
+STORE_ENTRIES = 64
+# 内联预览的行数
+PREVIEW_LINES = 40
+
+
+class _StoredResult:
+    def __init__(self, handle: str, label: str, path: str):
+        self.handle = handle
+        self.label = label
+        self.path = path
+        self.created_at = time.time()
+        self._file = open(path, 'rb')
+        self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.map)
+        # 每行行首的字节偏移
+        self.offsets = array('Q', [0])
+        pos = self.map.find(b'\n')
+        while pos != -1 and pos + 1 < self.size:
+            self.offsets.append(pos + 1)
+            pos = self.map.find(b'\n', pos + 1)
+
+    @property
+    def lines(self) -> int:
+        return len(self.offsets)
+
+    def close(self):
+        self.map.close()
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class ResultStore:
+    """按句柄保存大结果，LRU 淘汰"""
+
+    def __init__(self, max_bytes: int = STORE_BYTES, max_entries: int = STORE_ENTRIES,
+                 inline_limit: int = INLINE_LIMIT):
+        self.max_bytes = max_bytes
+        self.max_entries = max(1, max_entries)
+        self.inline_limit = inline_limit
+        self._entries: 'OrderedDict[str, _StoredResult]' = OrderedDict()
+        self._total = 0
+        self._dir: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _directory(self) -> str:
+        if self._dir is None:
+            root = os.path.join(CACHE_DIR, 'results')
+            os.makedirs(root, exist_ok=True)
+            _remove_stale(root)
+            self._dir = os.path.join(root, str(os.getpid()))
+            os.makedirs(self._dir, exist_ok=True)
+            atexit.register(self.close)
+        return self._dir
+
+    def put(self, text: str, label: str = "") -> Dict:
+        """保存结果，返回 {'handle', 'label', 'lines', 'bytes'}"""
+        data = text.encode('utf-8')
+        with self._lock:
+            handle = uuid.uuid4().hex[:12]
+            path = os.path.join(self._directory(), handle)
+            with open(path, 'wb') as f:
+                f.write(data if data else b'\n')
+            entry = _StoredResult(handle, label, path)
+            self._entries[handle] = entry
+            self._total += entry.size
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._total > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._total -= evicted.size
+                evicted.close()
+            return {'handle': handle, 'label': label, 'lines': entry.lines, 'bytes': entry.size}
+
+    def read(self, handle: str, offset: int = 0, limit: int = 200, max_bytes: Optional[int] = None) -> Dict:
+        """
+        按行分页读取
+
+        Args:
+            offset: 起始行号（从 0 开始）
+            limit: 最多返回的行数
+            max_bytes: 单页最多返回的字节数，默认同内联阈值；至少返回一行（过长时截断）
+
+        Returns:
+            {'text', 'offset', 'next_offset'（读完时为 None）, 'lines', 'bytes', 'label'}；
+            句柄不存在（已淘汰或无效）时返回 {'error': ...}
+        """
+        max_bytes = max_bytes or self.inline_limit
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                return {'error': f"结果不存在或已被淘汰: {handle}"}
+            self._entries.move_to_end(handle)
+
+            total = entry.lines
+            offset = min(max(0, offset), total)
+            if offset >= total:
+                return {'text': '', 'offset': offset, 'next_offset': None,
+                        'lines': total, 'bytes': entry.size, 'label': entry.label}
+
+            start = entry.offsets[offset]
+            bound = start + max_bytes
+            # 行首不超过字节上限的最后一行之前的行都能完整放入本页
+            fit = total if entry.size <= bound else bisect_right(entry.offsets, bound) - 1
+            end_line = min(total, offset + max(1, limit), fit)
+            if end_line <= offset:
+                # 单行超过上限，截断该行
+                end_line, end = offset + 1, bound
+            else:
+                end = entry.offsets[end_line] if end_line < total else entry.size
+            text = entry.map[start:end].decode('utf-8', errors='replace').rstrip('\n')
+            return {'text': text, 'offset': offset, 'next_offset': end_line if end_line < total else None,
+                    'lines': total, 'bytes': entry.size, 'label': entry.label}
+
+    def close(self):
+        """删除所有结果及存储目录"""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.close()
+            self._entries.clear()
+            self._total = 0
+            if self._dir is not None:
+                shutil.rmtree(self._dir, ignore_errors=True)
+                self._dir = None
+
+
+def _remove_stale(root: str):
+    """清理已退出进程遗留的存储目录"""
+    for name in os.listdir(root):
+        if not name.isdigit() or int(name) == os.getpid():
+            continue
+        try:
+            os.kill(int(name), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        except OSError:
+            pass
@@ -0,0 +1,323 @@
+"""
+长驻 adb shell 会话
+
+每个设备保持少量交互式 `adb shell` 进程，命令通过标准输入写入，stdout 与
+stderr 分别以带随机标记的哨兵行分帧（stdout 的哨兵携带退出码），避免每条
+命令都重新建立 shell。
+
+- 每条命令在子 shell `( ... )` 中执行，cd、变量和 exit 不会影响会话本身；
+- 一个会话同一时间只借给一个调用方，调用方取消时终止的只是自己借用的会话；
+- 会话都在忙时最多等待 SESSION_WAIT 秒，仍借不到则由调用方改用单次 adb shell，
+  耗时长的命令不会阻塞同一设备上的输入等短命令；
+- 命令写入会话之后出现的任何错误都不会重试，避免点击、删除等操作被重复执行；
+- 不支持 shell_v2 的设备（Android 7 之前）上 adb shell 会把 stderr 合并进
+  stdout，无法按两个管道分帧。会话启动时先探测一次，合并时该设备不再使用
+  会话，改用单次 adb shell。
+
+会话意外退出时在下一次借用时重建，空闲超时后自动关闭。
+"""
+
+import os
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .instrumentation import get_instrumentation
+
+# 空闲多久（秒）后关闭会话
+IDLE_TIMEOUT = float(os.environ.get('ADB_MCP_SHELL_IDLE_TIMEOUT', '300'))
+# 每台设备最多保持的会话数
+SESSIONS_PER_DEVICE = max(1, int(os.environ.get('ADB_MCP_SHELL_SESSIONS_PER_DEVICE', '2')))
+# 所有会话都在忙时最多等待的时间（秒）
+SESSION_WAIT = 0.5
+# 会话启动后探测 stdout/stderr 是否分离的超时（秒）
+PROBE_TIMEOUT = 10.0
+
+
+class ShellSessionError(Exception):
+    """命令已写入会话后会话断开或超时，命令可能已执行，不能重试"""
+
+
+class ShellSessionUnavailable(ShellSessionError):
+    """会话无法启动或命令未能写入，命令没有执行，可以改用其他方式执行"""
+
+
+class ShellSessionUnsupported(ShellSessionUnavailable):
+    """设备的 adb shell 合并了 stdout 与 stderr，无法在会话中分帧"""
+
+
+class _Pipe:
+    """后台线程读取的输出管道，按哨兵切分"""
+
+    def __init__(self, stream):
+        self._chunks: "queue.Queue[bytes]" = queue.Queue()
+        self._buffer = b''
+        threading.Thread(target=self._pump, args=(stream, self._chunks), daemon=True).start()
+
+    @staticmethod
+    def _pump(stream, chunks: "queue.Queue[bytes]"):
+        while True:
+            data = stream.read1(65536) if hasattr(stream, 'read1') else stream.read(65536)
+            chunks.put(data)
+            if not data:
+                return
+
+    def close(self):
+        """让正在等待的 read_frame 立即结束，不必等管道另一端全部关闭"""
+        self._chunks.put(b'')
+
+    def read_frame(self, marker: bytes, deadline: float) -> Tuple[bytes, bytes]:
+        """读取到 marker 之后的换行为止，返回 (marker 之前的内容, marker 与换行之间的内容)"""
+        while True:
+            index = self._buffer.find(marker)
+            if index >= 0:
+                end = self._buffer.find(b'\n', index + len(marker))
+                if end >= 0:
+                    frame, trailer = self._buffer[:index], self._buffer[index + len(marker):end]
+                    self._buffer = self._buffer[end + 1:]
+                    return frame, trailer
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ShellSessionError("Command timed out")
+            try:
+                chunk = self._chunks.get(timeout=remaining)
+            except queue.Empty:
+                raise ShellSessionError("Command timed out")
+            if not chunk:
+                raise ShellSessionError(self._buffer.decode('utf-8', errors='replace').strip()
+                                        or "shell session closed")
+            self._buffer += chunk
+
+
+class ShellSession:
+    """单个设备上的一个长驻 adb shell 会话"""
+
+    def __init__(self, device_id: Optional[str] = None):
+        self.device_id = device_id
+        self.last_used = time.monotonic()
+        self.in_use = False
+        self._process: Optional[subprocess.Popen] = None
+        self._stdout: Optional[_Pipe] = None
+        self._stderr: Optional[_Pipe] = None
+        self._token = uuid.uuid4().hex
+        self._counter = 0
+        # 探测到 stdout 与 stderr 被合并后置为 True，会话不再可用
+        self.unsupported = False
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self):
+        cmd = ['adb']
+        if self.device_id:
+            cmd += ['-s', self.device_id]
+        cmd.append('shell')
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0
+            )
+        except OSError as e:
+            raise ShellSessionUnavailable(str(e))
+        get_instrumentation().count_spawn('shell_session')
+
+        self._process = process
+        # 管道读取放在后台线程，保证在所有平台上都能按超时等待
+        self._stdout = _Pipe(process.stdout)
+        self._stderr = _Pipe(process.stderr)
+        self._probe()
+
+    def _probe(self):
+        """
+        确认 stdout 与 stderr 分别到达两个管道
+
+        先向 stderr 再向 stdout 输出标记：两者被合并时 stderr 的标记出现在
+        stdout 标记之前的内容中。
+        """
+        marker = f"__ADB_MCP_{self._token}_PROBE__"
+        deadline = time.monotonic() + PROBE_TIMEOUT
+        try:
+            self._process.stdin.write(f"printf '\\n{marker}E\\n' >&2; printf '\\n{marker}O\\n'\n".encode())
+            self._process.stdin.flush()
+            before, _ = self._stdout.read_frame(f"\n{marker}O".encode(), deadline)
+            if f"{marker}E".encode() in before:
+                self.unsupported = True
+                raise ShellSessionUnsupported("adb shell merges stderr into stdout (no shell_v2)")
+            self._stderr.read_frame(f"\n{marker}E".encode(), deadline)
+        except ShellSessionUnavailable:
+            self.kill()
+            raise
+        except (ShellSessionError, OSError, ValueError) as e:
+            # 命令尚未写入，调用方可以改用其他方式执行
+            self.kill()
+            raise ShellSessionUnavailable(str(e) or "shell session closed")
+
+    def kill(self):
+        """终止会话进程，下一次借用时重新建立"""
+        process = self._process
+        self._process = None
+        if process is not None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+            self._stdout.close()
+            self._stderr.close()
+
+    def run(self, command: str, timeout: float = 30) -> Tuple[int, str, str]:
+        """
+        在会话中执行一条命令；调用方需先通过 ShellSessionPool.checkout 独占该会话
+
+        Returns:
+            (exit_code, stdout, stderr)
+
+        Raises:
+            ShellSessionUnsupported: 设备的 adb shell 合并了 stdout 与 stderr（命令没有执行）
+            ShellSessionUnavailable: 会话无法启动或命令未写入（命令没有执行）
+            ShellSessionError: 写入后会话断开或命令超时（此时会话已被终止）
+        """
+        if self.unsupported:
+            raise ShellSessionUnsupported("adb shell merges stderr into stdout (no shell_v2)")
+        if not self.alive:
+            self._start()
+        process = self._process
+        self._counter += 1
+        sentinel = f"__ADB_MCP_{self._token}_{self._counter}__"
+        script = (f"( {command}\n) </dev/null; "
+                  f"printf '\\n{sentinel}:%d\\n' $?; printf '\\n{sentinel}\\n' >&2\n")
+        try:
+            if process is None:
+                raise ValueError("shell session closed")
+            process.stdin.write(script.encode('utf-8'))
+            process.stdin.flush()
+        except (OSError, ValueError) as e:
+            # 写入失败说明 shell 已经退出，命令没有被读取
+            self.kill()
+            raise ShellSessionUnavailable(str(e) or "shell session closed")
+
+        deadline = time.monotonic() + timeout
+        try:
+            stdout, exit_code = self._stdout.read_frame(f"\n{sentinel}:".encode(), deadline)
+            stderr, _ = self._stderr.read_frame(f"\n{sentinel}".encode(), deadline)
+        except ShellSessionError:
+            self.kill()
+            raise
+        finally:
+            self.last_used = time.monotonic()
+        return (int(exit_code.strip() or b'0'),
+                stdout.decode('utf-8', errors='replace'),
+                stderr.decode('utf-8', errors='replace'))
+
+
+class ShellSessionPool:
+    """按设备管理少量 ShellSession 并借给调用方独占使用，后台线程回收空闲会话"""
+
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT, per_device: int = SESSIONS_PER_DEVICE,
+                 wait: float = SESSION_WAIT):
+        self.idle_timeout = idle_timeout
+        self.per_device = per_device
+        self.wait = wait
+        self._sessions: Dict[Optional[str], List[ShellSession]] = {}
+        # adb shell 合并 stdout 与 stderr 的设备，不再为其建立会话
+        self._unsupported: Set[Optional[str]] = set()
+        self._cond = threading.Condition()
+        self._reaper: Optional[threading.Thread] = None
+
+    def _acquire(self, device_id: Optional[str], wait: float) -> Optional[ShellSession]:
+        deadline = time.monotonic() + wait
+        with self._cond:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, daemon=True)
+                self._reaper.start()
+            while True:
+                if device_id in self._unsupported:
+                    return None
+                sessions = self._sessions.setdefault(device_id, [])
+                # 优先借用已建立的会话
+                idle = [s for s in sessions if not s.in_use]
+                idle.sort(key=lambda s: not s.alive)
+                if idle:
+                    session = idle[0]
+                elif len(sessions) < self.per_device:
+                    session = ShellSession(device_id)
+                    sessions.append(session)
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+                    continue
+                session.in_use = True
+                return session
+
+    def _release(self, session: ShellSession):
+        with self._cond:
+            session.in_use = False
+            if session.unsupported:
+                self._unsupported.add(session.device_id)
+                sessions = self._sessions.get(session.device_id, [])
+                if session in sessions:
+                    sessions.remove(session)
+                self._cond.notify_all()
+            else:
+                self._cond.notify()
+
+    @contextmanager
+    def checkout(self, device_id: Optional[str], wait: Optional[float] = None) -> Iterator[Optional[ShellSession]]:
+        """独占借用设备的一个会话；等待 wait 秒后仍全部在忙时得到 None"""
+        session = self._acquire(device_id, self.wait if wait is None else wait)
+        try:
+            yield session
+        finally:
+            if session is not None:
+                self._release(session)
+
+    def run(self, command: str, device_id: Optional[str] = None,
+            timeout: float = 30) -> Tuple[int, str, str]:
+        """
+        借用会话执行命令
+
+        Raises:
+            ShellSessionUnavailable: 会话都在忙或无法启动（命令没有执行）
+            ShellSessionError: 命令已写入后失败（不会重试）
+        """
+        with self.checkout(device_id) as session:
+            if session is None:
+                raise ShellSessionUnavailable("all shell sessions are busy")
+            return session.run(command, timeout)
+
+    def close(self, device_id: Optional[str]):
+        """关闭设备的会话（设备重连时调用），并重新探测其是否支持会话"""
+        with self._cond:
+            sessions = self._sessions.pop(device_id, [])
+            self._unsupported.discard(device_id)
+        for session in sessions:
+            session.kill()
+
+    def close_all(self):
+        with self._cond:
+            sessions = [s for group in self._sessions.values() for s in group]
+            self._sessions.clear()
+            self._unsupported.clear()
+        for session in sessions:
+            session.kill()
+
+    def _reap(self):
+        interval = max(1.0, min(self.idle_timeout / 4, 30.0))
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            with self._cond:
+                idle = [s for group in self._sessions.values() for s in group
+                        if s.alive and not s.in_use and now - s.last_used > self.idle_timeout]
+            for session in idle:
+                session.kill()
@@ -0,0 +1,186 @@
+"""
+tar 流式批量传输
+
+大量小文件逐个走 sync 协议时，每个文件都要一次往返，吞吐量很低。这里把
+整个目录打包成一个 tar 流：拉取时设备端 `tar -c` 的输出经 exec-out 边接收
+边解包，推送时本地边打包边写入设备端 `tar -x` 的标准输入。归档不落盘、
+不整体缓存在内存中，可选 gzip 压缩。
+
+exec-out 不返回退出码，设备端打包命令在归档之后追加一行状态（tar 的退出码
+与错误输出），主机端从流的末尾取出，据此判断拉取是否完整。
+"""
+
+import os
+import posixpath
+import shlex
+import tarfile
+import threading
+from typing import Callable, Optional, Tuple
+
+# 解包时拒绝绝对路径、`..` 以及指向目标目录之外的链接
+_DATA_FILTER = getattr(tarfile, 'data_filter', None)
+
+# 归档之后的状态行标记，其后为 "<退出码>:<tar 的错误输出>"
+STATUS_MARKER = b'\n__ADB_MCP_TAR_STATUS__:'
+# 为查找状态行保留的流末尾字节数
+_STATUS_TAIL = 16384
+
+
+def device_create_command(remote_path: str, compress: bool) -> str:
+    """设备端打包命令：在父目录下以相对路径打包输出到 stdout，之后追加状态行"""
+    parent = posixpath.dirname(remote_path.rstrip('/')) or '/'
+    name = posixpath.basename(remote_path.rstrip('/'))
+    tar = f"tar -c{'z' if compress else ''}f - -C {shlex.quote(parent)} {shlex.quote(name)}"
+    # tar 的 stdout 经 fd 3 输出归档，stderr 由命令替换收集，不混入归档数据
+    marker = STATUS_MARKER.decode().replace('\n', '\\n')
+    return f"exec 3>&1; err=$({tar} 2>&1 >&3 3>&-); rc=$?; exec 3>&-; printf '{marker}%d:%s' $rc \"$err\""
+
+
+def parse_status(tail: bytes) -> Optional[Tuple[int, str]]:
+    """从流末尾取出状态行，返回 (退出码, 错误输出)；没有状态行（流提前中断）时返回 None"""
+    index = tail.rfind(STATUS_MARKER)
+    if index < 0:
+        return None
+    code, _, message = tail[index + len(STATUS_MARKER):].partition(b':')
+    try:
+        return int(code), message.decode('utf-8', errors='replace').strip()
+    except ValueError:
+        return None
+
+
+class _TailReader:
+    """透传读取并保留最后若干字节"""
+
+    def __init__(self, fileobj, size: int = _STATUS_TAIL):
+        self._fileobj = fileobj
+        self._size = size
+        self.tail = b''
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fileobj.read(size)
+        if data:
+            self.tail = (self.tail + data)[-self._size:]
+        return data
+
+
+def device_extract_command(remote_dir: str, compress: bool) -> str:
+    """设备端解包命令：从 stdin 读取归档并解包到 remote_dir"""
+    quoted = shlex.quote(remote_dir)
+    return f"mkdir -p {quoted} && tar -x{'z' if compress else ''}f - -C {quoted}"
+
+
+def _rename(name: str, old_root: str, new_root: str) -> str:
+    if name == old_root:
+        return new_root
+    if name.startswith(old_root + '/'):
+        return new_root + name[len(old_root):]
+    return name
+
+
+def extract_stream(fileobj, dest_dir: str, compress: bool, rename: Optional[Tuple[str, str]] = None) -> Tuple[int, int]:
+    """
+    从可读的二进制流中逐个成员解包到 dest_dir
+
+    Args:
+        rename: (归档中的顶层名称, 新名称)，用于拉取到指定的本地文件/目录名
+
+    Returns:
+        (文件数, 字节数)
+    """
+    files = total = 0
+    with tarfile.open(fileobj=fileobj, mode='r|gz' if compress else 'r|') as archive:
+        for member in archive:
+            if rename is not None:
+                member.name = _rename(member.name, *rename)
+            if _DATA_FILTER is not None:
+                archive.extract(member, dest_dir, filter='data')
+            else:
+                if member.name.startswith('/') or '..' in member.name.split('/'):
+                    raise tarfile.TarError(f"unsafe path in archive: {member.name}")
+                archive.extract(member, dest_dir)
+            if member.isfile():
+                files += 1
+                total += member.size
+    # 读完归档末尾的填充块，避免发送方因管道写满而阻塞
+    while fileobj.read(65536):
+        pass
+    return files, total
+
+
+def create_stream(fileobj, local_path: str, arcname: str, compress: bool) -> Tuple[int, int]:
+    """
+    将本地文件或目录打包写入可写的二进制流
+
+    Returns:
+        (文件数, 字节数)
+    """
+    counts = [0, 0]
+
+    def count(info: tarfile.TarInfo) -> tarfile.TarInfo:
+        if info.isfile():
+            counts[0] += 1
+            counts[1] += info.size
+        # 设备上通常不存在与主机相同的用户，不保留属主
+        info.uid = info.gid = 0
+        info.uname = info.gname = ''
+        return info
+
+    with tarfile.open(fileobj=fileobj, mode='w|gz' if compress else 'w|') as archive:
+        archive.add(local_path, arcname=arcname, filter=count)
+    return counts[0], counts[1]
+
+
+def receive_via_pipe(produce: Callable[[object], Tuple[bool, str]], dest_dir: str, compress: bool,
+                     rename: Optional[Tuple[str, str]] = None) -> Tuple[bool, Tuple[int, int], str]:
+    """
+    在后台线程中解包 produce 写入管道的数据
+
+    Args:
+        produce: 以可写文件对象为参数、把 device_create_command 的输出写入其中的函数，
+                 返回 (success, stderr)
+
+    Returns:
+        (success, (文件数, 字节数), 错误信息)；设备端 tar 退出码非 0 或流中没有
+        状态行（传输中断）时视为失败
+    """
+    read_fd, write_fd = os.pipe()
+    reader = os.fdopen(read_fd, 'rb')
+    writer = os.fdopen(write_fd, 'wb')
+    tail = _TailReader(reader)
+    outcome = {}
+
+    def consume():
+        try:
+            outcome['counts'] = extract_stream(tail, dest_dir, compress, rename)
+        except (tarfile.TarError, OSError, EOFError) as e:
+            outcome['error'] = str(e) or e.__class__.__name__
+            # 继续读到流末尾，取出设备端 tar 的状态行
+            try:
+                while tail.read(65536):
+                    pass
+            except OSError:
+                pass
+        finally:
+            reader.close()
+
+    thread = threading.Thread(target=consume, name='adb-tar-extract', daemon=True)
+    thread.start()
+    try:
+        success, stderr = produce(writer)
+    finally:
+        try:
+            writer.close()
+        except OSError:
+            pass
+    thread.join()
+
+    status = parse_status(tail.tail)
+    if status is not None and status[0] != 0:
+        return False, outcome.get('counts', (0, 0)), status[1] or f"tar exited with {status[0]}"
+    if 'error' in outcome:
+        return False, (0, 0), stderr or outcome['error']
+    if not success:
+        return False, outcome.get('counts', (0, 0)), stderr
+    if status is None:
+        return False, outcome['counts'], "tar stream ended before the device reported an exit status"
+    return True, outcome['counts'], ""
@@ -0,0 +1,21 @@
+import pytest
+
+from src.utils.adb_protocol import ADBClient
+from tests.fake_adb_server import FakeADBServer, FakeDevice
+
+
+@pytest.fixture
+def device():
+    return FakeDevice('emulator-5554')
+
+
+@pytest.fixture
+def adb_server(device):
+    server = FakeADBServer([device]).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(adb_server):
+    return ADBClient(adb_server.host, adb_server.port)
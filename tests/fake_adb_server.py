@@ -0,0 +1,284 @@
+"""
+测试用的伪造 adb server
+
+在本地随机端口上实现 adb server 主机协议的一个子集：host:*、host:transport、
+shell,v2,raw: / shell:、exec: 和 sync:（STAT/LIST/RECV/SEND/QUIT）。设备的
+文件系统保存在内存中，shell 命令由测试提供的处理函数应答，不依赖真实设备
+或 adb 可执行文件。
+"""
+
+import socket
+import socketserver
+import stat
+import struct
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+# 处理函数返回 DROP 时，服务器在发送完 stdout 后直接断开连接，不发送退出码
+DROP = object()
+# 处理函数返回 DROP_IN_PAYLOAD 时，shell v2 数据包只发出一部分就断开连接
+DROP_IN_PAYLOAD = object()
+
+ShellResult = Union[Tuple[bytes, bytes, int], object]
+ShellHandler = Callable[[str, bytes], ShellResult]
+
+
+class FakeDevice:
+    """一台伪造的设备：内存文件系统 + shell 命令应答"""
+
+    def __init__(self, serial: str, features: Tuple[str, ...] = ('shell_v2', 'cmd', 'stat_v2'),
+                 state: str = 'device', model: str = 'Pixel'):
+        self.serial = serial
+        self.features = features
+        self.state = state
+        self.model = model
+        # 路径 -> (mode, 内容, mtime)；目录的内容为 b''
+        self.files: Dict[str, Tuple[int, bytes, int]] = {'/': (stat.S_IFDIR | 0o755, b'', 0)}
+        self.responses: Dict[str, ShellResult] = {}
+        self.handler: Optional[ShellHandler] = None
+        # 按顺序记录收到的 shell / exec 命令
+        self.commands: List[str] = []
+        # RECV 在发送这么多字节后返回 FAIL（模拟传输中途失败）
+        self.fail_recv_after: Optional[int] = None
+        # 以这些前缀开头的 shell v2 命令先读完标准输入再执行
+        self.stdin_prefixes: Tuple[str, ...] = ()
+
+    def add_file(self, path: str, data: bytes, mode: int = 0o644, mtime: int = 1700000000):
+        parent = path.rsplit('/', 1)[0] or '/'
+        if parent not in self.files:
+            self.add_dir(parent)
+        self.files[path] = (stat.S_IFREG | mode, data, mtime)
+
+    def add_dir(self, path: str, mode: int = 0o755, mtime: int = 1700000000):
+        parent = path.rsplit('/', 1)[0] or '/'
+        if parent not in self.files:
+            self.add_dir(parent)
+        self.files[path] = (stat.S_IFDIR | mode, b'', mtime)
+
+    def run_shell(self, command: str, stdin: bytes = b'') -> ShellResult:
+        self.commands.append(command)
+        if command in self.responses:
+            return self.responses[command]
+        if self.handler is not None:
+            return self.handler(command, stdin)
+        return b'', f"/system/bin/sh: {command.split()[0] if command.split() else ''}: inaccessible or not found\n".encode(), 127
+
+
+class FakeADBServer:
+    """在后台线程中运行的伪造 adb server"""
+
+    def __init__(self, devices: Optional[List[FakeDevice]] = None):
+        self.devices: Dict[str, FakeDevice] = {d.serial: d for d in (devices or [])}
+        # 按顺序记录每个连接收到的第一个请求
+        self.requests: List[str] = []
+        self.connections = 0
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server.connections += 1
+                try:
+                    _Session(server, self.request).run()
+                except (ConnectionError, OSError):
+                    pass
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        self.host, self.port = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+
+    def add_device(self, device: FakeDevice) -> FakeDevice:
+        self.devices[device.serial] = device
+        return device
+
+    def start(self) -> 'FakeADBServer':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def device_list(self, long_format: bool) -> str:
+        lines = []
+        for d in self.devices.values():
+            line = f"{d.serial:<22}{d.state}"
+            if long_format:
+                line += f" product:sdk model:{d.model} device:generic transport_id:1"
+            lines.append(line + "\n")
+        return ''.join(lines)
+
+
+class _Session:
+    """单个客户端连接上的协议交互"""
+
+    def __init__(self, server: FakeADBServer, sock: socket.socket):
+        self.server = server
+        self.sock = sock
+        self.device: Optional[FakeDevice] = None
+
+    def recv_exactly(self, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("client closed")
+            data += chunk
+        return data
+
+    def read_request(self) -> str:
+        length = int(self.recv_exactly(4), 16)
+        return self.recv_exactly(length).decode('utf-8')
+
+    def okay(self, payload: Optional[str] = None):
+        data = b'OKAY'
+        if payload is not None:
+            encoded = payload.encode('utf-8')
+            data += b'%04x' % len(encoded) + encoded
+        self.sock.sendall(data)
+
+    def fail(self, message: str):
+        encoded = message.encode('utf-8')
+        self.sock.sendall(b'FAIL' + b'%04x' % len(encoded) + encoded)
+
+    def run(self):
+        request = self.read_request()
+        self.server.requests.append(request)
+        devices = self.server.devices
+
+        if request in ('host:devices', 'host:devices-l'):
+            return self.okay(self.server.device_list(request.endswith('-l')))
+        if request == 'host:version':
+            return self.okay('0029')
+        if request == 'host:get-serialno':
+            if len(devices) != 1:
+                return self.fail("more than one device/emulator" if devices else "no devices/emulators found")
+            return self.okay(next(iter(devices)))
+        if request.startswith('host-serial:') and request.endswith(':features'):
+            serial = request[len('host-serial:'):-len(':features')]
+            if serial not in devices:
+                return self.fail(f"device '{serial}' not found")
+            return self.okay(','.join(devices[serial].features))
+        if request == 'host:transport-any':
+            if len(devices) != 1:
+                return self.fail("more than one device/emulator" if devices else "no devices/emulators found")
+            self.device = next(iter(devices.values()))
+        elif request.startswith('host:transport:'):
+            serial = request[len('host:transport:'):]
+            if serial not in devices:
+                return self.fail(f"device '{serial}' not found")
+            self.device = devices[serial]
+        else:
+            return self.fail(f"unknown host service '{request}'")
+
+        self.okay()
+        service = self.read_request()
+        self.server.requests.append(service)
+        if service.startswith('shell,v2,raw:'):
+            return self.shell_v2(service[len('shell,v2,raw:'):])
+        if service.startswith('shell:'):
+            return self.shell_legacy(service[len('shell:'):])
+        if service.startswith('exec:'):
+            return self.exec(service[len('exec:'):])
+        if service == 'sync:':
+            self.okay()
+            return self.sync()
+        return self.fail(f"unknown service '{service}'")
+
+    def shell_v2(self, command: str):
+        self.okay()
+        # 读取 stdin 直到 CLOSE_STDIN
+        stdin = b''
+        if command.startswith(self.device.stdin_prefixes):
+            while True:
+                packet_id, length = struct.unpack('<BI', self.recv_exactly(5))
+                payload = self.recv_exactly(length) if length else b''
+                if packet_id == 0:
+                    stdin += payload
+                elif packet_id == 4:
+                    break
+        result = self.device.run_shell(command, stdin)
+        if result is DROP:
+            self.sock.sendall(struct.pack('<BI', 1, 4) + b'part')
+            self.sock.shutdown(socket.SHUT_RDWR)
+            return
+        if result is DROP_IN_PAYLOAD:
+            self.sock.sendall(struct.pack('<BI', 1, 100) + b'part')
+            self.sock.shutdown(socket.SHUT_RDWR)
+            return
+        stdout, stderr, exit_code = result
+        if stdout:
+            self.sock.sendall(struct.pack('<BI', 1, len(stdout)) + stdout)
+        if stderr:
+            self.sock.sendall(struct.pack('<BI', 2, len(stderr)) + stderr)
+        self.sock.sendall(struct.pack('<BI', 3, 1) + bytes([exit_code & 0xff]))
+
+    def shell_legacy(self, command: str):
+        self.okay()
+        result = self.device.run_shell(command)
+        if result is DROP:
+            return
+        stdout, stderr, _ = result
+        self.sock.sendall(stdout + stderr)
+
+    def exec(self, command: str):
+        self.okay()
+        result = self.device.run_shell(command)
+        if result is DROP:
+            return
+        self.sock.sendall(result[0])
+
+    def sync(self):
+        files = self.device.files
+        while True:
+            cmd = self.recv_exactly(4)
+            length = struct.unpack('<I', self.recv_exactly(4))[0]
+            arg = self.recv_exactly(length).decode('utf-8')
+            if cmd == b'QUIT':
+                return
+            if cmd == b'STAT':
+                mode, data, mtime = files.get(arg, (0, b'', 0))
+                self.sock.sendall(b'STAT' + struct.pack('<III', mode, len(data), mtime))
+            elif cmd == b'LIST':
+                prefix = arg.rstrip('/') + '/'
+                for path, (mode, data, mtime) in sorted(files.items()):
+                    name = path[len(prefix):]
+                    if path.startswith(prefix) and name and '/' not in name:
+                        encoded = name.encode('utf-8')
+                        self.sock.sendall(b'DENT' + struct.pack('<IIII', mode, len(data), mtime, len(encoded)) + encoded)
+                self.sock.sendall(b'DONE' + b'\0' * 16)
+            elif cmd == b'RECV':
+                entry = files.get(arg)
+                if entry is None or not stat.S_ISREG(entry[0]):
+                    message = b"No such file or directory"
+                    self.sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+                    return
+                data = entry[1]
+                limit = self.device.fail_recv_after
+                if limit is not None:
+                    self.sock.sendall(b'DATA' + struct.pack('<I', limit) + data[:limit])
+                    message = b"read failed: I/O error"
+                    self.sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+                    return
+                for start in range(0, len(data), 65536):
+                    chunk = data[start:start + 65536]
+                    self.sock.sendall(b'DATA' + struct.pack('<I', len(chunk)) + chunk)
+                self.sock.sendall(b'DONE' + struct.pack('<I', 0))
+            elif cmd == b'SEND':
+                path, mode = arg.rsplit(',', 1)
+                data = b''
+                while True:
+                    kind = self.recv_exactly(4)
+                    value = struct.unpack('<I', self.recv_exactly(4))[0]
+                    if kind == b'DONE':
+                        break
+                    data += self.recv_exactly(value)
+                self.device.add_file(path, data, int(mode) & 0o7777, value)
+                self.sock.sendall(b'OKAY' + struct.pack('<I', 0))
+            else:
+                message = b"unknown sync command"
+                self.sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+                return
@@ -0,0 +1,214 @@
+import os
+import stat
+
+import pytest
+
+from src.utils.adb_protocol import ADBProtocolError
+from src.utils import adb_helper
+from src.utils.adb_helper import ADBHelper
+from src.utils.command_cache import CommandCache
+from tests.fake_adb_server import DROP, DROP_IN_PAYLOAD, FakeDevice
+
+
+# ==================== host: ====================
+
+def test_devices_long_format(client):
+    listing = client.devices()
+    assert listing.startswith('emulator-5554')
+    assert 'model:Pixel' in listing
+
+
+def test_resolve_serial_uses_get_serialno(client, adb_server):
+    assert client.resolve_serial(None) == 'emulator-5554'
+    assert client.resolve_serial('other') == 'other'
+    assert adb_server.requests == ['host:get-serialno']
+
+
+def test_features_are_cached_per_device(client, adb_server):
+    assert 'shell_v2' in client.features('emulator-5554')
+    client.features('emulator-5554')
+    assert adb_server.requests.count('host-serial:emulator-5554:features') == 1
+
+    client.forget_device('emulator-5554')
+    client.features('emulator-5554')
+    assert adb_server.requests.count('host-serial:emulator-5554:features') == 2
+
+
+def test_host_request_failure_raises(client, adb_server, device):
+    adb_server.add_device(FakeDevice('emulator-5556'))
+    with pytest.raises(ADBProtocolError, match='more than one device'):
+        client.resolve_serial(None)
+
+
+# ==================== transport ====================
+
+def test_transport_to_unknown_serial_raises(client):
+    with pytest.raises(ADBProtocolError, match="device 'nope' not found"):
+        client.open_service('nope', 'shell:true')
+
+
+def test_transport_any_selects_only_device(client, adb_server, device):
+    device.responses['echo hi'] = (b'hi\n', b'', 0)
+    conn = client.open_service(None, 'exec:echo hi')
+    try:
+        assert conn.read_all() == b'hi\n'
+    finally:
+        conn.close()
+    assert adb_server.requests[:2] == ['host:transport-any', 'exec:echo hi']
+
+
+# ==================== shell,v2 ====================
+
+def test_shell_v2_separates_streams_and_exit_code(client, device):
+    device.responses['ls /nope'] = (b'out\n', b'ls: /nope: No such file or directory\n', 1)
+    exit_code, stdout, stderr = client.shell('emulator-5554', 'ls /nope')
+    assert exit_code == 1
+    assert stdout == b'out\n'
+    assert stderr == b'ls: /nope: No such file or directory\n'
+
+
+def test_shell_v2_writes_stdin(client, device):
+    device.stdin_prefixes = ('cat',)
+    device.handler = lambda command, stdin: (stdin.upper(), b'', 0)
+    payload = b'x' * 40000  # 超过单个 stdin 包的大小，需要分包
+
+    exit_code, stdout, _ = client.shell('emulator-5554', 'cat', stdin_writer=lambda w: w.write(payload))
+    assert exit_code == 0
+    assert stdout == payload.upper()
+
+
+def test_iter_shell_streams_and_returns_exit_code(client, device):
+    device.responses['logcat -d'] = (b'line1\nline2\n', b'warn', 3)
+    chunks = client.iter_shell('emulator-5554', 'logcat -d')
+    output = []
+    while True:
+        try:
+            output.append(next(chunks))
+        except StopIteration as stop:
+            assert stop.value == (3, b'warn')
+            break
+    assert b''.join(output) == b'line1\nline2\n'
+
+
+def test_shell_v2_connection_drop_is_an_error(client, device):
+    device.responses['input tap 1 2'] = DROP
+    with pytest.raises(ADBProtocolError, match='before the command exited'):
+        client.shell('emulator-5554', 'input tap 1 2')
+
+
+def test_iter_shell_connection_drop_is_an_error(client, device):
+    device.responses['cat big'] = DROP
+    chunks = client.iter_shell('emulator-5554', 'cat big')
+    assert next(chunks) == b'part'
+    with pytest.raises(ADBProtocolError):
+        next(chunks)
+
+
+def test_connection_drop_inside_payload_is_an_error(client, device):
+    device.responses['input tap 1 2'] = DROP_IN_PAYLOAD
+    with pytest.raises(ADBProtocolError, match='before the command exited'):
+        client.shell('emulator-5554', 'input tap 1 2')
+
+
+def test_helper_does_not_rerun_command_after_drop(client, device, monkeypatch):
+    monkeypatch.setattr(ADBHelper, '_client', client)
+    monkeypatch.setattr(ADBHelper, '_command_cache', CommandCache(enabled=False))
+    monkeypatch.setattr(adb_helper, 'ADB_TRANSPORT', 'auto')
+    monkeypatch.setattr(ADBHelper, '_run_subprocess_command',
+                        staticmethod(lambda cmd, timeout=30: pytest.fail("command re-run through adb client")))
+    device.responses['input tap 1 2'] = DROP_IN_PAYLOAD
+    success, _, error = ADBHelper.run_adb_command(['-s', 'emulator-5554', 'shell', 'input tap 1 2'])
+    assert not success and 'before the command exited' in error
+    assert device.commands == ['input tap 1 2']
+
+
+def test_legacy_shell_without_shell_v2(adb_server, client):
+    old = adb_server.add_device(FakeDevice('old-device', features=('cmd',)))
+    old.responses['getprop ro.x'] = (b'1\n', b'', 5)
+    exit_code, stdout, stderr = client.shell('old-device', 'getprop ro.x')
+    assert (exit_code, stdout, stderr) == (0, b'1\n', b'')
+    assert 'shell:getprop ro.x' in adb_server.requests
+
+
+def test_exec_out_returns_raw_bytes(client, device):
+    device.responses['screencap'] = (b'\x89PNG\r\n\x1a\n\x00\x01', b'', 0)
+    assert client.exec_out('emulator-5554', 'screencap') == b'\x89PNG\r\n\x1a\n\x00\x01'
+
+
+# ==================== sync ====================
+
+def test_sync_stat(client, device):
+    device.add_file('/sdcard/a.txt', b'hello', mode=0o640, mtime=1234)
+    mode, size, mtime = client.stat('emulator-5554', '/sdcard/a.txt')
+    assert stat.S_ISREG(mode) and stat.S_IMODE(mode) == 0o640
+    assert (size, mtime) == (5, 1234)
+    assert client.stat('emulator-5554', '/sdcard/missing') == (0, 0, 0)
+
+
+def test_sync_list(client, device):
+    device.add_file('/sdcard/a.txt', b'hello')
+    device.add_dir('/sdcard/DCIM')
+    session = client.acquire_sync('emulator-5554')
+    try:
+        entries = {e['name']: e for e in session.list('/sdcard')}
+    finally:
+        client.release_sync(session)
+    assert set(entries) == {'a.txt', 'DCIM'}
+    assert stat.S_ISDIR(entries['DCIM']['mode'])
+    assert entries['a.txt']['size'] == 5
+
+
+def test_sync_recv(client, device, tmp_path):
+    data = os.urandom(200000)  # 多个 DATA 包
+    device.add_file('/sdcard/big.bin', data)
+    local = tmp_path / 'big.bin'
+    assert client.pull('emulator-5554', '/sdcard/big.bin', str(local)) == len(data)
+    assert local.read_bytes() == data
+    assert [p.name for p in tmp_path.iterdir()] == ['big.bin']
+
+
+def test_sync_recv_failure_leaves_no_partial_file(client, device, tmp_path):
+    device.add_file('/sdcard/big.bin', b'x' * 1000)
+    device.fail_recv_after = 100
+    local = tmp_path / 'big.bin'
+    local.write_bytes(b'previous')
+
+    with pytest.raises(ADBProtocolError, match='I/O error'):
+        client.pull('emulator-5554', '/sdcard/big.bin', str(local))
+    # 已有文件保持不变，也没有残留的临时文件
+    assert local.read_bytes() == b'previous'
+    assert [p.name for p in tmp_path.iterdir()] == ['big.bin']
+
+
+def test_sync_recv_missing_file(client, tmp_path):
+    with pytest.raises(ADBProtocolError, match='No such file'):
+        client.pull('emulator-5554', '/sdcard/missing', str(tmp_path / 'x'))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sync_send_preserves_mode_and_mtime(client, device, tmp_path):
+    local = tmp_path / 'tool.sh'
+    local.write_bytes(b'#!/bin/sh\necho hi\n' * 5000)
+    os.chmod(local, 0o755)
+    os.utime(local, (1600000000, 1600000000))
+
+    assert client.push('emulator-5554', str(local), '/data/local/tmp/tool.sh') == local.stat().st_size
+    mode, data, mtime = device.files['/data/local/tmp/tool.sh']
+    assert data == local.read_bytes()
+    assert stat.S_IMODE(mode) == 0o755
+    assert mtime == 1600000000
+
+
+def test_sync_sessions_are_pooled(client, adb_server, device):
+    device.add_file('/sdcard/a.txt', b'a')
+    for _ in range(3):
+        client.stat('emulator-5554', '/sdcard/a.txt')
+    assert adb_server.requests.count('sync:') == 1
+
+
+def test_failed_sync_session_is_not_reused(client, adb_server, device, tmp_path):
+    with pytest.raises(ADBProtocolError):
+        client.pull('emulator-5554', '/sdcard/missing', str(tmp_path / 'x'))
+    device.add_file('/sdcard/a.txt', b'a')
+    assert client.stat('emulator-5554', '/sdcard/a.txt')[1] == 1
+    assert adb_server.requests.count('sync:') == 2
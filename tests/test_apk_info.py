@@ -0,0 +1,112 @@
+"""本地 APK 标识：二进制 AndroidManifest.xml 解析与按文件缓存的标识"""
+
+import os
+import struct
+import zipfile
+
+import pytest
+
+from src.utils import apk_info
+from src.utils.apk_info import (ATTR_VERSION_CODE, ATTR_VERSION_CODE_MAJOR, ATTR_VERSION_NAME, NO_ENTRY,
+                                TYPE_INT_DEC, TYPE_STRING, APKError, APKIdentityCache, parse_manifest)
+
+# 前三个字符串与资源映射一一对应
+STRINGS = ['versionCode', 'versionName', 'versionCodeMajor', 'package', 'split', 'manifest',
+           'com.example.app', '1.2.3', 'config.arm64_v8a', 'application']
+RESOURCE_IDS = [ATTR_VERSION_CODE, ATTR_VERSION_NAME, ATTR_VERSION_CODE_MAJOR]
+
+
+def string_pool(strings, utf8):
+    encoded = []
+    for s in strings:
+        if utf8:
+            data = s.encode('utf-8')
+            encoded.append(bytes([len(s), len(data)]) + data + b'\0')
+        else:
+            encoded.append(struct.pack('<H', len(s)) + s.encode('utf-16-le') + b'\0\0')
+    offsets, pos = [], 0
+    for item in encoded:
+        offsets.append(pos)
+        pos += len(item)
+    body = b''.join(encoded)
+    body += b'\0' * (-len(body) % 4)
+    strings_start = 28 + 4 * len(strings)
+    header = struct.pack('<HHIIIIII', 0x0001, 28, strings_start + len(body), len(strings), 0,
+                         0x100 if utf8 else 0, strings_start, 0)
+    return header + struct.pack(f'<{len(strings)}I', *offsets) + body
+
+
+def start_element(name, attributes):
+    attrs = b''.join(struct.pack('<IIIHBBI', NO_ENTRY, attr, raw, 8, 0, value_type, value)
+                     for attr, raw, value_type, value in attributes)
+    ext = struct.pack('<IIHHHHHH', NO_ENTRY, name, 20, 20, len(attributes), 0, 0, 0)
+    return struct.pack('<HHIII', 0x0102, 16, 16 + len(ext) + len(attrs), 1, NO_ENTRY) + ext + attrs
+
+
+def manifest(attributes, utf8=False, element=5):
+    resource_map = struct.pack(f'<HHI{len(RESOURCE_IDS)}I', 0x0180, 8, 8 + 4 * len(RESOURCE_IDS), *RESOURCE_IDS)
+    body = string_pool(STRINGS, utf8) + resource_map + start_element(element, attributes)
+    return struct.pack('<HHI', 0x0003, 8, 8 + len(body)) + body
+
+
+BASE_ATTRIBUTES = [
+    (0, NO_ENTRY, TYPE_INT_DEC, 42),   # versionCode
+    (1, 7, TYPE_STRING, 7),            # versionName
+    (3, 6, TYPE_STRING, 6),            # package
+]
+
+
+@pytest.mark.parametrize('utf8', [False, True])
+def test_parse_manifest(utf8):
+    assert parse_manifest(manifest(BASE_ATTRIBUTES, utf8)) == \
+        {'package': 'com.example.app', 'version_code': 42, 'version_name': '1.2.3', 'split': None}
+
+
+def test_split_and_version_code_major():
+    info = parse_manifest(manifest(BASE_ATTRIBUTES + [(4, 8, TYPE_STRING, 8), (2, NO_ENTRY, TYPE_INT_DEC, 1)]))
+    assert info['split'] == 'config.arm64_v8a'
+    assert info['version_code'] == (1 << 32) | 42
+
+
+def test_malformed_manifests():
+    with pytest.raises(APKError):
+        parse_manifest(b'<?xml version="1.0"?>')
+    with pytest.raises(APKError):
+        parse_manifest(manifest(BASE_ATTRIBUTES, element=9))
+    with pytest.raises(APKError):
+        parse_manifest(manifest(BASE_ATTRIBUTES[:2]))
+
+
+def write_apk(path, attributes=BASE_ATTRIBUTES):
+    with zipfile.ZipFile(path, 'w') as apk:
+        apk.writestr('AndroidManifest.xml', manifest(attributes))
+        apk.writestr('classes.dex', b'dex')
+
+
+def test_identity_cache(tmp_path, monkeypatch):
+    apk = tmp_path / 'app.apk'
+    write_apk(apk)
+    cache = APKIdentityCache(str(tmp_path / 'cache' / 'apk_identity.json'))
+    identity = cache.identify(str(apk))
+    assert identity['package'] == 'com.example.app' and len(identity['md5']) == 32
+    assert identity['size'] == apk.stat().st_size
+
+    # 文件未变时不重新解析，缓存可跨实例复用
+    monkeypatch.setattr(apk_info, 'read_apk_manifest', lambda path: pytest.fail("must use cache"))
+    assert APKIdentityCache(cache.path).identify(str(apk)) == identity
+    monkeypatch.undo()
+
+    write_apk(apk, [(0, NO_ENTRY, TYPE_INT_DEC, 43)] + BASE_ATTRIBUTES[1:])
+    os.utime(apk, ns=(identity['mtime_ns'] + 10 ** 9, identity['mtime_ns'] + 10 ** 9))
+    assert cache.identify(str(apk))['version_code'] == 43
+
+
+def test_identify_without_manifest(tmp_path):
+    apk = tmp_path / 'broken.apk'
+    with zipfile.ZipFile(apk, 'w') as archive:
+        archive.writestr('classes.dex', b'dex')
+    with pytest.raises(APKError):
+        APKIdentityCache(str(tmp_path / 'cache.json')).identify(str(apk))
+    (tmp_path / 'not.apk').write_bytes(b'plain')
+    with pytest.raises(APKError):
+        APKIdentityCache(str(tmp_path / 'cache.json')).identify(str(tmp_path / 'not.apk'))
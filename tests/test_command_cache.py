@@ -0,0 +1,158 @@
+"""命令结果缓存：命令分类、失效规则、TTL、LRU、single-flight 和流式缓存"""
+
+import threading
+import time
+
+import pytest
+
+from src.utils import command_cache
+from src.utils.command_cache import CommandCache, classify, invalidated_tags
+
+
+def counter(result=(True, "out", "")):
+    calls = []
+
+    def execute():
+        calls.append(1)
+        return result
+    return execute, calls
+
+
+@pytest.mark.parametrize('argv, policy', [
+    (['shell', 'getprop', 'ro.product.model'], None),
+    (['shell', 'pm list packages -3'], 'packages'),
+    (['shell', 'dumpsys', 'battery'], 'battery'),
+    (['shell', 'dumpsys', 'package', 'com.foo'], 'packages'),
+    (['shell', 'ls -la /sdcard'], 'listing'),
+    (['shell', 'ls /sdcard | wc -l'], None),
+    (['shell', 'ls', '/sdcard/*.jpg'], None),
+    (['shell', 'cat /proc/$(echo x)'], None),
+    (['shell', 'input', 'tap', '1', '2'], None),
+    (['pull', '/sdcard/a', '/tmp/a'], None),
+])
+def test_classify(argv, policy):
+    result = classify(argv)
+    assert (result.name if result else None) == policy
+
+
+def test_invalidated_tags():
+    assert invalidated_tags(['install', '-r', 'app.apk']) == ['packages']
+    assert invalidated_tags(['shell', 'cd /sdcard && rm a.txt; pm clear com.foo']) == ['files', 'packages']
+    assert invalidated_tags(['reboot']) == ['*']
+    assert invalidated_tags(['shell', 'ls /sdcard']) == []
+
+
+def test_hit_miss_and_write_invalidation():
+    cache = CommandCache()
+    execute, calls = counter()
+    argv = ['shell', 'ls', '/sdcard']
+    assert cache.run('dev', 'adb', argv, execute) == (True, "out", "")
+    cache.run('dev', 'adb', argv, execute)
+    # 不同设备和通道分别缓存
+    cache.run('other', 'adb', argv, execute)
+    cache.run('dev', 'session', argv, execute)
+    assert len(calls) == 3
+
+    cache.run('dev', 'adb', ['shell', 'rm', '/sdcard/a'], lambda: (True, "", ""))
+    cache.run('dev', 'adb', argv, execute)
+    cache.run('other', 'adb', argv, execute)
+    assert len(calls) == 4
+
+    stats = cache.stats(reset=True)
+    assert (stats['hits'], stats['misses'], stats['invalidations']) == (2, 4, 1)
+    assert stats['policies']['listing']['hits'] == 2
+    assert cache.stats()['hits'] == 0
+
+
+def test_failures_are_not_cached_and_ttl_expires(monkeypatch):
+    cache = CommandCache()
+    failing, calls = counter((False, "", "device offline"))
+    cache.run('dev', 'adb', ['shell', 'dumpsys', 'battery'], failing)
+    cache.run('dev', 'adb', ['shell', 'dumpsys', 'battery'], failing)
+    assert len(calls) == 2
+
+    execute, calls = counter()
+    cache.run('dev', 'adb', ['shell', 'dumpsys', 'battery'], execute)
+    now = time.monotonic()
+    monkeypatch.setattr(command_cache.time, 'monotonic', lambda: now + 60)
+    cache.run('dev', 'adb', ['shell', 'dumpsys', 'battery'], execute)
+    assert len(calls) == 2
+
+
+def test_lru_and_size_limits(monkeypatch):
+    cache = CommandCache(max_entries=2)
+    execute, calls = counter()
+    for path in ('/a', '/b', '/a', '/c', '/a', '/b'):
+        cache.run('dev', 'adb', ['shell', 'ls', path], execute)
+    # /b 在放入 /c 时被淘汰
+    assert len(calls) == 4 and cache.stats()['evictions'] == 2
+
+    monkeypatch.setattr(command_cache, 'MAX_ENTRY_BYTES', 2)
+    execute, calls = counter((True, "large", ""))
+    cache.run('dev', 'adb', ['shell', 'ls', '/big'], execute)
+    cache.run('dev', 'adb', ['shell', 'ls', '/big'], execute)
+    assert len(calls) == 2
+
+
+def test_concurrent_requests_execute_once():
+    cache = CommandCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return True, "battery", ""
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.run('dev', 'adb', ['shell', 'dumpsys', 'battery'], slow)))
+               for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1 and results == [(True, "battery", "")] * 4
+    assert cache.stats()['collapsed'] == 3
+
+
+def test_invalidation_during_execution_skips_store():
+    cache = CommandCache()
+
+    def execute():
+        cache.invalidate('dev', ['files'])
+        return True, "stale", ""
+
+    cache.run('dev', 'adb', ['shell', 'ls', '/sdcard'], execute)
+    assert cache.stats()['entries'] == 0
+
+
+def source(chunks, result=(True, "")):
+    yield from chunks
+    return result
+
+
+def test_stream_records_complete_reads_only():
+    cache = CommandCache()
+    opened = []
+
+    def open_source():
+        opened.append(1)
+        return source([b'a\n', b'b\n'])
+
+    argv = ['shell', 'cat', '/proc/meminfo']
+    partial = cache.stream('dev', argv, open_source)
+    next(partial)
+    partial.close()
+    assert b''.join(cache.stream('dev', argv, open_source)) == b'a\nb\n'
+    replay = cache.stream('dev', argv, open_source)
+    assert b''.join(replay) == b'a\nb\n' and len(opened) == 2
+
+    disabled = CommandCache(enabled=False)
+    list(disabled.stream('dev', argv, open_source))
+    list(disabled.stream('dev', argv, open_source))
+    assert len(opened) == 4
@@ -0,0 +1,73 @@
+"""设备状态快照：分段切分与各分段解析为带单位的数值"""
+
+from src.utils.device_snapshot import SECTION_MARKER, SECTIONS, parse_snapshot, snapshot_script
+
+OUTPUT = f"""{SECTION_MARKER}battery
+Current Battery Service state:
+  AC powered: false
+  USB powered: true
+  status: 2
+  health: 2
+  level: 45
+  scale: 50
+  voltage: 4012
+  temperature: 287
+  technology: Li-ion
+{SECTION_MARKER}memory
+MemTotal:        4000000 kB
+MemFree:          200000 kB
+MemAvailable:    1000000 kB
+SwapTotal:        524288 kB
+{SECTION_MARKER}storage
+Filesystem     1K-blocks    Used Available Use% Mounted on
+/dev/block/dm-0  1000     400       600  40% /
+/dev/fuse      2000000 1500000    500000  75% /storage/emulated
+{SECTION_MARKER}props
+ro.product.model=Pixel 7
+sys.boot_completed=1
+unrelated.prop=x
+{SECTION_MARKER}uptime
+12345.67 23456.78
+{SECTION_MARKER}load
+1.25 0.80 0.50 3/1024 4321
+{SECTION_MARKER}thermal
+thermal_zone0 42500 cpu-0
+thermal_zone1 38 battery
+thermal_zone2 n/a skin
+"""
+
+
+def test_script_has_one_marker_per_section():
+    script = snapshot_script(SECTIONS)
+    assert all(f"echo {SECTION_MARKER}{name};" in script for name in SECTIONS)
+    assert snapshot_script(['uptime']) == f"echo {SECTION_MARKER}uptime; cat /proc/uptime 2>/dev/null"
+
+
+def test_parse_snapshot():
+    snapshot = parse_snapshot(OUTPUT.replace('\n', '\r\n'))
+    assert snapshot['battery'] == {'level_percent': 90.0, 'temperature_c': 28.7, 'voltage_v': 4.012,
+                                   'status': 'charging', 'health': 'good', 'plugged': ['USB'],
+                                   'technology': 'Li-ion'}
+    memory = snapshot['memory']
+    assert (memory['total_bytes'], memory['available_bytes'], memory['used_percent']) == \
+        (4000000 * 1024, 1000000 * 1024, 75.0)
+    assert memory['swap_total_bytes'] == 524288 * 1024 and memory['swap_free_bytes'] is None
+
+    assert snapshot['storage'][1] == {'filesystem': '/dev/fuse', 'mounted_on': '/storage/emulated',
+                                      'size_bytes': 2000000 * 1024, 'used_bytes': 1500000 * 1024,
+                                      'available_bytes': 500000 * 1024, 'use_percent': 75.0}
+    assert len(snapshot['storage']) == 2
+    assert snapshot['props'] == {'ro.product.model': 'Pixel 7', 'sys.boot_completed': '1'}
+    assert snapshot['uptime'] == {'uptime_seconds': 12345.67, 'idle_seconds': 23456.78}
+    assert snapshot['load'] == {'load_1m': 1.25, 'load_5m': 0.8, 'load_15m': 0.5,
+                                'running_tasks': 3, 'total_tasks': 1024}
+    assert snapshot['thermal'] == [{'zone': 'thermal_zone0', 'type': 'cpu-0', 'temp_c': 42.5},
+                                   {'zone': 'thermal_zone1', 'type': 'battery', 'temp_c': 38.0}]
+
+
+def test_missing_and_unknown_sections():
+    snapshot = parse_snapshot(f"noise\n{SECTION_MARKER}uptime\n{SECTION_MARKER}bogus\nx\n"
+                              f"{SECTION_MARKER}battery\n  level: 5\n")
+    assert snapshot['uptime'] == {'uptime_seconds': None, 'idle_seconds': None}
+    assert 'bogus' not in snapshot
+    assert snapshot['battery']['level_percent'] == 5.0 and snapshot['battery']['status'] is None
@@ -0,0 +1,42 @@
+"""设备跟踪器：devices -l 行解析与按差异产生的上线、下线、状态变化事件"""
+
+from src.utils.device_tracker import DeviceTracker, parse_device_line
+
+
+def test_parse_device_line():
+    assert parse_device_line('emulator-5554 device product:sdk model:Pixel_7 transport_id:1') == \
+        {'id': 'emulator-5554', 'status': 'device', 'product': 'sdk', 'model': 'Pixel_7', 'transport_id': '1'}
+    assert parse_device_line('192.168.1.5:5555\toffline') == {'id': '192.168.1.5:5555', 'status': 'offline'}
+    assert parse_device_line('* daemon started successfully') is None
+    assert parse_device_line('') is None
+    assert parse_device_line('lonely') is None
+
+
+def test_apply_emits_incremental_events():
+    tracker = DeviceTracker(client=None)
+    events = []
+    tracker.add_listener(lambda event, info: events.append((event, info['id'], info['status'])))
+
+    tracker._apply('A device\nB unauthorized\n')
+    tracker._apply('A device\nB unauthorized\n')
+    tracker._apply('A device\nB device\n')
+    tracker._apply('B device\n')
+
+    assert events == [('connected', 'A', 'device'), ('connected', 'B', 'unauthorized'),
+                      ('changed', 'B', 'device'), ('disconnected', 'A', 'device')]
+    assert tracker.devices() == [{'id': 'B', 'status': 'device'}]
+    assert [e['event'] for e in tracker.recent_events(2)] == ['changed', 'disconnected']
+
+
+def test_listener_errors_do_not_stop_updates():
+    tracker = DeviceTracker(client=None)
+    seen = []
+
+    def broken(event, info):
+        raise RuntimeError("listener failed")
+
+    tracker.add_listener(broken)
+    tracker.add_listener(lambda event, info: seen.append(event))
+    tracker._apply('A device')
+    tracker._apply('')
+    assert seen == ['connected', 'disconnected'] and tracker.devices() == []
@@ -0,0 +1,59 @@
+"""目录增量同步：清单建立与解析、摘要复用、差异比较和本地缓存"""
+
+import os
+
+from src.utils import dir_sync
+from src.utils.dir_sync import (REMOTE_DIR_MARKER, diff_manifests, local_manifest, needs_hash,
+                                parse_hashes, parse_remote_manifest, remote_hash_scripts, reuse_hashes)
+
+
+def test_local_manifest(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'b.txt').write_bytes(b'12345')
+    (tmp_path / 'a.txt').write_bytes(b'')
+    os.utime(tmp_path / 'a.txt', (1700000000, 1700000000))
+    manifest = local_manifest(str(tmp_path))
+    assert manifest['a.txt'] == [0, 1700000000, None]
+    assert manifest['sub/b.txt'][0] == 5 and set(manifest) == {'a.txt', 'sub/b.txt'}
+
+
+def test_parse_remote_manifest():
+    output = f"{REMOTE_DIR_MARKER}\r\n12 1700000000 ./a b.txt\r\n0 1 ./sub/c\nstat: bad\n"
+    assert parse_remote_manifest(output) == (True, {'a b.txt': [12, 1700000000, None], 'sub/c': [0, 1, None]})
+    assert parse_remote_manifest('') == (False, {})
+
+
+def test_hash_scripts_and_parse(monkeypatch):
+    monkeypatch.setattr(dir_sync, 'HASH_BATCH', 2)
+    scripts = list(remote_hash_scripts('/sdcard/my dir', ['a', 'b c', 'd']))
+    assert scripts == ["cd '/sdcard/my dir' && md5sum ./a './b c'", "cd '/sdcard/my dir' && md5sum ./d"]
+    digest = '0' * 32
+    assert parse_hashes(f"{digest}  ./b c\r\nmd5sum: ./x: No such file\n{digest}  d\n") == {'b c': digest, 'd': digest}
+
+
+def test_reuse_hashes_only_for_unchanged_entries():
+    manifest = {'same': [1, 10, None], 'touched': [1, 11, None], 'new': [1, 10, None]}
+    reuse_hashes(manifest, {'same': [1, 10, 'h1'], 'touched': [1, 10, 'h2']})
+    assert manifest == {'same': [1, 10, 'h1'], 'touched': [1, 11, None], 'new': [1, 10, None]}
+
+
+def test_diff_manifests():
+    source = {'a': [1, 10, 'x'], 'b': [2, 20, 'y'], 'c': [3, 30, 'z'], 'd': [4, 40, None]}
+    target = {'a': [1, 99, 'x'], 'b': [2, 20, 'other'], 'c': [9, 30, 'z'], 'd': [4, 40, None], 'e': [1, 1, None]}
+    assert needs_hash(source, target) == ['a', 'b', 'd']
+    # 按摘要比较时修改时间不同但内容相同的文件不传输
+    assert diff_manifests(source, target, checksum=True) == (['b', 'c'], ['e'], 2)
+    assert diff_manifests(source, target, checksum=False) == (['a', 'c'], ['e'], 2)
+
+
+def test_cache_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(dir_sync, 'CACHE_DIR', str(tmp_path / 'cache'))
+    assert dir_sync.load_cache('dev', '/local', '/sdcard/x') == ({}, {})
+    dir_sync.save_cache('dev', '/local', '/sdcard/x/', {'a': [1, 2, 'h']}, {'a': [1, 3, 'h']})
+    assert dir_sync.load_cache('dev', '/local', '/sdcard/x') == ({'a': [1, 2, 'h']}, {'a': [1, 3, 'h']})
+    assert dir_sync.load_cache('other', '/local', '/sdcard/x') == ({}, {})
+
+    path = dir_sync._cache_path('dev', '/local', '/sdcard/x')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{broken')
+    assert dir_sync.load_cache('dev', '/local', '/sdcard/x') == ({}, {})
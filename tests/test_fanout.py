@@ -0,0 +1,132 @@
+"""多设备并发执行：单次调用并发上限、按设备串行、失败隔离与结果形式"""
+
+import threading
+import time
+
+import pytest
+
+from src.utils import fanout
+from src.utils.adb_helper import ADBHelper
+from src.utils.fanout import fan_out, normalize_result
+
+
+class Tracker:
+    """记录并发执行的最大数量，以及同一设备是否被同时占用"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.devices = set()
+        self.overlaps = []
+
+    def __call__(self, device_id, value=None):
+        with self.lock:
+            if device_id in self.devices:
+                self.overlaps.append(device_id)
+            self.devices.add(device_id)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.devices.discard(device_id)
+            self.running -= 1
+        return True, f"{device_id}:{value}", ""
+
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    monkeypatch.setattr(fanout, 'GLOBAL_CONCURRENCY', 4)
+    monkeypatch.setattr(fanout, '_executor', None)
+    yield
+    if fanout._executor is not None:
+        fanout._executor.shutdown(wait=True)
+
+
+@pytest.mark.parametrize('result, expected', [
+    ((True, "out", ""), {'success': True, 'output': "out", 'error': ''}),
+    ((False, "", "offline"), {'success': False, 'output': "", 'error': "offline"}),
+    ({'error': "offline"}, {'success': False, 'output': None, 'error': "offline"}),
+    ({'level': '50'}, {'success': True, 'output': {'level': '50'}, 'error': ''}),
+    ([], {'success': True, 'output': [], 'error': ''}),
+])
+def test_normalize_result(result, expected):
+    assert normalize_result(result) == expected
+
+
+def test_call_limit(small_pool):
+    tracker = Tracker()
+    result = fan_out(tracker, [f"dev{i}" for i in range(8)], {'value': 1}, max_concurrency=2)
+    assert result['succeeded'] == 8 and tracker.peak == 2
+    assert [r['device_id'] for r in result['results']] == [f"dev{i}" for i in range(8)]
+    assert result['results'][0]['output'] == "dev0:1"
+
+
+def test_device_busy_elsewhere_does_not_hold_workers(small_pool):
+    # 两次并发调用都以 dev0 开头：第二次调用等待 dev0 时不占用工作线程，
+    # 其余设备照常执行，且 dev0 从不被同时占用
+    tracker = Tracker()
+    devices = ['dev0'] + [f"dev{i}" for i in range(1, 4)]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fan_out(tracker, devices, max_concurrency=4)))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert [r['succeeded'] for r in results] == [4, 4]
+    assert tracker.overlaps == []
+    assert tracker.peak <= fanout.GLOBAL_CONCURRENCY
+    assert fanout._device_busy == {}
+
+
+def test_failures_are_isolated(small_pool):
+    def operation(device_id):
+        if device_id == 'bad':
+            raise RuntimeError("boom")
+        if device_id == 'offline':
+            return {'error': "device offline"}
+        return True, device_id, ""
+
+    result = fan_out(operation, ['ok1', 'bad', 'offline', 'ok2', 'ok1'])
+    by_device = {r['device_id']: r for r in result['results']}
+    assert (result['succeeded'], result['failed']) == (2, 2)
+    assert by_device['bad']['error'] == "boom" and by_device['offline']['error'] == "device offline"
+    assert by_device['ok2']['output'] == 'ok2'
+    assert len(result['results']) == 4
+
+
+def test_empty_list_failures_are_reported(small_pool, monkeypatch):
+    class Inventory:
+        def get(self, device_id, refresh=False):
+            if device_id == 'offline':
+                return False, {}, None, "device offline"
+            return True, {'com.foo': {'system': False}, 'android': {'system': True}}, None, ""
+
+    monkeypatch.setattr(ADBHelper, '_package_inventory', Inventory())
+    result = ADBHelper.run_on_devices('list_packages', ['dev', 'offline'])
+    by_device = {r['device_id']: r for r in result['results']}
+    assert by_device['dev']['output'] == ['com.foo']
+    assert not by_device['offline']['success'] and by_device['offline']['error'] == "device offline"
+    # 单设备接口的返回形式不变
+    assert ADBHelper.list_packages('offline') == []
+
+
+def test_waiting_for_a_device_leaves_workers_free(monkeypatch, small_pool):
+    monkeypatch.setattr(fanout, 'GLOBAL_CONCURRENCY', 2)
+    started = threading.Event()
+
+    def slow(device_id):
+        started.set()
+        time.sleep(0.5)
+        return True, "", ""
+
+    holder = threading.Thread(target=fan_out, args=(slow, ['dev0']))
+    holder.start()
+    started.wait(5)
+    # dev0 正被占用，dev1 不必排在它后面等待工作线程
+    result = fan_out(lambda device_id: (True, "", ""), ['dev0', 'dev1'])
+    holder.join(5)
+    by_device = {r['device_id']: r for r in result['results']}
+    assert by_device['dev1']['queued_ms'] < 250 and by_device['dev0']['queued_ms'] >= 250
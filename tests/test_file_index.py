@@ -0,0 +1,143 @@
+"""设备文件索引：stat 输出解析、子树查询、失效以及传输后的失效时机"""
+
+import stat
+
+import pytest
+
+from src.utils import file_index
+from src.utils.adb_helper import ADBHelper
+from src.utils.command_cache import CommandCache
+from src.utils.file_index import FileIndex, normalize, parse_index_line
+
+DIR = stat.S_IFDIR | 0o771
+FILE = stat.S_IFREG | 0o660
+
+
+def entry(path: str, mode: int = FILE, size: int = 0):
+    return path, mode, size, 1700000000, 'u0_a1', 'media_rw'
+
+
+ENTRIES = [
+    entry('/sdcard/DCIM', DIR),
+    entry('/sdcard/DCIM/a.jpg', size=100),
+    entry('/sdcard/DCIM/Camera', DIR),
+    entry('/sdcard/DCIM/Camera/b.jpg', size=300),
+    entry('/sdcard/DCIM0.txt', size=7),
+    entry('/sdcard/notes.txt', size=5),
+]
+
+
+@pytest.fixture
+def index():
+    index = FileIndex(ttl=60)
+    index.store('dev', '/sdcard', None, list(ENTRIES), complete=True)
+    return index
+
+
+def test_parse_index_line():
+    assert parse_index_line('81b0\t12\t1700000000\troot\tsdcard_rw\t/sdcard/my file.txt') == \
+        ('/sdcard/my file.txt', 0o100660, 12, 1700000000, 'root', 'sdcard_rw')
+    assert parse_index_line('41f9\t3452\t1\troot\troot\t/data/a\tb') == \
+        ('/data/a\tb', 0o40771, 3452, 1, 'root', 'root')
+    assert parse_index_line('continued line of a name') is None
+    assert parse_index_line('zz\t1\t1\tu\tg\t/x') is None
+    assert normalize('//sdcard/./DCIM/') == '/sdcard/DCIM'
+
+
+def test_subtree_and_depth(index):
+    root = index.lookup('dev', '/sdcard/DCIM')
+    assert root is not None and root.is_dir('/sdcard/DCIM/Camera')
+    # /sdcard/DCIM0.txt 与 /sdcard/DCIM 前缀相同但不在子树中
+    assert [e[0] for e in root.subtree('/sdcard/DCIM')] == \
+        ['/sdcard/DCIM/Camera', '/sdcard/DCIM/Camera/b.jpg', '/sdcard/DCIM/a.jpg']
+    assert [e[0] for e in root.subtree('/sdcard/DCIM', 1)] == ['/sdcard/DCIM/Camera', '/sdcard/DCIM/a.jpg']
+    assert index.lookup('dev', '/data') is None
+    assert index.lookup('other', '/sdcard') is None
+
+
+def test_depth_limited_index_only_covers_shallow_queries():
+    index = FileIndex()
+    index.store('dev', '/sdcard', 1, [e for e in ENTRIES if e[0].count('/') <= 2], complete=True)
+    assert index.lookup('dev', '/sdcard', 1) is not None
+    assert index.lookup('dev', '/sdcard') is None
+    assert index.lookup('dev', '/sdcard/DCIM', 1) is None
+    # 不完整的遍历结果不缓存
+    index.store('dev', '/data', None, [], complete=False)
+    assert index.lookup('dev', '/data') is None
+
+
+def test_ttl(index):
+    index.ttl = 0
+    assert index.lookup('dev', '/sdcard') is None
+
+
+@pytest.mark.parametrize('path, dropped', [
+    ('/sdcard/DCIM/new.jpg', True),   # 子树内的写操作
+    ('/sdcard', True),
+    ('/', True),                      # 覆盖索引根目录的写操作
+    ('/data/local/tmp', False),
+])
+def test_invalidate_overlapping_roots(index, path, dropped):
+    index.invalidate('dev', path)
+    assert (index.lookup('dev', '/sdcard') is None) == dropped
+
+
+def test_invalidate_whole_device(index):
+    index.invalidate('dev')
+    assert index.lookup('dev', '/sdcard') is None
+
+
+def test_match_and_rollup():
+    assert [e[0] for e in file_index.match(ENTRIES, '/sdcard', '*.jpg')] == \
+        ['/sdcard/DCIM/a.jpg', '/sdcard/DCIM/Camera/b.jpg']
+    assert [e[0] for e in file_index.match(ENTRIES, '/sdcard', 'DCIM/Camera/*')] == ['/sdcard/DCIM/Camera/b.jpg']
+    usage = file_index.rollup(ENTRIES, '/sdcard')
+    assert (usage['total_bytes'], usage['files'], usage['dirs']) == (412, 4, 2)
+    assert usage['children'][0] == {'name': 'DCIM', 'bytes': 400, 'files': 2, 'is_dir': True}
+
+
+@pytest.fixture
+def helper_index(monkeypatch):
+    index = FileIndex()
+    monkeypatch.setattr(ADBHelper, '_file_index', index)
+    monkeypatch.setattr(ADBHelper, '_command_cache', CommandCache())
+    return index
+
+
+def test_push_invalidates_listings_taken_during_transfer(helper_index, tmp_path, monkeypatch):
+    local = tmp_path / 'a.txt'
+    local.write_text('x')
+
+    def transfer(cmd, timeout=30):
+        # 传输期间的列目录结果被缓存
+        helper_index.store('dev', '/sdcard', None, list(ENTRIES), complete=True)
+        return True, "1 file pushed", ""
+
+    monkeypatch.setattr(ADBHelper, 'run_adb_command', staticmethod(transfer))
+    assert ADBHelper.push_file(str(local), '/sdcard/a.txt', 'dev')[0]
+    assert helper_index.lookup('dev', '/sdcard') is None
+
+
+def test_failed_push_still_invalidates(helper_index, tmp_path, monkeypatch):
+    def transfer(cmd, timeout=30):
+        helper_index.store('dev', '/sdcard', None, list(ENTRIES), complete=True)
+        raise OSError("adb died")
+
+    monkeypatch.setattr(ADBHelper, 'run_adb_command', staticmethod(transfer))
+    with pytest.raises(OSError):
+        ADBHelper.push_file(str(tmp_path), '/sdcard/DCIM', 'dev')
+    assert helper_index.lookup('dev', '/sdcard') is None
+
+
+def test_sync_push_invalidates_after_transfer(helper_index, tmp_path, monkeypatch):
+    def sync(*args):
+        helper_index.store('dev', '/sdcard', None, list(ENTRIES), complete=True)
+        return True, {}, ""
+
+    monkeypatch.setattr(ADBHelper, '_sync_directory', staticmethod(sync))
+    ADBHelper.sync_push(str(tmp_path), '/sdcard/DCIM', 'dev')
+    assert helper_index.lookup('dev', '/sdcard') is None
+
+    # dry_run 不修改设备，索引保留
+    ADBHelper.sync_push(str(tmp_path), '/sdcard/DCIM', 'dev', dry_run=True)
+    assert helper_index.lookup('dev', '/sdcard') is not None
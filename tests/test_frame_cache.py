@@ -0,0 +1,92 @@
+"""屏幕帧变化检测与按句柄取回缓存帧"""
+
+import pytest
+
+from src.utils import frame_cache
+from src.utils.adb_helper import ADBHelper
+from src.utils.frame_cache import GRID_COLUMNS, GRID_ROWS, FrameCache
+
+WIDTH, HEIGHT = 64, 128
+
+
+def frame(color=(10, 20, 30), patch=None):
+    """纯色帧；patch=(x, y, w, h, color) 时在该区域填充另一种颜色"""
+    pixels = bytearray(bytes(color) + b'\xff') * (WIDTH * HEIGHT)
+    if patch is not None:
+        x, y, w, h, other = patch
+        for row in range(y, y + h):
+            start = (row * WIDTH + x) * 4
+            pixels[start:start + w * 4] = (bytes(other) + b'\xff') * w
+    return bytes(pixels)
+
+
+@pytest.fixture(params=['numpy', 'pure'])
+def cache(request, monkeypatch):
+    if request.param == 'pure':
+        monkeypatch.setattr(frame_cache, 'np', None)
+    elif frame_cache.np is None:
+        pytest.skip("NumPy not installed")
+    return FrameCache()
+
+
+def test_first_frame_then_unchanged(cache):
+    first = cache.update('dev', WIDTH, HEIGHT, frame())
+    assert first['changed'] and first['first_frame']
+    assert first['change_ratio'] == 1.0
+
+    again = cache.update('dev', WIDTH, HEIGHT, frame())
+    assert not again['changed'] and again['handle'] == first['handle']
+    assert again['changed_regions'] == [] and again['bounding_box'] is None
+
+
+def test_changed_region(cache):
+    cache.update('dev', WIDTH, HEIGHT, frame())
+    # 一个分块为 8x8 像素：覆盖第 2 行第 1、2 列的分块
+    result = cache.update('dev', WIDTH, HEIGHT, frame(patch=(8, 16, 16, 8, (250, 250, 250))))
+    assert result['changed'] and not result['first_frame']
+    assert result['bounding_box'] == [8, 16, 16, 8]
+    assert len(result['changed_regions']) == 2
+    assert result['change_ratio'] == round(2 / (GRID_ROWS * GRID_COLUMNS), 4)
+
+
+def test_resolution_change_replaces_frame(cache):
+    cache.update('dev', WIDTH, HEIGHT, frame())
+    pixels = bytes(4 * HEIGHT * WIDTH)
+    result = cache.update('dev', HEIGHT, WIDTH, pixels)
+    assert result['changed'] and (result['width'], result['height']) == (HEIGHT, WIDTH)
+
+
+def test_find_by_handle(cache):
+    old = cache.update('dev', WIDTH, HEIGHT, frame())['handle']
+    new = cache.update('dev', WIDTH, HEIGHT, frame((200, 0, 0)))['handle']
+    assert cache.find(old) is None
+    found = cache.find(new)
+    assert (found.width, found.height, bytes(found.pixels)) == (WIDTH, HEIGHT, frame((200, 0, 0)))
+    cache.invalidate('dev')
+    assert cache.find(new) is None
+
+
+def test_capture_image_from_handle(monkeypatch):
+    cache = FrameCache()
+    monkeypatch.setattr(ADBHelper, '_frame_cache', cache)
+    monkeypatch.setattr(ADBHelper, 'capture_screen_raw',
+                        staticmethod(lambda device_id=None: pytest.fail("frame_handle must not capture")))
+    handle = cache.update(None, WIDTH, HEIGHT, frame())['handle']
+
+    success, image, _ = ADBHelper.capture_screenshot_image(scale=0.5, frame_handle=handle)
+    assert success
+    assert (image['format'], image['width'], image['height']) == ('png', WIDTH // 2, HEIGHT // 2)
+    assert image['data'].startswith(b'\x89PNG')
+
+    success, image, error = ADBHelper.capture_screenshot_image(frame_handle='0123456789abcdef')
+    assert not success and image is None and 'frame not found' in error
+
+
+def test_save_frame_by_handle(monkeypatch, tmp_path):
+    cache = FrameCache()
+    monkeypatch.setattr(ADBHelper, '_frame_cache', cache)
+    handle = cache.update('dev', WIDTH, HEIGHT, frame())['handle']
+    path = tmp_path / 'frame.png'
+    success, stdout, _ = ADBHelper.take_screenshot(str(path), 'dev', frame_handle=handle)
+    assert success and path.read_bytes().startswith(b'\x89PNG')
+    assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,94 @@
+"""截图数据处理：screencap 原始帧解析、裁剪缩放与 PNG 编码"""
+
+import struct
+import zlib
+
+import pytest
+
+from src.utils import image_utils
+from src.utils.image_utils import crop_and_scale, encode_png, parse_raw_screencap
+
+WIDTH, HEIGHT = 40, 30
+
+
+def gradient():
+    """每个像素的 R/G 为其列/行坐标，alpha 为 0xff"""
+    return b''.join(bytes((col, row, 7, 0xff)) for row in range(HEIGHT) for col in range(WIDTH))
+
+
+@pytest.fixture(params=['numpy', 'pure'])
+def backend(request, monkeypatch):
+    if request.param == 'pure':
+        monkeypatch.setattr(image_utils, 'np', None)
+    elif image_utils.np is None:
+        pytest.skip("NumPy not installed")
+    return request.param
+
+
+def test_parse_raw_screencap_header_sizes():
+    pixels = bytes(range(16))
+    for header in (struct.pack('<III', 2, 2, 1), struct.pack('<IIII', 2, 2, 1, 0)):
+        width, height, pixel_format, data = parse_raw_screencap(header + pixels)
+        assert (width, height, pixel_format, bytes(data)) == (2, 2, 1, pixels)
+
+    with pytest.raises(ValueError):
+        parse_raw_screencap(b'\0' * 8)
+    with pytest.raises(ValueError):
+        parse_raw_screencap(struct.pack('<III', 2, 2, 1) + pixels[:-1])
+    with pytest.raises(ValueError):
+        parse_raw_screencap(struct.pack('<III', 2, 2, 5) + pixels)
+
+
+def test_rgbx_frames_are_opaque():
+    # RGBX_8888（格式 2）的第四个字节未定义，不能作为 alpha
+    pixels = bytes((1, 2, 3, 0, 4, 5, 6, 0x42))
+    width, height, _, data = parse_raw_screencap(struct.pack('<III', 2, 1, 2) + pixels)
+    assert bytes(data) == bytes((1, 2, 3, 0xff, 4, 5, 6, 0xff))
+    # RGBA_8888 的 alpha 原样保留
+    assert bytes(parse_raw_screencap(struct.pack('<III', 2, 1, 1) + pixels)[3]) == pixels
+
+
+def test_encode_png_round_trip():
+    rgb = bytes(range(2 * 3 * 3))
+    png = encode_png(2, 3, rgb, channels=3)
+    assert png.startswith(image_utils.PNG_SIGNATURE)
+    width, height, depth, color_type = struct.unpack_from('>IIBB', png, 16)
+    assert (width, height, depth, color_type) == (2, 3, 8, 2)
+    idat_length = struct.unpack_from('>I', png, 33)[0]
+    raw = zlib.decompress(png[41:41 + idat_length])
+    assert raw == b''.join(b'\x00' + rgb[row * 6:(row + 1) * 6] for row in range(3))
+
+
+@pytest.mark.parametrize('crop, scale, size', [
+    (None, 1.0, (WIDTH, HEIGHT)),
+    (None, 0.5, (WIDTH // 2, HEIGHT // 2)),
+    (None, 0.3, (12, 9)),
+    ([10, 5, 20, 10], 1.0, (20, 10)),
+    ([30, 20, 100, 100], 0.5, (5, 5)),
+])
+def test_crop_and_scale_shape(backend, crop, scale, size):
+    width, height, channels, data = crop_and_scale(WIDTH, HEIGHT, gradient(), crop, scale)
+    assert (width, height, channels) == (*size, 3)
+    assert len(data) == width * height * 3
+
+
+def test_crop_without_scaling_keeps_pixels(backend):
+    _, _, _, data = crop_and_scale(WIDTH, HEIGHT, gradient(), [10, 5, 2, 2])
+    assert data == bytes((10, 5, 7, 11, 5, 7, 10, 6, 7, 11, 6, 7))
+
+
+def test_backends_agree_on_solid_frame(monkeypatch):
+    if image_utils.np is None:
+        pytest.skip("NumPy not installed")
+    solid = bytes((12, 34, 56, 0xff)) * (WIDTH * HEIGHT)
+    expected = crop_and_scale(WIDTH, HEIGHT, solid, [3, 4, 25, 17], 0.4)
+    monkeypatch.setattr(image_utils, 'np', None)
+    assert crop_and_scale(WIDTH, HEIGHT, solid, [3, 4, 25, 17], 0.4) == expected
+    assert expected[3] == bytes((12, 34, 56)) * (expected[0] * expected[1])
+
+
+def test_invalid_scale():
+    with pytest.raises(ValueError):
+        crop_and_scale(WIDTH, HEIGHT, gradient(), scale=0)
+    with pytest.raises(ValueError):
+        crop_and_scale(WIDTH, HEIGHT, gradient(), crop=[0, 0, 1])
@@ -0,0 +1,107 @@
+"""批量输入：步骤编译、标记行解析、超时计算以及经由长驻会话执行"""
+
+import os
+import stat
+
+import pytest
+
+from src.utils import adb_helper
+from src.utils.adb_helper import ADBHelper
+from src.utils.command_cache import CommandCache
+from src.utils.shell_session import ShellSessionPool
+
+# 用本地 sh 代替设备 shell 的 adb，每次启动都记录到 calls 文件
+FAKE_ADB = """#!/bin/sh
+echo "$*" >> "$(dirname "$0")/calls"
+if [ "$1" = "-s" ]; then shift 2; fi
+[ "$1" = "shell" ] || exit 1
+shift
+if [ $# -eq 0 ]; then exec sh; fi
+exec sh -c "$*"
+"""
+
+# 设备上的 input 命令：记录参数，keyevent 999 视为失败
+FAKE_INPUT = """#!/bin/sh
+echo "$*" >> "$(dirname "$0")/inputs"
+if [ "$1 $2" = "keyevent 999" ]; then echo "unknown keycode" >&2; exit 2; fi
+"""
+
+
+@pytest.mark.parametrize('step, command, seconds', [
+    ({'type': 'tap', 'x': 10, 'y': '20'}, "input tap 10 20", 0.5),
+    ({'type': 'Swipe', 'x1': 1, 'y1': 2, 'x2': 3, 'y2': 4, 'duration': 1000}, "input swipe 1 2 3 4 1000", 1.5),
+    ({'type': 'keyevent', 'keycode': 66}, "input keyevent 66", 0.5),
+    ({'type': 'text', 'text': "it's a test"}, "input text 'it'\"'\"'s%sa%stest'", 1.0),
+    ({'type': 'sleep', 'ms': 250}, "sleep 0.25", 0.25),
+    ({'type': 'sleep', 'seconds': 2}, "sleep 2", 2.0),
+])
+def test_compile_input_step(step, command, seconds):
+    assert ADBHelper._compile_input_step(step) == (command, seconds)
+
+
+@pytest.mark.parametrize('step, message', [
+    ({'type': 'tap', 'x': 1}, "missing parameter 'y'"),
+    ({'type': 'tap', 'x': 'left', 'y': 1}, "invalid parameter"),
+    ({'type': 'sleep', 'ms': -1}, "must not be negative"),
+    ({'type': 'scroll'}, "unknown step type"),
+])
+def test_compile_input_step_errors(step, message):
+    with pytest.raises(ValueError, match=message):
+        ADBHelper._compile_input_step(step)
+
+
+def test_parse_step_markers():
+    stdout = "noise\nM0:0: \nM1:2:unknown keycode: 999 \nM2:x:bad\nM3\n"
+    assert ADBHelper._parse_step_markers(stdout, 'M') == {0: (0, ''), 1: (2, 'unknown keycode: 999')}
+
+
+def test_timeout_follows_expected_duration(monkeypatch):
+    seen = []
+    monkeypatch.setattr(adb_helper, 'SHELL_SESSIONS', True)
+    monkeypatch.setattr(ADBHelper, '_run_in_session',
+                        staticmethod(lambda args, device_id, timeout: seen.append(timeout) or (True, "", "")))
+    ADBHelper.send_input_batch([{'type': 'tap', 'x': 1, 'y': 2}] * 3, device_id='dev')
+    # 含较长等待的批次同样经由会话执行
+    ADBHelper.send_input_batch([{'type': 'sleep', 'ms': 40000}], device_id='dev')
+    # 三次点击预计 1.5 秒
+    assert seen[0] == 8 and seen[0] <= adb_helper.SESSION_MAX_TIMEOUT
+    assert seen[1] == 65
+
+
+@pytest.fixture
+def device_shell(tmp_path, monkeypatch):
+    for name, script in (('adb', FAKE_ADB), ('input', FAKE_INPUT)):
+        path = tmp_path / name
+        path.write_text(script)
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv('PATH', f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    pool = ShellSessionPool(per_device=1, wait=0.2)
+    monkeypatch.setattr(ADBHelper, '_shell_sessions', pool)
+    monkeypatch.setattr(adb_helper, 'SHELL_SESSIONS', True)
+    monkeypatch.setattr(adb_helper, 'ADB_TRANSPORT', 'subprocess')
+    monkeypatch.setattr(ADBHelper, '_command_cache', CommandCache(enabled=False))
+    yield tmp_path
+    pool.close_all()
+
+
+def test_batch_runs_in_one_session(device_shell):
+    steps = [{'type': 'tap', 'x': 1, 'y': 2}, {'type': 'keyevent', 'keycode': 999},
+             {'type': 'text', 'text': 'never'}]
+    success, results, _ = ADBHelper.send_input_batch(steps, device_id='dev')
+    assert not success
+    assert [r['status'] for r in results] == ['ok', 'failed', 'skipped']
+    assert results[1]['exit_code'] == 2 and results[1]['output'] == 'unknown keycode'
+
+    success, results, _ = ADBHelper.send_input_batch(steps, stop_on_error=False, device_id='dev')
+    assert [r['status'] for r in results] == ['ok', 'failed', 'ok']
+
+    assert (device_shell / 'inputs').read_text().splitlines() == \
+        ['tap 1 2', 'keyevent 999', 'tap 1 2', 'keyevent 999', 'text never']
+    # 两个批次都在同一个长驻会话中执行
+    assert (device_shell / 'calls').read_text().splitlines() == ['-s dev shell']
+
+
+def test_invalid_step_is_rejected_before_running(device_shell):
+    success, results, error = ADBHelper.send_input_batch([{'type': 'tap', 'x': 1, 'y': 2}, {'type': 'fly'}])
+    assert not success and results == [] and error.startswith('step 1:')
+    assert not (device_shell / 'calls').exists()
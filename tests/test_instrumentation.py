@@ -0,0 +1,103 @@
+"""延迟与吞吐统计：命令类别、分位数、快照、Prometheus 输出和工具错误判定"""
+
+import re
+from pathlib import Path
+
+import fastmcp_server
+from src.utils import instrumentation
+from src.utils.instrumentation import Instrumentation, _Series, command_label, instrument_source
+
+
+def test_command_label():
+    assert command_label(['shell', 'getprop', 'ro.product.model']) == 'shell:getprop'
+    assert command_label(['shell', '/system/bin/dumpsys battery']) == 'shell:dumpsys'
+    assert command_label(['shell', 'for f in *; do echo $f; done']) == 'shell:for'
+    assert command_label(['shell', '[ -d /x ] && echo dir']) == 'shell:script'
+    assert command_label(['exec-out']) == 'exec-out'
+    assert command_label(['pull', '/a', '/b']) == 'pull'
+    assert command_label([]) == 'unknown'
+
+
+def test_series_quantiles():
+    series = _Series()
+    for _ in range(90):
+        series.observe(0.002, False, False, 10)
+    for _ in range(10):
+        series.observe(0.2, True, False, 0)
+    assert series.quantile(0.5) <= 0.0025
+    assert 0.1 < series.quantile(0.99) <= 0.2
+    summary = series.summary()
+    assert (summary['count'], summary['errors'], summary['bytes']) == (100, 10, 900)
+    assert summary['error_rate'] == 0.1
+    assert summary['max_ms'] == 200.0
+    assert _Series().quantile(0.5) is None
+
+
+def test_snapshot_and_reset():
+    stats = Instrumentation(prometheus_file='')
+    stats.observe('tool', 'get_battery_info', 0.01, error=True)
+    stats.observe_command('emulator-5554', ['shell', 'dumpsys', 'battery'], 0.5, False, "Command timed out", 0)
+    stats.count_spawn('command')
+    stats.count_transfer('pull', 100)
+    stats.count_connection()
+
+    snapshot = stats.snapshot(reset=True)
+    assert snapshot['tools']['get_battery_info']['errors'] == 1
+    assert snapshot['commands']['shell:dumpsys']['timeouts'] == 1
+    assert snapshot['devices']['emulator-5554']['count'] == 1
+    assert snapshot['subprocesses_spawned'] == {'command': 1, 'total': 1}
+    assert snapshot['bytes_transferred'] == {'pull': 100}
+    assert snapshot['adb_server_connections'] == 1
+
+    empty = stats.snapshot()
+    assert empty['tools'] == {} and empty['subprocesses_spawned'] == {'total': 0}
+
+
+def test_prometheus_text_and_dump(tmp_path):
+    stats = Instrumentation(prometheus_file=str(tmp_path / 'metrics' / 'adb.prom'), interval=0)
+    stats.observe('tool', 'send_tap', 0.003)
+    stats.observe('tool', 'send_tap', 7.0, error=True)
+    stats.count_spawn('shell_session')
+    text = stats.prometheus_text()
+    assert 'adb_mcp_tool_duration_seconds_bucket{tool="send_tap",le="0.005"} 1' in text
+    assert 'adb_mcp_tool_duration_seconds_bucket{tool="send_tap",le="+Inf"} 2' in text
+    assert 'adb_mcp_tool_duration_seconds_count{tool="send_tap"} 2' in text
+    assert 'adb_mcp_tool_errors_total{tool="send_tap"} 1' in text
+    assert 'adb_mcp_tool_timeouts_total' not in text
+    assert 'adb_mcp_subprocesses_spawned_total{kind="shell_session"} 1' in text
+
+    stats.maybe_dump()
+    assert (tmp_path / 'metrics' / 'adb.prom').read_text(encoding='utf-8') == text
+    assert list((tmp_path / 'metrics').iterdir()) == [tmp_path / 'metrics' / 'adb.prom']
+
+
+def test_instrument_source(monkeypatch):
+    stats = Instrumentation(prometheus_file='')
+    monkeypatch.setattr(instrumentation, '_instrumentation', stats)
+
+    def source(chunks, result):
+        yield from chunks
+        return result
+
+    assert list(instrument_source(source([b'ab', b'c'], (True, "")), 'dev', ['exec-out', 'cat'])) == [b'ab', b'c']
+    assert list(instrument_source(source([b'x'], (False, "boom")), 'dev', ['exec-out', 'cat'])) == [b'x']
+    early = instrument_source(source([b'1', b'2'], (True, "")), 'dev', ['exec-out', 'cat'])
+    next(early)
+    early.close()
+
+    command = stats.snapshot()['commands']['exec-out:cat']
+    assert (command['count'], command['errors'], command['bytes']) == (3, 1, 5)
+
+
+def test_tool_error_results():
+    assert fastmcp_server._is_error_result("❌ 获取电池信息失败: device offline")
+    assert fastmcp_server._is_error_result({'error': 'device offline'})
+    assert not fastmcp_server._is_error_result("电池信息:\n  level: 50")
+    assert not fastmcp_server._is_error_result({'level': 50})
+
+
+def test_every_error_return_starts_with_marker():
+    source = Path(fastmcp_server.__file__).read_text(encoding='utf-8')
+    returns = re.findall(r'return f?"([^"\n]*(?:失败|时发生错误)[^"\n]*)"', source)
+    assert returns
+    assert [text for text in returns if not text.startswith("❌")] == []
@@ -0,0 +1,100 @@
+"""结构化 logcat 存储：文本与二进制摄入、查询、淘汰和标签表重建"""
+
+import re
+import struct
+
+from src.utils import logcat_store
+from src.utils.logcat_store import LogStore, format_time, level_rank, parse_time
+
+BASE = parse_time('01-02 03:04:05.000')
+
+
+def text_line(i: int, tag: str = 'Tag', level: str = 'I', pid: int = 100, message: str = '') -> str:
+    return f"{format_time(BASE + i)} {pid:5d} {pid + 1:5d} {level} {tag}: {message or f'message {i}'}"
+
+
+def binary_entry(i: int, tag: str = 'Tag', level: str = 'I', pid: int = 100, message: str = '') -> bytes:
+    payload = bytes([level_rank(level) + 1]) + tag.encode() + b'\0' + (message or f'message {i}').encode() + b'\0'
+    timestamp = BASE + i
+    return struct.pack('<HHiIIIII', len(payload), 28, pid, pid + 1, int(timestamp),
+                       int(round((timestamp % 1) * 1e9)), 0, 0) + payload
+
+
+def test_text_lines_are_parsed():
+    store = LogStore(100)
+    store.append(text_line(0, 'ActivityManager', 'W', 42, 'hello: world'))
+    store.append('--------- beginning of main')
+    records, truncated = store.query()
+    assert not truncated
+    assert [r['seq'] for r in records] == [0, 1]
+    first = records[0]
+    assert (first['tag'], first['level'], first['pid'], first['tid']) == ('ActivityManager', 'W', 42, 43)
+    assert first['message'] == 'hello: world'
+    assert abs(first['time'] - BASE) < 1e-3
+    # 无法解析的行沿用上一行的时间，级别为空
+    assert records[1]['level'] == '' and records[1]['time'] == first['time']
+
+
+def test_binary_entries_are_parsed_and_formatted():
+    store = LogStore(100)
+    data = binary_entry(0, 'Net', 'E', 7, 'down') + binary_entry(1, 'Net', 'D', 7, 'up')
+    assert store.extend_binary(data + data[:10]) == len(data)
+    records, _ = store.query()
+    assert [(r['tag'], r['level'], r['message']) for r in records] == [('Net', 'E', 'down'), ('Net', 'D', 'up')]
+    assert records[0]['line'] == f"{format_time(BASE)}     7     8 E Net: down"
+
+
+def test_query_filters():
+    store = LogStore(100)
+    for i in range(10):
+        store.append(text_line(i, 'A' if i % 2 else 'B', 'E' if i >= 8 else 'D', 100 + i % 3))
+    assert [r['seq'] for r in store.query(tags=['A'])[0]] == [1, 3, 5, 7, 9]
+    assert [r['seq'] for r in store.query(pids=[101], tags=['A'])[0]] == [1, 7]
+    assert [r['seq'] for r in store.query(min_level=level_rank('E'))[0]] == [8, 9]
+    assert [r['seq'] for r in store.query(start_time=BASE + 3, end_time=BASE + 5)[0]] == [3, 4, 5]
+    assert store.query(tags=['missing']) == ([], False)
+    records, truncated = store.query(limit=3)
+    assert [r['seq'] for r in records] == [7, 8, 9] and truncated
+
+
+def test_str_pattern_matches_binary_records_with_unicode_semantics():
+    store = LogStore(100)
+    store.extend_binary(binary_entry(0, message='état changé') + binary_entry(1, message='plain'))
+    store.append(text_line(2, message='état texte'))
+    # (?u) 与非 ASCII 的 \w 在 bytes 正则中不可用或含义不同
+    assert [r['seq'] for r in store.query(pattern=re.compile(r'(?u)^\w+t\b'))[0]] == [0, 2]
+    assert [r['seq'] for r in store.query(pattern=re.compile(r'chang\w'))[0]] == [0]
+    # bytes 正则直接匹配原始字节
+    assert [r['seq'] for r in store.query(pattern=re.compile(rb'pla'))[0]] == [1]
+
+
+def test_eviction_and_iter_from():
+    store = LogStore(capacity=8, segment_size=4)
+    for i in range(20):
+        store.append(text_line(i, f'T{i % 2}'))
+    assert store.first_seq == 12 and len(store) == 8
+    assert [seq for seq, _ in store.iter_from(15)] == [15, 16, 17, 18, 19]
+    assert [seq for seq, _ in store.iter_from(0, 'T1')] == [13, 15, 17, 19]
+
+
+def test_tag_table_is_rebuilt_after_eviction(monkeypatch):
+    monkeypatch.setattr(logcat_store, 'TAG_LIMIT', 8)
+    store = LogStore(capacity=8, segment_size=4)
+    for i in range(200):
+        store.append(text_line(i, f'Unique{i}'))
+    for i in range(200, 400):
+        store.extend_binary(binary_entry(i, f'Raw{i}'))
+    assert len(store._tag_names) <= 2 * 8 + 1
+    assert len(store._raw_tag_ids) <= len(store._tag_names)
+    records, _ = store.query()
+    assert [r['tag'] for r in records] == [f'Raw{i}' for i in range(392, 400)]
+    assert [r['seq'] for r in store.query(tags=['Raw395'])[0]] == [395]
+    assert [line for _, line in store.iter_from(0, 'Raw399')][0].endswith('Raw399: message 399')
+
+
+def test_binary_resume_skips_duplicates():
+    store = LogStore(100)
+    store.extend_binary(binary_entry(0) + binary_entry(1))
+    store.begin_resume()
+    store.extend_binary(binary_entry(1) + binary_entry(2))
+    assert [r['message'] for r in store.query()[0]] == ['message 0', 'message 1', 'message 2']
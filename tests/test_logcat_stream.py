@@ -0,0 +1,105 @@
+"""后台 logcat 跟随：读取、adb 错误报告与重连"""
+
+import os
+import stat
+import time
+
+import pytest
+
+from src.utils import adb_helper
+from src.utils.adb_helper import ADBHelper
+from src.utils.logcat_stream import LogcatFollower, LogcatFollowerError, LogcatFollowerPool
+
+# `adb -s missing ...` 与真实 adb 一样报错退出；其他设备输出三行日志后按
+# FAKE_LOGCAT_MODE 保持运行（follow）或退出（exit）
+FAKE_ADB = """#!/bin/sh
+if [ "$1" = "-s" ]; then serial=$2; shift 2; fi
+if [ "$serial" = "missing" ]; then
+    echo "adb: device 'missing' not found" >&2
+    exit 1
+fi
+echo "$serial $*" >> "$(dirname "$0")/calls"
+for i in 1 2 3; do
+    echo "01-02 03:04:05.00$i  100  101 I Tag$i   : message $i"
+done
+[ "$FAKE_LOGCAT_MODE" = "exit" ] && exit 0
+exec sleep 30
+"""
+
+
+@pytest.fixture
+def fake_adb(tmp_path, monkeypatch):
+    path = tmp_path / 'adb'
+    path.write_text(FAKE_ADB)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv('PATH', f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('FAKE_LOGCAT_MODE', 'follow')
+    return tmp_path
+
+
+@pytest.fixture
+def followers(fake_adb, monkeypatch):
+    pool = LogcatFollowerPool()
+    monkeypatch.setattr(ADBHelper, '_logcat_followers', pool)
+    monkeypatch.setattr(adb_helper, 'LOGCAT_FOLLOW', True)
+    yield pool
+    pool.close_all()
+
+
+def test_read_returns_lines_and_cursor(fake_adb):
+    follower = LogcatFollower('dev', binary=False)
+    try:
+        follower.ensure_started()
+        result = follower.read()
+        assert [line.rsplit(' ', 1)[1] for line in result['lines']] == ['1', '2', '3']
+        assert follower.read(result['cursor'])['lines'] == []
+        assert follower.read(0, filter_tag='Tag2')['lines'] == [result['lines'][1]]
+        assert follower.error is None
+    finally:
+        follower.stop()
+
+
+def test_missing_device_reports_adb_error(fake_adb):
+    follower = LogcatFollower('missing', binary=False)
+    with pytest.raises(LogcatFollowerError) as excinfo:
+        follower.ensure_started()
+    assert "code 1" in str(excinfo.value)
+    assert "device 'missing' not found" in str(excinfo.value)
+    assert not follower.alive
+
+
+def test_helper_reports_error_instead_of_empty_success(followers):
+    success, data, error = ADBHelper.read_logcat(device_id='missing')
+    assert not success and data is None
+    assert "device 'missing' not found" in error
+
+    success, data, error = ADBHelper.query_logcat(device_id='missing')
+    assert not success and "device 'missing' not found" in error
+
+
+def test_dead_follower_restarts_on_next_read(followers, fake_adb, monkeypatch):
+    monkeypatch.setenv('FAKE_LOGCAT_MODE', 'exit')
+    success, data, _ = ADBHelper.read_logcat(device_id='dev')
+    assert success and len(data['lines']) == 3
+
+    follower = followers.peek('dev')
+    deadline = time.monotonic() + 2
+    while follower.alive and time.monotonic() < deadline:
+        time.sleep(0.05)
+    # 正常输出后退出码为 0 不算错误，下次读取时重连
+    assert follower.error is None
+    monkeypatch.setenv('FAKE_LOGCAT_MODE', 'follow')
+    success, data, _ = ADBHelper.read_logcat(cursor=data['cursor'], device_id='dev')
+    assert success
+    calls = (fake_adb / 'calls').read_text().splitlines()
+    assert len(calls) == 2
+    # 重连从最后接收的时间戳继续
+    assert calls[1].endswith('-T 01-02 03:04:05.003')
+
+
+def test_stopped_follower_is_not_an_error(fake_adb):
+    follower = LogcatFollower('dev', binary=False)
+    follower.ensure_started()
+    follower.stop()
+    time.sleep(0.2)
+    assert follower.error is None
@@ -0,0 +1,138 @@
+"""后台指标采样：环形缓冲区、统计、降采样、输出解析和独占会话"""
+
+import math
+import os
+import stat
+import time
+
+import pytest
+
+from src.utils.metrics_sampler import Monitor, RingBuffer, aggregate, downsample, percentile, sample_script
+
+# 用本地 sh 代替设备 shell 的 adb，每次启动都记录到 calls 文件
+FAKE_ADB = """#!/bin/sh
+echo "$*" >> "$(dirname "$0")/calls"
+if [ "$1" = "-s" ]; then shift 2; fi
+[ "$1" = "shell" ] || exit 1
+shift
+if [ $# -eq 0 ]; then exec sh; fi
+exec sh -c "$*"
+"""
+
+SAMPLE = """B 87 312 -250000
+M MemTotal: 4000000 kB
+M MemAvailable: 1000000 kB
+L 1.50 1.25 0.75 2/100 1234
+C cpu  100 0 100 700 100 0 0 0 0 0
+C cpu0 50 0 50 350 50 0 0 0 0 0
+C cpu1 50 0 50 350 50 0 0 0 0 0
+P 0 4321 (my app) S 1 2 3 4 5 6 7 8 9 10 40 10 0 0
+R 0 VmRSS:	  20480 kB"""
+
+
+def monitor(run_shell=None, **kwargs):
+    return Monitor(run_shell or (lambda args, device_id, timeout: (True, "", "")), 'dev', 1.0,
+                   ['battery', 'memory', 'load', 'cpu'], ['com.example'], **kwargs)
+
+
+def test_ring_buffer_wraps_in_order():
+    buffer = RingBuffer(['a', 'b'], capacity=3)
+    for i in range(5):
+        buffer.append(float(i), {'a': i})
+    times, columns = buffer.snapshot(['a', 'b', 'missing'])
+    assert times == [2.0, 3.0, 4.0]
+    assert columns['a'] == [2.0, 3.0, 4.0]
+    assert all(math.isnan(v) for v in columns['b']) and 'missing' not in columns
+    assert buffer.snapshot(['a'], since=3.5) == ([4.0], {'a': [4.0]})
+
+
+def test_aggregate_and_percentile():
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.5
+    stats = aggregate([3.0, math.nan, 1.0, 2.0, math.nan])
+    assert (stats['min'], stats['max'], stats['mean'], stats['last'], stats['samples']) == (1.0, 3.0, 2.0, 2.0, 3)
+    assert aggregate([math.nan]) is None
+
+
+def test_downsample_buckets():
+    times = [float(i) for i in range(10)]
+    values = [float(i) for i in range(10)]
+    assert downsample(times, values, 20) == list(zip(times, values))
+    assert downsample(times, values, 2) == [(2.0, 2.0), (7.0, 7.0)]
+    assert downsample([], [], 5) == []
+
+
+def test_sample_script_groups():
+    script = sample_script(['load'], ['a b'])
+    assert 'loadavg' in script and 'meminfo' not in script
+    assert "pidof 'a b'" in script and '/proc/stat' in script
+
+
+def test_parse_sample_output():
+    sampler = monitor()
+    first = sampler._parse(SAMPLE)
+    assert first['battery_level'] == 87 and first['battery_temp_c'] == pytest.approx(31.2)
+    assert first['battery_current_ma'] == -250
+    assert first['mem_available_bytes'] == 1000000 * 1024 and first['mem_used_percent'] == 75
+    assert (first['load_1m'], first['load_15m']) == (1.5, 0.75)
+    assert first['com.example:rss_bytes'] == 20480 * 1024
+    # CPU 占用需要两次采样的差值
+    assert 'cpu_percent' not in first
+
+    second = sampler._parse(SAMPLE.replace('cpu  100 0 100 700', 'cpu  150 0 150 800')
+                            .replace('40 10 0 0', '60 20 0 0'))
+    assert second['cpu_percent'] == pytest.approx(50.0)
+    # 进程 30 个 tick，两个核心下每核 100 个 tick
+    assert second['com.example:cpu_percent'] == pytest.approx(30.0)
+
+
+@pytest.fixture
+def fake_adb(tmp_path, monkeypatch):
+    path = tmp_path / 'adb'
+    path.write_text(FAKE_ADB)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv('PATH', f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    return tmp_path / 'calls'
+
+
+def wait_for_samples(sampler, count, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while sampler.buffer.count < count and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def test_monitor_uses_one_dedicated_session(fake_adb):
+    sampler = Monitor(lambda *args: pytest.fail("session must be used"), 'dev', 0.5, ['load'], [])
+    sampler._script = 'echo L 0.5 0.25 0.125'
+    sampler.start()
+    wait_for_samples(sampler, 3)
+    sampler.stop()
+    sampler._thread.join(5)
+
+    assert sampler.buffer.count >= 3 and sampler.errors == 0
+    assert sampler.read()['aggregates']['load_1m']['last'] == 0.5
+    # 多次采样只启动了一个 adb shell 进程
+    assert fake_adb.read_text().splitlines() == ['-s dev shell']
+
+
+def test_monitor_without_session_uses_runner():
+    calls = []
+
+    def run_shell(args, device_id, timeout):
+        calls.append((device_id, timeout))
+        return True, "L 2 1 0", ""
+
+    sampler = Monitor(run_shell, 'dev', 0.5, ['load'], [], duration=1.2, use_session=False)
+    sampler.start()
+    sampler._thread.join(5)
+    assert not sampler.running and calls and calls[0] == ('dev', 5)
+    assert sampler.read()['aggregates']['load_5m']['last'] == 1.0
+
+
+def test_monitor_records_errors():
+    sampler = monitor(lambda args, device_id, timeout: (False, "", "device offline"),
+                      duration=0.6, use_session=False)
+    sampler.start()
+    sampler._thread.join(5)
+    result = sampler.read()
+    assert result['errors'] >= 1 and result['last_error'] == "device offline"
+    assert result['samples'] == 0
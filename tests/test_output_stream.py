@@ -0,0 +1,42 @@
+"""命令输出流：逐块与逐行产出、跨块的多字节字符、字节上限和提前关闭"""
+
+from src.utils.output_stream import OutputStream
+
+
+def source(chunks, result=(True, ""), closed=None):
+    try:
+        yield from chunks
+        return result
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+def test_lines_across_chunks():
+    # "é" 的两个字节被拆到两个块中
+    stream = OutputStream(source([b'first\r\nsec', b'ond\n\xc3', b'\xa9t', b'\xc3\xa9']))
+    assert list(stream) == ['first', 'second', 'été']
+    assert stream.success and stream.bytes_read == 19 and not stream.truncated
+
+
+def test_binary_chunks_and_result():
+    stream = OutputStream(source([b'ab', b'cd'], (False, "error: closed")), binary=True)
+    assert stream.read() == b'abcd'
+    assert (stream.success, stream.stderr) == (False, "error: closed")
+
+
+def test_limit_truncates_and_stops_source():
+    closed = []
+    stream = OutputStream(source([b'line1\n', b'line2\nline3\n', b'never'], closed=closed), max_bytes=9)
+    assert list(stream) == ['line1', 'lin', stream.marker]
+    assert stream.truncated and stream.bytes_read == 9 and closed
+
+    binary = OutputStream(source([b'abc', b'def']), max_bytes=4, binary=True)
+    assert binary.read() == b'abcd' and binary.truncated
+
+
+def test_close_before_end_stops_source():
+    closed = []
+    with OutputStream(source([b'a\n', b'b\n'], closed=closed)) as stream:
+        assert next(iter(stream)) == 'a'
+    assert closed and stream.success is None
@@ -0,0 +1,77 @@
+"""已安装应用清单：pm list packages 解析、TTL、差异记录和安装/卸载后的局部更新"""
+
+from src.utils.package_inventory import THIRD_PARTY_MARKER, PackageInventory, parse_inventory, parse_package_line
+
+LINE = ('package:/data/app/~~a==/com.foo-b==/base.apk=com.foo versionCode:12 uid:10234  '
+        'installer=com.android.vending')
+
+
+def listing(packages, third_party=()):
+    lines = [f"package:/data/app/{name}/base.apk={name} versionCode:{code} uid:10000 installer=null"
+             for name, code in packages.items()]
+    return '\n'.join(lines + [THIRD_PARTY_MARKER] + [f"package:{name}" for name in third_party])
+
+
+class FakeShell:
+    def __init__(self, packages, third_party=()):
+        self.packages = dict(packages)
+        self.third_party = list(third_party)
+        self.calls = 0
+
+    def __call__(self, args, device_id=None):
+        self.calls += 1
+        # list_script(package) 以 `pm list packages -3 <包名>` 结尾
+        name = args[0].rsplit('-3', 1)[1].strip()
+        packages = {name: self.packages[name]} if name in self.packages else self.packages
+        return True, listing(packages, [p for p in self.third_party if p in packages]), ""
+
+
+def test_parse_package_line():
+    assert parse_package_line(LINE) == {'package': 'com.foo', 'path': '/data/app/~~a==/com.foo-b==/base.apk',
+                                        'version_code': 12, 'uid': 10234, 'installer': 'com.android.vending',
+                                        'system': True}
+    # 旧系统只输出包名和路径；共享 UID 以逗号分隔
+    assert parse_package_line('package:com.bar')['path'] == ''
+    assert parse_package_line('package:/a.apk=com.baz uid:1000,1001 installer=null')['uid'] == 1000
+    assert parse_package_line('Error: unknown option') is None
+
+
+def test_parse_inventory_marks_third_party():
+    packages = parse_inventory(listing({'com.sys': 1, 'com.app': 2}, ['com.app']) + '\r\n')
+    assert packages['com.app']['system'] is False and packages['com.sys']['system'] is True
+
+
+def test_ttl_and_diff():
+    shell = FakeShell({'com.a': 1, 'com.b': 1})
+    inventory = PackageInventory(shell, ttl=60)
+    success, packages, changes, _ = inventory.get('dev')
+    assert success and set(packages) == {'com.a', 'com.b'}
+    assert changes == {'added': [], 'removed': [], 'updated': []}
+    inventory.get('dev')
+    assert shell.calls == 1
+
+    shell.packages = {'com.a': 2, 'com.c': 1}
+    _, _, changes, _ = inventory.get('dev', refresh=True)
+    assert changes == {'added': ['com.c'], 'removed': ['com.b'], 'updated': ['com.a']}
+
+
+def test_install_and_remove_update_single_entry():
+    shell = FakeShell({'com.a': 1, 'com.b': 1}, ['com.a', 'com.b'])
+    inventory = PackageInventory(shell, ttl=60)
+    inventory.get('dev')
+
+    shell.packages['com.new'] = 5
+    shell.third_party.append('com.new')
+    inventory.package_installed('dev', 'com.new')
+    _, packages, changes, _ = inventory.get('dev')
+    assert packages['com.new']['version_code'] == 5 and not packages['com.new']['system']
+    assert changes['added'] == ['com.new'] and shell.calls == 2
+
+    inventory.package_removed('dev', 'com.a')
+    _, packages, changes, _ = inventory.get('dev')
+    assert 'com.a' not in packages and changes['removed'] == ['com.a'] and shell.calls == 2
+
+
+def test_failure_is_not_cached():
+    inventory = PackageInventory(lambda args, device_id=None: (False, "", "device offline"))
+    assert inventory.get('dev') == (False, {}, {}, "device offline")
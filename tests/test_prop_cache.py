@@ -0,0 +1,105 @@
+"""系统属性缓存：getprop 解析、ro.* 与其他属性的缓存时长、重启失效和按名查询"""
+
+import re
+
+from src.utils import prop_cache
+from src.utils.prop_cache import PropertyCache, parse_getprop
+
+
+class FakeShell:
+    """按脚本内容模拟设备上的 cat boot_id / getprop / getprop <key>"""
+
+    def __init__(self):
+        self.boot_id = 'boot-1'
+        self.props = {'ro.product.model': 'Pixel', 'ro.build.version.sdk': '34', 'sys.boot_completed': '1'}
+        self.scripts = []
+
+    def __call__(self, args, device_id=None):
+        script = args[0]
+        self.scripts.append(script)
+        lines = [self.boot_id]
+        if '__ADB_MCP_PROP__' in script:
+            for key in re.findall(r'echo __ADB_MCP_PROP__(\S+);', script):
+                lines += [f'__ADB_MCP_PROP__{key}', self.props.get(key, '')]
+        else:
+            skip_ro = 'grep -v' in script
+            lines += [f'[{k}]: [{v}]' for k, v in self.props.items() if not (skip_ro and k.startswith('ro.'))]
+        return True, '\n'.join(lines), ''
+
+
+def test_parse_getprop():
+    assert parse_getprop('[a.b]: [1]\n[empty]: []\nnoise\n[c]: [x: y]\n') == {'a.b': '1', 'empty': '', 'c': 'x: y'}
+
+
+def test_ro_props_cached_and_volatile_refreshed():
+    shell = FakeShell()
+    cache = PropertyCache(shell, volatile_ttl=60)
+    assert cache.get_all('dev') == (True, shell.props.copy(), '')
+    assert cache.get_all('dev')[1]['sys.boot_completed'] == '1' and len(shell.scripts) == 1
+
+    cache.volatile_ttl = 0
+    shell.props['sys.boot_completed'] = '0'
+    shell.props['ro.product.model'] = 'changed'
+    success, props, _ = cache.get_all('dev')
+    # 只刷新非 ro.* 属性
+    assert success and 'grep -v' in shell.scripts[-1]
+    assert props['sys.boot_completed'] == '0' and props['ro.product.model'] == 'Pixel'
+
+
+def test_reboot_drops_ro_props():
+    shell = FakeShell()
+    cache = PropertyCache(shell, volatile_ttl=0)
+    cache.get_all('dev')
+    shell.boot_id = 'boot-2'
+    shell.props['ro.product.model'] = 'Pixel 2'
+    assert cache.get_all('dev')[1]['ro.product.model'] == 'Pixel 2'
+    assert 'grep -v' not in shell.scripts[-1]
+
+
+def test_get_fetches_only_missing_keys():
+    shell = FakeShell()
+    cache = PropertyCache(shell, volatile_ttl=60)
+    assert cache.get(['ro.product.model', 'missing.key'], 'dev') == \
+        (True, {'ro.product.model': 'Pixel', 'missing.key': ''}, '')
+    # ro.* 已缓存，不再访问设备
+    assert cache.get(['ro.product.model'], 'dev')[1] == {'ro.product.model': 'Pixel'}
+    assert len(shell.scripts) == 1
+
+    cache.get(['sys.boot_completed'], 'dev')
+    assert len(shell.scripts) == 2
+
+
+def test_invalidate_and_errors():
+    shell = FakeShell()
+    cache = PropertyCache(shell, volatile_ttl=60)
+    cache.get_all('dev')
+    cache.invalidate('dev')
+    cache.get_all('dev')
+    assert len(shell.scripts) == 2
+
+    failing = PropertyCache(lambda args, device_id=None: (False, '', 'device offline'))
+    assert failing.get_all('dev') == (False, {}, 'device offline')
+    assert failing.get(['ro.a'], 'dev') == (False, {}, 'device offline')
+
+
+def test_get_rechecks_boot_id_after_ttl(monkeypatch):
+    shell = FakeShell()
+    cache = PropertyCache(shell, volatile_ttl=5)
+    now = [100.0]
+    monkeypatch.setattr(prop_cache.time, 'monotonic', lambda: now[0])
+    cache.get_all('dev')
+    assert cache.get(['ro.product.model'], 'dev')[1] == {'ro.product.model': 'Pixel'}
+    assert len(shell.scripts) == 1
+
+    # 设备在没有通知缓存的情况下重启；TTL 内仍返回缓存值，过期后随查询校验 boot_id
+    shell.boot_id = 'boot-2'
+    shell.props['ro.product.model'] = 'Pixel 2'
+    now[0] += 10
+    assert cache.get(['ro.product.model'], 'dev')[1] == {'ro.product.model': 'Pixel 2'}
+    assert 'ro.product.model' in shell.scripts[-1]
+    # 旧启动的全部属性已丢弃，ro.build.version.sdk 需重新读取
+    cache.get(['ro.build.version.sdk'], 'dev')
+    assert len(shell.scripts) == 3
+    assert cache.get(['ro.product.model', 'ro.build.version.sdk'], 'dev')[1] == \
+        {'ro.product.model': 'Pixel 2', 'ro.build.version.sdk': '34'}
+    assert len(shell.scripts) == 3
@@ -0,0 +1,57 @@
+"""大结果落盘存储：按行分页、单页字节上限、LRU 淘汰和清理"""
+
+import os
+
+import pytest
+
+from src.utils import result_store
+from src.utils.result_store import ResultStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, 'CACHE_DIR', str(tmp_path))
+    store = ResultStore(max_bytes=1024, max_entries=3, inline_limit=64)
+    yield store
+    store.close()
+
+
+def test_paging_by_lines(store):
+    text = '\n'.join(f'line {i}' for i in range(10))
+    info = store.put(text, 'dump')
+    assert (info['lines'], info['bytes'], info['label']) == (10, len(text), 'dump')
+
+    page = store.read(info['handle'], 0, 3)
+    assert page['text'] == 'line 0\nline 1\nline 2' and page['next_offset'] == 3
+    last = store.read(info['handle'], 8, 5)
+    assert last['text'] == 'line 8\nline 9' and last['next_offset'] is None
+    assert store.read(info['handle'], 50)['text'] == ''
+
+
+def test_page_byte_limit(store):
+    handle = store.put('\n'.join(['x' * 30] * 4) + '\n' + 'y' * 100)['handle']
+    # 单页 64 字节只容下两行
+    page = store.read(handle, 0, 10)
+    assert page['text'] == '\n'.join(['x' * 30] * 2) and page['next_offset'] == 2
+    # 超过上限的单行被截断
+    long_line = store.read(handle, 4, 10, max_bytes=10)
+    assert long_line['text'] == 'y' * 10 and long_line['next_offset'] is None
+
+
+def test_lru_eviction(store, tmp_path):
+    handles = [store.put(f'result {i}')['handle'] for i in range(3)]
+    store.read(handles[0])
+    store.put('result 3')
+    assert 'error' in store.read(handles[1])
+    assert store.read(handles[0])['text'] == 'result 0'
+
+    store.put('z' * 2000)
+    assert all('error' in store.read(h) for h in handles)
+    assert len(os.listdir(tmp_path / 'results' / str(os.getpid()))) == 1
+
+
+def test_close_removes_directory(store, tmp_path):
+    handle = store.put('')['handle']
+    assert store.read(handle)['lines'] == 1
+    store.close()
+    assert not (tmp_path / 'results' / str(os.getpid())).exists()
@@ -0,0 +1,189 @@
+"""长驻 shell 会话：分帧、子 shell 隔离、stderr 分离、借用与不重试"""
+
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from src.utils import adb_helper
+from src.utils.adb_helper import ADBHelper, CancelScope
+from src.utils.command_cache import CommandCache
+from src.utils.shell_session import (ShellSessionError, ShellSessionPool, ShellSessionUnavailable,
+                                      ShellSessionUnsupported)
+
+# 用本地 sh 代替设备 shell 的 adb：`adb [-s id] shell [cmd...]`
+FAKE_ADB = """#!/bin/sh
+if [ "$1" = "-s" ]; then shift 2; fi
+[ "$1" = "shell" ] || exit 1
+shift
+if [ $# -eq 0 ]; then exec sh; fi
+exec sh -c "$*"
+"""
+
+
+@pytest.fixture
+def fake_adb(tmp_path, monkeypatch):
+    path = tmp_path / 'adb'
+    path.write_text(FAKE_ADB)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv('PATH', f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    return tmp_path
+
+
+@pytest.fixture
+def pool(fake_adb):
+    pool = ShellSessionPool(per_device=2, wait=0.2)
+    yield pool
+    pool.close_all()
+
+
+@pytest.fixture
+def helper_pool(fake_adb, monkeypatch):
+    pool = ShellSessionPool(per_device=1, wait=0.2)
+    monkeypatch.setattr(ADBHelper, '_shell_sessions', pool)
+    monkeypatch.setattr(adb_helper, 'SHELL_SESSIONS', True)
+    monkeypatch.setattr(ADBHelper, '_command_cache', CommandCache(enabled=False))
+    yield pool
+    pool.close_all()
+
+
+def test_run_returns_exit_code_stdout_and_stderr_separately(pool):
+    assert pool.run('echo out; echo err >&2; exit 3', 'dev') == (3, 'out\n', 'err\n')
+    assert pool.run('printf no-newline', 'dev') == (0, 'no-newline', '')
+
+
+def test_commands_run_in_subshell(pool):
+    with pool.checkout('dev') as session:
+        cwd = session.run('pwd')[1]
+        session.run('cd / && FOO=bar')
+        assert session.run('pwd; echo "[$FOO]"')[1] == cwd + '[]\n'
+        session.run('exit 0')
+        # exit 只结束子 shell，会话仍然可用
+        assert session.alive
+        assert session.run('echo again') == (0, 'again\n', '')
+
+
+def test_checkout_is_exclusive_and_times_out(pool):
+    with pool.checkout('dev') as first, pool.checkout('dev') as second:
+        assert first is not None and second is not None and first is not second
+        start = time.monotonic()
+        with pool.checkout('dev') as third:
+            assert third is None
+        assert time.monotonic() - start < 1
+        with pytest.raises(ShellSessionUnavailable):
+            pool.run('echo busy', 'dev')
+    # 归还后可以再次借用，且复用已建立的会话
+    with pool.checkout('dev') as again:
+        assert again in (first, second)
+
+
+def test_timeout_kills_session_without_retry(pool, tmp_path):
+    marker = tmp_path / 'count'
+    with pool.checkout('dev') as session:
+        with pytest.raises(ShellSessionError) as excinfo:
+            session.run(f'echo x >> {marker}; sleep 5', timeout=0.3)
+        assert not isinstance(excinfo.value, ShellSessionUnavailable)
+        assert not session.alive
+    time.sleep(0.2)
+    assert marker.read_text() == 'x\n'
+
+
+def test_helper_falls_back_to_one_shot_when_sessions_busy(helper_pool, monkeypatch):
+    calls = []
+    real = ADBHelper._execute_adb_command
+    monkeypatch.setattr(ADBHelper, '_execute_adb_command',
+                        staticmethod(lambda cmd, timeout=30: calls.append(cmd) or real(cmd, timeout)))
+
+    assert ADBHelper.run_shell_command(['echo', 'a;', 'echo', 'b', '>&2'], 'dev') == (True, 'a', 'b')
+    assert calls == []
+
+    with helper_pool.checkout('dev'):
+        assert ADBHelper.run_shell_command(['echo', 'one-shot'], 'dev')[:2] == (True, 'one-shot')
+    assert calls == [['-s', 'dev', 'shell', 'echo', 'one-shot']]
+
+    # 超时较长的脚本不占用会话
+    ADBHelper.run_shell_command(['echo', 'long'], 'dev', timeout=300)
+    assert calls[-1] == ['-s', 'dev', 'shell', 'echo', 'long']
+
+
+def test_helper_does_not_retry_after_session_dies(helper_pool, tmp_path, monkeypatch):
+    marker = tmp_path / 'count'
+    monkeypatch.setattr(ADBHelper, '_execute_adb_command',
+                        staticmethod(lambda cmd, timeout=30: pytest.fail("command retried")))
+    success, _, error = ADBHelper.run_shell_command([f'echo x >> {marker};', 'kill -9 $$'], 'dev')
+    assert not success and error
+    assert marker.read_text() == 'x\n'
+
+
+def test_cancel_only_kills_callers_session(helper_pool):
+    with helper_pool.checkout('other') as other:
+        other.run('true')
+        scope = CancelScope()
+        result = {}
+
+        def runner():
+            with scope:
+                result['value'] = ADBHelper.run_shell_command(['sleep', '5'], 'dev')
+
+        thread = threading.Thread(target=runner)
+        thread.start()
+        time.sleep(0.3)
+        scope.cancel()
+        thread.join(2)
+        assert not thread.is_alive()
+        assert result['value'][0] is False
+        assert other.alive
+
+
+# 不支持 shell_v2 的设备：adb shell 把 stderr 合并进 stdout
+MERGED_ADB = """#!/bin/sh
+echo "$*" >> "$(dirname "$0")/calls"
+if [ "$1" = "-s" ]; then shift 2; fi
+[ "$1" = "shell" ] || exit 1
+shift
+if [ $# -eq 0 ]; then exec sh 2>&1; fi
+exec sh -c "$*" 2>&1
+"""
+
+
+@pytest.fixture
+def merged_adb(tmp_path, monkeypatch):
+    path = tmp_path / 'adb'
+    path.write_text(MERGED_ADB)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv('PATH', f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    return tmp_path / 'calls'
+
+
+def test_merged_streams_are_detected_before_running_commands(merged_adb, tmp_path):
+    pool = ShellSessionPool(per_device=1, wait=0.2)
+    marker = tmp_path / 'count'
+    start = time.monotonic()
+    with pytest.raises(ShellSessionUnsupported):
+        pool.run(f'echo x >> {marker}', 'dev')
+    assert time.monotonic() - start < 5
+    assert not marker.exists()
+    # 之后不再为该设备建立会话，重连（close）后重新探测
+    with pool.checkout('dev') as session:
+        assert session is None
+    pool.close('dev')
+    with pool.checkout('dev') as session:
+        assert session is not None
+    pool.close_all()
+
+
+def test_helper_uses_one_shot_shell_on_merged_streams(merged_adb, monkeypatch):
+    pool = ShellSessionPool(per_device=1, wait=0.2)
+    monkeypatch.setattr(ADBHelper, '_shell_sessions', pool)
+    monkeypatch.setattr(adb_helper, 'SHELL_SESSIONS', True)
+    monkeypatch.setattr(ADBHelper, '_command_cache', CommandCache(enabled=False))
+    monkeypatch.setattr(adb_helper, 'ADB_TRANSPORT', 'subprocess')
+
+    assert ADBHelper.run_shell_command(['echo', 'first'], 'dev')[:2] == (True, 'first')
+    assert ADBHelper.run_shell_command(['echo', 'second'], 'dev')[:2] == (True, 'second')
+    # 只探测过一次会话，之后的命令都用单次 adb shell
+    assert merged_adb.read_text().splitlines() == ['-s dev shell', '-s dev shell echo first',
+                                                   '-s dev shell echo second']
+    pool.close_all()
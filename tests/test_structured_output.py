@@ -0,0 +1,65 @@
+"""工具的 json 输出与结果判定：字段投影、分页，以及未变化不算失败"""
+
+import asyncio
+
+import fastmcp_server
+from fastmcp_server import AsyncADBHelper
+
+USAGE = {'total_bytes': 30, 'files': 3, 'dirs': 1, 'cached': True, 'truncated': False,
+         'children': [{'name': 'DCIM', 'bytes': 20, 'files': 2, 'is_dir': True},
+                      {'name': 'a.txt', 'bytes': 10, 'files': 1, 'is_dir': False}]}
+
+
+def patch(monkeypatch, name, result):
+    async def fake(*args, **kwargs):
+        return result
+    monkeypatch.setattr(AsyncADBHelper, name, staticmethod(fake))
+
+
+def test_disk_usage_pages_children(monkeypatch):
+    patch(monkeypatch, 'get_disk_usage', USAGE)
+    result = asyncio.run(fastmcp_server.get_disk_usage('/sdcard', output_format='json', fields=['name', 'bytes'],
+                                                       limit=1))
+    assert result['items'] == [{'name': 'DCIM', 'bytes': 20}]
+    assert (result['total'], result['next_offset'], result['total_bytes']) == (2, 1, 30)
+
+    text = asyncio.run(fastmcp_server.get_disk_usage('/sdcard', offset=1))
+    assert 'a.txt' in text and 'DCIM' not in text
+
+    patch(monkeypatch, 'get_disk_usage', {'error': 'no such directory'})
+    assert asyncio.run(fastmcp_server.get_disk_usage('/x', output_format='json')) == {'error': 'no such directory'}
+
+
+def test_snapshot_projects_each_section(monkeypatch):
+    patch(monkeypatch, 'get_device_snapshot', {
+        'battery': {'level_percent': 50.0, 'status': 'charging'},
+        'storage': [{'mounted_on': '/data', 'available_bytes': 1, 'size_bytes': 2}],
+    })
+    result = asyncio.run(fastmcp_server.get_device_snapshot(output_format='json',
+                                                            fields=['level_percent', 'available_bytes']))
+    assert result == {'battery': {'level_percent': 50.0}, 'storage': [{'available_bytes': 1}]}
+
+
+def test_metrics_projects_aggregates(monkeypatch):
+    patch(monkeypatch, 'get_metrics', {
+        'running': True, 'series': {'load_1m': [[1.0, 0.5]]},
+        'aggregates': {'load_1m': {'last': 0.5, 'min': 0.5, 'max': 0.5, 'p99': 0.5}, 'cpu_percent': None},
+    })
+    result = asyncio.run(fastmcp_server.get_metrics(output_format='json', fields=['last', 'max']))
+    assert result['aggregates'] == {'load_1m': {'last': 0.5, 'max': 0.5}, 'cpu_percent': None}
+    assert result['series'] == {'load_1m': [[1.0, 0.5]]}
+
+
+def test_screen_change_timeout_is_not_an_error(monkeypatch):
+    unchanged = {'handle': 'f1', 'changed': False, 'first_frame': False, 'changed_regions': [],
+                 'bounding_box': None, 'change_ratio': 0.0, 'width': 2, 'height': 2,
+                 'timed_out': True, 'polls': 3, 'elapsed_ms': 1000.0}
+    patch(monkeypatch, 'wait_for_screen_change', (True, unchanged, ""))
+    text = asyncio.run(fastmcp_server.wait_for_screen_change(timeout=1))
+    assert not fastmcp_server._is_error_result(text) and '未变化' in text
+    result = asyncio.run(fastmcp_server.wait_for_screen_change(timeout=1, output_format='json'))
+    assert result['changed'] is False and not fastmcp_server._is_error_result(result)
+
+    patch(monkeypatch, 'wait_for_screen_change', (False, None, "device offline"))
+    assert fastmcp_server._is_error_result(asyncio.run(fastmcp_server.wait_for_screen_change()))
+    assert asyncio.run(fastmcp_server.wait_for_screen_change(output_format='json')) == {'error': "device offline"}
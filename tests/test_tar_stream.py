@@ -0,0 +1,76 @@
+"""tar 流：设备端打包命令的状态行与主机端解包"""
+
+import io
+import os
+import subprocess
+
+import pytest
+
+from src.utils import tar_stream
+
+
+def run_device(command: str, cut: int = 0):
+    """用本地 sh 执行设备端命令并写入 sink（模拟 exec-out）；cut 截掉输出末尾的字节数"""
+    def produce(sink):
+        output = subprocess.run(['sh', '-c', command], stdout=subprocess.PIPE).stdout
+        sink.write(output[:-cut] if cut else output)
+        return True, ""
+    return produce
+
+
+@pytest.fixture
+def remote(tmp_path):
+    root = tmp_path / 'device' / 'data'
+    (root / 'sub').mkdir(parents=True)
+    (root / 'a.txt').write_bytes(b'alpha')
+    (root / 'sub' / 'b.bin').write_bytes(os.urandom(3000))
+    return root
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_pull_directory(remote, tmp_path, compress):
+    dest = tmp_path / 'local'
+    dest.mkdir()
+    command = tar_stream.device_create_command(str(remote), compress)
+    success, counts, error = tar_stream.receive_via_pipe(run_device(command), str(dest), compress)
+    assert (success, counts, error) == (True, (2, 3005), "")
+    assert (dest / 'data' / 'a.txt').read_bytes() == b'alpha'
+    assert (dest / 'data' / 'sub' / 'b.bin').read_bytes() == (remote / 'sub' / 'b.bin').read_bytes()
+
+
+def test_pull_with_rename(remote, tmp_path):
+    command = tar_stream.device_create_command(str(remote) + '/', False)
+    success, counts, _ = tar_stream.receive_via_pipe(run_device(command), str(tmp_path), False, ('data', 'copy'))
+    assert success and counts[0] == 2
+    assert (tmp_path / 'copy' / 'a.txt').read_bytes() == b'alpha'
+
+
+def test_device_tar_failure_is_reported(remote, tmp_path):
+    command = tar_stream.device_create_command(str(remote / 'missing'), False)
+    success, _, error = tar_stream.receive_via_pipe(run_device(command), str(tmp_path), False)
+    assert not success
+    assert 'missing' in error
+
+
+def test_truncated_stream_is_a_failure(remote, tmp_path):
+    # 截掉状态行：归档本身完整，但无法确认设备端 tar 正常结束
+    command = tar_stream.device_create_command(str(remote), False)
+    output = subprocess.run(['sh', '-c', command], stdout=subprocess.PIPE).stdout
+    trailer = len(output) - output.rindex(tar_stream.STATUS_MARKER)
+    success, _, error = tar_stream.receive_via_pipe(run_device(command, cut=trailer), str(tmp_path), False)
+    assert not success
+    assert 'exit status' in error
+
+
+def test_parse_status():
+    assert tar_stream.parse_status(b'data' + tar_stream.STATUS_MARKER + b'0:') == (0, '')
+    assert tar_stream.parse_status(tar_stream.STATUS_MARKER + b'1:tar: x: No such file\n') == (1, 'tar: x: No such file')
+    assert tar_stream.parse_status(b'no trailer') is None
+
+
+def test_create_and_extract_round_trip(remote, tmp_path):
+    buffer = io.BytesIO()
+    assert tar_stream.create_stream(buffer, str(remote), 'data', False) == (2, 3005)
+    buffer.seek(0)
+    assert tar_stream.extract_stream(buffer, str(tmp_path), False, ('data', 'out')) == (2, 3005)
+    assert (tmp_path / 'out' / 'a.txt').read_bytes() == b'alpha'